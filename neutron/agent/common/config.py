@@ -27,6 +27,11 @@ LOG = logging.getLogger(__name__)
 ROOT_HELPER_OPTS = [
     cfg.StrOpt('root_helper', default='sudo',
                help=_('Root helper application.')),
+    cfg.StrOpt('root_helper_daemon',
+               help=_('Root helper daemon application to use when '
+                      'possible. Commands run as root are then sent to a '
+                      'long lived privileged process over a UNIX socket '
+                      'instead of spawning the root helper each time.')),
     cfg.BoolOpt('use_helper_for_ns_read',
                 default=True,
                 help=_('Use the root helper to read the namespaces from '
@@ -53,6 +58,15 @@ USE_NAMESPACES_OPTS = [
 IPTABLES_OPTS = [
     cfg.BoolOpt('comment_iptables_rules', default=True,
                 help=_("Add comments to iptables rules.")),
+    cfg.BoolOpt('iptables_incremental_apply', default=False,
+                help=_("Apply iptables changes with iptables-restore "
+                       "--noflush, rewriting only the chains that changed "
+                       "since the last apply instead of saving and "
+                       "restoring the complete tables.")),
+    cfg.IntOpt('iptables_full_resync_interval', default=300,
+               help=_("Interval between full iptables-save/iptables-restore "
+                      "resyncs when iptables_incremental_apply is enabled "
+                      "(seconds), use 0 to disable")),
 ]
 
 PROCESS_MONITOR_OPTS = [
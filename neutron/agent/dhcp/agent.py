@@ -15,6 +15,7 @@
 
 import collections
 import os
+import time
 
 import eventlet
 
@@ -55,7 +56,12 @@ class DhcpAgent(manager.Manager):
         super(DhcpAgent, self).__init__(host=host)
         self.needs_resync_reasons = collections.defaultdict(list)
         self.conf = cfg.CONF
+        if self.conf.sync_batch_size < 1:
+            LOG.error(_LE('sync_batch_size must be at least 1.'))
+            raise SystemExit(1)
         self.cache = NetworkCache()
+        # Number of reloads of dirty networks and of the updates they absorbed
+        self.reload_stats = collections.Counter()
         self.dhcp_driver_cls = importutils.import_class(self.conf.dhcp_driver)
         ctx = context.get_admin_context_without_session()
         self.plugin_rpc = DhcpPluginApi(topics.PLUGIN,
@@ -96,6 +102,8 @@ class DhcpAgent(manager.Manager):
         """Activate the DHCP agent."""
         self.sync_state()
         self.periodic_resync()
+        if self.conf.reload_allocations_interval:
+            self.periodic_reload()
 
     def call_driver(self, action, network, **action_kwargs):
         """Invoke an action on a DHCP driver instance."""
@@ -142,12 +150,10 @@ class DhcpAgent(manager.Manager):
         """
         only_nets = set([] if (not networks or None in networks) else networks)
         LOG.info(_LI('Synchronizing state'))
-        pool = eventlet.GreenPool(cfg.CONF.num_sync_threads)
         known_network_ids = set(self.cache.get_network_ids())
 
         try:
-            active_networks = self.plugin_rpc.get_active_networks_info()
-            active_network_ids = set(network.id for network in active_networks)
+            active_network_ids = set(self.plugin_rpc.get_active_networks())
             for deleted_id in known_network_ids - active_network_ids:
                 try:
                     self.disable_dhcp_helper(deleted_id)
@@ -156,18 +162,44 @@ class DhcpAgent(manager.Manager):
                     LOG.exception(_LE('Unable to sync network state on '
                                       'deleted network %s'), deleted_id)
 
-            for network in active_networks:
-                if (not only_nets or  # specifically resync all
-                        network.id not in known_network_ids or  # missing net
-                        network.id in only_nets):  # specific network to sync
-                    pool.spawn(self.safe_configure_dhcp_for_network, network)
-            pool.waitall()
+            self._sync_networks(
+                [network_id for network_id in sorted(active_network_ids)
+                 if (not only_nets or  # specifically resync all
+                     network_id not in known_network_ids or  # missing net
+                     network_id in only_nets)])  # specific network to sync
             LOG.info(_LI('Synchronizing state complete'))
 
         except Exception as e:
             self.schedule_resync(e)
             LOG.exception(_LE('Unable to sync network state.'))
 
+    def _sync_networks(self, network_ids):
+        """Configure DHCP for networks, fetching them by batches.
+
+        The next batch is fetched while the networks of the previous ones are
+        configured by the sync threads, and fetching waits for a free thread.
+        """
+        pool = eventlet.GreenPool(self.conf.num_sync_threads)
+        progress = SyncProgress(len(network_ids), self.conf.sync_batch_size)
+        batch_size = self.conf.sync_batch_size
+        try:
+            for i in range(0, len(network_ids), batch_size):
+                batch = network_ids[i:i + batch_size]
+                networks = self.plugin_rpc.get_networks_info(batch)
+                # Networks deleted in the meantime are not returned
+                progress.networks_done(len(batch) - len(networks))
+                for network in networks:
+                    pool.spawn(self._sync_network, network, progress)
+        finally:
+            # Don't leave networks being configured once the sync is over
+            pool.waitall()
+
+    def _sync_network(self, network, progress):
+        try:
+            self.safe_configure_dhcp_for_network(network)
+        finally:
+            progress.networks_done(1)
+
     @utils.exception_logger()
     def _periodic_resync_helper(self):
         """Resync the dhcp state at the configured interval."""
@@ -189,6 +221,46 @@ class DhcpAgent(manager.Manager):
         """Spawn a thread to periodically resync the dhcp state."""
         eventlet.spawn(self._periodic_resync_helper)
 
+    def reload_allocations(self, network):
+        """Reload the DHCP allocations of a network after an update.
+
+        With reload_allocations_interval set, the network is only marked
+        dirty and the periodic reload picks up its latest cached state.
+        """
+        if self.conf.reload_allocations_interval:
+            self.cache.mark_dirty(network.id)
+        else:
+            self.call_driver('reload_allocations', network)
+
+    @utils.synchronized('dhcp-agent')
+    def reload_dirty_networks(self):
+        """Reload the allocations of the networks updated since last time."""
+        for network_id, events in self.cache.pop_dirty_networks().items():
+            network = self.cache.get_network_by_id(network_id)
+            if not network:
+                # DHCP was disabled for the network in the meantime
+                continue
+            self.call_driver('reload_allocations', network)
+            self.reload_stats['reloads'] += 1
+            self.reload_stats['events'] += events
+            LOG.debug("Reloaded allocations of network %(net_id)s for "
+                      "%(events)d updates (%(reloads)d reloads for "
+                      "%(total)d updates so far)",
+                      {'net_id': network_id, 'events': events,
+                       'reloads': self.reload_stats['reloads'],
+                       'total': self.reload_stats['events']})
+
+    @utils.exception_logger()
+    def _periodic_reload_helper(self):
+        """Reload the dirty networks at the configured interval."""
+        while True:
+            eventlet.sleep(self.conf.reload_allocations_interval)
+            self.reload_dirty_networks()
+
+    def periodic_reload(self):
+        """Spawn a thread to periodically reload the dirty networks."""
+        eventlet.spawn(self._periodic_reload_helper)
+
     def safe_get_network_info(self, network_id):
         try:
             network = self.plugin_rpc.get_network_info(network_id)
@@ -265,7 +337,7 @@ class DhcpAgent(manager.Manager):
         new_cidrs = set(s.cidr for s in network.subnets if s.enable_dhcp)
 
         if new_cidrs and old_cidrs == new_cidrs:
-            self.call_driver('reload_allocations', network)
+            self.reload_allocations(network)
             self.cache.put(network)
         elif new_cidrs:
             if self.call_driver('restart', network):
@@ -317,7 +389,7 @@ class DhcpAgent(manager.Manager):
         network = self.cache.get_network_by_id(updated_port.network_id)
         if network:
             self.cache.put_port(updated_port)
-            self.call_driver('reload_allocations', network)
+            self.reload_allocations(network)
 
     # Use the update handler for the port create event.
     port_create_end = port_update_end
@@ -329,7 +401,7 @@ class DhcpAgent(manager.Manager):
         if port:
             network = self.cache.get_network_by_id(port.network_id)
             self.cache.remove_port(port)
-            self.call_driver('reload_allocations', network)
+            self.reload_allocations(network)
 
     def enable_isolated_metadata_proxy(self, network):
 
@@ -376,6 +448,7 @@ class DhcpPluginApi(object):
         1.0 - Initial version.
         1.1 - Added get_active_networks_info, create_dhcp_port,
               and update_dhcp_port methods.
+        1.2 - Added get_networks_info method.
 
     """
 
@@ -396,6 +469,26 @@ class DhcpPluginApi(object):
                               host=self.host)
         return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
 
+    def get_active_networks(self):
+        """Make a remote process call to retrieve the active network ids."""
+        cctxt = self.client.prepare()
+        return cctxt.call(self.context, 'get_active_networks', host=self.host)
+
+    def get_networks_info(self, network_ids):
+        """Make a remote process call to retrieve info of networks."""
+        try:
+            cctxt = self.client.prepare(version='1.2')
+            networks = cctxt.call(self.context, 'get_networks_info',
+                                  network_ids=network_ids, host=self.host)
+        except oslo_messaging.UnsupportedVersion:
+            # The server has not been upgraded yet, fall back to fetching
+            # the networks one by one
+            LOG.debug("get_networks_info is not supported by the server, "
+                      "retrieving the networks one by one")
+            return [network for network in
+                    map(self.get_network_info, network_ids) if network]
+        return [dhcp.NetModel(self.use_namespaces, n) for n in networks]
+
     def get_network_info(self, network_id):
         """Make a remote process call to retrieve network info."""
         cctxt = self.client.prepare()
@@ -450,6 +543,8 @@ class NetworkCache(object):
         self.cache = {}
         self.subnet_lookup = {}
         self.port_lookup = {}
+        # Number of updates since the last reload, by network id
+        self.dirty_networks = collections.Counter()
 
     def get_network_ids(self):
         return self.cache.keys()
@@ -504,6 +599,14 @@ class NetworkCache(object):
                 del self.port_lookup[port.id]
                 break
 
+    def mark_dirty(self, network_id):
+        self.dirty_networks[network_id] += 1
+
+    def pop_dirty_networks(self):
+        dirty_networks = self.dirty_networks
+        self.dirty_networks = collections.Counter()
+        return dirty_networks
+
     def get_port_by_id(self, port_id):
         network = self.get_network_by_port_id(port_id)
         if network:
@@ -525,6 +628,35 @@ class NetworkCache(object):
                 'ports': num_ports}
 
 
+class SyncProgress(object):
+    """Count the networks synced by the agent and log the time left."""
+
+    def __init__(self, total, report_interval):
+        self.total = total
+        self.done = 0
+        self.report_interval = report_interval
+        self.started_at = time.time()
+
+    def networks_done(self, count):
+        if not count:
+            return
+        reported = self.done // self.report_interval
+        self.done += count
+        if (self.done // self.report_interval != reported or
+                self.done == self.total):
+            LOG.info(_LI("Synchronized %(done)d of %(total)d networks, "
+                         "%(eta)d seconds left"),
+                     {'done': self.done, 'total': self.total,
+                      'eta': self.eta()})
+
+    def eta(self):
+        """Estimate the seconds left from the average time per network."""
+        if not self.done:
+            return 0
+        elapsed = time.time() - self.started_at
+        return elapsed / self.done * (self.total - self.done)
+
+
 class DhcpAgentWithStateReport(DhcpAgent):
     def __init__(self, host=None):
         super(DhcpAgentWithStateReport, self).__init__(host=host)
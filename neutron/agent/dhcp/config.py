@@ -29,7 +29,16 @@ DHCP_AGENT_OPTS = [
                        "dedicated network. Requires "
                        "enable_isolated_metadata = True")),
     cfg.IntOpt('num_sync_threads', default=4,
-               help=_('Number of threads to use during sync process.'))
+               help=_('Number of threads to use during sync process.')),
+    cfg.IntOpt('sync_batch_size', default=50,
+               help=_('Number of networks fetched per RPC call during '
+                      'sync process. The next batch is fetched while the '
+                      'networks of the previous one are configured.')),
+    cfg.FloatOpt('reload_allocations_interval', default=0,
+                 help=_("Interval in seconds to coalesce the port and "
+                        "subnet updates of a network before reloading its "
+                        "DHCP allocations. When 0, allocations are "
+                        "reloaded on every update."))
 ]
 
 DHCP_OPTS = [
@@ -109,6 +109,16 @@ class FirewallDriver(object):
         """Update group members in a security group."""
         raise NotImplementedError()
 
+    def update_security_group_members_delta(self, sg_id, added_ips,
+                                            removed_ips):
+        """Add and remove group members of a security group.
+
+        added_ips and removed_ips map ethertypes to lists of IPs. Return
+        False if the driver can't apply them without refreshing the ports
+        whose rules refer to the security group.
+        """
+        return False
+
     def update_security_group_rules(self, sg_id, rules):
         """Update rules in a security group."""
         raise NotImplementedError()
@@ -121,6 +121,11 @@ class L3PluginApi(object):
         cctxt = self.client.prepare(version='1.3')
         return cctxt.call(context, 'get_service_plugin_list')
 
+    def get_router_checksums(self, context):
+        """Make a call to get the checksums of the routers of the agent."""
+        cctxt = self.client.prepare(version='1.5')
+        return cctxt.call(context, 'get_router_checksums', host=self.host)
+
 
 class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                  ha.AgentMixin,
@@ -148,6 +153,7 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         else:
             self.conf = cfg.CONF
         self.router_info = {}
+        self._router_checksums_supported = True
 
         self._check_config_params()
 
@@ -232,6 +238,16 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             LOG.error(msg)
             raise SystemExit(1)
 
+        if self.conf.router_processing_workers < 1:
+            msg = _LE('router_processing_workers must be at least 1.')
+            LOG.error(msg)
+            raise SystemExit(1)
+
+        if self.conf.sync_routers_chunk_size < 1:
+            msg = _LE('sync_routers_chunk_size must be at least 1.')
+            LOG.error(msg)
+            raise SystemExit(1)
+
     def _fetch_external_net_id(self, force=False):
         """Find UUID of single external network for this agent."""
         if self.conf.gateway_external_network_id:
@@ -865,6 +881,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
     def _process_router_update(self):
         for rp, update in self._queue.each_update_to_next_router():
             LOG.debug("Starting router update for %s", update.id)
+            # Forget the checksum of the router until the update succeeds,
+            # so that the next full sync fetches it again if it fails
+            ri = self.router_info.get(update.id)
+            if ri:
+                ri.checksum = None
             router = update.router
             if update.action != queue.DELETE_ROUTER and not router:
                 try:
@@ -892,6 +913,11 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
 
             try:
                 self._process_router_if_compatible(router)
+                # Only a router synced with its checksum is known unchanged
+                # at the next full sync
+                ri = self.router_info.get(router['id'])
+                if ri:
+                    ri.checksum = update.checksum
             except n_exc.RouterNotCompatibleWithAgent as e:
                 LOG.exception(e.msg)
                 # Was the router previously handled by this agent?
@@ -908,11 +934,15 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
             LOG.debug("Finished a router update for %s", update.id)
             rp.fetched_and_processed(update.timestamp)
 
-    def _process_routers_loop(self):
-        LOG.debug("Starting _process_routers_loop")
-        pool = eventlet.GreenPool(size=8)
+    def _process_routers_loop(self, worker=0):
+        LOG.debug("Starting _process_routers_loop of worker %d", worker)
         while True:
-            pool.spawn_n(self._process_router_update)
+            try:
+                self._process_router_update()
+            except Exception:
+                LOG.exception(_LE("Failed processing router update in "
+                                  "worker %d"), worker)
+                self.fullsync = True
 
     @periodic_task.periodic_task
     def periodic_sync_routers_task(self, context):
@@ -941,9 +971,15 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
         prev_router_ids = set(self.router_info)
         timestamp = timeutils.utcnow()
 
+        checksums = {}
         try:
             if self.conf.use_namespaces:
-                routers = self.plugin_rpc.get_routers(context)
+                checksums = self._fetch_router_checksums(context)
+                if checksums is None:
+                    checksums = {}
+                    routers = self.plugin_rpc.get_routers(context)
+                else:
+                    routers = self._fetch_changed_routers(context, checksums)
             else:
                 routers = self.plugin_rpc.get_routers(context,
                                                       [self.conf.router_id])
@@ -958,12 +994,17 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                 update = queue.RouterUpdate(r['id'],
                                             queue.PRIORITY_SYNC_ROUTERS_TASK,
                                             router=r,
-                                            timestamp=timestamp)
+                                            timestamp=timestamp,
+                                            checksum=checksums.get(r['id']))
                 self._queue.add(update)
             self.fullsync = False
             LOG.debug("periodic_sync_routers_task successfully completed")
 
             curr_router_ids = set([r['id'] for r in routers])
+            # The unchanged routers are kept as they are
+            for router_id in set(checksums) - curr_router_ids:
+                ns_manager.keep_router(router_id)
+                curr_router_ids.add(router_id)
 
             # Delete routers that have disappeared since the last sync
             for router_id in prev_router_ids - curr_router_ids:
@@ -974,8 +1015,38 @@ class L3NATAgent(firewall_l3_agent.FWaaSL3AgentRpcCallback,
                                             action=queue.DELETE_ROUTER)
                 self._queue.add(update)
 
+    def _fetch_router_checksums(self, context):
+        """Return the checksums of the routers, None if not supported."""
+        if not self._router_checksums_supported:
+            return
+        try:
+            return self.plugin_rpc.get_router_checksums(context)
+        except oslo_messaging.RemoteError as e:
+            if e.exc_type not in ('UnsupportedVersion', 'AttributeError'):
+                raise
+            LOG.warning(_LW('The server does not support syncing the '
+                            'routers by checksum, syncing all the routers. '
+                            'Detail message: %s'), e)
+            self._router_checksums_supported = False
+
+    def _fetch_changed_routers(self, context, checksums):
+        """Fetch in chunks the routers whose checksum changed."""
+        router_ids = sorted(
+            router_id for router_id, checksum in checksums.items()
+            if (router_id not in self.router_info or
+                self.router_info[router_id].checksum != checksum))
+        LOG.debug("Fetching %(changed)d changed routers out of %(total)d",
+                  {'changed': len(router_ids), 'total': len(checksums)})
+        chunk_size = self.conf.sync_routers_chunk_size
+        routers = []
+        for i in range(0, len(router_ids), chunk_size):
+            routers.extend(self.plugin_rpc.get_routers(
+                context, router_ids[i:i + chunk_size]))
+        return routers
+
     def after_start(self):
-        eventlet.spawn_n(self._process_routers_loop)
+        for worker in range(self.conf.router_processing_workers):
+            eventlet.spawn_n(self._process_routers_loop, worker)
         LOG.info(_LI("L3 agent started"))
         # When L3 agent is ready, we immediately do a full sync
         self.periodic_sync_routers_task(self.context)
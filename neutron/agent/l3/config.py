@@ -64,5 +64,20 @@ OPTS = [
     cfg.StrOpt('metadata_access_mark',
                default='0x1',
                help=_('Iptables mangle mark used to mark metadata valid '
-                      'requests'))
+                      'requests')),
+    cfg.IntOpt('router_processing_workers',
+               default=8,
+               help=_("Number of greenthreads processing the router "
+                      "updates from a shared queue. The updates of a "
+                      "router are processed one at a time.")),
+    cfg.BoolOpt('use_ip_batch',
+                default=False,
+                help=_("Apply the address, route and ARP entry changes of a "
+                       "router with one 'ip -batch' process instead of one "
+                       "process per change. The root helper filters cannot "
+                       "check the commands of a batch.")),
+    cfg.IntOpt('sync_routers_chunk_size',
+               default=64,
+               help=_("Number of routers fetched at once when syncing the "
+                      "routers whose checksum changed.")),
 ]
@@ -175,7 +175,7 @@ class DvrRouter(router.RouterInfo):
                 if f['subnet_id'] == subnet_id:
                     return port
 
-    def _update_arp_entry(self, ip, mac, subnet_id, operation):
+    def _update_arp_entry(self, ip, mac, subnet_id, operation, batch=None):
         """Add or delete arp entry into router namespace for the subnet."""
         port = self._get_internal_port(subnet_id)
         # update arp entry only if the subnet is attached to the router
@@ -184,10 +184,10 @@ class DvrRouter(router.RouterInfo):
 
         ip_cidr = str(ip) + '/32'
         try:
-            # TODO(mrsmith): optimize the calls below for bulk calls
             net = netaddr.IPNetwork(ip_cidr)
             interface_name = self.get_internal_device_name(port['id'])
-            device = ip_lib.IPDevice(interface_name, namespace=self.ns_name)
+            device = ip_lib.IPDevice(interface_name, namespace=self.ns_name,
+                                     batch=batch)
             if operation == 'add':
                 device.neigh.add(net.version, ip, mac)
             elif operation == 'delete':
@@ -207,10 +207,15 @@ class DvrRouter(router.RouterInfo):
         # processing a router.
         subnet_ports = self.agent.get_ports_by_subnet(subnet_id)
 
+        batch = self._get_ip_batch()
         for p in subnet_ports:
             if p['device_owner'] not in l3_constants.ROUTER_INTERFACE_OWNERS:
                 for fixed_ip in p['fixed_ips']:
                     self._update_arp_entry(fixed_ip['ip_address'],
                                            p['mac_address'],
                                            subnet_id,
-                                           'add')
+                                           'add',
+                                           batch)
+        if batch and batch.flush():
+            raise RuntimeError(_("DVR: Failed updating arp entries of "
+                                 "subnet %s") % subnet_id)
@@ -59,6 +59,10 @@ class RouterInfo(object):
         self.driver = interface_driver
         # radvd is a neutron.agent.linux.ra.DaemonMonitor
         self.radvd = None
+        # Checksum of the router sync data last processed, if known
+        self.checksum = None
+        # The NAT rules of each floating IP, by floating and fixed IP
+        self.floating_ip_nat_rules = {}
 
     @property
     def router(self):
@@ -94,7 +98,16 @@ class RouterInfo(object):
                           *args, action=self._snat_action)
         self._snat_action = None
 
-    def _update_routing_table(self, operation, route):
+    def _get_ip_batch(self):
+        """Return an IpBatch of the router namespace, None if disabled."""
+        if self.agent_conf.use_ip_batch:
+            return ip_lib.IpBatch(namespace=self.ns_name)
+
+    def _update_routing_table(self, operation, route, batch=None):
+        if batch:
+            batch.add([], 'route', [operation, 'to', route['destination'],
+                                    'via', route['nexthop']])
+            return
         cmd = ['ip', 'route', operation, 'to', route['destination'],
                'via', route['nexthop']]
         ip_wrapper = ip_lib.IPWrapper(namespace=self.ns_name)
@@ -106,6 +119,7 @@ class RouterInfo(object):
         old_routes = self.routes
         adds, removes = common_utils.diff_list_of_dict(old_routes,
                                                        new_routes)
+        batch = self._get_ip_batch()
         for route in adds:
             LOG.debug("Added route entry is '%s'", route)
             # remove replaced route from deleted route
@@ -113,10 +127,12 @@ class RouterInfo(object):
                 if route['destination'] == del_route['destination']:
                     removes.remove(del_route)
             #replace success even if there is no existing route
-            self._update_routing_table('replace', route)
+            self._update_routing_table('replace', route, batch)
         for route in removes:
             LOG.debug("Removed route entry is '%s'", route)
-            self._update_routing_table('delete', route)
+            self._update_routing_table('delete', route, batch)
+        if batch:
+            batch.flush()
         self.routes = new_routes
 
     def get_ex_gw_port(self):
@@ -134,23 +150,33 @@ class RouterInfo(object):
                 ('float-snat', '-s %s -j SNAT --to %s' %
                  (fixed_ip, floating_ip))]
 
+    @staticmethod
+    def _get_floating_ip_nat_tag(key):
+        return 'floating_ip-%s-%s' % key
+
     def process_floating_ip_nat_rules(self):
         """Configure NAT rules for the router's floating IPs.
 
-        Configures iptables rules for the floating ips of the given router
+        Configures iptables rules for the floating ips of the given router.
+        Only the rules of the floating ips added, removed or remapped since
+        the last call are changed.
         """
-        # Clear out all iptables rules for floating ips
-        self.iptables_manager.ipv4['nat'].clear_rules_by_tag('floating_ip')
-
-        floating_ips = self.get_floating_ips()
-        # Loop once to ensure that floating ips are configured.
-        for fip in floating_ips:
-            # Rebuild iptables rules for the floating ip.
-            fixed = fip['fixed_ip_address']
-            fip_ip = fip['floating_ip_address']
-            for chain, rule in self.floating_forward_rules(fip_ip, fixed):
-                self.iptables_manager.ipv4['nat'].add_rule(chain, rule,
-                                                           tag='floating_ip')
+        nat = self.iptables_manager.ipv4['nat']
+        fip_rules = {}
+        for fip in self.get_floating_ips():
+            key = (fip['floating_ip_address'], fip['fixed_ip_address'])
+            fip_rules[key] = self.floating_forward_rules(*key)
+
+        for key, rules in self.floating_ip_nat_rules.items():
+            if fip_rules.get(key) != rules:
+                nat.clear_rules_by_tag(self._get_floating_ip_nat_tag(key))
+                del self.floating_ip_nat_rules[key]
+        for key, rules in sorted(fip_rules.items()):
+            if key not in self.floating_ip_nat_rules:
+                for chain, rule in rules:
+                    nat.add_rule(chain, rule,
+                                 tag=self._get_floating_ip_nat_tag(key))
+                self.floating_ip_nat_rules[key] = rules
 
         self.iptables_manager.apply()
 
@@ -182,7 +208,8 @@ class RouterInfo(object):
     def remove_floating_ip(self, device, ip_cidr):
         net = netaddr.IPNetwork(ip_cidr)
         device.addr.delete(net.version, ip_cidr)
-        self.driver.delete_conntrack_state(namespace=self.ns_name, ip=ip_cidr)
+        ip_lib.call_after_batch(device, self.driver.delete_conntrack_state,
+                                namespace=self.ns_name, ip=ip_cidr)
 
     def get_router_cidrs(self, device):
         return set([addr['cidr'] for addr in device.addr.list()])
@@ -200,9 +227,13 @@ class RouterInfo(object):
                       self.router['id'])
             return fip_statuses
 
-        device = ip_lib.IPDevice(interface_name, namespace=self.ns_name)
+        # The address changes of a batch are applied at once at the end
+        batch = self._get_ip_batch()
+        device = ip_lib.IPDevice(interface_name, namespace=self.ns_name,
+                                 batch=batch)
         existing_cidrs = self.get_router_cidrs(device)
         new_cidrs = set()
+        added_fips = {}
 
         floating_ips = self.get_floating_ips()
         # Loop once to ensure that floating ips are configured.
@@ -214,6 +245,7 @@ class RouterInfo(object):
             if ip_cidr not in existing_cidrs:
                 fip_statuses[fip['id']] = self.add_floating_ip(
                     fip, interface_name, device)
+                added_fips[ip_cidr] = fip['id']
 
         fips_to_remove = (
             ip_cidr for ip_cidr in existing_cidrs - new_cidrs
@@ -221,6 +253,16 @@ class RouterInfo(object):
         for ip_cidr in fips_to_remove:
             self.remove_floating_ip(device, ip_cidr)
 
+        if batch:
+            for failure in batch.flush():
+                if failure.command == 'addr' and failure.args[0] == 'add':
+                    fip_id = added_fips.get(failure.args[1])
+                    if fip_id:
+                        LOG.warn(_LW("Unable to configure IP address for "
+                                     "floating IP: %s"), fip_id)
+                        fip_statuses[fip_id] = (
+                            l3_constants.FLOATINGIP_STATUS_ERROR)
+
         return fip_statuses
 
     def configure_fip_addresses(self, interface_name):
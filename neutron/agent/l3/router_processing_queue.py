@@ -31,7 +31,7 @@ class RouterUpdate(object):
     and process a request to update a router.
     """
     def __init__(self, router_id, priority,
-                 action=None, router=None, timestamp=None):
+                 action=None, router=None, timestamp=None, checksum=None):
         self.priority = priority
         self.timestamp = timestamp
         if not timestamp:
@@ -39,6 +39,7 @@ class RouterUpdate(object):
         self.id = router_id
         self.action = action
         self.router = router
+        self.checksum = checksum
 
     def __lt__(self, other):
         """Implements priority among updates
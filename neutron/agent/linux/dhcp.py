@@ -15,6 +15,7 @@
 
 import abc
 import collections
+import hashlib
 import os
 import re
 import shutil
@@ -273,6 +274,27 @@ class DhcpLocalProcess(DhcpBase):
         pass
 
 
+# The config lines rendered for a port, and the leases of its host lines
+PortLines = collections.namedtuple('PortLines',
+                                   ['hosts', 'addn_hosts', 'opts', 'leases'])
+
+
+class DnsmasqConfigCache(object):
+    """Config lines of the ports of a network, kept across reloads.
+
+    Only the ports which changed since the last reload are rendered again,
+    and the config files whose content didn't change are not rewritten.
+    """
+
+    def __init__(self):
+        # Key of what port lines depend on besides the port itself
+        self.network_key = None
+        # Port id -> (port key, PortLines)
+        self.ports = {}
+        # Config file name -> hash of the content last written
+        self.file_hashes = {}
+
+
 class Dnsmasq(DhcpLocalProcess):
     # The ports that need to be opened when security policies are active
     # on the Neutron port used for DHCP.  These are provided as a convenience
@@ -283,6 +305,9 @@ class Dnsmasq(DhcpLocalProcess):
 
     _TAG_PREFIX = 'tag%d'
 
+    # Network id -> DnsmasqConfigCache, as a driver is created for each call
+    _config_caches = {}
+
     @classmethod
     def check_version(cls):
         pass
@@ -377,6 +402,10 @@ class Dnsmasq(DhcpLocalProcess):
         """Spawn the process, if it's not spawned already."""
         self._spawn_or_reload_process(reload_with_HUP=False)
 
+    def disable(self, retain_port=False):
+        super(Dnsmasq, self).disable(retain_port)
+        self._config_caches.pop(self.network.id, None)
+
     def _spawn_or_reload_process(self, reload_with_HUP):
         """Spawns or reloads a Dnsmasq process for the network.
 
@@ -434,28 +463,136 @@ class Dnsmasq(DhcpLocalProcess):
             name,  # Canonical hostname in the format 'hostname[.domain]'.
         )
         """
-        v6_nets = dict((subnet.id, subnet) for subnet in
-                       self.network.subnets if subnet.ip_version == 6)
+        v6_nets = self._get_v6_nets()
         for port in self.network.ports:
-            for alloc in port.fixed_ips:
-                # Note(scollins) Only create entries that are
-                # associated with the subnet being managed by this
-                # dhcp agent
-                if alloc.subnet_id in v6_nets:
-                    addr_mode = v6_nets[alloc.subnet_id].ipv6_address_mode
-                    if addr_mode == constants.IPV6_SLAAC:
-                        continue
-                    elif addr_mode == constants.DHCPV6_STATELESS:
-                        alloc = hostname = fqdn = None
-                        yield (port, alloc, hostname, fqdn)
-                        continue
+            for host in self._iter_port_hosts(port, v6_nets):
+                yield host
+
+    def _get_v6_nets(self):
+        return dict((subnet.id, subnet) for subnet in
+                    self.network.subnets if subnet.ip_version == 6)
+
+    def _iter_port_hosts(self, port, v6_nets):
+        """Iterate over the hosts of a port, see _iter_hosts."""
+        for alloc in port.fixed_ips:
+            # Note(scollins) Only create entries that are
+            # associated with the subnet being managed by this
+            # dhcp agent
+            if alloc.subnet_id in v6_nets:
+                addr_mode = v6_nets[alloc.subnet_id].ipv6_address_mode
+                if addr_mode == constants.IPV6_SLAAC:
+                    continue
+                elif addr_mode == constants.DHCPV6_STATELESS:
+                    alloc = hostname = fqdn = None
+                    yield (port, alloc, hostname, fqdn)
+                    continue
+
+            hostname = 'host-%s' % alloc.ip_address.replace(
+                '.', '-').replace(':', '-')
+            fqdn = hostname
+            if self.conf.dhcp_domain:
+                fqdn = '%s.%s' % (fqdn, self.conf.dhcp_domain)
+            yield (port, alloc, hostname, fqdn)
+
+    def _get_config_cache(self):
+        cache = self._config_caches.setdefault(self.network.id,
+                                               DnsmasqConfigCache())
+        network_key = (self.conf.dhcp_domain,
+                       tuple((s.id, s.enable_dhcp,
+                              getattr(s, 'ipv6_address_mode', None))
+                             for s in self.network.subnets))
+        if cache.network_key != network_key:
+            cache.network_key = network_key
+            cache.ports = {}
+        return cache
+
+    @staticmethod
+    def _get_port_key(port):
+        extra_dhcp_opts = getattr(port, 'extra_dhcp_opts', None) or []
+        return (port.mac_address, port.device_owner,
+                tuple((alloc.subnet_id, alloc.ip_address)
+                      for alloc in port.fixed_ips),
+                tuple((opt.opt_name, opt.opt_value, opt.ip_version)
+                      for opt in extra_dhcp_opts))
+
+    def _get_ports_lines(self):
+        """Return the PortLines of the network ports, in the ports order.
+
+        The lines of the ports which didn't change since the last reload
+        are taken from the config cache.
+        """
+        cache = self._get_config_cache()
+        v6_nets = self._get_v6_nets()
+        dhcp_enabled_subnet_ids = set(s.id for s in self.network.subnets
+                                      if s.enable_dhcp)
+        ports = {}
+        ports_lines = []
+        for port in self.network.ports:
+            port_key = self._get_port_key(port)
+            cached = cache.ports.get(port.id)
+            if cached and cached[0] == port_key:
+                port_lines = cached[1]
+            else:
+                port_lines = self._render_port(port, v6_nets,
+                                               dhcp_enabled_subnet_ids)
+            ports[port.id] = (port_key, port_lines)
+            ports_lines.append(port_lines)
+        cache.ports = ports
+        return ports_lines
+
+    def _render_port(self, port, v6_nets, dhcp_enabled_subnet_ids):
+        hosts = []
+        addn_hosts = []
+        leases = set()
+        has_extra_opts = getattr(port, 'extra_dhcp_opts', False)
+        for (port, alloc, hostname, name) in self._iter_port_hosts(port,
+                                                                   v6_nets):
+            if not alloc:
+                if has_extra_opts:
+                    hosts.append('%s,%s%s\n' %
+                                 (port.mac_address, 'set:', port.id))
+                continue
 
-                hostname = 'host-%s' % alloc.ip_address.replace(
-                    '.', '-').replace(':', '-')
-                fqdn = hostname
-                if self.conf.dhcp_domain:
-                    fqdn = '%s.%s' % (fqdn, self.conf.dhcp_domain)
-                yield (port, alloc, hostname, fqdn)
+            # It is compulsory to write the `fqdn` before the `hostname` in
+            # order to obtain it in PTR responses.
+            addn_hosts.append('%s\t%s %s\n' %
+                              (alloc.ip_address, name, hostname))
+
+            # don't write ip address which belongs to a dhcp disabled subnet.
+            if alloc.subnet_id not in dhcp_enabled_subnet_ids:
+                continue
+
+            leases.add((alloc.ip_address, port.mac_address))
+            # (dzyu) Check if it is legal ipv6 address, if so, need wrap
+            # it with '[]' to let dnsmasq to distinguish MAC address from
+            # IPv6 address.
+            ip_address = alloc.ip_address
+            if netaddr.valid_ipv6(ip_address):
+                ip_address = '[%s]' % ip_address
+
+            if has_extra_opts:
+                hosts.append('%s,%s,%s,%s%s\n' %
+                             (port.mac_address, name, ip_address,
+                              'set:', port.id))
+            else:
+                hosts.append('%s,%s,%s\n' %
+                             (port.mac_address, name, ip_address))
+
+        return PortLines(hosts=hosts, addn_hosts=addn_hosts,
+                         opts=self._generate_opts_for_port(port),
+                         leases=leases)
+
+    def _replace_config_file(self, filename, content):
+        """Write a config file unless it already has this content."""
+        cache = self._config_caches.get(self.network.id)
+        content_hash = hashlib.sha1(content).hexdigest()
+        if (cache and cache.file_hashes.get(filename) == content_hash and
+                os.path.exists(filename)):
+            LOG.debug('Config file %s is unchanged', filename)
+            return
+        utils.replace_file(filename, content)
+        if cache:
+            cache.file_hashes[filename] = content_hash
 
     def _output_hosts_file(self):
         """Writes a dnsmasq compatible dhcp hosts file.
@@ -473,41 +610,14 @@ class Dnsmasq(DhcpLocalProcess):
         should receive a dhcp lease, the hosts resolution in itself is
         defined by the `_output_addn_hosts_file` method.
         """
-        buf = six.StringIO()
         filename = self.get_conf_file_name('host')
 
         LOG.debug('Building host file: %s', filename)
-        dhcp_enabled_subnet_ids = [s.id for s in self.network.subnets
-                                   if s.enable_dhcp]
-        for (port, alloc, hostname, name) in self._iter_hosts():
-            if not alloc:
-                if getattr(port, 'extra_dhcp_opts', False):
-                    buf.write('%s,%s%s\n' %
-                              (port.mac_address, 'set:', port.id))
-                continue
-
-            # don't write ip address which belongs to a dhcp disabled subnet.
-            if alloc.subnet_id not in dhcp_enabled_subnet_ids:
-                continue
-
-            # (dzyu) Check if it is legal ipv6 address, if so, need wrap
-            # it with '[]' to let dnsmasq to distinguish MAC address from
-            # IPv6 address.
-            ip_address = alloc.ip_address
-            if netaddr.valid_ipv6(ip_address):
-                ip_address = '[%s]' % ip_address
-
-            if getattr(port, 'extra_dhcp_opts', False):
-                buf.write('%s,%s,%s,%s%s\n' %
-                          (port.mac_address, name, ip_address,
-                           'set:', port.id))
-            else:
-                buf.write('%s,%s,%s\n' %
-                          (port.mac_address, name, ip_address))
-
-        utils.replace_file(filename, buf.getvalue())
+        content = ''.join(line for port_lines in self._get_ports_lines()
+                          for line in port_lines.hosts)
+        self._replace_config_file(filename, content)
         LOG.debug('Done building host file %s with contents:\n%s', filename,
-                  buf.getvalue())
+                  content)
         return filename
 
     def _read_hosts_file_leases(self, filename):
@@ -520,11 +630,30 @@ class Dnsmasq(DhcpLocalProcess):
         return leases
 
     def _release_unused_leases(self):
-        filename = self.get_conf_file_name('host')
-        old_leases = self._read_hosts_file_leases(filename)
+        cache = self._config_caches.get(self.network.id)
+        if cache is None:
+            # Nothing was written since the agent started, read the leases
+            # of the current hosts file
+            filename = self.get_conf_file_name('host')
+            old_leases = self._read_hosts_file_leases(filename)
+            ports = self.network.ports
+        else:
+            # Only the ports which changed since the hosts file was written
+            # can have unused leases
+            old_leases = set()
+            ports = []
+            cached_ports = dict(cache.ports)
+            for port in self.network.ports:
+                cached = cached_ports.pop(port.id, None)
+                if not cached or cached[0] != self._get_port_key(port):
+                    ports.append(port)
+                    if cached:
+                        old_leases |= cached[1].leases
+            for port_key, port_lines in cached_ports.values():
+                old_leases |= port_lines.leases
 
         new_leases = set()
-        for port in self.network.ports:
+        for port in ports:
             for alloc in port.fixed_ips:
                 new_leases.add((alloc.ip_address, port.mac_address))
 
@@ -541,14 +670,10 @@ class Dnsmasq(DhcpLocalProcess):
         Each line in this file is in the same form as a standard /etc/hosts
         file.
         """
-        buf = six.StringIO()
-        for (port, alloc, hostname, fqdn) in self._iter_hosts():
-            # It is compulsory to write the `fqdn` before the `hostname` in
-            # order to obtain it in PTR responses.
-            if alloc:
-                buf.write('%s\t%s %s\n' % (alloc.ip_address, fqdn, hostname))
+        content = ''.join(line for port_lines in self._get_ports_lines()
+                          for line in port_lines.addn_hosts)
         addn_hosts = self.get_conf_file_name('addn_hosts')
-        utils.replace_file(addn_hosts, buf.getvalue())
+        self._replace_config_file(addn_hosts, content)
         return addn_hosts
 
     def _output_opts_file(self):
@@ -557,7 +682,7 @@ class Dnsmasq(DhcpLocalProcess):
         options += self._generate_opts_per_port(subnet_index_map)
 
         name = self.get_conf_file_name('opts')
-        utils.replace_file(name, '\n'.join(options))
+        self._replace_config_file(name, '\n'.join(options))
         return name
 
     def _generate_opts_per_subnet(self):
@@ -635,26 +760,32 @@ class Dnsmasq(DhcpLocalProcess):
                                                        i, 'router'))
         return options, subnet_index_map
 
+    def _generate_opts_for_port(self, port):
+        options = []
+        if getattr(port, 'extra_dhcp_opts', False):
+            port_ip_versions = set(
+                [netaddr.IPAddress(ip.ip_address).version
+                 for ip in port.fixed_ips])
+            for opt in port.extra_dhcp_opts:
+                opt_ip_version = opt.ip_version
+                if opt_ip_version in port_ip_versions:
+                    options.append(
+                        self._format_option(opt_ip_version, port.id,
+                                            opt.opt_name, opt.opt_value))
+                else:
+                    LOG.info(_LI("Cannot apply dhcp option %(opt)s "
+                                 "because it's ip_version %(version)d "
+                                 "is not in port's address IP versions"),
+                             {'opt': opt.opt_name,
+                              'version': opt_ip_version})
+        return options
+
     def _generate_opts_per_port(self, subnet_index_map):
         options = []
         dhcp_ips = collections.defaultdict(list)
-        for port in self.network.ports:
-            if getattr(port, 'extra_dhcp_opts', False):
-                port_ip_versions = set(
-                    [netaddr.IPAddress(ip.ip_address).version
-                     for ip in port.fixed_ips])
-                for opt in port.extra_dhcp_opts:
-                    opt_ip_version = opt.ip_version
-                    if opt_ip_version in port_ip_versions:
-                        options.append(
-                            self._format_option(opt_ip_version, port.id,
-                                                opt.opt_name, opt.opt_value))
-                    else:
-                        LOG.info(_LI("Cannot apply dhcp option %(opt)s "
-                                     "because it's ip_version %(version)d "
-                                     "is not in port's address IP versions"),
-                                 {'opt': opt.opt_name,
-                                  'version': opt_ip_version})
+        ports_lines = self._get_ports_lines()
+        for port, port_lines in zip(self.network.ports, ports_lines):
+            options.extend(port_lines.opts)
 
             # provides all dnsmasq ip as dns-server if there is more than
             # one dnsmasq for a subnet and there is no dns-server submitted
@@ -0,0 +1,105 @@
+# Copyright (c) 2015 OpenStack Foundation.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+from neutron.agent.linux import utils as linux_utils
+from neutron.common import constants
+from neutron.i18n import _LE
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Zone 0 is the default zone of the untracked traffic
+ZONE_MIN = 1
+ZONE_MAX = 65535
+# conntrack options of a deletion, in command line order
+ENTRY_OPTIONS = ('-f', '-p', '-s', '-d', '--dport', '-w')
+ADDRESS_FAMILY = {constants.IPv4: 'ipv4',
+                  constants.IPv6: 'ipv6'}
+
+
+class IpConntrackManager(object):
+    """Smart wrapper for conntrack.
+
+       Hands out the conntrack zones of the devices, and queues the
+       deletion of the entries of the flows a firewall stopped allowing.
+       The queue is run once per apply, without the deletions which an
+       other queued deletion already covers.
+    """
+
+    def __init__(self, execute=None, namespace=None):
+        self.execute = execute or linux_utils.execute
+        self.namespace = namespace
+        self.zones = {}
+        self._pending_entries = []
+
+    def get_zone(self, key):
+        """Return the zone of a device or network, allocating it first."""
+        if key not in self.zones:
+            used_zones = set(self.zones.values())
+            for zone in range(ZONE_MIN, ZONE_MAX + 1):
+                if zone not in used_zones:
+                    self.zones[key] = zone
+                    break
+            else:
+                LOG.error(_LE("No conntrack zone left for %s"), key)
+                return
+        return self.zones[key]
+
+    def release_zones(self, used_keys):
+        """Release the zones of the keys no longer used."""
+        for key in set(self.zones) - set(used_keys):
+            del self.zones[key]
+
+    def delete_entries(self, ethertype, protocol=None, source=None,
+                       dest=None, dport=None, zone=None):
+        """Queue the deletion of the entries matching the given fields."""
+        entry = {'-f': ADDRESS_FAMILY[ethertype], '-p': protocol,
+                 '-s': source, '-d': dest, '--dport': dport, '-w': zone}
+        entry = frozenset((option, str(value))
+                          for option, value in entry.items()
+                          if value is not None)
+        self._pending_entries.append(entry)
+
+    def apply(self):
+        """Delete the entries queued since the last apply."""
+        entries = self._get_pending_entries()
+        self._pending_entries = []
+        for entry in entries:
+            options = dict(entry)
+            cmd = ['conntrack', '-D']
+            for option in ENTRY_OPTIONS:
+                if option in options:
+                    cmd.extend([option, options[option]])
+            try:
+                # conntrack -D returns 1 when no entry matched
+                self._apply(cmd)
+            except RuntimeError:
+                LOG.exception(_LE("Failed deleting conntrack entries "
+                                  "with %s"), ' '.join(cmd))
+
+    def _get_pending_entries(self):
+        entries = set(self._pending_entries)
+        # A deletion matching fewer fields covers the deletions matching
+        # the same fields and more
+        return sorted((entry for entry in entries
+                       if not any(other < entry for other in entries)),
+                      key=sorted)
+
+    def _apply(self, cmd):
+        cmd_ns = []
+        if self.namespace:
+            cmd_ns.extend(['ip', 'netns', 'exec', self.namespace])
+        cmd_ns.extend(cmd)
+        return self.execute(cmd_ns, run_as_root=True, check_exit_code=True,
+                            extra_ok_codes=[1])
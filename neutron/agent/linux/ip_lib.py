@@ -13,8 +13,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import eventlet
+import collections
+import itertools
+import re
 
+import eventlet
 import netaddr
 from oslo_config import cfg
 
@@ -38,6 +41,11 @@ LOOPBACK_DEVNAME = 'lo'
 VLAN_INTERFACE_DETAIL = ['vlan protocol 802.1q',
                          'vlan protocol 802.1Q',
                          'vlan id']
+# ip -batch reports the line of each failed command after its error
+BATCH_COMMAND_FAILED = re.compile(r'^Command failed -:(\d+)$')
+
+IpBatchFailure = collections.namedtuple('IpBatchFailure',
+                                        'options command args error')
 
 
 class SubProcessBase(object):
@@ -215,9 +223,10 @@ class IpRule(IPWrapper):
 
 
 class IPDevice(SubProcessBase):
-    def __init__(self, name, namespace=None):
+    def __init__(self, name, namespace=None, batch=None):
         super(IPDevice, self).__init__(namespace=namespace)
         self.name = name
+        self.batch = batch
         self.link = IpLinkCommand(self)
         self.addr = IpAddrCommand(self)
         self.route = IpRouteCommand(self)
@@ -246,6 +255,12 @@ class IpCommandBase(object):
                                      args,
                                      kwargs.get('use_root_namespace', False))
 
+    def _as_root_or_batch(self, *args, **kwargs):
+        batch = getattr(self._parent, 'batch', None)
+        if not isinstance(batch, IpBatch):
+            return self._as_root(*args, **kwargs)
+        batch.add(kwargs.get('options', []), self.COMMAND, args)
+
 
 class IpDeviceCommandBase(IpCommandBase):
     @property
@@ -327,22 +342,22 @@ class IpAddrCommand(IpDeviceCommandBase):
     COMMAND = 'addr'
 
     def add(self, ip_version, cidr, broadcast, scope='global'):
-        self._as_root('add',
-                      cidr,
-                      'brd',
-                      broadcast,
-                      'scope',
-                      scope,
-                      'dev',
-                      self.name,
-                      options=[ip_version])
+        self._as_root_or_batch('add',
+                               cidr,
+                               'brd',
+                               broadcast,
+                               'scope',
+                               scope,
+                               'dev',
+                               self.name,
+                               options=[ip_version])
 
     def delete(self, ip_version, cidr):
-        self._as_root('del',
-                      cidr,
-                      'dev',
-                      self.name,
-                      options=[ip_version])
+        self._as_root_or_batch('del',
+                               cidr,
+                               'dev',
+                               self.name,
+                               options=[ip_version])
 
     def flush(self):
         self._as_root('flush', self.name)
@@ -419,10 +434,12 @@ class IpRouteCommand(IpDeviceCommandBase):
         return [x for x in iterate_routes()]
 
     def add_onlink_route(self, cidr):
-        self._as_root('replace', cidr, 'dev', self.name, 'scope', 'link')
+        self._as_root_or_batch('replace', cidr, 'dev', self.name,
+                               'scope', 'link')
 
     def delete_onlink_route(self, cidr):
-        self._as_root('del', cidr, 'dev', self.name, 'scope', 'link')
+        self._as_root_or_batch('del', cidr, 'dev', self.name,
+                               'scope', 'link')
 
     def get_gateway(self, scope=None, filters=None):
         if filters is None:
@@ -491,37 +508,37 @@ class IpRouteCommand(IpDeviceCommandBase):
         args = ['replace', cidr, 'via', ip, 'dev', self.name]
         if table:
             args += ['table', table]
-        self._as_root(*args)
+        self._as_root_or_batch(*args)
 
     def delete_route(self, cidr, ip, table=None):
         args = ['del', cidr, 'via', ip, 'dev', self.name]
         if table:
             args += ['table', table]
-        self._as_root(*args)
+        self._as_root_or_batch(*args)
 
 
 class IpNeighCommand(IpDeviceCommandBase):
     COMMAND = 'neigh'
 
     def add(self, ip_version, ip_address, mac_address):
-        self._as_root('replace',
-                      ip_address,
-                      'lladdr',
-                      mac_address,
-                      'nud',
-                      'permanent',
-                      'dev',
-                      self.name,
-                      options=[ip_version])
+        self._as_root_or_batch('replace',
+                               ip_address,
+                               'lladdr',
+                               mac_address,
+                               'nud',
+                               'permanent',
+                               'dev',
+                               self.name,
+                               options=[ip_version])
 
     def delete(self, ip_version, ip_address, mac_address):
-        self._as_root('del',
-                      ip_address,
-                      'lladdr',
-                      mac_address,
-                      'dev',
-                      self.name,
-                      options=[ip_version])
+        self._as_root_or_batch('del',
+                               ip_address,
+                               'lladdr',
+                               mac_address,
+                               'dev',
+                               self.name,
+                               options=[ip_version])
 
 
 class IpNetnsCommand(IpCommandBase):
@@ -563,6 +580,94 @@ class IpNetnsCommand(IpCommandBase):
         return False
 
 
+class IpBatch(object):
+    """Queues the ip commands changing a namespace, to run them at once.
+
+    The address, route and neighbour changes of the devices of a batch are
+    queued until flush, which runs them in order with one 'ip -force -batch'
+    process per run of commands sharing their options. ip carries on past
+    the commands failing, and flush reports each of them.
+    """
+
+    def __init__(self, namespace=None):
+        self.namespace = namespace
+        self._commands = []
+        self._callbacks = []
+
+    def device(self, name):
+        """Return a device of the namespace queuing its changes here."""
+        return IPDevice(name, namespace=self.namespace, batch=self)
+
+    def add(self, options, command, args):
+        self._commands.append((tuple(options), command,
+                               tuple(str(arg) for arg in args)))
+
+    def after_flush(self, func, *args, **kwargs):
+        """Call func once the queued commands ran."""
+        self._callbacks.append((func, args, kwargs))
+
+    def flush(self):
+        """Run the queued commands, then the queued calls.
+
+        Return an IpBatchFailure for each failed command.
+        """
+        commands, self._commands = self._commands, []
+        callbacks, self._callbacks = self._callbacks, []
+        failures = []
+        for options, group in itertools.groupby(commands, lambda c: c[0]):
+            failures.extend(self._run_batch(options, list(group)))
+        for failure in failures:
+            LOG.error(_LE("Failed running ip %(command)s in namespace "
+                          "%(namespace)s: %(error)s"),
+                      {'command': ' '.join((failure.command,) +
+                                           failure.args),
+                       'namespace': self.namespace,
+                       'error': failure.error})
+        for func, args, kwargs in callbacks:
+            func(*args, **kwargs)
+        return failures
+
+    def _run_batch(self, options, commands):
+        cmd = (['ip'] + ['-%s' % o for o in options] +
+               ['-force', '-batch', '-'])
+        cmd = add_namespace_to_cmd(cmd, self.namespace)
+        lines = [' '.join((command,) + args)
+                 for _options, command, args in commands]
+        _stdout, stderr = utils.execute(
+            cmd, process_input='\n'.join(lines) + '\n', run_as_root=True,
+            check_exit_code=False, return_stderr=True,
+            log_fail_as_error=False)
+        failures = []
+        error = []
+        for line in stderr.splitlines():
+            match = BATCH_COMMAND_FAILED.match(line)
+            if not match:
+                error.append(line)
+                continue
+            failed = commands[int(match.group(1)) - 1]
+            failures.append(IpBatchFailure(options, failed[1], failed[2],
+                                           '\n'.join(error)))
+            error = []
+        if error and not failures:
+            # ip could not run any command, e.g. without the namespace
+            failures = [IpBatchFailure(options, command, args,
+                                       '\n'.join(error))
+                        for _options, command, args in commands]
+        return failures
+
+
+def call_after_batch(device, func, *args, **kwargs):
+    """Call func once the changes queued on device are applied.
+
+    A device not part of an IpBatch applies its changes right away.
+    """
+    batch = getattr(device, 'batch', None)
+    if isinstance(batch, IpBatch):
+        batch.after_flush(func, *args, **kwargs)
+    else:
+        func(*args, **kwargs)
+
+
 def device_exists(device_name, namespace=None):
     """Return True if the device exists in the namespace."""
     try:
@@ -11,7 +11,10 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+from oslo_utils import excutils
+
 from neutron.agent.linux import utils as linux_utils
+from neutron.common import constants
 from neutron.common import utils
 
 IPSET_ADD_BULK_THRESHOLD = 5
@@ -24,12 +27,22 @@ class IpsetManager(object):
 
        Keeps track of ip addresses per set, using bulk
        or single ip add/remove for smaller changes.
+
+       The sets the kernel already holds are indexed on first use, so
+       that an agent restart only changes the sets which differ. The
+       changes are written with ipset restore, once per call, or once
+       for all the sets changed while applying is deferred. When a restore
+       fails, the sets are indexed again from the kernel.
     """
 
     def __init__(self, execute=None, namespace=None):
         self.execute = execute or linux_utils.execute
         self.namespace = namespace
         self.ipset_sets = {}
+        self._sets_loaded = False
+        self._defer_apply = False
+        # ipset restore lines waiting for defer_apply_off
+        self._pending_input = []
 
     @staticmethod
     def get_name(id, ethertype):
@@ -41,6 +54,7 @@ class IpsetManager(object):
 
     def set_exists(self, id, ethertype):
         """Returns true if the id+ethertype pair is known to the manager."""
+        self._load_sets()
         set_name = self.get_name(id, ethertype)
         return set_name in self.ipset_sets
 
@@ -51,49 +65,122 @@ class IpsetManager(object):
         add / remove new members, or swapped atomically if
         that's faster.
         """
+        self._load_sets()
         set_name = self.get_name(id, ethertype)
         if not self.set_exists(id, ethertype):
-            # The initial creation is handled with create/refresh to
-            # avoid any downtime for existing sets (i.e. avoiding
-            # a flush/restore), as the restore operation of ipset is
-            # additive to the existing set.
-            self._create_set(set_name, ethertype)
-            self._refresh_set(set_name, member_ips, ethertype)
-            # TODO(majopela,shihanzhang,haleyb): Optimize this by
-            # gathering the system ipsets at start. So we can determine
-            # if a normal restore is enough for initial creation.
-            # That should speed up agent boot up time.
+            process_input = self._create_set_input(set_name, ethertype)
+            process_input += self._add_members_input(set_name, member_ips)
         else:
             add_ips = self._get_new_set_ips(set_name, member_ips)
             del_ips = self._get_deleted_set_ips(set_name, member_ips)
             if (len(add_ips) + len(del_ips) < IPSET_ADD_BULK_THRESHOLD):
-                self._add_members_to_set(set_name, add_ips)
-                self._del_members_from_set(set_name, del_ips)
+                process_input = (self._add_members_input(set_name, add_ips) +
+                                 self._del_members_input(set_name, del_ips))
             else:
-                self._refresh_set(set_name, member_ips, ethertype)
+                process_input = self._refresh_set_input(set_name, member_ips,
+                                                        ethertype)
+        self.ipset_sets[set_name] = list(member_ips)
+        self._restore_or_defer(process_input)
+
+    @utils.synchronized('ipset', external=True)
+    def add_members(self, id, ethertype, member_ips):
+        """Add members to an existing set."""
+        set_name = self.get_name(id, ethertype)
+        add_ips = [ip for ip in member_ips
+                   if ip not in self.ipset_sets[set_name]]
+        self.ipset_sets[set_name].extend(add_ips)
+        self._restore_or_defer(self._add_members_input(set_name, add_ips))
+
+    @utils.synchronized('ipset', external=True)
+    def del_members(self, id, ethertype, member_ips):
+        """Remove members from an existing set."""
+        set_name = self.get_name(id, ethertype)
+        del_ips = [ip for ip in member_ips
+                   if ip in self.ipset_sets[set_name]]
+        self.ipset_sets[set_name] = [ip for ip in self.ipset_sets[set_name]
+                                     if ip not in del_ips]
+        self._restore_or_defer(self._del_members_input(set_name, del_ips))
 
     @utils.synchronized('ipset', external=True)
     def destroy(self, id, ethertype, forced=False):
+        # The pending changes may refer to the set
+        self._apply_pending()
         set_name = self.get_name(id, ethertype)
         self._destroy(set_name, forced)
 
+    def defer_apply_on(self):
+        self._defer_apply = True
+
+    @utils.synchronized('ipset', external=True)
+    def defer_apply_off(self):
+        self._defer_apply = False
+        self._apply_pending()
+
+    def _load_sets(self):
+        """Index the members of the sets the kernel holds, once."""
+        if self._sets_loaded:
+            return
+        ipset_sets = {}
+        for line in self._apply(['ipset', 'save']).splitlines():
+            words = line.split()
+            if len(words) < 3 or not words[1].startswith(
+                    (constants.IPv4, constants.IPv6)):
+                continue
+            if words[0] == 'create' and not words[1].endswith(SWAP_SUFFIX):
+                ipset_sets[words[1]] = []
+            elif words[0] == 'add' and words[1] in ipset_sets:
+                ipset_sets[words[1]].append(words[2])
+        ipset_sets.update(self.ipset_sets)
+        self.ipset_sets = ipset_sets
+        self._sets_loaded = True
+
+    def _create_set_input(self, set_name, ethertype):
+        return ["create %s hash:ip family %s" %
+                (set_name, self._get_ipset_set_type(ethertype))]
+
+    def _add_members_input(self, set_name, member_ips):
+        return ["add %s %s" % (set_name, ip) for ip in member_ips]
+
+    def _del_members_input(self, set_name, member_ips):
+        return ["del %s %s" % (set_name, ip) for ip in member_ips]
+
+    def _refresh_set_input(self, set_name, member_ips, ethertype):
+        new_set_name = set_name + SWAP_SUFFIX
+        # A swap set left by an interrupted refresh may hold members
+        process_input = self._create_set_input(new_set_name, ethertype)
+        process_input.append("flush %s" % new_set_name)
+        process_input += self._add_members_input(new_set_name, member_ips)
+        process_input.append("swap %s %s" % (new_set_name, set_name))
+        process_input.append("destroy %s" % new_set_name)
+        return process_input
+
+    def _restore_or_defer(self, process_input):
+        self._pending_input.extend(process_input)
+        if not self._defer_apply:
+            self._apply_pending()
+
+    def _apply_pending(self):
+        if self._pending_input:
+            process_input = self._pending_input
+            self._pending_input = []
+            try:
+                self._restore_sets(process_input)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    # The index already has the changes the kernel may
+                    # have missed, index the kernel sets again instead
+                    self.ipset_sets = {}
+                    self._sets_loaded = False
+
     def _add_member_to_set(self, set_name, member_ip):
         cmd = ['ipset', 'add', '-exist', set_name, member_ip]
         self._apply(cmd)
         self.ipset_sets[set_name].append(member_ip)
 
     def _refresh_set(self, set_name, member_ips, ethertype):
-        new_set_name = set_name + SWAP_SUFFIX
-        set_type = self._get_ipset_set_type(ethertype)
-        process_input = ["create %s hash:ip family %s" % (new_set_name,
-                                                          set_type)]
-        for ip in member_ips:
-            process_input.append("add %s %s" % (new_set_name, ip))
-
-        self._restore_sets(process_input)
-        self._swap_sets(new_set_name, set_name)
-        self._destroy(new_set_name, True)
-        self.ipset_sets[set_name] = member_ips
+        self._restore_sets(
+            self._refresh_set_input(set_name, member_ips, ethertype))
+        self.ipset_sets[set_name] = list(member_ips)
 
     def _del_member_from_set(self, set_name, member_ip):
         cmd = ['ipset', 'del', set_name, member_ip]
@@ -112,7 +199,7 @@ class IpsetManager(object):
         if self.namespace:
             cmd_ns.extend(['ip', 'netns', 'exec', self.namespace])
         cmd_ns.extend(cmd)
-        self.execute(cmd_ns, run_as_root=True, process_input=input)
+        return self.execute(cmd_ns, run_as_root=True, process_input=input)
 
     def _get_new_set_ips(self, set_name, expected_ips):
         new_member_ips = (set(expected_ips) -
@@ -124,16 +211,6 @@ class IpsetManager(object):
                               set(expected_ips))
         return list(deleted_member_ips)
 
-    def _add_members_to_set(self, set_name, add_ips):
-        for ip in add_ips:
-            if ip not in self.ipset_sets[set_name]:
-                self._add_member_to_set(set_name, ip)
-
-    def _del_members_from_set(self, set_name, del_ips):
-        for ip in del_ips:
-            if ip in self.ipset_sets[set_name]:
-                self._del_member_from_set(set_name, ip)
-
     def _get_ipset_set_type(self, ethertype):
         return 'inet6' if ethertype == 'IPv6' else 'inet'
 
@@ -141,10 +218,6 @@ class IpsetManager(object):
         cmd = ['ipset', 'restore', '-exist']
         self._apply(cmd, process_input)
 
-    def _swap_sets(self, src_set, dest_set):
-        cmd = ['ipset', 'swap', src_set, dest_set]
-        self._apply(cmd)
-
     def _destroy(self, set_name, forced=False):
         if set_name in self.ipset_sets or forced:
             cmd = ['ipset', 'destroy', set_name]
@@ -13,10 +13,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+
 import netaddr
 from oslo_config import cfg
 
 from neutron.agent import firewall
+from neutron.agent.linux import ip_conntrack
 from neutron.agent.linux import ipset_manager
 from neutron.agent.linux import iptables_comments as ic
 from neutron.agent.linux import iptables_manager
@@ -34,10 +37,15 @@ SPOOF_FILTER = 'spoof-filter'
 CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'i',
                      EGRESS_DIRECTION: 'o',
                      SPOOF_FILTER: 's'}
+# Prefixes of the chains shared by the ports of the same security groups
+SG_CHAIN_NAME_PREFIX = {INGRESS_DIRECTION: 'gi',
+                        EGRESS_DIRECTION: 'go'}
 DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
                        'egress': 'dest_ip_prefix'}
 IPSET_DIRECTION = {INGRESS_DIRECTION: 'src',
                    EGRESS_DIRECTION: 'dst'}
+# Protocols conntrack tracks the ports of
+CONNTRACK_PORT_PROTOCOLS = ('tcp', 'udp', 'sctp', 'udplite')
 LINUX_DEV_LEN = 14
 comment_rule = iptables_manager.comment_rule
 
@@ -65,6 +73,11 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         self.sg_members = {}
         self.pre_sg_members = None
         self.enable_ipset = cfg.CONF.SECURITYGROUP.enable_ipset
+        self.shared_sg_chains = cfg.CONF.SECURITYGROUP.shared_sg_chains
+        # Names of the shared security group chains set up
+        self.sg_chains = set()
+        self.ipconntrack = ip_conntrack.IpConntrackManager()
+        self.flush_conntrack = cfg.CONF.SECURITYGROUP.flush_conntrack
 
     @property
     def ports(self):
@@ -78,6 +91,41 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         LOG.debug("Update members of security group (%s)", sg_id)
         self.sg_members[sg_id] = sg_members
 
+    def update_security_group_members_delta(self, sg_id, added_ips,
+                                            removed_ips):
+        # Without ipset the rules of the ports list the member IPs, and the
+        # rules referring to a group without ipset yet are left out
+        ethertypes = [ethertype
+                      for ethertype in (constants.IPv4, constants.IPv6)
+                      if added_ips.get(ethertype) or
+                      removed_ips.get(ethertype)]
+        if not self.enable_ipset or not all(
+                self.ipset.set_exists(sg_id, ethertype)
+                for ethertype in ethertypes):
+            return False
+        LOG.debug("Update members of security group (%s) by delta", sg_id)
+        sg_members = self.sg_members.setdefault(sg_id, {})
+        for ethertype in ethertypes:
+            added = added_ips.get(ethertype, [])
+            removed = removed_ips.get(ethertype, [])
+            current_ips = sg_members.get(ethertype, [])
+            sg_members[ethertype] = (
+                [ip for ip in current_ips if ip not in removed] +
+                [ip for ip in added if ip not in current_ips])
+            self.ipset.add_members(sg_id, ethertype, added)
+            self.ipset.del_members(sg_id, ethertype, removed)
+        if self.flush_conntrack:
+            removed_ips = dict((ethertype, removed_ips.get(ethertype, []))
+                               for ethertype in ethertypes)
+            for port in self.filtered_ports.values():
+                for rule in self._get_port_rules(port, self.sg_rules):
+                    # The delta may change the members of one ethertype
+                    removed = removed_ips.get(rule['ethertype'])
+                    if rule.get('remote_group_id') == sg_id and removed:
+                        self._delete_conntrack_entries(port, rule, removed)
+            self.ipconntrack.apply()
+        return True
+
     def prepare_port_filter(self, port):
         LOG.debug("Preparing device (%s) filter", port['device'])
         self._remove_chains()
@@ -131,6 +179,9 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             self._remove_chain(port, INGRESS_DIRECTION)
             self._remove_chain(port, EGRESS_DIRECTION)
             self._remove_chain(port, SPOOF_FILTER)
+        for chain_name in self.sg_chains:
+            self._remove_chain_by_name_v4v6(chain_name)
+        self.sg_chains = set()
         self._remove_chain_by_name_v4v6(SG_CHAIN)
 
     def _setup_chain(self, port, DIRECTION):
@@ -336,9 +387,18 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def _add_rules_by_security_group(self, port, direction):
         # select rules for current port and direction
         security_group_rules = self._select_sgr_by_direction(port, direction)
-        security_group_rules += self._select_sg_rules_for_port(port, direction)
+        sg_chain_name = None
+        if (self.shared_sg_chains and self.enable_ipset and
+                port.get('security_groups')):
+            # with ipset, the rules of security groups don't depend on the
+            # port and are set up in a chain shared by their ports
+            sg_chain_name = self._add_sg_chain(port['security_groups'],
+                                               direction)
+        else:
+            security_group_rules += self._select_sg_rules_for_port(
+                port, direction)
         # make sure ipset members are updated for remote security groups
-        if self.enable_ipset:
+        if self.enable_ipset and not sg_chain_name:
             remote_sg_ids = self._get_remote_sg_ids(port, direction)
             self._update_ipset_members(remote_sg_ids)
         # split groups by ip version
@@ -357,14 +417,48 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             ipv6_iptables_rules += self._accept_inbound_icmpv6()
         # include IPv4 and IPv6 iptable rules from security group
         ipv4_iptables_rules += self._convert_sgr_to_iptables_rules(
-            ipv4_sg_rules)
+            ipv4_sg_rules, sg_chain_name)
         ipv6_iptables_rules += self._convert_sgr_to_iptables_rules(
-            ipv6_sg_rules)
+            ipv6_sg_rules, sg_chain_name)
         # finally add the rules to the port chain for a given direction
         self._add_rules_to_chain_v4v6(self._port_chain_name(port, direction),
                                       ipv4_iptables_rules,
                                       ipv6_iptables_rules)
 
+    def _sg_chain_name(self, sg_ids, direction):
+        digest = hashlib.sha1(','.join(sorted(sg_ids))).hexdigest()
+        return iptables_manager.get_chain_name(
+            '%s%s' % (SG_CHAIN_NAME_PREFIX[direction], digest))
+
+    def _add_sg_chain(self, sg_ids, direction):
+        """Set up the chain shared by the ports of security groups.
+
+        A match returns from the chain, and the port chains jump to it last,
+        so that a packet accepted by a port still goes through the chains of
+        the other ports on its way. Unmatched packets are dropped.
+        """
+        chain_name = self._sg_chain_name(sg_ids, direction)
+        if chain_name in self.sg_chains:
+            return chain_name
+        self.sg_chains.add(chain_name)
+        self._add_chain_by_name_v4v6(chain_name)
+        security_group_rules = [rule
+                                for sg_id in sorted(sg_ids)
+                                for rule in self.sg_rules.get(sg_id, [])
+                                if rule['direction'] == direction]
+        self._update_ipset_members(self._get_remote_sg_ids(
+            {'security_groups': sg_ids}, direction))
+        ipv4_sg_rules, ipv6_sg_rules = self._split_sgr_by_ethertype(
+            security_group_rules)
+        ipv4_iptables_rules = self._convert_sgr_to_return_rules(ipv4_sg_rules)
+        ipv6_iptables_rules = self._convert_sgr_to_return_rules(ipv6_sg_rules)
+        fallback_rule = [comment_rule('-j $sg-fallback',
+                                      comment=ic.UNMATCHED)]
+        self._add_rules_to_chain_v4v6(chain_name,
+                                      ipv4_iptables_rules + fallback_rule,
+                                      ipv6_iptables_rules + fallback_rule)
+        return chain_name
+
     def _add_fixed_egress_rules(self, port, ipv4_iptables_rules,
                                 ipv6_iptables_rules):
         self._spoofing_rule(port,
@@ -425,17 +519,27 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
         else:
             return self._generate_plain_rule_args(sg_rule)
 
-    def _convert_sgr_to_iptables_rules(self, security_group_rules):
+    def _convert_sgr_to_iptables_rules(self, security_group_rules,
+                                       sg_chain_name=None):
         iptables_rules = []
         self._drop_invalid_packets(iptables_rules)
         self._allow_established(iptables_rules)
+        iptables_rules += self._convert_sgr_to_return_rules(
+            security_group_rules)
+
+        if sg_chain_name:
+            iptables_rules += ['-j $%s' % sg_chain_name]
+        else:
+            iptables_rules += [comment_rule('-j $sg-fallback',
+                                            comment=ic.UNMATCHED)]
+        return iptables_rules
+
+    def _convert_sgr_to_return_rules(self, security_group_rules):
+        iptables_rules = []
         for rule in security_group_rules:
             args = self._convert_sg_rule_to_iptables_args(rule)
             if args:
                 iptables_rules += [' '.join(args)]
-
-        iptables_rules += [comment_rule('-j $sg-fallback',
-                                        comment=ic.UNMATCHED)]
         return iptables_rules
 
     def _drop_invalid_packets(self, iptables_rules):
@@ -495,8 +599,12 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
     def filter_defer_apply_on(self):
         if not self._defer_apply:
             self.iptables.defer_apply_on()
+            self.ipset.defer_apply_on()
             self._pre_defer_filtered_ports = dict(self.filtered_ports)
-            self.pre_sg_members = dict(self.sg_members)
+            # The member lists may be replaced by a delta
+            self.pre_sg_members = dict(
+                (sg_id, dict(sg_members))
+                for sg_id, sg_members in self.sg_members.items())
             self.pre_sg_rules = dict(self.sg_rules)
             self._defer_apply = True
 
@@ -543,12 +651,89 @@ class IptablesFirewallDriver(firewall.FirewallDriver):
             if remove_group_id in self.sg_rules:
                 self.sg_rules.pop(remove_group_id, None)
 
+    def _get_port_zone(self, port):
+        """Return the conntrack zone of a port, None for the default."""
+        return None
+
+    def _get_port_rules(self, port, sg_rules):
+        return [rule for sg_id in port.get('security_groups', [])
+                for rule in sg_rules.get(sg_id, [])]
+
+    def _delete_conntrack_entries(self, port, rule, remote_ips=None):
+        """Queue the deletion of the port's flows a rule allowed.
+
+        remote_ips restricts the deletion to the flows of these addresses
+        of the rule's remote group.
+        """
+        if remote_ips is not None and not remote_ips:
+            return
+        ethertype = rule['ethertype']
+        direction = rule['direction']
+        protocol = rule.get('protocol')
+        if protocol in ('icmp', 'icmpv6', 'ipv6-icmp'):
+            protocol = 'icmpv6' if ethertype == constants.IPv6 else 'icmp'
+        dport = None
+        if (protocol in CONNTRACK_PORT_PROTOCOLS and
+                rule.get('port_range_min') is not None and
+                rule.get('port_range_min') == rule.get('port_range_max')):
+            dport = rule['port_range_min']
+        if remote_ips is None:
+            # conntrack only matches a single address
+            ip_prefix = rule.get(DIRECTION_IP_PREFIX[direction])
+            remote_ips = [None]
+            if ip_prefix and netaddr.IPNetwork(ip_prefix).size == 1:
+                remote_ips = [str(netaddr.IPNetwork(ip_prefix).ip)]
+        # The port's IPv6 flows aren't zoned, the raw table is IPv4 only
+        zone = (self._get_port_zone(port)
+                if ethertype == constants.IPv4 else None)
+        version = 4 if ethertype == constants.IPv4 else 6
+        for port_ip in port.get('fixed_ips', []):
+            if netaddr.IPNetwork(port_ip).version != version:
+                continue
+            for remote_ip in remote_ips:
+                if direction == INGRESS_DIRECTION:
+                    source, dest = remote_ip, port_ip
+                else:
+                    source, dest = port_ip, remote_ip
+                self.ipconntrack.delete_entries(
+                    ethertype, protocol=protocol, source=source, dest=dest,
+                    dport=dport, zone=zone)
+
+    def _delete_removed_rules_conntrack(self):
+        """Delete the flows of the rules the ports no longer have."""
+        for device, port in self.filtered_ports.items():
+            pre_port = self._pre_defer_filtered_ports.get(device)
+            if not pre_port:
+                continue
+            rules = self._get_port_rules(port, self.sg_rules)
+            for rule in self._get_port_rules(pre_port, self.pre_sg_rules):
+                remote_group_id = rule.get('remote_group_id')
+                if not remote_group_id:
+                    if rule not in rules:
+                        self._delete_conntrack_entries(port, rule)
+                    continue
+                # Only the flows of the group members were allowed
+                ethertype = rule['ethertype']
+                removed_ips = self.pre_sg_members.get(
+                    remote_group_id, {}).get(ethertype, [])
+                if rule in rules:
+                    ips = self._get_current_sg_member_ips(remote_group_id,
+                                                          ethertype)
+                    removed_ips = [ip for ip in removed_ips if ip not in ips]
+                self._delete_conntrack_entries(port, rule, removed_ips)
+        self.ipconntrack.apply()
+
     def filter_defer_apply_off(self):
         if self._defer_apply:
             self._defer_apply = False
             self._remove_chains_apply(self._pre_defer_filtered_ports)
             self._setup_chains_apply(self.filtered_ports)
+            # The sets must exist before rules refer to them
+            self.ipset.defer_apply_off()
             self.iptables.defer_apply_off()
+            # The flows are deleted once the rules stopped allowing them
+            if self.flush_conntrack:
+                self._delete_removed_rules_conntrack()
             self._remove_unused_security_group_info()
             self._pre_defer_filtered_ports = None
 
@@ -562,3 +747,51 @@ class OVSHybridIptablesFirewallDriver(IptablesFirewallDriver):
 
     def _get_device_name(self, port):
         return (self.OVS_HYBRID_TAP_PREFIX + port['device'])[:LINUX_DEV_LEN]
+
+    def _get_br_device_name(self, port):
+        return ('qvb' + port['device'])[:LINUX_DEV_LEN]
+
+    def _get_zone_key(self, port):
+        zone_scope = cfg.CONF.SECURITYGROUP.conntrack_zone
+        if zone_scope == 'network':
+            return port.get('network_id')
+        elif zone_scope == 'port':
+            return port['device']
+
+    def _get_port_zone(self, port):
+        zone_key = self._get_zone_key(port)
+        if zone_key:
+            return self.ipconntrack.get_zone(zone_key)
+
+    def _get_zone_rules(self, port):
+        """Return the raw rules setting the conntrack zone of a port.
+
+        The packets from the VM enter the port's bridge from the tap
+        device, the packets to the VM from the veth of the integration
+        bridge.
+        """
+        zone = self._get_port_zone(port)
+        if zone is None:
+            return []
+        return ['-m physdev --physdev-in %s -j CT --zone %s' % (device, zone)
+                for device in (self._get_device_name(port),
+                               self._get_br_device_name(port))]
+
+    def _setup_chains_apply(self, ports):
+        super(OVSHybridIptablesFirewallDriver, self)._setup_chains_apply(
+            ports)
+        if not cfg.CONF.SECURITYGROUP.conntrack_zone:
+            return
+        for port in ports.values():
+            for rule in self._get_zone_rules(port):
+                self.iptables.ipv4['raw'].add_rule('PREROUTING', rule)
+        self.ipconntrack.release_zones(
+            [self._get_zone_key(port) for port in ports.values()])
+
+    def _remove_chains_apply(self, ports):
+        if cfg.CONF.SECURITYGROUP.conntrack_zone:
+            for port in ports.values():
+                for rule in self._get_zone_rules(port):
+                    self.iptables.ipv4['raw'].remove_rule('PREROUTING', rule)
+        super(OVSHybridIptablesFirewallDriver, self)._remove_chains_apply(
+            ports)
@@ -19,9 +19,11 @@
 """Implements iptables rules using linux utilities."""
 
 import contextlib
+import hashlib
 import os
 import re
 import sys
+import time
 
 from oslo_concurrency import lockutils
 from oslo_config import cfg
@@ -71,6 +73,22 @@ def get_chain_name(chain_name, wrap=True):
         return chain_name[:MAX_CHAIN_LEN_NOWRAP]
 
 
+def _strip_packets_bytes(line):
+    """Return an iptables-save line without its [packet:byte] count.
+
+    Chains come out as ':<name>' and rules as '-A <chain> ...', so both can
+    be used as keys no matter which counts the kernel reported.
+
+    """
+    if line.startswith(':'):
+        # it's a chain, for example, ":neutron-billing - [0:0]"
+        return ':' + line[1:].split(' ', 1)[0]
+    elif line.startswith('['):
+        # it's a rule, for example, "[0:0] -A neutron-billing..."
+        return line.split('] ', 1)[1].strip()
+    return line
+
+
 class IptablesRule(object):
     """An iptables rule.
 
@@ -253,9 +271,23 @@ class IptablesTable(object):
     def clear_rules_by_tag(self, tag):
         if not tag:
             return
-        rules = [rule for rule in self.rules if rule.tag == tag]
-        for rule in rules:
-            self.rules.remove(rule)
+        self.rules = [rule for rule in self.rules if rule.tag != tag]
+
+
+class IptablesTableImage(object):
+    """The state of one table as last applied by an IptablesManager.
+
+    chains maps every wrapped chain name to the tuple of rules it holds,
+    shared_checksum covers everything living outside the wrapped chains
+    (unwrapped chains and their rules), which can only be changed by a full
+    iptables-save/iptables-restore round trip.
+
+    """
+
+    def __init__(self, chains, shared_checksum, version=0):
+        self.chains = chains
+        self.shared_checksum = shared_checksum
+        self.version = version
 
 
 class IptablesManager(object):
@@ -279,6 +311,13 @@ class IptablesManager(object):
     wrapped in the same was as the built-in filter chains. Additionally,
     there's a snat chain that is applied after the POSTROUTING chain.
 
+    When AGENT.iptables_incremental_apply is set, the manager keeps an image
+    of what it last applied for every table and only rewrites the wrapped
+    chains that differ from it, using iptables-restore --noflush. A full
+    iptables-save/iptables-restore is still done the first time, whenever
+    unwrapped chains or rules change and every
+    AGENT.iptables_full_resync_interval seconds.
+
     """
 
     def __init__(self, _execute=None, state_less=False, use_ipv6=False,
@@ -293,6 +332,10 @@ class IptablesManager(object):
         self.namespace = namespace
         self.iptables_apply_deferred = False
         self.wrap_name = binary_name[:16]
+        # Images of the tables as last applied, keyed by command and then
+        # by table name, used by the incremental apply.
+        self._applied_images = {}
+        self._last_full_resync = None
 
         self.ipv4 = {'filter': IptablesTable(binary_name=self.wrap_name)}
         self.ipv6 = {'filter': IptablesTable(binary_name=self.wrap_name)}
@@ -424,48 +467,202 @@ class IptablesManager(object):
         if self.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        incremental = cfg.CONF.AGENT.iptables_incremental_apply
+        full_resync = not incremental or self._full_resync_due()
+
         for cmd, tables in s:
-            args = ['%s-save' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            all_tables = self.execute(args, run_as_root=True)
-            all_lines = all_tables.split('\n')
-            # Traverse tables in sorted order for predictable dump output
-            for table_name in sorted(tables):
-                table = tables[table_name]
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                    all_lines[start:end], table, table_name)
-
-            args = ['%s-restore' % (cmd,), '-c']
-            if self.namespace:
-                args = ['ip', 'netns', 'exec', self.namespace] + args
-            try:
-                self.execute(args, process_input='\n'.join(all_lines),
-                             run_as_root=True)
-            except RuntimeError as r_error:
-                with excutils.save_and_reraise_exception():
-                    try:
-                        line_no = int(re.search(
-                            'iptables-restore: line ([0-9]+?) failed',
-                            str(r_error)).group(1))
-                        context = IPTABLES_ERROR_LINES_OF_CONTEXT
-                        log_start = max(0, line_no - context)
-                        log_end = line_no + context
-                    except AttributeError:
-                        # line error wasn't found, print all lines instead
-                        log_start = 0
-                        log_end = len(all_lines)
-                    log_lines = ('%7d. %s' % (idx, l)
-                                 for idx, l in enumerate(
-                                     all_lines[log_start:log_end],
-                                     log_start + 1)
-                                 )
-                    LOG.error(_LE("IPTablesManager.apply failed to apply the "
-                                  "following set of iptables rules:\n%s"),
-                              '\n'.join(log_lines))
+            if not incremental:
+                self._apply_full(cmd, tables)
+                continue
+            old_images = self._applied_images.get(cmd, {})
+            images = self._get_table_images(tables)
+            if full_resync or not self._apply_incremental(cmd, tables,
+                                                          images):
+                self._apply_full(cmd, tables)
+                # The remove lists were consumed by the full apply
+                images = self._get_table_images(tables)
+                for table_name, image in images.items():
+                    if table_name in old_images:
+                        image.version = old_images[table_name].version + 1
+            self._applied_images[cmd] = images
+            LOG.debug('%(cmd)s table versions now %(versions)s',
+                      {'cmd': cmd,
+                       'versions': dict((name, image.version)
+                                        for name, image in images.items())})
+
+        if incremental and full_resync:
+            self._last_full_resync = time.time()
         LOG.debug("IPTablesManager.apply completed with success")
 
+    def _full_resync_due(self):
+        if self._last_full_resync is None:
+            return True
+        interval = cfg.CONF.AGENT.iptables_full_resync_interval
+        return interval > 0 and (
+            time.time() - self._last_full_resync >= interval)
+
+    def _apply_full(self, cmd, tables):
+        args = ['%s-save' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        all_tables = self.execute(args, run_as_root=True)
+        all_lines = all_tables.split('\n')
+        # Traverse tables in sorted order for predictable dump output
+        for table_name in sorted(tables):
+            table = tables[table_name]
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                all_lines[start:end], table, table_name)
+
+        args = ['%s-restore' % (cmd,), '-c']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args, process_input='\n'.join(all_lines),
+                         run_as_root=True)
+        except RuntimeError as r_error:
+            # Whatever was applied before is unknown now
+            self._applied_images.pop(cmd, None)
+            with excutils.save_and_reraise_exception():
+                try:
+                    line_no = int(re.search(
+                        'iptables-restore: line ([0-9]+?) failed',
+                        str(r_error)).group(1))
+                    context = IPTABLES_ERROR_LINES_OF_CONTEXT
+                    log_start = max(0, line_no - context)
+                    log_end = line_no + context
+                except AttributeError:
+                    # line error wasn't found, print all lines instead
+                    log_start = 0
+                    log_end = len(all_lines)
+                log_lines = ('%7d. %s' % (idx, l)
+                             for idx, l in enumerate(
+                                 all_lines[log_start:log_end],
+                                 log_start + 1)
+                             )
+                LOG.error(_LE("IPTablesManager.apply failed to apply the "
+                              "following set of iptables rules:\n%s"),
+                          '\n'.join(log_lines))
+
+    def _apply_incremental(self, cmd, tables, images):
+        """Rewrite only the wrapped chains changed since the last apply.
+
+        Returns False when the change can't be expressed incrementally and
+        a full apply is needed instead.
+
+        """
+        lines = self._get_incremental_lines(
+            tables, self._applied_images.get(cmd), images)
+        if lines is None:
+            return False
+        if not lines:
+            LOG.debug('No %s changes to apply', cmd)
+            return True
+
+        args = ['%s-restore' % (cmd,), '--noflush']
+        if self.namespace:
+            args = ['ip', 'netns', 'exec', self.namespace] + args
+        try:
+            self.execute(args, process_input='\n'.join(lines + ['']),
+                         run_as_root=True)
+        except RuntimeError:
+            LOG.warn(_LW('Incremental %s-restore failed, falling back to a '
+                         'full resync'), cmd)
+            self._applied_images.pop(cmd, None)
+            return False
+        return True
+
+    def _get_incremental_lines(self, tables, old_images, new_images):
+        if old_images is None or set(old_images) != set(new_images):
+            return None
+
+        lines = []
+        for table_name in sorted(tables):
+            table = tables[table_name]
+            old = old_images[table_name]
+            new = new_images[table_name]
+            if (table.remove_rules or table.remove_chains or
+                    old.shared_checksum != new.shared_checksum):
+                return None
+
+            dirty_chains = sorted(name for name, rules in new.chains.items()
+                                  if old.chains.get(name) != rules)
+            removed_chains = sorted(set(old.chains) - set(new.chains))
+            if not dirty_chains and not removed_chains:
+                new.version = old.version
+                continue
+            new.version = old.version + 1
+
+            # With --noflush, declaring an existing user defined chain
+            # flushes it, so dirty chains are written again unless editing
+            # them in place is shorter.
+            rewritten_chains = []
+            rule_lines = []
+            for name in dirty_chains:
+                edit = self._get_chain_edit(old.chains.get(name),
+                                            new.chains[name])
+                if edit is None:
+                    rewritten_chains.append(name)
+                    rule_lines += new.chains[name]
+                else:
+                    rule_lines += edit
+            lines.append('*%s' % table_name)
+            lines += [':%s - [0:0]' % name
+                      for name in rewritten_chains + removed_chains]
+            lines += rule_lines
+            lines += ['-X %s' % name for name in removed_chains]
+            lines.append('COMMIT')
+        return lines
+
+    def _get_chain_edit(self, old_rules, new_rules):
+        """Return the lines editing a chain in place, None to rewrite it.
+
+        A chain can be edited in place when its new rules are its old ones
+        minus some rules, followed by rules appended at its end.
+
+        """
+        if old_rules is None:
+            return
+        new_set = set(new_rules)
+        kept = [rule for rule in old_rules if rule in new_set]
+        if tuple(kept) != new_rules[:len(kept)]:
+            return
+        # Rules are rendered as '-A <chain> <rule>'
+        edit = ['-D' + rule[2:] for rule in old_rules if rule not in new_set]
+        edit += new_rules[len(kept):]
+        # Rewriting takes one line per rule, plus the chain declaration
+        if len(edit) <= len(new_rules):
+            return edit
+
+    def _get_table_images(self, tables):
+        return dict((table_name, self._get_table_image(table))
+                    for table_name, table in tables.items())
+
+    def _get_table_image(self, table):
+        wrapped = dict(('%s-%s' % (self.wrap_name, name), ([], []))
+                       for name in table.chains)
+        shared = sorted(table.unwrapped_chains)
+        for rule in table.rules:
+            if rule.wrap:
+                top, bot = wrapped.setdefault(
+                    '%s-%s' % (rule.wrap_name, rule.chain), ([], []))
+                (top if rule.top else bot).append(str(rule))
+            else:
+                shared.append('%s %s' % (rule.top, rule))
+
+        chains = {}
+        for name, (top, bot) in wrapped.items():
+            # Mirror _modify_rules, where the last duplicate wins
+            rules = []
+            seen = set()
+            for rule in reversed(top + bot):
+                if rule not in seen:
+                    seen.add(rule)
+                    rules.append(rule)
+            chains[name] = tuple(reversed(rules))
+        return IptablesTableImage(
+            chains, hashlib.md5('\n'.join(shared)).hexdigest())
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -517,149 +714,73 @@ class IptablesManager(object):
                           '# Completed by iptables_manager']
             current_lines = fake_table
 
-        # Fill old_filter with any chains or rules we might have added,
-        # they could have a [packet:byte] count we want to preserve.
-        # Fill new_filter with any chains or rules without our name in them.
-        old_filter, new_filter = [], []
-        for line in current_lines:
-            (old_filter if self.wrap_name in line else
-             new_filter).append(line.strip())
-
-        rules_index = self._find_rules_index(new_filter)
-
         all_chains = [':%s' % name for name in unwrapped_chains]
         all_chains += [':%s-%s' % (self.wrap_name, name) for name in chains]
-
-        # Iterate through all the chains, trying to find an existing
-        # match.
-        our_chains = []
-        for chain in all_chains:
-            chain_str = str(chain).strip()
-
-            old = self._find_last_entry(old_filter, chain_str)
-            if not old:
-                dup = self._find_last_entry(new_filter, chain_str)
-            new_filter = [s for s in new_filter if chain_str not in s.strip()]
-
-            # if no old or duplicates, use original chain
-            if old or dup:
-                chain_str = str(old or dup)
+        rule_strs = [str(rule).strip() for rule in rules]
+
+        # Index the existing chains and rules by their text without any
+        # [packet:byte] count, so the ones we are about to write can reuse
+        # the count. The last entry wins, as the one iptables really uses.
+        # Entries with our name in them are only kept if we still want
+        # them, any other entry is left alone unless we write it ourselves.
+        our_entries = set(all_chains)
+        our_entries.update(rule_strs)
+        old_entries, dup_entries, new_filter = {}, {}, []
+        for line in current_lines:
+            line = line.strip()
+            entry = _strip_packets_bytes(line)
+            if self.wrap_name in line:
+                old_entries[entry] = line
+            elif entry in our_entries:
+                dup_entries[entry] = line
             else:
-                # add-on the [packet:bytes]
-                chain_str += ' - [0:0]'
+                new_filter.append(line)
+
+        rules_index = self._find_rules_index(new_filter)
 
-            our_chains += [chain_str]
+        # if no old or duplicates, add-on the [packet:bytes]
+        our_chains = [old_entries.get(chain) or dup_entries.get(chain) or
+                      chain + ' - [0:0]' for chain in all_chains]
 
-        # Iterate through all the rules, trying to find an existing
-        # match.
         our_rules = []
         bot_rules = []
-        for rule in rules:
-            rule_str = str(rule).strip()
-            # Further down, we weed out duplicates from the bottom of the
-            # list, so here we remove the dupes ahead of time.
-
-            old = self._find_last_entry(old_filter, rule_str)
-            if not old:
-                dup = self._find_last_entry(new_filter, rule_str)
-            new_filter = [s for s in new_filter if rule_str not in s.strip()]
-
-            # if no old or duplicates, use original rule
-            if old or dup:
-                rule_str = str(old or dup)
-                # backup one index so we write the array correctly
-                if not old:
-                    rules_index -= 1
-            else:
-                # add-on the [packet:bytes]
-                rule_str = '[0:0] ' + rule_str
-
+        for rule, rule_str in zip(rules, rule_strs):
+            rule_str = (old_entries.get(rule_str) or
+                        dup_entries.get(rule_str) or '[0:0] ' + rule_str)
             if rule.top:
                 # rule.top == True means we want this rule to be at the top.
-                our_rules += [rule_str]
+                our_rules.append(rule_str)
             else:
-                bot_rules += [rule_str]
+                bot_rules.append(rule_str)
 
         our_rules += bot_rules
 
         new_filter[rules_index:rules_index] = our_rules
         new_filter[rules_index:rules_index] = our_chains
 
-        def _strip_packets_bytes(line):
-            # strip any [packet:byte] counts at start or end of lines
-            if line.startswith(':'):
-                # it's a chain, for example, ":neutron-billing - [0:0]"
-                line = line.split(':')[1]
-                line = line.split(' - [', 1)[0]
-            elif line.startswith('['):
-                # it's a rule, for example, "[0:0] -A neutron-billing..."
-                line = line.split('] ', 1)[1]
-            line = line.strip()
-            return line
-
-        seen_chains = set()
-
-        def _weed_out_duplicate_chains(line):
-            # ignore [packet:byte] counts at end of lines
-            if line.startswith(':'):
-                line = _strip_packets_bytes(line)
-                if line in seen_chains:
-                    return False
-                else:
-                    seen_chains.add(line)
-
-            # Leave it alone
-            return True
-
-        seen_rules = set()
-
-        def _weed_out_duplicate_rules(line):
-            if line.startswith('['):
-                line = _strip_packets_bytes(line)
-                if line in seen_rules:
-                    return False
-                else:
-                    seen_rules.add(line)
-
-            # Leave it alone
-            return True
-
-        def _weed_out_removes(line):
-            # We need to find exact matches here
-            if line.startswith(':'):
-                line = _strip_packets_bytes(line)
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
-            elif line.startswith('['):
-                line = _strip_packets_bytes(line)
-                for rule in remove_rules:
-                    rule_str = _strip_packets_bytes(str(rule))
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
-
-            # Leave it alone
-            return True
+        removes = set(':%s' % chain for chain in remove_chains)
+        removes.update(str(rule).strip() for rule in remove_rules)
 
         # We filter duplicates.  Go through the chains and rules, letting
         # the *last* occurrence take precedence since it could have a
         # non-zero [packet:byte] count we want to preserve.  We also filter
         # out anything in the "remove" list.
-        new_filter.reverse()
-        new_filter = [line for line in new_filter
-                      if _weed_out_duplicate_chains(line) and
-                      _weed_out_duplicate_rules(line) and
-                      _weed_out_removes(line)]
-        new_filter.reverse()
+        seen_entries = set()
+        filtered = []
+        for line in reversed(new_filter):
+            if line.startswith((':', '[')):
+                entry = _strip_packets_bytes(line)
+                if entry in seen_entries or entry in removes:
+                    continue
+                seen_entries.add(entry)
+            filtered.append(line)
+        filtered.reverse()
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
-        return new_filter
+        return filtered
 
     def _get_traffic_counters_cmd_tables(self, chain, wrap=True):
         name = get_chain_name(chain, wrap)
@@ -14,6 +14,7 @@
 #    under the License.
 
 import collections
+import contextlib
 import itertools
 import operator
 
@@ -94,6 +95,12 @@ class VifPort(object):
                 self.switch.br_name)
 
 
+# The columns of a bridge's ports read in a single OVSDB round trip by the
+# VIF port helpers of OVSBridge
+PortSnapshot = collections.namedtuple(
+    'PortSnapshot', ['port_names', 'interfaces', 'port_tags', 'xapi_ids'])
+
+
 class BaseOVS(object):
 
     def __init__(self):
@@ -140,6 +147,8 @@ class OVSBridge(BaseOVS):
     def __init__(self, br_name):
         super(OVSBridge, self).__init__()
         self.br_name = br_name
+        self._port_snapshot = None
+        self._port_snapshot_active = False
 
     def set_controller(self, controllers):
         self.ovsdb.set_controller(self.br_name,
@@ -180,6 +189,7 @@ class OVSBridge(BaseOVS):
             if interface_attr_tuples:
                 txn.add(self.ovsdb.db_set('Interface', port_name,
                                           *interface_attr_tuples))
+        self._port_snapshot = None
         return self.get_port_ofport(port_name)
 
     def replace_port(self, port_name, *interface_attr_tuples):
@@ -191,9 +201,11 @@ class OVSBridge(BaseOVS):
             if interface_attr_tuples:
                 txn.add(self.ovsdb.db_set('Interface', port_name,
                                           *interface_attr_tuples))
+        self._port_snapshot = None
 
     def delete_port(self, port_name):
         self.ovsdb.del_port(port_name, self.br_name).execute()
+        self._port_snapshot = None
 
     def run_ofctl(self, cmd, args, process_input=None):
         full_args = ["ovs-ofctl", cmd, self.br_name] + args
@@ -300,52 +312,96 @@ class OVSBridge(BaseOVS):
                               "Exception: %(exception)s"),
                           {'cmd': args, 'exception': e})
 
+    @contextlib.contextmanager
+    def port_snapshot(self):
+        """Share one dump of the bridge's ports between the VIF helpers.
+
+        Inside the block, get_vif_ports, get_vif_port_set and
+        get_port_tag_dict are served from a single OVSDB query done on first
+        use, so a caller scanning the bridge pays one round trip whatever
+        the number of ports. Adding or deleting ports through this bridge
+        drops the snapshot so that the next read sees the change.
+        """
+        self._port_snapshot_active = True
+        try:
+            yield
+        finally:
+            self._port_snapshot_active = False
+            self._port_snapshot = None
+
+    def _dump_ports(self):
+        with self.ovsdb.transaction(check_error=True) as txn:
+            names_cmd = txn.add(self.ovsdb.list_ports(self.br_name))
+            ifaces_cmd = txn.add(self.ovsdb.db_list(
+                'Interface', columns=['name', 'external_ids', 'ofport']))
+            tags_cmd = txn.add(self.ovsdb.db_list(
+                'Port', columns=['name', 'tag']))
+        port_names = names_cmd.result
+        # The Interface and Port tables hold the rows of every bridge
+        names = set(port_names)
+        interfaces = dict((iface['name'], iface)
+                          for iface in ifaces_cmd.result
+                          if iface['name'] in names)
+        port_tags = dict((port['name'], port['tag'])
+                         for port in tags_cmd.result
+                         if port['name'] in names)
+        return PortSnapshot(port_names, interfaces, port_tags, {})
+
+    def _get_port_snapshot(self):
+        if not self._port_snapshot_active:
+            return self._dump_ports()
+        if self._port_snapshot is None:
+            self._port_snapshot = self._dump_ports()
+        return self._port_snapshot
+
+    def _get_vif_iface_id(self, snapshot, external_ids):
+        if 'iface-id' in external_ids:
+            return external_ids['iface-id']
+        # if this is a xenserver and iface-id is not automatically
+        # synced to OVS from XAPI, we grab it from XAPI directly
+        xs_vif_uuid = external_ids['xs-vif-uuid']
+        if xs_vif_uuid not in snapshot.xapi_ids:
+            snapshot.xapi_ids[xs_vif_uuid] = self.get_xapi_iface_id(
+                xs_vif_uuid)
+        return snapshot.xapi_ids[xs_vif_uuid]
+
+    @staticmethod
+    def _is_vif_interface(iface):
+        external_ids = iface['external_ids']
+        return ('attached-mac' in external_ids and
+                ('iface-id' in external_ids or
+                 'xs-vif-uuid' in external_ids))
+
     # returns a VIF object for each VIF port
     def get_vif_ports(self):
         edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_val("Interface", name, "external_ids",
-                                           check_error=True)
-            ofport = self.db_get_val("Interface", name, "ofport",
-                                     check_error=True)
-            if "iface-id" in external_ids and "attached-mac" in external_ids:
-                p = VifPort(name, ofport, external_ids["iface-id"],
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-            elif ("xs-vif-uuid" in external_ids and
-                  "attached-mac" in external_ids):
-                # if this is a xenserver and iface-id is not automatically
-                # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-                p = VifPort(name, ofport, iface_id,
-                            external_ids["attached-mac"], self)
-                edge_ports.append(p)
-
+        snapshot = self._get_port_snapshot()
+        for name in snapshot.port_names:
+            iface = snapshot.interfaces.get(name)
+            if iface is None or not self._is_vif_interface(iface):
+                continue
+            external_ids = iface['external_ids']
+            p = VifPort(name, iface['ofport'],
+                        self._get_vif_iface_id(snapshot, external_ids),
+                        external_ids['attached-mac'], self)
+            edge_ports.append(p)
         return edge_ports
 
     def get_vif_port_set(self):
         edge_ports = set()
-        port_names = self.get_port_name_list()
-        cmd = self.ovsdb.db_list(
-            'Interface', port_names,
-            columns=['name', 'external_ids', 'ofport'], if_exists=True)
-        results = cmd.execute(check_error=True)
-        for result in results:
-            if result['ofport'] == UNASSIGNED_OFPORT:
+        snapshot = self._get_port_snapshot()
+        for name in snapshot.port_names:
+            iface = snapshot.interfaces.get(name)
+            if iface is None:
+                continue
+            if iface['ofport'] == UNASSIGNED_OFPORT:
                 LOG.warn(_LW("Found not yet ready openvswitch port: %s"),
-                         result['name'])
-            elif result['ofport'] == INVALID_OFPORT:
-                LOG.warn(_LW("Found failed openvswitch port: %s"),
-                         result['name'])
-            elif 'attached-mac' in result['external_ids']:
-                external_ids = result['external_ids']
-                if 'iface-id' in external_ids:
-                    edge_ports.add(external_ids['iface-id'])
-                elif 'xs-vif-uuid' in external_ids:
-                    iface_id = self.get_xapi_iface_id(
-                        external_ids['xs-vif-uuid'])
-                    edge_ports.add(iface_id)
+                         name)
+            elif iface['ofport'] == INVALID_OFPORT:
+                LOG.warn(_LW("Found failed openvswitch port: %s"), name)
+            elif self._is_vif_interface(iface):
+                edge_ports.add(self._get_vif_iface_id(
+                    snapshot, iface['external_ids']))
         return edge_ports
 
     def get_port_tag_dict(self):
@@ -363,10 +419,7 @@ class OVSBridge(BaseOVS):
         in the "Interface" table queried by the get_vif_port_set() method.
 
         """
-        port_names = self.get_port_name_list()
-        cmd = self.ovsdb.db_list('Port', port_names, columns=['name', 'tag'])
-        results = cmd.execute(check_error=True)
-        return {p['name']: p['tag'] for p in results}
+        return dict(self._get_port_snapshot().port_tags)
 
     def get_vif_port_by_id(self, port_id):
         ports = self.ovsdb.db_find(
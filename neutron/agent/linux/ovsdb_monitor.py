@@ -12,15 +12,45 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+
 import eventlet
+from oslo_serialization import jsonutils
 
 from neutron.agent.linux import async_process
-from neutron.i18n import _LE
+from neutron.i18n import _LE, _LW
 from neutron.openstack.common import log as logging
 
 
 LOG = logging.getLogger(__name__)
 
+OVSDB_ACTION_INITIAL = 'initial'
+OVSDB_ACTION_INSERT = 'insert'
+OVSDB_ACTION_DELETE = 'delete'
+OVSDB_ACTION_NEW = 'new'
+
+EVENT_ADDED = 'added'
+EVENT_REMOVED = 'removed'
+EVENT_MODIFIED = 'modified'
+# The 'old' rows of a modification only hold the changed columns, the 'new'
+# rows hold them all
+ACTION_EVENTS = {OVSDB_ACTION_INITIAL: EVENT_ADDED,
+                 OVSDB_ACTION_INSERT: EVENT_ADDED,
+                 OVSDB_ACTION_DELETE: EVENT_REMOVED,
+                 OVSDB_ACTION_NEW: EVENT_MODIFIED}
+
+
+def _val_to_py(val):
+    """Convert a json ovsdb value to a native python object."""
+    if isinstance(val, list) and len(val) == 2:
+        if val[0] == 'set':
+            return [_val_to_py(x) for x in val[1]]
+        elif val[0] == 'map':
+            return dict((_val_to_py(x), _val_to_py(y)) for x, y in val[1])
+        elif val[0] == 'uuid':
+            return val[1]
+    return val
+
 
 class OvsdbMonitor(async_process.AsyncProcess):
     """Manages an invocation of 'ovsdb-client monitor'."""
@@ -58,16 +88,24 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
     The has_updates() method indicates whether changes to the ovsdb
     Interface table have been detected since the monitor started or
     since the previous access.
+
+    The get_events() method tells which interfaces were added, removed
+    or modified since its previous call.
     """
 
     def __init__(self, respawn_interval=None):
         super(SimpleInterfaceMonitor, self).__init__(
             'Interface',
-            columns=['name', 'ofport'],
+            columns=['name', 'ofport', 'external_ids'],
             format='json',
             respawn_interval=respawn_interval,
         )
         self.data_received = False
+        # The latest event of each interface name, in arrival order
+        self._events = collections.OrderedDict()
+        # Whether events may have been missed since get_events() last
+        # returned them
+        self._events_lost = True
 
     @property
     def is_active(self):
@@ -84,7 +122,65 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
         the absence of updates at the expense of potential false
         positives.
         """
-        return bool(list(self.iter_stdout())) or not self.is_active
+        return self.process_events() or not self.is_active
+
+    def process_events(self):
+        """Turn the rows received into interface events.
+
+        Return whether any output was received.
+        """
+        received = False
+        for line in self.iter_stdout():
+            received = True
+            try:
+                output = jsonutils.loads(line)
+                rows = [dict(zip(output['headings'], row))
+                        for row in output['data']]
+            except (ValueError, KeyError, TypeError):
+                LOG.warn(_LW("Unable to parse ovsdb monitor output: %s"),
+                         line)
+                self._events_lost = True
+                continue
+            for row in rows:
+                event = ACTION_EVENTS.get(row.get('action'))
+                if event:
+                    self._add_event(event, {
+                        'name': row['name'],
+                        'ofport': _val_to_py(row['ofport']),
+                        'external_ids': _val_to_py(row['external_ids'])})
+        return received
+
+    def _add_event(self, event, device):
+        # Only the change since the previous get_events() call is kept
+        previous = self._events.pop(device['name'], None)
+        if previous:
+            previous_event = previous[0]
+            if previous_event == EVENT_ADDED:
+                if event == EVENT_REMOVED:
+                    return
+                event = EVENT_ADDED
+            elif previous_event == EVENT_REMOVED and event == EVENT_ADDED:
+                event = EVENT_MODIFIED
+        self._events[device['name']] = (event, device)
+
+    def get_events(self):
+        """Return the interface events since the previous call.
+
+        The events are returned as a dict of the added, removed and
+        modified interfaces, each a dict of the name, ofport and
+        external_ids columns. None is returned instead when events may
+        have been missed, while the monitor wasn't running or reading
+        their output.
+        """
+        self.process_events()
+        events = {EVENT_ADDED: [], EVENT_REMOVED: [], EVENT_MODIFIED: []}
+        for event, device in self._events.values():
+            events[event].append(device)
+        self._events.clear()
+        if self._events_lost or not self.is_active:
+            self._events_lost = not self.is_active
+            return
+        return events
 
     def start(self, block=False, timeout=5):
         super(SimpleInterfaceMonitor, self).start()
@@ -95,6 +191,7 @@ class SimpleInterfaceMonitor(OvsdbMonitor):
 
     def _kill(self, *args, **kwargs):
         self.data_received = False
+        self._events_lost = True
         super(SimpleInterfaceMonitor, self)._kill(*args, **kwargs)
 
     def _read_stdout(self):
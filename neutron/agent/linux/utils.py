@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import fcntl
 import glob
 import os
@@ -20,11 +21,14 @@ import shlex
 import socket
 import struct
 import tempfile
+import threading
+import time
 
 import eventlet
 from eventlet.green import subprocess
 from eventlet import greenthread
 from oslo_config import cfg
+from oslo_rootwrap import client
 from oslo_utils import excutils
 
 from neutron.agent.common import config
@@ -37,6 +41,63 @@ from neutron.openstack.common import log as logging
 LOG = logging.getLogger(__name__)
 config.register_root_helper(cfg.CONF)
 
+# Per command number of calls and latency of execute(), for tuning.
+_execute_stats = collections.defaultdict(
+    lambda: {'calls': 0, 'total_time': 0.0, 'max_time': 0.0})
+
+
+class RootwrapDaemonHelper(object):
+    """Holds the client of the rootwrap daemon shared by the process.
+
+    The daemon is spawned on first use through root_helper_daemon and
+    restarted by the client if it dies. Every thread talks to it over its
+    own connection, so concurrent commands don't wait on each other.
+    """
+
+    __client = None
+    __lock = threading.Lock()
+
+    def __new__(cls):
+        """There is no reason to instantiate this class"""
+        raise NotImplementedError()
+
+    @classmethod
+    def get_client(cls):
+        with cls.__lock:
+            if cls.__client is None:
+                cls.__client = client.Client(
+                    shlex.split(cfg.CONF.AGENT.root_helper_daemon))
+            return cls.__client
+
+
+def addl_env_args(addl_env):
+    """Build arguments for adding additional environment vars with env"""
+
+    # If using rootwrap, an EnvFilter should be set up for the command
+    # instead of a CommandFilter.
+    if addl_env is None:
+        return []
+    return ['env'] + ['%s=%s' % pair for pair in addl_env.items()]
+
+
+def _get_command_name(cmd):
+    if cmd[:3] == ['ip', 'netns', 'exec'] and len(cmd) > 4:
+        cmd = cmd[4:]
+    return os.path.basename(str(cmd[0]))
+
+
+def _update_execute_stats(command_name, elapsed):
+    stats = _execute_stats[command_name]
+    stats['calls'] += 1
+    stats['total_time'] += elapsed
+    stats['max_time'] = max(stats['max_time'], elapsed)
+
+
+def get_execute_stats():
+    """Return the number of calls and latency of execute() per command."""
+    return dict((name, dict(stats))
+                for name, stats in _execute_stats.items())
+
 
 def create_process(cmd, run_as_root=False, addl_env=None):
     """Create a process object for the given command.
@@ -62,30 +123,47 @@ def create_process(cmd, run_as_root=False, addl_env=None):
     return obj, cmd
 
 
+def execute_rootwrap_daemon(cmd, process_input, addl_env):
+    cmd = map(str, addl_env_args(addl_env) + cmd)
+    # oslo_rootwrap.daemon raises on filter match errors where
+    # oslo_rootwrap.cmd converts them to return codes. No neutron code should
+    # be running commands the filters reject in the first place.
+    LOG.debug("Running command (rootwrap daemon): %s", cmd)
+    return RootwrapDaemonHelper.get_client().execute(cmd, process_input)
+
+
 def execute(cmd, process_input=None, addl_env=None,
             check_exit_code=True, return_stderr=False, log_fail_as_error=True,
             extra_ok_codes=None, run_as_root=False):
+    start = time.time()
+    command_name = _get_command_name(cmd)
     try:
-        obj, cmd = create_process(cmd, run_as_root=run_as_root,
-                                  addl_env=addl_env)
-        _stdout, _stderr = obj.communicate(process_input)
-        obj.stdin.close()
+        if run_as_root and cfg.CONF.AGENT.root_helper_daemon:
+            returncode, _stdout, _stderr = (
+                execute_rootwrap_daemon(cmd, process_input, addl_env))
+        else:
+            obj, cmd = create_process(cmd, run_as_root=run_as_root,
+                                      addl_env=addl_env)
+            _stdout, _stderr = obj.communicate(process_input)
+            returncode = obj.returncode
+            obj.stdin.close()
         m = _("\nCommand: %(cmd)s\nExit code: %(code)s\nStdout: %(stdout)s\n"
-              "Stderr: %(stderr)s") % {'cmd': cmd, 'code': obj.returncode,
+              "Stderr: %(stderr)s") % {'cmd': cmd, 'code': returncode,
                                        'stdout': _stdout, 'stderr': _stderr}
 
         extra_ok_codes = extra_ok_codes or []
-        if obj.returncode and obj.returncode in extra_ok_codes:
-            obj.returncode = None
+        if returncode and returncode in extra_ok_codes:
+            returncode = None
 
-        if obj.returncode and log_fail_as_error:
+        if returncode and log_fail_as_error:
             LOG.error(m)
         else:
             LOG.debug(m)
 
-        if obj.returncode and check_exit_code:
+        if returncode and check_exit_code:
             raise RuntimeError(m)
     finally:
+        _update_execute_stats(command_name, time.time() - start)
         # NOTE(termie): this appears to be necessary to let the subprocess
         #               call clean something up in between calls, without
         #               it two execute calls in a row hangs the second one
@@ -20,13 +20,21 @@ import six
 
 interface_map = {
     'vsctl': 'neutron.agent.ovsdb.impl_vsctl.OvsdbVsctl',
+    'native': 'neutron.agent.ovsdb.impl_idl.OvsdbIdl',
 }
 
 OPTS = [
     cfg.StrOpt('ovsdb_interface',
                choices=interface_map.keys(),
                default='vsctl',
-               help=_('The interface for interacting with the OVSDB')),
+               help=_('The interface for interacting with the OVSDB. '
+                      'The native interface requires the python ovs '
+                      'library')),
+    cfg.StrOpt('ovsdb_connection',
+               default='tcp:127.0.0.1:6640',
+               help=_('The connection string for the native OVSDB backend. '
+                      'ovsdb-server must be listening on it, e.g. after '
+                      'running "ovs-vsctl set-manager ptcp:6640:127.0.0.1"')),
 ]
 cfg.CONF.register_opts(OPTS, 'OVS')
 
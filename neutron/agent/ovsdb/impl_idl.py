@@ -0,0 +1,204 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import Queue
+import time
+
+from oslo_config import cfg
+from oslo_utils import excutils
+from ovs.db import idl
+
+from neutron.agent.ovsdb import api
+from neutron.agent.ovsdb.native import commands as cmd
+from neutron.agent.ovsdb.native import connection
+from neutron.agent.ovsdb.native import idlutils
+from neutron.i18n import _LE
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+
+class Transaction(api.Transaction):
+    def __init__(self, api, ovsdb_connection, timeout,
+                 check_error=False, log_errors=True):
+        self.api = api
+        self.check_error = check_error
+        self.log_errors = log_errors
+        self.commands = []
+        self.results = Queue.Queue(1)
+        self.ovsdb_connection = ovsdb_connection
+        self.timeout = timeout
+        self.idl_txn = None
+        self._inserted = {}
+
+    def add(self, command):
+        """Add a command to the transaction
+
+        returns The command passed as a convenience
+        """
+
+        self.commands.append(command)
+        return command
+
+    def commit(self):
+        self.ovsdb_connection.queue_txn(self)
+        try:
+            result = self.results.get(timeout=self.timeout)
+        except Queue.Empty:
+            result = connection.OvsdbTimeout(
+                connection=self.ovsdb_connection.connection)
+        if isinstance(result, Exception):
+            if self.log_errors:
+                LOG.error(_LE("OVSDB transaction %(cmds)s failed: %(err)s"),
+                          {'cmds': [str(c) for c in self.commands],
+                           'err': result})
+            if self.check_error:
+                raise result
+            return
+        return result
+
+    def insert(self, table, name=None):
+        """Insert a row, which later commands can find by name"""
+
+        row = self.idl_txn.insert(self.api.idl.tables[table])
+        if name is not None:
+            row.name = name
+            self._inserted[(table, name)] = row
+        return row
+
+    def row_by_record(self, table, record):
+        row = self._inserted.get((table, record))
+        if row is not None:
+            return row
+        return idlutils.row_by_record(self.api.idl, table, record)
+
+    def do_commit(self):
+        """Run the commands and commit them, from the connection thread"""
+
+        start_time = time.time()
+        attempts = 0
+        while True:
+            elapsed_time = time.time() - start_time
+            if attempts > 0 and elapsed_time > self.timeout:
+                raise connection.OvsdbTimeout(
+                    connection=self.ovsdb_connection.connection)
+            attempts += 1
+            self.idl_txn = idl.Transaction(self.api.idl)
+            self._inserted = {}
+            try:
+                for command in self.commands:
+                    LOG.debug("Running txn command: %s", command)
+                    command.run_idl(self)
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self.idl_txn.abort()
+            seqno = self.api.idl.change_seqno
+            status = self.idl_txn.commit_block()
+            if status == idl.Transaction.TRY_AGAIN:
+                # Our replica was out of date, refresh it and rerun
+                LOG.debug("OVSDB transaction returned TRY_AGAIN, retrying")
+                connection.wait_for_change(
+                    self.api.idl, self.ovsdb_connection.connection,
+                    self.timeout, seqno)
+                continue
+            elif status == idl.Transaction.ERROR:
+                raise RuntimeError(_("OVSDB Error: %s") %
+                                   self.idl_txn.get_error())
+            elif status == idl.Transaction.ABORTED:
+                LOG.debug("Transaction aborted")
+                return
+            elif status == idl.Transaction.UNCHANGED:
+                LOG.debug("Transaction caused no change")
+            return [command.result for command in self.commands]
+
+
+class OvsdbIdl(api.API):
+    """OVSDB API backed by a persistent connection to ovsdb-server
+
+    Reads are served from an in-memory replica of the tables the agents use
+    and all the commands of a transaction are sent as a single OVSDB
+    transaction, so no ovs-vsctl process is ever spawned.
+    """
+
+    ovsdb_connection = None
+
+    def __init__(self, context):
+        super(OvsdbIdl, self).__init__(context)
+        if OvsdbIdl.ovsdb_connection is None:
+            OvsdbIdl.ovsdb_connection = connection.Connection(
+                cfg.CONF.OVS.ovsdb_connection, context.vsctl_timeout)
+        OvsdbIdl.ovsdb_connection.start()
+        self.idl = OvsdbIdl.ovsdb_connection.idl
+
+    def transaction(self, check_error=False, log_errors=True, **kwargs):
+        return Transaction(self, OvsdbIdl.ovsdb_connection,
+                           self.context.vsctl_timeout,
+                           check_error, log_errors)
+
+    def add_br(self, name, may_exist=True):
+        return cmd.AddBridgeCommand(self, name, may_exist)
+
+    def del_br(self, name, if_exists=True):
+        return cmd.DelBridgeCommand(self, name, if_exists)
+
+    def br_exists(self, name):
+        return cmd.BridgeExistsCommand(self, name)
+
+    def port_to_br(self, name):
+        return cmd.PortToBridgeCommand(self, name)
+
+    def iface_to_br(self, name):
+        return cmd.InterfaceToBridgeCommand(self, name)
+
+    def list_br(self):
+        return cmd.ListBridgesCommand(self)
+
+    def br_get_external_id(self, name, field):
+        return cmd.BrGetExternalIdCommand(self, name, field)
+
+    def db_set(self, table, record, *col_values):
+        return cmd.DbSetCommand(self, table, record, *col_values)
+
+    def db_clear(self, table, record, column):
+        return cmd.DbClearCommand(self, table, record, column)
+
+    def db_get(self, table, record, column):
+        return cmd.DbGetCommand(self, table, record, column)
+
+    def db_list(self, table, records=None, columns=None, if_exists=False):
+        return cmd.DbListCommand(self, table, records, columns, if_exists)
+
+    def db_find(self, table, *conditions, **kwargs):
+        return cmd.DbFindCommand(self, table, *conditions, **kwargs)
+
+    def set_controller(self, bridge, controllers):
+        return cmd.SetControllerCommand(self, bridge, controllers)
+
+    def del_controller(self, bridge):
+        return cmd.DelControllerCommand(self, bridge)
+
+    def get_controller(self, bridge):
+        return cmd.GetControllerCommand(self, bridge)
+
+    def set_fail_mode(self, bridge, mode):
+        return cmd.SetFailModeCommand(self, bridge, mode)
+
+    def add_port(self, bridge, port, may_exist=True):
+        return cmd.AddPortCommand(self, bridge, port, may_exist)
+
+    def del_port(self, port, bridge=None, if_exists=True):
+        return cmd.DelPortCommand(self, port, bridge, if_exists)
+
+    def list_ports(self, bridge):
+        return cmd.ListPortsCommand(self, bridge)
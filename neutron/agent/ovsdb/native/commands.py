@@ -0,0 +1,373 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+from neutron.agent.ovsdb import api
+from neutron.agent.ovsdb.native import idlutils
+from neutron.common import exceptions
+
+
+class OvsdbCommandError(exceptions.NeutronException):
+    message = _("%(cmd)s failed: %(reason)s")
+
+
+class BaseCommand(api.Command):
+    """A command run against the local replica inside an OVSDB transaction
+
+    Reads are served from the replica; writes are recorded on the rows and
+    sent to ovsdb-server when the transaction commits.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self.result = None
+
+    def execute(self, check_error=False, log_errors=True):
+        with self.api.transaction(check_error, log_errors) as txn:
+            txn.add(self)
+        return self.result
+
+    def run_idl(self, txn):
+        raise NotImplementedError()
+
+    def __str__(self):
+        command_info = self.__dict__
+        return "%s(%s)" % (
+            self.__class__.__name__,
+            ", ".join("%s=%s" % (k, v) for k, v in command_info.items()
+                      if k not in ['api', 'result']))
+
+    def _rows(self, table):
+        return self.api.idl.tables[table].rows.values()
+
+    def _port_bridge(self, port):
+        for br in self._rows('Bridge'):
+            if port in br.ports:
+                return br
+
+
+class AddBridgeCommand(BaseCommand):
+    def __init__(self, api, name, may_exist):
+        super(AddBridgeCommand, self).__init__(api)
+        self.name = name
+        self.may_exist = may_exist
+
+    def run_idl(self, txn):
+        if idlutils.row_by_value(self.api.idl, 'Bridge', 'name', self.name,
+                                 None):
+            if self.may_exist:
+                return
+            raise OvsdbCommandError(cmd='add-br',
+                                    reason=_("bridge %s already exists") %
+                                    self.name)
+        row = txn.insert('Bridge', self.name)
+        port = txn.insert('Port', self.name)
+        iface = txn.insert('Interface', self.name)
+        iface.type = 'internal'
+        port.interfaces = [iface]
+        row.ports = [port]
+        ovs = self.api.idl.tables['Open_vSwitch'].rows.values()[0]
+        ovs.verify('bridges')
+        ovs.bridges = ovs.bridges + [row]
+
+
+class DelBridgeCommand(BaseCommand):
+    def __init__(self, api, name, if_exists):
+        super(DelBridgeCommand, self).__init__(api)
+        self.name = name
+        self.if_exists = if_exists
+
+    def run_idl(self, txn):
+        try:
+            br = txn.row_by_record('Bridge', self.name)
+        except idlutils.RowNotFound:
+            if self.if_exists:
+                return
+            raise
+        ovs = self.api.idl.tables['Open_vSwitch'].rows.values()[0]
+        ovs.verify('bridges')
+        ovs.bridges = [b for b in ovs.bridges if b != br]
+        for port in br.ports:
+            for iface in port.interfaces:
+                iface.delete()
+            port.delete()
+        for controller in br.controller:
+            controller.delete()
+        br.delete()
+
+
+class BridgeExistsCommand(BaseCommand):
+    def __init__(self, api, name):
+        super(BridgeExistsCommand, self).__init__(api)
+        self.name = name
+
+    def run_idl(self, txn):
+        self.result = bool(idlutils.row_by_value(self.api.idl, 'Bridge',
+                                                 'name', self.name, None))
+
+
+class ListBridgesCommand(BaseCommand):
+    def run_idl(self, txn):
+        self.result = sorted(br.name for br in self._rows('Bridge'))
+
+
+class BrGetExternalIdCommand(BaseCommand):
+    def __init__(self, api, name, field):
+        super(BrGetExternalIdCommand, self).__init__(api)
+        self.name = name
+        self.field = field
+
+    def run_idl(self, txn):
+        br = txn.row_by_record('Bridge', self.name)
+        self.result = br.external_ids.get(self.field)
+
+
+class PortToBridgeCommand(BaseCommand):
+    def __init__(self, api, name):
+        super(PortToBridgeCommand, self).__init__(api)
+        self.name = name
+
+    def run_idl(self, txn):
+        port = txn.row_by_record('Port', self.name)
+        br = self._port_bridge(port)
+        if br is None:
+            raise OvsdbCommandError(cmd='port-to-br',
+                                    reason=_("no bridge has port %s") %
+                                    self.name)
+        self.result = br.name
+
+
+class InterfaceToBridgeCommand(BaseCommand):
+    def __init__(self, api, name):
+        super(InterfaceToBridgeCommand, self).__init__(api)
+        self.name = name
+
+    def run_idl(self, txn):
+        iface = txn.row_by_record('Interface', self.name)
+        for port in self._rows('Port'):
+            if iface in port.interfaces:
+                br = self._port_bridge(port)
+                if br is not None:
+                    self.result = br.name
+                    return
+        raise OvsdbCommandError(cmd='iface-to-br',
+                                reason=_("no bridge has interface %s") %
+                                self.name)
+
+
+class DbSetCommand(BaseCommand):
+    def __init__(self, api, table, record, *col_values):
+        super(DbSetCommand, self).__init__(api)
+        self.table = table
+        self.record = record
+        self.col_values = col_values
+
+    def run_idl(self, txn):
+        record = txn.row_by_record(self.table, self.record)
+        for col, val in self.col_values:
+            # Like ovs-vsctl, setting a map only updates the given keys
+            if isinstance(val, collections.Mapping):
+                new_val = dict(getattr(record, col))
+                new_val.update(val)
+                val = new_val
+            setattr(record, col, val)
+
+
+class DbClearCommand(BaseCommand):
+    def __init__(self, api, table, record, column):
+        super(DbClearCommand, self).__init__(api)
+        self.table = table
+        self.record = record
+        self.column = column
+
+    def run_idl(self, txn):
+        record = txn.row_by_record(self.table, self.record)
+        # Create an empty value of the column type
+        value = type(getattr(record, self.column))()
+        setattr(record, self.column, value)
+
+
+class DbGetCommand(BaseCommand):
+    def __init__(self, api, table, record, column):
+        super(DbGetCommand, self).__init__(api)
+        self.table = table
+        self.record = record
+        self.column = column
+
+    def run_idl(self, txn):
+        record = txn.row_by_record(self.table, self.record)
+        self.result = idlutils.get_column_value(record, self.column)
+
+
+class DbListCommand(BaseCommand):
+    def __init__(self, api, table, records, columns, if_exists):
+        super(DbListCommand, self).__init__(api)
+        self.table = table
+        self.records = records
+        self.columns = columns
+        self.if_exists = if_exists
+
+    def run_idl(self, txn):
+        columns = self.columns or (
+            list(self.api.idl.tables[self.table].columns) + ['_uuid'])
+        if self.records:
+            rows = []
+            for record in self.records:
+                try:
+                    rows.append(txn.row_by_record(self.table, record))
+                except idlutils.RowNotFound:
+                    if not self.if_exists:
+                        raise
+        else:
+            rows = self._rows(self.table)
+        self.result = [
+            dict((c, idlutils.get_column_value(row, c)) for c in columns)
+            for row in rows]
+
+
+class DbFindCommand(BaseCommand):
+    def __init__(self, api, table, *conditions, **kwargs):
+        super(DbFindCommand, self).__init__(api)
+        self.table = table
+        self.conditions = conditions
+        self.columns = kwargs.get('columns')
+
+    def run_idl(self, txn):
+        columns = self.columns or (
+            list(self.api.idl.tables[self.table].columns) + ['_uuid'])
+        self.result = [
+            dict((c, idlutils.get_column_value(row, c)) for c in columns)
+            for row in self._rows(self.table)
+            if all(idlutils.condition_match(row, cond)
+                   for cond in self.conditions)]
+
+
+class SetControllerCommand(BaseCommand):
+    def __init__(self, api, bridge, targets):
+        super(SetControllerCommand, self).__init__(api)
+        self.bridge = bridge
+        self.targets = targets
+
+    def run_idl(self, txn):
+        br = txn.row_by_record('Bridge', self.bridge)
+        for controller in br.controller:
+            controller.delete()
+        controllers = []
+        for target in self.targets:
+            controller = txn.insert('Controller')
+            controller.target = target
+            controllers.append(controller)
+        br.verify('controller')
+        br.controller = controllers
+
+
+class DelControllerCommand(BaseCommand):
+    def __init__(self, api, bridge):
+        super(DelControllerCommand, self).__init__(api)
+        self.bridge = bridge
+
+    def run_idl(self, txn):
+        br = txn.row_by_record('Bridge', self.bridge)
+        for controller in br.controller:
+            controller.delete()
+        br.controller = []
+
+
+class GetControllerCommand(BaseCommand):
+    def __init__(self, api, bridge):
+        super(GetControllerCommand, self).__init__(api)
+        self.bridge = bridge
+
+    def run_idl(self, txn):
+        br = txn.row_by_record('Bridge', self.bridge)
+        self.result = [c.target for c in br.controller]
+
+
+class SetFailModeCommand(BaseCommand):
+    def __init__(self, api, bridge, mode):
+        super(SetFailModeCommand, self).__init__(api)
+        self.bridge = bridge
+        self.mode = mode
+
+    def run_idl(self, txn):
+        br = txn.row_by_record('Bridge', self.bridge)
+        br.verify('fail_mode')
+        br.fail_mode = self.mode
+
+
+class AddPortCommand(BaseCommand):
+    def __init__(self, api, bridge, port, may_exist):
+        super(AddPortCommand, self).__init__(api)
+        self.bridge = bridge
+        self.port = port
+        self.may_exist = may_exist
+
+    def run_idl(self, txn):
+        br = txn.row_by_record('Bridge', self.bridge)
+        existing = idlutils.row_by_value(self.api.idl, 'Port', 'name',
+                                         self.port, None)
+        if existing is not None:
+            if self.may_exist and existing in br.ports:
+                return
+            raise OvsdbCommandError(cmd='add-port',
+                                    reason=_("port %s already exists") %
+                                    self.port)
+        port = txn.insert('Port', self.port)
+        iface = txn.insert('Interface', self.port)
+        port.interfaces = [iface]
+        br.verify('ports')
+        br.ports = br.ports + [port]
+
+
+class DelPortCommand(BaseCommand):
+    def __init__(self, api, port, bridge, if_exists):
+        super(DelPortCommand, self).__init__(api)
+        self.port = port
+        self.bridge = bridge
+        self.if_exists = if_exists
+
+    def run_idl(self, txn):
+        try:
+            port = txn.row_by_record('Port', self.port)
+        except idlutils.RowNotFound:
+            if self.if_exists:
+                return
+            raise
+        if self.bridge:
+            br = txn.row_by_record('Bridge', self.bridge)
+            if port not in br.ports:
+                raise OvsdbCommandError(
+                    cmd='del-port',
+                    reason=_("bridge %(br)s does not have port %(port)s") %
+                    {'br': self.bridge, 'port': self.port})
+        else:
+            br = self._port_bridge(port)
+        if br is not None:
+            br.verify('ports')
+            br.ports = [p for p in br.ports if p != port]
+        for iface in port.interfaces:
+            iface.delete()
+        port.delete()
+
+
+class ListPortsCommand(BaseCommand):
+    def __init__(self, api, bridge):
+        super(ListPortsCommand, self).__init__(api)
+        self.bridge = bridge
+
+    def run_idl(self, txn):
+        br = txn.row_by_record('Bridge', self.bridge)
+        # Like ovs-vsctl, don't report the bridge's own local port
+        self.result = sorted(p.name for p in br.ports if p.name != br.name)
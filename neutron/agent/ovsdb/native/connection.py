@@ -0,0 +1,150 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import Queue
+import threading
+import time
+
+from ovs.db import idl
+from ovs import jsonrpc
+from ovs import poller
+from ovs import stream
+
+from neutron.common import exceptions
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# The tables the agents work with, which are replicated locally
+REPLICATED_TABLES = ('Open_vSwitch', 'Bridge', 'Port', 'Interface',
+                     'Controller')
+
+
+class OvsdbConnectionError(exceptions.NeutronException):
+    message = _("Could not connect to OVSDB at %(connection)s: %(reason)s")
+
+
+class OvsdbTimeout(exceptions.NeutronException):
+    message = _("Timed out waiting for OVSDB at %(connection)s")
+
+
+class TransactionQueue(Queue.Queue, object):
+    """A transaction queue the connection thread can poll on
+
+    Putting a transaction writes to a pipe, so the connection thread blocked
+    on the OVSDB socket also wakes up for new transactions.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TransactionQueue, self).__init__(*args, **kwargs)
+        alertpipe = os.pipe()
+        self.alertin = os.fdopen(alertpipe[0], 'r', 0)
+        self.alertout = os.fdopen(alertpipe[1], 'w', 0)
+
+    def get_nowait(self, *args, **kwargs):
+        try:
+            result = super(TransactionQueue, self).get_nowait(*args, **kwargs)
+        except Queue.Empty:
+            return None
+        self.alertin.read(1)
+        return result
+
+    def put(self, *args, **kwargs):
+        super(TransactionQueue, self).put(*args, **kwargs)
+        self.alertout.write('X')
+        self.alertout.flush()
+
+    @property
+    def alert_fileno(self):
+        return self.alertin.fileno()
+
+
+def get_schema_helper(connection):
+    err, strm = stream.Stream.open_block(stream.Stream.open(connection))
+    if err:
+        raise OvsdbConnectionError(connection=connection,
+                                   reason=os.strerror(err))
+    rpc = jsonrpc.Connection(strm)
+    req = jsonrpc.Message.create_request('get_schema', ['Open_vSwitch'])
+    err, resp = rpc.transact_block(req)
+    rpc.close()
+    if err:
+        raise OvsdbConnectionError(connection=connection,
+                                   reason=os.strerror(err))
+    elif resp.error:
+        raise OvsdbConnectionError(connection=connection, reason=resp.error)
+    return idl.SchemaHelper(None, resp.result)
+
+
+def wait_for_change(_idl, connection, timeout, seqno=None):
+    if seqno is None:
+        seqno = _idl.change_seqno
+    stop = time.time() + timeout
+    while _idl.change_seqno == seqno and not _idl.run():
+        ovs_poller = poller.Poller()
+        _idl.wait(ovs_poller)
+        ovs_poller.timer_wait(timeout * 1000)
+        ovs_poller.block()
+        if time.time() > stop:
+            raise OvsdbTimeout(connection=connection)
+
+
+class Connection(object):
+    """A persistent connection to ovsdb-server
+
+    The connection keeps an in-memory replica of REPLICATED_TABLES up to date
+    from a background thread, which also runs the queued transactions so
+    that the replica is only ever touched from one place.
+    """
+
+    def __init__(self, connection, timeout):
+        self.idl = None
+        self.connection = connection
+        self.timeout = timeout
+        self.txns = TransactionQueue(1)
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.idl is not None:
+                return
+
+            helper = get_schema_helper(self.connection)
+            for table in REPLICATED_TABLES:
+                helper.register_table(table)
+            self.idl = idl.Idl(self.connection, helper)
+            wait_for_change(self.idl, self.connection, self.timeout)
+            self.poller = poller.Poller()
+            self.thread = threading.Thread(target=self.run)
+            self.thread.setDaemon(True)
+            self.thread.start()
+
+    def run(self):
+        while True:
+            self.idl.wait(self.poller)
+            self.poller.fd_wait(self.txns.alert_fileno, poller.POLLIN)
+            self.poller.block()
+            self.idl.run()
+            txn = self.txns.get_nowait()
+            if txn is not None:
+                try:
+                    txn.results.put(txn.do_commit())
+                except Exception as ex:
+                    # Errors are handled by the thread waiting for the result
+                    txn.results.put(ex)
+                self.txns.task_done()
+
+    def queue_txn(self, txn):
+        self.txns.put(txn)
@@ -0,0 +1,130 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Helpers to query the local replica of an OVSDB database.
+
+These only rely on the attributes the ovs IDL exposes (tables holding a
+dict of rows keyed by uuid, rows exposing their columns as attributes), so
+they work on any in-memory replica with the same shape.
+"""
+
+import operator
+import uuid
+
+import six
+
+from neutron.common import exceptions
+
+
+class RowNotFound(exceptions.NeutronException):
+    message = _("Cannot find %(table)s with %(col)s=%(match)s")
+
+
+_OPERATORS = {'=': operator.eq,
+              '!=': operator.ne,
+              '<': operator.lt,
+              '>': operator.gt,
+              '<=': operator.le,
+              '>=': operator.ge}
+
+# Tables whose records can't be looked up by name are reached through the
+# name of the record referencing them: (table, name column, ref column)
+_LOOKUP_TABLE = {
+    'Controller': ('Bridge', 'name', 'controller'),
+}
+
+
+def row_by_value(idl_, table, column, match, default=RowNotFound):
+    """Return the first row of table whose column equals match."""
+    tab = idl_.tables[table]
+    for r in tab.rows.values():
+        if getattr(r, column) == match:
+            return r
+    if default is RowNotFound:
+        raise RowNotFound(table=table, col=column, match=match)
+    return default
+
+
+def row_by_record(idl_, table, record):
+    """Return the row of table matching a record name or uuid."""
+    t = idl_.tables[table]
+    if isinstance(record, uuid.UUID):
+        record_uuid = record
+    else:
+        try:
+            record_uuid = uuid.UUID(record)
+        except ValueError:
+            # Not a UUID string, continue lookup by name
+            record_uuid = None
+    if record_uuid is not None:
+        try:
+            return t.rows[record_uuid]
+        except KeyError:
+            raise RowNotFound(table=table, col='uuid', match=record)
+
+    ref_table, column, ref_column = _LOOKUP_TABLE.get(
+        table, (table, 'name', None))
+    row = row_by_value(idl_, ref_table, column, record)
+    if ref_column is None:
+        return row
+    refs = getattr(row, ref_column)
+    if not refs:
+        raise RowNotFound(table=table, col=column, match=record)
+    return refs[0]
+
+
+def get_column_value(row, col):
+    """Return a column value the way ovs-vsctl would report it."""
+    if col == '_uuid':
+        return row.uuid
+    val = getattr(row, col)
+    # The IDL returns lists of rows where ovs-vsctl returns their uuids
+    if isinstance(val, list) and val:
+        val = [getattr(v, 'uuid', v) for v in val]
+        # ovs-vsctl treats lists of 1 as single results
+        if len(val) == 1:
+            val = val[0]
+    return val
+
+
+def condition_match(row, condition):
+    """Return whether a row matches a (column, op, value) condition
+
+    This follows the ovs-vsctl 'find' semantics: a map value compares the
+    given keys, which must exist in the row, and the {op} operators compare
+    sets.
+    """
+    column, op, match = condition
+    val = getattr(row, column)
+    if isinstance(match, dict):
+        for key, value in match.items():
+            if key not in val or not _compare(val[key], op, value):
+                return False
+        return True
+    if op.startswith('{'):
+        val = set(val if isinstance(val, list) else [val])
+        match = set(match if isinstance(match, (list, tuple, set))
+                    else [match])
+        op = op.strip('{}')
+    elif isinstance(val, list) and len(val) == 1:
+        # optional atomic columns come back from the IDL as lists
+        val = val[0]
+    return _compare(val, op, match)
+
+
+def _compare(val, op, match):
+    if isinstance(val, six.string_types) and not isinstance(
+            match, six.string_types):
+        match = str(match)
+    return _OPERATORS[op](val, match)
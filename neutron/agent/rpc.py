@@ -88,6 +88,7 @@ class PluginApi(object):
               return value to include fixed_ips and device_owner for
               the device port
         1.4 - tunnel_sync rpc signature upgrade to obtain 'host'
+        1.5 - Support update_device_list
     '''
 
     def __init__(self, topic):
@@ -126,6 +127,42 @@ class PluginApi(object):
         return cctxt.call(context, 'update_device_up', device=device,
                           agent_id=agent_id, host=host)
 
+    def update_device_list(self, context, devices_up, devices_down,
+                           agent_id, host):
+        """Report the status of several devices in a single call.
+
+        Returns a dict with the 'devices_up' set up, the 'devices_down'
+        details as returned by update_device_down, and the
+        'failed_devices_up' and 'failed_devices_down' that the server could
+        not update.
+        """
+        try:
+            cctxt = self.client.prepare(version='1.5')
+            res = cctxt.call(context, 'update_device_list',
+                             devices_up=devices_up, devices_down=devices_down,
+                             agent_id=agent_id, host=host)
+        except oslo_messaging.UnsupportedVersion:
+            # The server has not been upgraded yet, fall back to one call
+            # per device
+            res = {'devices_up': [], 'failed_devices_up': [],
+                   'devices_down': [], 'failed_devices_down': []}
+            for device in devices_up:
+                try:
+                    self.update_device_up(context, device, agent_id, host)
+                except Exception:
+                    res['failed_devices_up'].append(device)
+                else:
+                    res['devices_up'].append(device)
+            for device in devices_down:
+                try:
+                    details = self.update_device_down(context, device,
+                                                      agent_id, host)
+                except Exception:
+                    res['failed_devices_down'].append(device)
+                else:
+                    res['devices_down'].append(details)
+        return res
+
     def tunnel_sync(self, context, tunnel_ip, tunnel_type=None, host=None):
         try:
             cctxt = self.client.prepare(version='1.4')
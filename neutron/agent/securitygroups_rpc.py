@@ -46,7 +46,26 @@ security_group_opts = [
     cfg.BoolOpt(
         'enable_ipset',
         default=True,
-        help=_('Use ipset to speed-up the iptables based security groups.'))
+        help=_('Use ipset to speed-up the iptables based security groups.')),
+    cfg.BoolOpt(
+        'shared_sg_chains',
+        default=False,
+        help=_('Set up the iptables rules of security groups once, in '
+               'chains shared by the ports having the same security '
+               'groups, instead of in the chains of every port. Requires '
+               'enable_ipset.')),
+    cfg.BoolOpt(
+        'flush_conntrack',
+        default=False,
+        help=_('Delete the conntrack entries of the flows a security group '
+               'rule or member removal stops allowing, so that their '
+               'established connections are cut right away.')),
+    cfg.StrOpt(
+        'conntrack_zone',
+        choices=['network', 'port'],
+        help=_('Give each network or port its own conntrack zone in the '
+               'OVS hybrid iptables firewall driver, so that the flows of '
+               'ports with overlapping addresses are tracked apart.'))
 ]
 cfg.CONF.register_opts(security_group_opts, 'SECURITYGROUP')
 
@@ -144,13 +163,20 @@ class SecurityGroupAgentRpcCallbackMixin(object):
         """Callback for security group member update.
 
         :param security_groups: list of updated security_groups
+        :param member_updates: optional member IPs added and removed, by
+                               security group
         """
         security_groups = kwargs.get('security_groups', [])
+        member_updates = kwargs.get('member_updates')
         LOG.debug("Security group member updated on remote: %s",
                   security_groups)
         if not self.sg_agent:
             return self._security_groups_agent_not_set()
-        self.sg_agent.security_groups_member_updated(security_groups)
+        if member_updates:
+            self.sg_agent.security_groups_member_updated(
+                security_groups, member_updates=member_updates)
+        else:
+            self.sg_agent.security_groups_member_updated(security_groups)
 
     def security_groups_provider_updated(self, context, **kwargs):
         """Callback for security group provider update."""
@@ -186,6 +212,10 @@ class SecurityGroupAgentRpc(object):
         # Flag raised when a global refresh is needed
         self.global_refresh_firewall = False
         self._use_enhanced_rpc = None
+        # Last member update sequence number by (source, security group)
+        self._member_update_seqs = {}
+        # Number of security group information updates in progress
+        self._sg_info_updates = 0
 
     @property
     def use_enhanced_rpc(self):
@@ -219,7 +249,19 @@ class SecurityGroupAgentRpc(object):
                             *args, **kwargs)
         return decorated_function
 
+    def tracks_sg_info_update(func):
+        @functools.wraps(func)
+        def decorated_function(self, *args, **kwargs):
+            self._sg_info_updates += 1
+            try:
+                return func(self,  # pylint: disable=not-callable
+                            *args, **kwargs)
+            finally:
+                self._sg_info_updates -= 1
+        return decorated_function
+
     @skip_if_noopfirewall_or_firewall_disabled
+    @tracks_sg_info_update
     def prepare_devices_filter(self, device_ids):
         if not device_ids:
             return
@@ -259,13 +301,42 @@ class SecurityGroupAgentRpc(object):
             security_groups,
             'security_groups')
 
-    def security_groups_member_updated(self, security_groups):
+    def security_groups_member_updated(self, security_groups,
+                                       member_updates=None):
         LOG.info(_LI("Security group "
                  "member updated %r"), security_groups)
+        if member_updates:
+            security_groups = self._apply_member_updates(
+                security_groups, member_updates)
         self._security_group_updated(
             security_groups,
             'security_group_source_groups')
 
+    def _apply_member_updates(self, security_groups, member_updates):
+        """Apply the member IPs added and removed by the server.
+
+        Return the security groups whose members must be fetched again,
+        because an update was missed or could not be applied.
+        """
+        refresh_groups = set(security_groups) - set(member_updates)
+        for sg_id, update in member_updates.items():
+            key = (update['source'], sg_id)
+            last_seq = self._member_update_seqs.get(key)
+            self._member_update_seqs[key] = update['seq']
+            if last_seq is None or update['seq'] != last_seq + 1:
+                # The first update from a server only sets the baseline
+                LOG.debug("Member update %(seq)s of security group %(sg)s "
+                          "follows %(last_seq)s, refreshing its members",
+                          {'seq': update['seq'], 'sg': sg_id,
+                           'last_seq': last_seq})
+                refresh_groups.add(sg_id)
+            elif (self._sg_info_updates or not self.use_enhanced_rpc or
+                  not self.firewall.update_security_group_members_delta(
+                      sg_id, update['added'], update['removed'])):
+                # Members being fetched may predate this update
+                refresh_groups.add(sg_id)
+        return list(refresh_groups)
+
     def _security_group_updated(self, security_groups, attribute):
         devices = []
         sec_grp_set = set(security_groups)
@@ -303,6 +374,7 @@ class SecurityGroupAgentRpc(object):
                 self.firewall.remove_port_filter(device)
 
     @skip_if_noopfirewall_or_firewall_disabled
+    @tracks_sg_info_update
     def refresh_firewall(self, device_ids=None):
         LOG.info(_LI("Refresh firewall rules"))
         if not device_ids:
@@ -392,15 +464,23 @@ class SecurityGroupAgentRpcApiMixin(object):
         cctxt.cast(context, 'security_groups_rule_updated',
                    security_groups=security_groups)
 
-    def security_groups_member_updated(self, context, security_groups):
-        """Notify member updated security groups."""
+    def security_groups_member_updated(self, context, security_groups,
+                                       member_updates=None):
+        """Notify member updated security groups.
+
+        Agents ignoring member_updates refresh the members of the security
+        groups.
+        """
         if not security_groups:
             return
+        kwargs = {}
+        if member_updates:
+            kwargs['member_updates'] = member_updates
         cctxt = self.client.prepare(version=SG_RPC_VERSION,
                                     topic=self._get_security_group_topic(),
                                     fanout=True)
         cctxt.cast(context, 'security_groups_member_updated',
-                   security_groups=security_groups)
+                   security_groups=security_groups, **kwargs)
 
     def security_groups_provider_updated(self, context):
         """Notify provider updated security groups."""
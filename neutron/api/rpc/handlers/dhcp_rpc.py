@@ -47,9 +47,10 @@ class DhcpRpcCallback(object):
     #     1.0 - Initial version.
     #     1.1 - Added get_active_networks_info, create_dhcp_port,
     #           and update_dhcp_port methods.
+    #     1.2 - Added get_networks_info method.
     target = oslo_messaging.Target(
         namespace=constants.RPC_NAMESPACE_DHCP_PLUGIN,
-        version='1.1')
+        version='1.2')
 
     def _get_active_networks(self, context, **kwargs):
         """Retrieve and return a list of the active networks."""
@@ -97,9 +98,6 @@ class DhcpRpcCallback(object):
 
     def get_active_networks(self, context, **kwargs):
         """Retrieve and return a list of the active network ids."""
-        # NOTE(arosen): This method is no longer used by the DHCP agent but is
-        # left so that neutron-dhcp-agents will still continue to work if
-        # neutron-server is upgraded and not the agent.
         host = kwargs.get('host')
         LOG.debug('get_active_networks requested from %s', host)
         nets = self._get_active_networks(context, **kwargs)
@@ -118,10 +116,15 @@ class DhcpRpcCallback(object):
         host = kwargs.get('host')
         LOG.debug('get_active_networks_info from %s', host)
         networks = self._get_active_networks(context, **kwargs)
+        return self._add_subnets_and_ports(context, networks,
+                                           enable_dhcp=[True])
+
+    def _add_subnets_and_ports(self, context, networks, **subnet_filters):
+        """Add their subnets and ports to networks, querying them once."""
         plugin = manager.NeutronManager.get_plugin()
         filters = {'network_id': [network['id'] for network in networks]}
         ports = plugin.get_ports(context, filters=filters)
-        filters['enable_dhcp'] = [True]
+        filters.update(subnet_filters)
         subnets = plugin.get_subnets(context, filters=filters)
 
         grouped_subnets = self._group_by_network_id(subnets)
@@ -132,6 +135,22 @@ class DhcpRpcCallback(object):
 
         return networks
 
+    def get_networks_info(self, context, **kwargs):
+        """Retrieve and return extended information about networks.
+
+        Networks which could not be found are left out of the result.
+        """
+        network_ids = kwargs.get('network_ids')
+        host = kwargs.get('host')
+        if not network_ids:
+            return []
+        LOG.debug('%(count)d networks requested from %(host)s',
+                  {'count': len(network_ids), 'host': host})
+        plugin = manager.NeutronManager.get_plugin()
+        networks = plugin.get_networks(context,
+                                       filters={'id': network_ids})
+        return self._add_subnets_and_ports(context, networks)
+
     def get_network_info(self, context, **kwargs):
         """Retrieve and return a extended information about a network."""
         network_id = kwargs.get('network_id')
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+
 from oslo_config import cfg
 import oslo_messaging
 from oslo_serialization import jsonutils
@@ -31,6 +33,14 @@ from neutron.plugins.common import constants as plugin_constants
 
 LOG = logging.getLogger(__name__)
 
+# Number of routers whose sync data is built at once for their checksums
+ROUTER_CHECKSUMS_CHUNK_SIZE = 64
+
+
+def get_router_checksum(router):
+    """Return the checksum of the sync data of a router."""
+    return hashlib.sha1(jsonutils.dumps(router, sort_keys=True)).hexdigest()
+
 
 class L3RpcCallback(object):
     """L3 agent RPC callback in plugin implementations."""
@@ -40,7 +50,8 @@ class L3RpcCallback(object):
     # 1.2 Added methods for DVR support
     # 1.3 Added a method that returns the list of activated services
     # 1.4 Added L3 HA update_router_state
-    target = oslo_messaging.Target(version='1.4')
+    # 1.5 Added get_router_checksums
+    target = oslo_messaging.Target(version='1.5')
 
     @property
     def plugin(self):
@@ -86,6 +97,48 @@ class L3RpcCallback(object):
                   jsonutils.dumps(routers, indent=5))
         return routers
 
+    def get_router_checksums(self, context, **kwargs):
+        """Return the checksums of the routers of a specific agent.
+
+        The agent syncs the routers whose checksum changed only. The sync
+        data of the routers is built a chunk of routers at a time.
+
+        @param context: contain user information
+        @param kwargs: host
+        @return: a dict of the checksum of each router by router id
+        """
+        host = kwargs.get('host')
+        context = neutron_context.get_admin_context()
+        if not self.l3plugin:
+            LOG.error(_LE('No plugin for L3 routing registered! Will reply '
+                          'to l3 agent with empty router checksums.'))
+            return {}
+        if utils.is_extension_supported(
+                self.l3plugin, constants.L3_AGENT_SCHEDULER_EXT_ALIAS):
+            if cfg.CONF.router_auto_schedule:
+                self.l3plugin.auto_schedule_routers(context, host, None)
+            router_ids = self.l3plugin.list_router_ids_on_active_l3_agent(
+                context, host)
+
+            def get_sync_data(router_ids):
+                return (
+                    self.l3plugin.list_active_sync_routers_on_active_l3_agent(
+                        context, host, router_ids))
+        else:
+            router_ids = [router['id'] for router in
+                          self.l3plugin.get_routers(context, fields=['id'])]
+
+            def get_sync_data(router_ids):
+                return self.l3plugin.get_sync_data(context, router_ids)
+        checksums = {}
+        for i in range(0, len(router_ids), ROUTER_CHECKSUMS_CHUNK_SIZE):
+            chunk = router_ids[i:i + ROUTER_CHECKSUMS_CHUNK_SIZE]
+            for router in get_sync_data(chunk):
+                checksums[router['id']] = get_router_checksum(router)
+        LOG.debug("Router checksums returned to l3 agent:\n %s",
+                  jsonutils.dumps(checksums, indent=5))
+        return checksums
+
     def _ensure_host_set_on_ports(self, context, host, routers):
         for router in routers:
             LOG.debug("Checking router: %(id)s for host: %(host)s",
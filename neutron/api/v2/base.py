@@ -129,19 +129,20 @@ class Controller(object):
                                     % self._plugin.__class__.__name__)
         return getattr(self._plugin, native_sorting_attr_name, False)
 
-    def _exclude_attributes_by_policy(self, context, data):
+    def _exclude_attributes_by_policy(self, context, data, checker=None):
         """Identifies attributes to exclude according to authZ policies.
 
         Return a list of attribute names which should be stripped from the
         response returned to the user because the user is not authorized
-        to see them.
+        to see them. A policy checker of the request can be given to reuse
+        the rules it already built.
         """
+        checker = checker or policy.Checker(context)
         attributes_to_exclude = []
         for attr_name in data.keys():
             attr_data = self._attr_info.get(attr_name)
             if attr_data and attr_data['is_visible']:
-                if policy.check(
-                    context,
+                if checker.check(
                     '%s:%s' % (self._plugin_handlers[self.SHOW], attr_name),
                     data,
                     might_not_exist=True):
@@ -245,16 +246,18 @@ class Controller(object):
         obj_list = obj_getter(request.context, **kwargs)
         obj_list = sorting_helper.sort(obj_list)
         obj_list = pagination_helper.paginate(obj_list)
+        # The rules are built once for all the items, and the parent
+        # resources their checks need are fetched together
+        checker = policy.Checker(request.context)
         # Check authz
         if do_authz:
             # FIXME(salvatore-orlando): obj_getter might return references to
             # other resources. Must check authZ on them too.
             # Omit items from list that should not be visible
-            obj_list = [obj for obj in obj_list
-                        if policy.check(request.context,
-                                        self._plugin_handlers[self.SHOW],
-                                        obj,
-                                        plugin=self._plugin)]
+            visible = checker.check_all(self._plugin_handlers[self.SHOW],
+                                        obj_list)
+            obj_list = [obj for obj, is_visible in zip(obj_list, visible)
+                        if is_visible]
         # Use the first element in the list for discriminating which attributes
         # should be filtered out because of authZ policies
         # fields_to_add contains a list of attributes added for request policy
@@ -263,7 +266,7 @@ class Controller(object):
         fields_to_strip = fields_to_add or []
         if obj_list:
             fields_to_strip += self._exclude_attributes_by_policy(
-                request.context, obj_list[0])
+                request.context, obj_list[0], checker=checker)
         collection = {self._collection:
                       [self._filter_attributes(
                           request.context, obj,
@@ -133,6 +133,16 @@ def Resource(controller, faults=None, deserializers=None, serializers=None):
             kwargs = {'body': body, 'content_type': content_type}
             raise webob.exc.HTTPInternalServerError(**kwargs)
 
+        context = request.environ.get('neutron.context')
+        # Don't create a parent lookup for requests which did none
+        parent_lookup = context and context._parent_lookup
+        if parent_lookup and parent_lookup.lookups:
+            LOG.debug("Policy checks of %(action)s looked up %(lookups)d "
+                      "parent resources with %(calls)d plugin calls",
+                      {'action': action,
+                       'lookups': parent_lookup.lookups,
+                       'calls': parent_lookup.plugin_calls})
+
         status = action_status.get(action, 200)
         body = serializer.serialize(result)
         # NOTE(jkoelker) Comply with RFC2616 section 9.7
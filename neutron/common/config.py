@@ -55,6 +55,33 @@ core_opts = [
                help=_("The base MAC address Neutron will use for VIFs")),
     cfg.IntOpt('mac_generation_retries', default=16,
                help=_("How many times Neutron will retry MAC generation")),
+    cfg.IntOpt('security_group_cache_ttl', default=0,
+               help=_("Seconds the compiled rules and member IPs of "
+                      "security groups are cached for agent requests. "
+                      "Changes made through a server process invalidate "
+                      "its cache right away, changes made through other "
+                      "API or RPC worker processes are seen once entries "
+                      "expire. 0 disables the cache.")),
+    cfg.BoolOpt('security_group_member_deltas', default=False,
+                help=_("Send the member IPs added to and removed from "
+                       "security groups along with member update "
+                       "notifications, so that agents update their ipsets "
+                       "without fetching all the members.")),
+    cfg.StrOpt('ip_allocation_strategy', default='range',
+               choices=['range', 'random', 'stride'],
+               help=_("How IP addresses are picked from allocation pools. "
+                      "'range' hands out the first free address of the "
+                      "subnet's availability ranges, serializing the "
+                      "allocations of a subnet. 'random' and 'stride' try "
+                      "candidate addresses and retry on conflicts, without "
+                      "maintaining availability ranges. Switching back to "
+                      "'range' leaves the availability ranges of existing "
+                      "subnets stale, so it may hand out addresses already "
+                      "allocated.")),
+    cfg.IntOpt('ip_allocation_retries', default=16,
+               help=_("How many candidate addresses the 'random' and "
+                      "'stride' strategies try before looking up the free "
+                      "addresses of a subnet")),
     cfg.BoolOpt('allow_bulk', default=True,
                 help=_("Allow the usage of the bulk API")),
     cfg.BoolOpt('allow_pagination', default=False,
@@ -64,6 +64,7 @@ class ContextBase(oslo_context.RequestContext):
             timestamp = datetime.datetime.utcnow()
         self.timestamp = timestamp
         self._session = None
+        self._parent_lookup = None
         self.roles = roles or []
         self.is_advsvc = policy.check_is_advsvc(self)
         if self.is_admin is None:
@@ -102,6 +103,13 @@ class ContextBase(oslo_context.RequestContext):
     def user_id(self, user_id):
         self.user = user_id
 
+    @property
+    def parent_lookup(self):
+        """Parent resources looked up by the policy checks of the request."""
+        if self._parent_lookup is None:
+            self._parent_lookup = policy.ParentLookup()
+        return self._parent_lookup
+
     def _get_read_deleted(self):
         return self._read_deleted
 
@@ -140,6 +148,8 @@ class ContextBase(oslo_context.RequestContext):
 
     def elevated(self, read_deleted=None):
         """Return a version of this context with admin flag set."""
+        # Create the parent lookup before copying so that it is shared
+        self.parent_lookup
         context = copy.copy(self)
         context.is_admin = True
 
@@ -15,12 +15,19 @@
 
 import weakref
 
+import sqlalchemy
+from sqlalchemy import orm
 from sqlalchemy import sql
 
 from neutron.common import exceptions as n_exc
 from neutron.db import sqlalchemyutils
 
 
+# The loader options of the eager load strategies
+EAGER_LOADERS = {'joined': orm.joinedload,
+                 'subquery': orm.subqueryload}
+
+
 class CommonDbMixin(object):
     """Common methods used in core and service plugins."""
     # Plugins, mixin classes implementing extension will register
@@ -35,6 +42,18 @@ class CommonDbMixin(object):
     # TODO(salvatore-orlando): Avoid using class-level variables
     _dict_extend_functions = {}
 
+    # This dictionary will store, for the methods above declaring them,
+    # the response fields a method sets and the model attributes it reads
+    _dict_extend_fields = {}
+
+    # The model attributes the response fields of a resource are built from,
+    # for the fields which are not a column of the model
+    _dict_fields_model_attrs = {}
+
+    # This dictionary will store, for the models of the resources, the eager
+    # load strategy of the relationships the dict extend functions walk
+    _dict_eager_loads = {}
+
     @classmethod
     def register_model_query_hook(cls, model, name, query_hook, filter_hook,
                                   result_filters=None):
@@ -57,8 +76,36 @@ class CommonDbMixin(object):
             'result_filters': result_filters}
 
     @classmethod
-    def register_dict_extend_funcs(cls, resource, funcs):
+    def register_dict_extend_funcs(cls, resource, funcs, fields=None,
+                                   model_attrs=None):
+        """Register methods extending the response dict of a resource.
+
+        fields lists the response fields the methods set, so that they are
+        not called when the caller asked for other fields only. model_attrs
+        lists the model attributes the methods read, so that list queries
+        asking for some fields only load those. Methods not declaring them
+        are always called, and the queries then load the whole rows.
+        """
         cls._dict_extend_functions.setdefault(resource, []).extend(funcs)
+        for func in funcs:
+            cls._dict_extend_fields[(resource, func)] = (
+                None if fields is None else frozenset(fields),
+                None if model_attrs is None else frozenset(model_attrs))
+
+    @classmethod
+    def register_dict_eager_loads(cls, model, loads):
+        """Register how to load relationships listings of a model walk.
+
+        loads maps relationship names of the model to an eager load strategy
+        of EAGER_LOADERS, which listing queries then apply to all the rows at
+        once. 'subquery' suits collections, which a join would repeat the row
+        of the model for, and 'joined' suits relationships to one row.
+        """
+        for name, strategy in loads.iteritems():
+            if strategy not in EAGER_LOADERS:
+                raise ValueError(_("Unknown eager load strategy %s")
+                                 % strategy)
+            cls._dict_eager_loads.setdefault(model, {})[name] = strategy
 
     @property
     def safe_reference(self):
@@ -148,10 +195,31 @@ class CommonDbMixin(object):
                     query = result_filter(query, filters)
         return query
 
+    def _get_dict_extend_fields(self, resource_type, func):
+        return self._dict_extend_fields.get((resource_type, func),
+                                            (None, None))
+
+    def _is_dict_extend_function_needed(self, resource_type, func, fields):
+        func_fields = self._get_dict_extend_fields(resource_type, func)[0]
+        return not fields or func_fields is None or bool(func_fields & fields)
+
+    def _make_columns_dict(self, db_object, columns, fields=None):
+        """Return the columns of db_object asked for in fields, and its id.
+
+        The columns not asked for are not read, as a projected query did
+        not load them.
+        """
+        return dict((column, db_object[column]) for column in columns
+                    if not fields or column in fields or column == 'id')
+
     def _apply_dict_extend_functions(self, resource_type,
-                                     response, db_object):
+                                     response, db_object, fields=None):
+        fields = fields and set(fields)
         for func in self._dict_extend_functions.get(
             resource_type, []):
+            if not self._is_dict_extend_function_needed(resource_type, func,
+                                                        fields):
+                continue
             args = (response, db_object)
             if isinstance(func, basestring):
                 func = getattr(self, func, None)
@@ -161,10 +229,18 @@ class CommonDbMixin(object):
             if func:
                 func(*args)
 
+    def _apply_eager_loads(self, query, model):
+        loads = self._dict_eager_loads.get(model)
+        if loads:
+            query = query.options(*[EAGER_LOADERS[strategy](name)
+                                    for name, strategy in loads.iteritems()])
+        return query
+
     def _get_collection_query(self, context, model, filters=None,
                               sorts=None, limit=None, marker_obj=None,
                               page_reverse=False):
         collection = self._model_query(context, model)
+        collection = self._apply_eager_loads(collection, model)
         collection = self._apply_filters_to_query(collection, model, filters)
         if limit and page_reverse and sorts:
             sorts = [(s[0], not s[1]) for s in sorts]
@@ -173,14 +249,61 @@ class CommonDbMixin(object):
                                                     marker_obj=marker_obj)
         return collection
 
+    def _get_projection_options(self, model, resource_type, fields):
+        """Return the options of a query loading what fields need only.
+
+        When every dict extend function to call declared what it reads, the
+        columns not needed are deferred and the relationships not needed are
+        loaded lazily. Otherwise only the relationships known not to be
+        needed are. The defaults of the model apply when the caller asks for
+        all the fields.
+        """
+        if not fields or not resource_type:
+            return []
+        fields = set(fields)
+        fields_attrs = self._dict_fields_model_attrs.get(resource_type, {})
+        needed = set(['id'])
+        for field in fields:
+            needed.update(fields_attrs.get(field, [field]))
+        # The relationships of the fields not asked for
+        unneeded = set()
+        for field, attrs in fields_attrs.iteritems():
+            if field not in fields:
+                unneeded.update(attrs)
+        project_columns = True
+        for func in self._dict_extend_functions.get(resource_type, []):
+            if isinstance(func, basestring) and not hasattr(self, func):
+                continue
+            func_attrs = self._get_dict_extend_fields(resource_type, func)[1]
+            if not self._is_dict_extend_function_needed(resource_type, func,
+                                                        fields):
+                unneeded.update(func_attrs or [])
+            elif func_attrs is None:
+                project_columns = False
+            else:
+                needed.update(func_attrs)
+        mapper = sqlalchemy.inspect(model)
+        options = [orm.lazyload(name)
+                   for name in mapper.relationships.keys()
+                   if name not in needed and
+                   (project_columns or name in unneeded)]
+        if project_columns:
+            columns = [name for name in mapper.column_attrs.keys()
+                       if name in needed]
+            options.append(orm.load_only(*columns))
+        return options
+
     def _get_collection(self, context, model, dict_func, filters=None,
                         fields=None, sorts=None, limit=None, marker_obj=None,
-                        page_reverse=False):
+                        page_reverse=False, resource_type=None):
         query = self._get_collection_query(context, model, filters=filters,
                                            sorts=sorts,
                                            limit=limit,
                                            marker_obj=marker_obj,
                                            page_reverse=page_reverse)
+        options = self._get_projection_options(model, resource_type, fields)
+        if options:
+            query = query.options(*options)
         items = [dict_func(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
@@ -29,6 +29,7 @@ from neutron.common import ipv6_utils
 from neutron.common import utils
 from neutron import context as ctx
 from neutron.db import common_db_mixin
+from neutron.db import ip_allocator
 from neutron.db import models_v2
 from neutron.db import sqlalchemyutils
 from neutron.extensions import l3
@@ -69,6 +70,14 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     __native_pagination_support = True
     __native_sorting_support = True
 
+    _dict_fields_model_attrs = {
+        attributes.NETWORKS: {'subnets': ['subnets']},
+        attributes.SUBNETS: {'allocation_pools': ['allocation_pools'],
+                             'dns_nameservers': ['dns_nameservers'],
+                             'host_routes': ['routes']},
+        attributes.PORTS: {'fixed_ips': ['fixed_ips']},
+    }
+
     def __init__(self):
         if cfg.CONF.notify_nova_on_port_status_changes:
             from neutron.notifiers import nova
@@ -147,6 +156,12 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                    'network_id': network_id,
                    'subnet_id': subnet_id,
                    'port_id': port_id})
+        reserved = ip_allocator.get_reservation(context, ip_address,
+                                                subnet_id)
+        if reserved:
+            # The IP allocator already inserted the allocation
+            reserved['port_id'] = port_id
+            return
         allocated = models_v2.IPAllocation(
             network_id=network_id,
             port_id=port_id,
@@ -157,6 +172,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     @staticmethod
     def _generate_ip(context, subnets):
+        allocator = ip_allocator.get_ip_allocator()
+        if allocator:
+            return allocator.generate_ip(context, subnets)
+
         try:
             return NeutronDbPluginV2._try_generate_ip(context, subnets)
         except n_exc.IpAddressGenerationFailure:
@@ -257,6 +276,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
     @staticmethod
     def _allocate_specific_ip(context, subnet_id, ip_address):
         """Allocate a specific IP address on the subnet."""
+        if ip_allocator.get_ip_allocator():
+            # Availability ranges are only kept by the 'range' strategy
+            ip_allocator.reserve_specific_ip(context, subnet_id, ip_address)
+            return
         ip = int(netaddr.IPAddress(ip_address))
         range_qry = context.session.query(
             models_v2.IPAvailabilityRange).join(
@@ -777,63 +800,58 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
 
     def _make_network_dict(self, network, fields=None,
                            process_extensions=True):
-        res = {'id': network['id'],
-               'name': network['name'],
-               'tenant_id': network['tenant_id'],
-               'admin_state_up': network['admin_state_up'],
-               'status': network['status'],
-               'shared': network['shared'],
-               'subnets': [subnet['id']
-                           for subnet in network['subnets']]}
+        res = self._make_columns_dict(network,
+                                      ('id', 'name', 'tenant_id',
+                                       'admin_state_up', 'status', 'shared'),
+                                      fields)
+        if not fields or 'subnets' in fields:
+            res['subnets'] = [subnet['id'] for subnet in network['subnets']]
         # Call auxiliary extend functions, if any
         if process_extensions:
             self._apply_dict_extend_functions(
-                attributes.NETWORKS, res, network)
+                attributes.NETWORKS, res, network, fields)
         return self._fields(res, fields)
 
     def _make_subnet_dict(self, subnet, fields=None):
-        res = {'id': subnet['id'],
-               'name': subnet['name'],
-               'tenant_id': subnet['tenant_id'],
-               'network_id': subnet['network_id'],
-               'ip_version': subnet['ip_version'],
-               'cidr': subnet['cidr'],
-               'allocation_pools': [{'start': pool['first_ip'],
-                                     'end': pool['last_ip']}
-                                    for pool in subnet['allocation_pools']],
-               'gateway_ip': subnet['gateway_ip'],
-               'enable_dhcp': subnet['enable_dhcp'],
-               'ipv6_ra_mode': subnet['ipv6_ra_mode'],
-               'ipv6_address_mode': subnet['ipv6_address_mode'],
-               'dns_nameservers': [dns['address']
-                                   for dns in subnet['dns_nameservers']],
-               'host_routes': [{'destination': route['destination'],
-                                'nexthop': route['nexthop']}
-                               for route in subnet['routes']],
-               'shared': subnet['shared']
-               }
+        res = self._make_columns_dict(subnet,
+                                      ('id', 'name', 'tenant_id',
+                                       'network_id', 'ip_version', 'cidr',
+                                       'gateway_ip', 'enable_dhcp',
+                                       'ipv6_ra_mode', 'ipv6_address_mode',
+                                       'shared'),
+                                      fields)
+        if not fields or 'allocation_pools' in fields:
+            res['allocation_pools'] = [{'start': pool['first_ip'],
+                                        'end': pool['last_ip']}
+                                       for pool in subnet['allocation_pools']]
+        if not fields or 'dns_nameservers' in fields:
+            res['dns_nameservers'] = [dns['address']
+                                      for dns in subnet['dns_nameservers']]
+        if not fields or 'host_routes' in fields:
+            res['host_routes'] = [{'destination': route['destination'],
+                                   'nexthop': route['nexthop']}
+                                  for route in subnet['routes']]
         # Call auxiliary extend functions, if any
-        self._apply_dict_extend_functions(attributes.SUBNETS, res, subnet)
+        self._apply_dict_extend_functions(attributes.SUBNETS, res, subnet,
+                                          fields)
         return self._fields(res, fields)
 
     def _make_port_dict(self, port, fields=None,
                         process_extensions=True):
-        res = {"id": port["id"],
-               'name': port['name'],
-               "network_id": port["network_id"],
-               'tenant_id': port['tenant_id'],
-               "mac_address": port["mac_address"],
-               "admin_state_up": port["admin_state_up"],
-               "status": port["status"],
-               "fixed_ips": [{'subnet_id': ip["subnet_id"],
-                              'ip_address': ip["ip_address"]}
-                             for ip in port["fixed_ips"]],
-               "device_id": port["device_id"],
-               "device_owner": port["device_owner"]}
+        res = self._make_columns_dict(port,
+                                      ('id', 'name', 'network_id',
+                                       'tenant_id', 'mac_address',
+                                       'admin_state_up', 'status',
+                                       'device_id', 'device_owner'),
+                                      fields)
+        if not fields or 'fixed_ips' in fields:
+            res['fixed_ips'] = [{'subnet_id': ip["subnet_id"],
+                                 'ip_address': ip["ip_address"]}
+                                for ip in port["fixed_ips"]]
         # Call auxiliary extend functions, if any
         if process_extensions:
             self._apply_dict_extend_functions(
-                attributes.PORTS, res, port)
+                attributes.PORTS, res, port, fields)
         return self._fields(res, fields)
 
     def _create_bulk(self, resource, context, request_items):
@@ -925,7 +943,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                     sorts=sorts,
                                     limit=limit,
                                     marker_obj=marker_obj,
-                                    page_reverse=page_reverse)
+                                    page_reverse=page_reverse,
+                                    resource_type=attributes.NETWORKS)
 
     def get_networks_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Network,
@@ -1288,7 +1307,8 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                     sorts=sorts,
                                     limit=limit,
                                     marker_obj=marker_obj,
-                                    page_reverse=page_reverse)
+                                    page_reverse=page_reverse,
+                                    resource_type=attributes.SUBNETS)
 
     def get_subnets_count(self, context, filters=None):
         return self._get_collection_count(context, models_v2.Subnet,
@@ -1466,6 +1486,7 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
             filters = {}
 
         query = self._model_query(context, Port)
+        query = self._apply_eager_loads(query, Port)
 
         fixed_ips = filters.pop('fixed_ips', {})
         ip_addresses = fixed_ips.get('ip_address')
@@ -1492,6 +1513,10 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                       sorts=sorts, limit=limit,
                                       marker_obj=marker_obj,
                                       page_reverse=page_reverse)
+        options = self._get_projection_options(models_v2.Port,
+                                               attributes.PORTS, fields)
+        if options:
+            query = query.options(*options)
         items = [self._make_port_dict(c, fields) for c in query]
         if limit and page_reverse:
             items.reverse()
@@ -1536,3 +1561,15 @@ class NeutronDbPluginV2(neutron_plugin_base_v2.NeutronPluginBaseV2,
                             device_id=device_id)
                 if tenant_id != router['tenant_id']:
                     raise n_exc.DeviceIDNotOwnedByTenant(device_id=device_id)
+
+
+# The collections of the core resources are loaded by separate queries, and
+# not joined to the rows of the listings
+NeutronDbPluginV2.register_dict_eager_loads(
+    models_v2.Network, {'subnets': 'subquery'})
+NeutronDbPluginV2.register_dict_eager_loads(
+    models_v2.Subnet, {'allocation_pools': 'subquery',
+                       'dns_nameservers': 'subquery',
+                       'routes': 'subquery'})
+NeutronDbPluginV2.register_dict_eager_loads(
+    models_v2.Port, {'fixed_ips': 'subquery'})
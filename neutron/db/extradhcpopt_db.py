@@ -134,4 +134,7 @@ class ExtraDhcpOptMixin(object):
         return res
 
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attributes.PORTS, ['_extend_port_dict_extra_dhcp_opt'])
+        attributes.PORTS, ['_extend_port_dict_extra_dhcp_opt'],
+        fields=[edo_ext.EXTRADHCPOPTS], model_attrs=['dhcp_opts'])
+    db_base_plugin_v2.NeutronDbPluginV2.register_dict_eager_loads(
+        models_v2.Port, {'dhcp_opts': 'subquery'})
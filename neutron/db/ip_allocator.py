@@ -0,0 +1,205 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IP allocation strategies trying candidate addresses of a subnet.
+
+The default 'range' strategy of NeutronDbPluginV2 hands out the first
+address of the subnet's IPAvailabilityRange rows, which every allocation on
+the subnet has to lock and update. The strategies here don't use availability
+ranges: they reserve a candidate address by inserting its IPAllocation row,
+and the primary key of that table rejects an address a concurrent request
+took first, in which case another candidate is tried.
+"""
+
+import abc
+import fractions
+import itertools
+import random
+
+import netaddr
+from oslo_config import cfg
+from oslo_db import exception as db_exc
+import six
+
+from neutron.common import exceptions as n_exc
+from neutron.db import models_v2
+from neutron.openstack.common import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Key of the addresses reserved by a session in its info dict
+_RESERVATIONS = 'neutron_ip_reservations'
+
+
+def get_pool_ranges(context, subnet_id):
+    """Return the sorted (first, last) integer ranges of a subnet's pools."""
+    pools = context.session.query(models_v2.IPAllocationPool).filter_by(
+        subnet_id=subnet_id)
+    return sorted((int(netaddr.IPAddress(pool['first_ip'])),
+                   int(netaddr.IPAddress(pool['last_ip'])))
+                  for pool in pools)
+
+
+def address_at(ranges, offset):
+    """Return the address at offset when ranges are laid end to end."""
+    for first, last in ranges:
+        size = last - first + 1
+        if offset < size:
+            return first + offset
+        offset -= size
+    raise IndexError(offset)
+
+
+def _reserve(context, subnet, ip_address):
+    """Insert the allocation of an address, False if it is taken."""
+    session = context.session
+    reservations = session.info.setdefault(_RESERVATIONS, {})
+    key = (ip_address, subnet['id'])
+    if get_reservation(context, ip_address, subnet['id']):
+        # Already reserved by an earlier allocation of this session
+        return False
+    allocation = models_v2.IPAllocation(ip_address=ip_address,
+                                        subnet_id=subnet['id'],
+                                        network_id=subnet['network_id'])
+    try:
+        # nested = True rolls back only the failed insert, keeping the
+        # enclosing transaction usable for the next candidate
+        with session.begin(subtransactions=True, nested=True):
+            session.add(allocation)
+    except db_exc.DBDuplicateEntry:
+        LOG.debug("IP %(ip_address)s of subnet %(subnet_id)s is already "
+                  "allocated", {'ip_address': ip_address,
+                                'subnet_id': subnet['id']})
+        return False
+    reservations[key] = allocation
+    return True
+
+
+@six.add_metaclass(abc.ABCMeta)
+class CandidateIpAllocator(object):
+    """Base class of the strategies generating candidate addresses."""
+
+    @abc.abstractmethod
+    def candidates(self, ranges, size):
+        """Yield the integer addresses to try, out of size in ranges."""
+
+    def generate_ip(self, context, subnets):
+        """Allocate an IP address from one of the subnets.
+
+        The address is reserved in the session of context, and becomes the
+        port's allocation when NeutronDbPluginV2 stores it.
+        """
+        for subnet in subnets:
+            ip_address = self._allocate_from_subnet(context, subnet)
+            if ip_address:
+                return {'ip_address': ip_address,
+                        'subnet_id': subnet['id']}
+            LOG.debug("All IPs from subnet %(subnet_id)s (%(cidr)s) "
+                      "allocated",
+                      {'subnet_id': subnet['id'], 'cidr': subnet['cidr']})
+        raise n_exc.IpAddressGenerationFailure(net_id=subnets[0]['network_id'])
+
+    def _allocate_from_subnet(self, context, subnet):
+        ranges = get_pool_ranges(context, subnet['id'])
+        size = sum(last - first + 1 for first, last in ranges)
+        if not size:
+            return
+        version = subnet['ip_version']
+        tries = min(size, cfg.CONF.ip_allocation_retries)
+        for candidate in itertools.islice(self.candidates(ranges, size),
+                                          tries):
+            ip_address = str(netaddr.IPAddress(candidate, version))
+            if _reserve(context, subnet, ip_address):
+                return ip_address
+
+        # The subnet is crowded, only try the addresses known to be free
+        LOG.debug("No free IP found in %(tries)d tries on subnet "
+                  "%(subnet_id)s, looking up its free addresses",
+                  {'tries': tries, 'subnet_id': subnet['id']})
+        allocations = context.session.query(
+            models_v2.IPAllocation.ip_address).filter_by(
+                subnet_id=subnet['id'])
+        free = netaddr.IPSet()
+        for first, last in ranges:
+            free |= netaddr.IPSet(netaddr.IPRange(
+                netaddr.IPAddress(first, version),
+                netaddr.IPAddress(last, version)))
+        free -= netaddr.IPSet(ip for ip, in allocations)
+        for ip in free:
+            if _reserve(context, subnet, str(ip)):
+                return str(ip)
+
+
+class RandomIpAllocator(CandidateIpAllocator):
+    """Try addresses picked at random in the allocation pools."""
+
+    def candidates(self, ranges, size):
+        while True:
+            yield address_at(ranges, random.randrange(size))
+
+
+class StrideIpAllocator(CandidateIpAllocator):
+    """Walk the allocation pools with a fixed stride from a random start.
+
+    The stride is coprime with the number of addresses, so the walk visits
+    every address once, while concurrent requests starting elsewhere seldom
+    collide.
+    """
+
+    def candidates(self, ranges, size):
+        offset = random.randrange(size)
+        stride = self._get_stride(size)
+        for _i in six.moves.range(size):
+            yield address_at(ranges, offset)
+            offset = (offset + stride) % size
+
+    @staticmethod
+    def _get_stride(size):
+        # Roughly the golden ratio of the size spreads consecutive addresses
+        # evenly across the pools
+        stride = max(1, int(size * 0.618))
+        while fractions.gcd(stride, size) != 1:
+            stride -= 1
+        return stride
+
+
+ALLOCATORS = {
+    'random': RandomIpAllocator,
+    'stride': StrideIpAllocator,
+}
+
+
+def get_ip_allocator():
+    """Return the configured candidate allocator, None for 'range'."""
+    allocator_class = ALLOCATORS.get(cfg.CONF.ip_allocation_strategy)
+    return allocator_class() if allocator_class else None
+
+
+def reserve_specific_ip(context, subnet_id, ip_address):
+    """Reserve an address requested for a port."""
+    subnet = context.session.query(models_v2.Subnet).filter_by(
+        id=subnet_id).one()
+    if not _reserve(context, subnet, ip_address):
+        raise n_exc.IpAddressInUse(net_id=subnet['network_id'],
+                                   ip_address=ip_address)
+
+
+def get_reservation(context, ip_address, subnet_id):
+    """Return the allocation reserved for an address by this session."""
+    reservations = context.session.info.get(_RESERVATIONS, {})
+    allocation = reservations.get((ip_address, subnet_id))
+    # A rolled back transaction expunges the allocations it reserved
+    if allocation is not None and allocation in context.session:
+        return allocation
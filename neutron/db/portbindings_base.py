@@ -37,4 +37,4 @@ def _extend_port_dict_binding(plugin, port_res, port_db):
 
 def register_port_dict_function():
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attributes.PORTS, [_extend_port_dict_binding])
+        attributes.PORTS, [_extend_port_dict_binding], model_attrs=[])
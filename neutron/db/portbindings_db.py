@@ -117,4 +117,7 @@ def _extend_port_dict_binding(plugin, port_res, port_db):
 
 # Register dict extend functions for ports
 db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-    attributes.PORTS, [_extend_port_dict_binding])
+    attributes.PORTS, [_extend_port_dict_binding],
+    model_attrs=['portbinding'])
+db_base_plugin_v2.NeutronDbPluginV2.register_dict_eager_loads(
+    models_v2.Port, {'portbinding': 'joined'})
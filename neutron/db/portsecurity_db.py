@@ -180,6 +180,12 @@ class PortSecurityDbMixin(object):
 
     # Register dict extend functions for ports and networks
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attrs.NETWORKS, ['_extend_port_security_dict'])
+        attrs.NETWORKS, ['_extend_port_security_dict'],
+        fields=[psec.PORTSECURITY], model_attrs=['port_security'])
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attrs.PORTS, ['_extend_port_security_dict'])
+        attrs.PORTS, ['_extend_port_security_dict'],
+        fields=[psec.PORTSECURITY], model_attrs=['port_security'])
+    db_base_plugin_v2.NeutronDbPluginV2.register_dict_eager_loads(
+        models_v2.Network, {'port_security': 'joined'})
+    db_base_plugin_v2.NeutronDbPluginV2.register_dict_eager_loads(
+        models_v2.Port, {'port_security': 'joined'})
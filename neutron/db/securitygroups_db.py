@@ -511,7 +511,10 @@ class SecurityGroupDbMixin(ext_sg.SecurityGroupPluginBase):
 
     # Register dict extend functions for ports
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attributes.PORTS, ['_extend_port_dict_security_group'])
+        attributes.PORTS, ['_extend_port_dict_security_group'],
+        fields=[ext_sg.SECURITYGROUPS], model_attrs=['security_groups'])
+    db_base_plugin_v2.NeutronDbPluginV2.register_dict_eager_loads(
+        models_v2.Port, {'security_groups': 'subquery'})
 
     def _process_port_create_security_group(self, context, port,
                                             security_group_ids):
@@ -13,7 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import os
+import time
+
 import netaddr
+from oslo_config import cfg
 from sqlalchemy.orm import exc
 
 from neutron.common import constants as q_const
@@ -22,9 +27,11 @@ from neutron.common import utils
 from neutron.db import allowedaddresspairs_db as addr_pair
 from neutron.db import models_v2
 from neutron.db import securitygroups_db as sg_db
+from neutron.extensions import allowedaddresspairs as addr_pair_ext
 from neutron.extensions import securitygroup as ext_sg
 from neutron.i18n import _LW
 from neutron.openstack.common import log as logging
+from neutron.openstack.common import uuidutils
 
 LOG = logging.getLogger(__name__)
 
@@ -34,6 +41,116 @@ DIRECTION_IP_PREFIX = {'ingress': 'source_ip_prefix',
 
 DHCP_RULE_PORT = {4: (67, 68, q_const.IPv4), 6: (547, 546, q_const.IPv6)}
 
+# Rules of a security group compiled for agents, and the remote groups
+# (remote_group_id, ethertype) they refer to
+CompiledRules = collections.namedtuple('CompiledRules',
+                                       ['rules', 'remote_groups'])
+
+
+class SecurityGroupCache(object):
+    """Values computed for security groups, shared by a server process.
+
+    Entries expire after security_group_cache_ttl seconds, which bounds how
+    long changes made by other server processes go unnoticed; changes made
+    through this process invalidate them right away. A value computed while
+    its entry was invalidated is not stored.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        # Security group id -> (expiry time, value)
+        self._entries = {}
+        # Bumped by invalidations, by security group id and for all groups
+        self._generations = collections.Counter()
+        self._epoch = 0
+
+    @property
+    def enabled(self):
+        return cfg.CONF.security_group_cache_ttl > 0
+
+    def get_many(self, sg_ids):
+        """Return the cached values by id, the missing ids and a token.
+
+        The token is passed to set_many along with the missing values.
+        """
+        found = {}
+        missing = []
+        now = time.time()
+        for sg_id in sg_ids:
+            entry = self._entries.get(sg_id) if self.enabled else None
+            if entry and entry[0] > now:
+                found[sg_id] = entry[1]
+            else:
+                missing.append(sg_id)
+        if self.enabled:
+            self.hits += len(found)
+            self.misses += len(missing)
+        token = (self._epoch,
+                 dict((sg_id, self._generations[sg_id])
+                      for sg_id in missing))
+        return found, missing, token
+
+    def set_many(self, values, token):
+        if not self.enabled:
+            return
+        epoch, generations = token
+        if epoch != self._epoch:
+            return
+        expires_at = time.time() + cfg.CONF.security_group_cache_ttl
+        for sg_id, value in values.items():
+            if generations.get(sg_id) == self._generations[sg_id]:
+                self._entries[sg_id] = (expires_at, value)
+
+    def invalidate(self, sg_ids):
+        for sg_id in sg_ids:
+            self._generations[sg_id] += 1
+            self._entries.pop(sg_id, None)
+
+    def clear(self):
+        self._epoch += 1
+        self._generations.clear()
+        self._entries.clear()
+
+    def stats(self):
+        return {'name': self.name, 'size': len(self._entries),
+                'hits': self.hits, 'misses': self.misses}
+
+
+# Compiled rules and member IPs of the security groups
+SG_RULES_CACHE = SecurityGroupCache('rules')
+SG_MEMBER_IPS_CACHE = SecurityGroupCache('member_ips')
+
+
+class MemberUpdateSequencer(object):
+    """Number the member updates sent for each security group.
+
+    Numbers are given per server process, which the source identifies, so
+    that agents can tell a missed update from updates of other processes.
+    """
+
+    def __init__(self):
+        self._pid = None
+        self.source = None
+        self._sequences = collections.Counter()
+
+    def next(self, sg_id):
+        # Forked workers get their own source
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.source = uuidutils.generate_uuid()
+            self._sequences.clear()
+        self._sequences[sg_id] += 1
+        return self.source, self._sequences[sg_id]
+
+    def forget(self, sg_id):
+        """Drop the sequence of a deleted security group."""
+        self._sequences.pop(sg_id, None)
+
+
+MEMBER_UPDATE_SEQUENCER = MemberUpdateSequencer()
+
 
 class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
     """Mixin class to add agent-based security group implementation."""
@@ -72,6 +189,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.create_security_group_rule_bulk_native(context,
                                                            bulk_rule)[0]
         sgids = [rule['security_group_id']]
+        SG_RULES_CACHE.invalidate(sgids)
         self.notifier.security_groups_rule_updated(context, sgids)
         return rule
 
@@ -81,6 +199,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                       self).create_security_group_rule_bulk_native(
                           context, security_group_rule)
         sgids = set([r['security_group_id'] for r in rules])
+        SG_RULES_CACHE.invalidate(sgids)
         self.notifier.security_groups_rule_updated(context, list(sgids))
         return rules
 
@@ -88,9 +207,19 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         rule = self.get_security_group_rule(context, sgrid)
         super(SecurityGroupServerRpcMixin,
               self).delete_security_group_rule(context, sgrid)
+        SG_RULES_CACHE.invalidate([rule['security_group_id']])
         self.notifier.security_groups_rule_updated(context,
                                                    [rule['security_group_id']])
 
+    def delete_security_group(self, context, id):
+        super(SecurityGroupServerRpcMixin,
+              self).delete_security_group(context, id)
+        # The rules of other groups with this group as remote group are
+        # deleted too
+        SG_RULES_CACHE.clear()
+        SG_MEMBER_IPS_CACHE.invalidate([id])
+        MEMBER_UPDATE_SEQUENCER.forget(id)
+
     def update_security_group_on_port(self, context, id, port,
                                       original_port, updated_port):
         """Update security groups on port.
@@ -113,6 +242,9 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                 context,
                 updated_port,
                 port_updates[ext_sg.SECURITYGROUPS])
+            SG_MEMBER_IPS_CACHE.invalidate(
+                set(original_port.get(ext_sg.SECURITYGROUPS) or []) |
+                set(port_updates[ext_sg.SECURITYGROUPS] or []))
             need_notify = True
         else:
             updated_port[ext_sg.SECURITYGROUPS] = (
@@ -134,9 +266,16 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                 original_port.get(ext_sg.SECURITYGROUPS),
                 updated_port.get(ext_sg.SECURITYGROUPS))):
             need_notify = True
+        if (need_notify or
+            original_port.get(addr_pair_ext.ADDRESS_PAIRS) !=
+                updated_port.get(addr_pair_ext.ADDRESS_PAIRS)):
+            SG_MEMBER_IPS_CACHE.invalidate(
+                set(original_port.get(ext_sg.SECURITYGROUPS) or []) |
+                set(updated_port.get(ext_sg.SECURITYGROUPS) or []))
         return need_notify
 
-    def notify_security_groups_member_updated_bulk(self, context, ports):
+    def notify_security_groups_member_updated_bulk(self, context, ports,
+                                                   original_ports=None):
         """Notify update event of security group members for ports.
 
         The agent setups the iptables rule to allow
@@ -146,9 +285,17 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
         security_groups_provider_updated() just notifies that an event
         occurs and the plugin agent fetches the update provider
         rule in the other RPC call (security_group_rules_for_devices).
+
+        The original ports of updated ports are given to also notify the
+        groups they left and the addresses they no longer have.
         """
         security_groups_provider_updated = False
         sec_groups = set()
+        original_ports = original_ports or []
+        for port in original_ports:
+            if port['device_owner'] not in (q_const.DEVICE_OWNER_DHCP,
+                                            q_const.DEVICE_OWNER_ROUTER_INTF):
+                sec_groups |= set(port.get(ext_sg.SECURITYGROUPS) or [])
         for port in ports:
             if port['device_owner'] == q_const.DEVICE_OWNER_DHCP:
                 security_groups_provider_updated = True
@@ -161,41 +308,137 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
             else:
                 sec_groups |= set(port.get(ext_sg.SECURITYGROUPS))
 
+        SG_MEMBER_IPS_CACHE.invalidate(sec_groups)
         if security_groups_provider_updated:
             self.notifier.security_groups_provider_updated(context)
         if sec_groups:
+            kwargs = {}
+            if cfg.CONF.security_group_member_deltas:
+                kwargs['member_updates'] = self._get_member_updates(
+                    context, original_ports + ports, sec_groups)
             self.notifier.security_groups_member_updated(
-                context, list(sec_groups))
+                context, list(sec_groups), **kwargs)
+
+    def _get_member_updates(self, context, ports, sec_groups):
+        """Return the member IPs added and removed by ports, by group id.
+
+        The addresses of the ports still found in a group were added, the
+        others were removed. The ports can include the original version of
+        updated ports, to remove the addresses they had.
+        """
+        member_ips = self._get_ips_for_remote_group(context, sec_groups)
+        member_updates = {}
+        for sg_id in sec_groups:
+            source, seq = MEMBER_UPDATE_SEQUENCER.next(sg_id)
+            update = {'source': source, 'seq': seq,
+                      'added': {q_const.IPv4: [], q_const.IPv6: []},
+                      'removed': {q_const.IPv4: [], q_const.IPv6: []}}
+            for port in ports:
+                if sg_id not in (port.get(ext_sg.SECURITYGROUPS) or []):
+                    continue
+                ips = [ip['ip_address'] for ip in port['fixed_ips']]
+                ips += [pair['ip_address'] for pair in
+                        port.get(addr_pair_ext.ADDRESS_PAIRS) or []]
+                for ip in ips:
+                    change = ('added' if ip in member_ips[sg_id]
+                              else 'removed')
+                    ethertype = 'IPv%d' % netaddr.IPNetwork(ip).version
+                    if ip not in update[change][ethertype]:
+                        update[change][ethertype].append(ip)
+            member_updates[sg_id] = update
+        return member_updates
 
     def notify_security_groups_member_updated(self, context, port):
         self.notify_security_groups_member_updated_bulk(context, [port])
 
+    def notify_security_groups_member_updated_on_update(
+            self, context, original_port, updated_port):
+        """Notify the member changes of the groups of an updated port.
+
+        Nothing is sent unless the addresses or the groups of the port
+        changed.
+        """
+        if (original_port['fixed_ips'] == updated_port['fixed_ips'] and
+            original_port.get(addr_pair_ext.ADDRESS_PAIRS) ==
+                updated_port.get(addr_pair_ext.ADDRESS_PAIRS) and
+            utils.compare_elements(
+                original_port.get(ext_sg.SECURITYGROUPS),
+                updated_port.get(ext_sg.SECURITYGROUPS))):
+            return
+        self.notify_security_groups_member_updated_bulk(
+            context, [updated_port], original_ports=[original_port])
+
     def security_group_info_for_ports(self, context, ports):
         sg_info = {'devices': ports,
                    'security_groups': {},
                    'sg_member_ips': {}}
-        rules_in_db = self._select_rules_for_ports(context, ports)
+        sgs_by_port = self._select_sg_ids_for_ports(context, ports)
+        compiled_rules = self._get_compiled_rules(
+            context, set(sg_id for sg_ids in sgs_by_port.values()
+                         for sg_id in sg_ids))
         remote_security_group_info = {}
-        for (port_id, rule_in_db) in rules_in_db:
+        for port_id, sg_ids in sgs_by_port.items():
+            port = sg_info['devices'][port_id]
+            for sg_id in sg_ids:
+                compiled = compiled_rules[sg_id]
+                if not compiled.rules:
+                    continue
+                source_groups = port.setdefault(
+                    'security_group_source_groups', [])
+                for remote_gid, ethertype in compiled.remote_groups:
+                    if remote_gid not in source_groups:
+                        source_groups.append(remote_gid)
+                    # this set will be serialized into a list by rpc code
+                    remote_security_group_info.setdefault(
+                        remote_gid, {}).setdefault(ethertype, set())
+                sg_info['security_groups'][sg_id] = list(compiled.rules)
+
+        sg_info['sg_member_ips'] = remote_security_group_info
+        # the provider rules do not belong to any security group, so these
+        # rules still reside in sg_info['devices'] [port_id]
+        self._apply_provider_rule(context, sg_info['devices'])
+
+        return self._get_security_group_member_ips(context, sg_info)
+
+    def _select_sg_ids_for_ports(self, context, ports):
+        """Return the ids of the security groups of ports, by port id."""
+        sgs_by_port = collections.defaultdict(list)
+        if not ports:
+            return sgs_by_port
+        sg_binding_port = sg_db.SecurityGroupPortBinding.port_id
+        sg_binding_sgid = sg_db.SecurityGroupPortBinding.security_group_id
+        query = context.session.query(sg_binding_port, sg_binding_sgid)
+        query = query.filter(sg_binding_port.in_(ports.keys()))
+        for port_id, sg_id in query:
+            sgs_by_port[port_id].append(sg_id)
+        return sgs_by_port
+
+    def _get_compiled_rules(self, context, sg_ids):
+        """Return the CompiledRules of security groups, by group id."""
+        compiled_rules, missing, token = SG_RULES_CACHE.get_many(sg_ids)
+        if not missing:
+            return compiled_rules
+        rules_by_sg = dict((sg_id, []) for sg_id in missing)
+        query = context.session.query(sg_db.SecurityGroupRule)
+        query = query.filter(
+            sg_db.SecurityGroupRule.security_group_id.in_(missing))
+        for rule_in_db in query:
+            rules_by_sg[rule_in_db['security_group_id']].append(rule_in_db)
+        missing_rules = dict((sg_id, self._compile_rules(rules))
+                             for sg_id, rules in rules_by_sg.items())
+        SG_RULES_CACHE.set_many(missing_rules, token)
+        compiled_rules.update(missing_rules)
+        return compiled_rules
+
+    def _compile_rules(self, rules_in_db):
+        rules = []
+        remote_groups = []
+        seen_rules = set()
+        for rule_in_db in rules_in_db:
             remote_gid = rule_in_db.get('remote_group_id')
-            security_group_id = rule_in_db.get('security_group_id')
             ethertype = rule_in_db['ethertype']
-            if ('security_group_source_groups'
-                not in sg_info['devices'][port_id]):
-                sg_info['devices'][port_id][
-                    'security_group_source_groups'] = []
-
-            if remote_gid:
-                if (remote_gid
-                    not in sg_info['devices'][port_id][
-                        'security_group_source_groups']):
-                    sg_info['devices'][port_id][
-                        'security_group_source_groups'].append(remote_gid)
-                if remote_gid not in remote_security_group_info:
-                    remote_security_group_info[remote_gid] = {}
-                if ethertype not in remote_security_group_info[remote_gid]:
-                    # this set will be serialized into a list by rpc code
-                    remote_security_group_info[remote_gid][ethertype] = set()
+            if remote_gid and (remote_gid, ethertype) not in remote_groups:
+                remote_groups.append((remote_gid, ethertype))
 
             direction = rule_in_db['direction']
             rule_dict = {
@@ -210,21 +453,14 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                         rule_dict[direction_ip_prefix] = rule_in_db[key]
                         continue
                     rule_dict[key] = rule_in_db[key]
-            if security_group_id not in sg_info['security_groups']:
-                sg_info['security_groups'][security_group_id] = []
-            if rule_dict not in sg_info['security_groups'][security_group_id]:
-                sg_info['security_groups'][security_group_id].append(
-                    rule_dict)
-
-        sg_info['sg_member_ips'] = remote_security_group_info
-        # the provider rules do not belong to any security group, so these
-        # rules still reside in sg_info['devices'] [port_id]
-        self._apply_provider_rule(context, sg_info['devices'])
-
-        return self._get_security_group_member_ips(context, sg_info)
+            rule_key = frozenset(rule_dict.items())
+            if rule_key not in seen_rules:
+                seen_rules.add(rule_key)
+                rules.append(rule_dict)
+        return CompiledRules(rules=rules, remote_groups=remote_groups)
 
     def _get_security_group_member_ips(self, context, sg_info):
-        ips = self._select_ips_for_remote_group(
+        ips = self._get_ips_for_remote_group(
             context, sg_info['sg_member_ips'].keys())
         for sg_id, member_ips in ips.items():
             for ip in member_ips:
@@ -233,6 +469,16 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
                     sg_info['sg_member_ips'][sg_id][ethertype].add(ip)
         return sg_info
 
+    def _get_ips_for_remote_group(self, context, remote_group_ids):
+        """Return the member IPs of security groups, by group id."""
+        ips_by_group, missing, token = SG_MEMBER_IPS_CACHE.get_many(
+            set(remote_group_ids))
+        if missing:
+            missing_ips = self._select_ips_for_remote_group(context, missing)
+            SG_MEMBER_IPS_CACHE.set_many(missing_ips, token)
+            ips_by_group.update(missing_ips)
+        return ips_by_group
+
     def _select_rules_for_ports(self, context, ports):
         if not ports:
             return []
@@ -378,7 +624,7 @@ class SecurityGroupServerRpcMixin(sg_db.SecurityGroupDbMixin):
 
     def _convert_remote_group_id_to_ip_prefix(self, context, ports):
         remote_group_ids = self._select_remote_group_ids(ports)
-        ips = self._select_ips_for_remote_group(context, remote_group_ids)
+        ips = self._get_ips_for_remote_group(context, remote_group_ids)
         for port in ports.values():
             updated_rule = []
             for rule in port.get('security_group_rules'):
@@ -857,6 +857,8 @@ class LinuxBridgeNeutronAgentRPC(object):
             # resync is needed
             return True
 
+        devices_up = []
+        devices_down = []
         for device_details in devices_details_list:
             device = device_details['device']
             LOG.debug("Port %s added", device)
@@ -880,44 +882,59 @@ class LinuxBridgeNeutronAgentRPC(object):
                         device_details['physical_network'],
                         segmentation_id,
                         device_details['port_id']):
-
-                        # update plugin about port status
-                        self.plugin_rpc.update_device_up(self.context,
-                                                         device,
-                                                         self.agent_id,
-                                                         cfg.CONF.host)
+                        devices_up.append(device)
                     else:
-                        self.plugin_rpc.update_device_down(self.context,
-                                                           device,
-                                                           self.agent_id,
-                                                           cfg.CONF.host)
+                        devices_down.append(device)
                 else:
                     self.remove_port_binding(device_details['network_id'],
                                              device_details['port_id'])
             else:
                 LOG.info(_LI("Device %s not defined on plugin"), device)
-        return False
+
+        if not devices_up and not devices_down:
+            return False
+        # update plugin about the status of all the ports at once
+        try:
+            devices_set = self.plugin_rpc.update_device_list(
+                self.context, devices_up, devices_down, self.agent_id,
+                cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("Unable to update the status of %(devices)s: %(e)s",
+                      {'devices': devices_up + devices_down, 'e': e})
+            # resync is needed
+            return True
+        failed_devices = (devices_set.get('failed_devices_up', []) +
+                          devices_set.get('failed_devices_down', []))
+        if failed_devices:
+            LOG.debug("Unable to update the status of %s", failed_devices)
+        return bool(failed_devices)
 
     def treat_devices_removed(self, devices):
         resync = False
         self.sg_agent.remove_devices_filter(devices)
         for device in devices:
             LOG.info(_LI("Attachment %s removed"), device)
-            details = None
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id,
-                                                             cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("port_removed failed for %(device)s: %(e)s",
-                          {'device': device, 'e': e})
+        devices = list(devices)
+        devices_down = []
+        try:
+            devices_set = self.plugin_rpc.update_device_list(
+                self.context, [], devices, self.agent_id, cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("port_removed failed for %(devices)s: %(e)s",
+                      {'devices': devices, 'e': e})
+            resync = True
+        else:
+            devices_down = devices_set.get('devices_down', [])
+            for device in devices_set.get('failed_devices_down', []):
+                LOG.debug("port_removed failed for %s", device)
                 resync = True
-            if details and details['exists']:
-                LOG.info(_LI("Port %s updated."), device)
+        for details in devices_down:
+            if details['exists']:
+                LOG.info(_LI("Port %s updated."), details['device'])
             else:
-                LOG.debug("Device %s not defined on plugin", device)
-            self.br_mgr.remove_empty_bridges()
+                LOG.debug("Device %s not defined on plugin",
+                          details['device'])
+        self.br_mgr.remove_empty_bridges()
         return resync
 
     def scan_devices(self, previous, sync):
@@ -77,6 +77,24 @@ def get_network_segments(session, network_id, filter_dynamic=False):
         return [_make_segment_dict(record) for record in records]
 
 
+def get_networks_segments(session, network_ids, filter_dynamic=False):
+    """Return the segments of each network, in a single query."""
+    if not network_ids:
+        return {}
+    with session.begin(subtransactions=True):
+        query = (session.query(models.NetworkSegment).
+                 filter(models.NetworkSegment.network_id.in_(network_ids)).
+                 order_by(models.NetworkSegment.segment_index))
+        if filter_dynamic is not None:
+            query = query.filter_by(is_dynamic=filter_dynamic)
+        records = query.all()
+
+        result = dict((net_id, []) for net_id in network_ids)
+        for record in records:
+            result[record.network_id].append(_make_segment_dict(record))
+        return result
+
+
 def get_segment_by_id(session, segment_id):
     with session.begin(subtransactions=True):
         try:
@@ -459,17 +459,27 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             self._update_port_dict_binding(port_res, port_db.port_binding)
 
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-        attributes.PORTS, ['_ml2_extend_port_dict_binding'])
+        attributes.PORTS, ['_ml2_extend_port_dict_binding'],
+        fields=[portbindings.HOST_ID, portbindings.VNIC_TYPE,
+                portbindings.PROFILE, portbindings.VIF_TYPE,
+                portbindings.VIF_DETAILS],
+        model_attrs=['port_binding'])
+    db_base_plugin_v2.NeutronDbPluginV2.register_dict_eager_loads(
+        models_v2.Port, {'port_binding': 'joined'})
 
     # Register extend dict methods for network and port resources.
     # Each mechanism driver that supports extend attribute for the resources
-    # can add those attribute to the result.
+    # can add those attribute to the result. The drivers read the models
+    # they extended the resources with, which load on first access.
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-               attributes.NETWORKS, ['_ml2_md_extend_network_dict'])
+               attributes.NETWORKS, ['_ml2_md_extend_network_dict'],
+               model_attrs=[])
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-               attributes.PORTS, ['_ml2_md_extend_port_dict'])
+               attributes.PORTS, ['_ml2_md_extend_port_dict'],
+               model_attrs=[])
     db_base_plugin_v2.NeutronDbPluginV2.register_dict_extend_funcs(
-               attributes.SUBNETS, ['_ml2_md_extend_subnet_dict'])
+               attributes.SUBNETS, ['_ml2_md_extend_subnet_dict'],
+               model_attrs=[])
 
     def _ml2_md_extend_network_dict(self, result, netdb):
         session = db_api.get_session()
@@ -655,8 +665,7 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
             nets = super(Ml2Plugin,
                          self).get_networks(context, filters, None, sorts,
                                             limit, marker, page_reverse)
-            for net in nets:
-                self.type_manager.extend_network_dict_provider(context, net)
+            self.type_manager.extend_networks_dict_provider(context, nets)
 
             nets = self._filter_nets_provider(context, nets, filters)
             nets = self._filter_nets_l3(context, nets, filters)
@@ -1047,6 +1056,8 @@ class Ml2Plugin(db_base_plugin_v2.NeutronDbPluginV2,
 
         need_port_update_notify |= self.is_security_group_member_updated(
             context, original_port, updated_port)
+        self.notify_security_groups_member_updated_on_update(
+            context, original_port, updated_port)
 
         if original_port['admin_state_up'] != updated_port['admin_state_up']:
             need_port_update_notify = True
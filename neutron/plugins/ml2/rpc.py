@@ -24,7 +24,7 @@ from neutron.common import rpc as n_rpc
 from neutron.common import topics
 from neutron.common import utils
 from neutron.extensions import portbindings
-from neutron.i18n import _LW
+from neutron.i18n import _LE, _LW
 from neutron import manager
 from neutron.openstack.common import log
 from neutron.plugins.common import constants as service_constants
@@ -46,7 +46,8 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
     #       return value to include fixed_ips and device_owner for
     #       the device port
     #   1.4 tunnel_sync rpc signature upgrade to obtain 'host'
-    target = oslo_messaging.Target(version='1.4')
+    #   1.5 Support update_device_list
+    target = oslo_messaging.Target(version='1.5')
 
     def __init__(self, notifier, type_manager):
         self.setup_tunnel_callback_mixin(notifier, type_manager)
@@ -119,6 +120,10 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
 
     def update_device_down(self, rpc_context, **kwargs):
         """Device no longer exists on agent."""
+        plugin = manager.NeutronManager.get_plugin()
+        return self._update_device_down(rpc_context, plugin, **kwargs)
+
+    def _update_device_down(self, rpc_context, plugin, **kwargs):
         # TODO(garyk) - live migration and port status
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
@@ -126,7 +131,6 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
         LOG.debug("Device %(device)s no longer exists at agent "
                   "%(agent_id)s",
                   {'device': device, 'agent_id': agent_id})
-        plugin = manager.NeutronManager.get_plugin()
         port_id = plugin._device_to_port_id(device)
         port_exists = True
         if (host and not plugin.port_bound_to_host(rpc_context,
@@ -150,12 +154,15 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
 
     def update_device_up(self, rpc_context, **kwargs):
         """Device is up on agent."""
+        plugin = manager.NeutronManager.get_plugin()
+        self._update_device_up(rpc_context, plugin, **kwargs)
+
+    def _update_device_up(self, rpc_context, plugin, **kwargs):
         agent_id = kwargs.get('agent_id')
         device = kwargs.get('device')
         host = kwargs.get('host')
         LOG.debug("Device %(device)s up at agent %(agent_id)s",
                   {'device': device, 'agent_id': agent_id})
-        plugin = manager.NeutronManager.get_plugin()
         port_id = plugin._device_to_port_id(device)
         if (host and not plugin.port_bound_to_host(rpc_context,
                                                    port_id, host)):
@@ -178,6 +185,45 @@ class RpcCallbacks(type_tunnel.TunnelRpcCallbackMixin):
             except exceptions.PortNotFound:
                 LOG.debug('Port %s not found during ARP update', port_id)
 
+    def update_device_list(self, rpc_context, **kwargs):
+        """Devices are up or no longer exist on agent.
+
+        All the devices are handled in this single call, sharing the DB
+        session of rpc_context. A device failing to update is reported back
+        in failed_devices_up or failed_devices_down without affecting the
+        others.
+        """
+        devices_up = kwargs.pop('devices_up', [])
+        devices_down = kwargs.pop('devices_down', [])
+        plugin = manager.NeutronManager.get_plugin()
+
+        updated_devices_up = []
+        failed_devices_up = []
+        for device in devices_up:
+            try:
+                self._update_device_up(rpc_context, plugin, device=device,
+                                       **kwargs)
+            except Exception:
+                failed_devices_up.append(device)
+                LOG.exception(_LE("Failed to update device %s up"), device)
+            else:
+                updated_devices_up.append(device)
+
+        devices_down_details = []
+        failed_devices_down = []
+        for device in devices_down:
+            try:
+                devices_down_details.append(self._update_device_down(
+                    rpc_context, plugin, device=device, **kwargs))
+            except Exception:
+                failed_devices_down.append(device)
+                LOG.exception(_LE("Failed to update device %s down"), device)
+
+        return {'devices_up': updated_devices_up,
+                'failed_devices_up': failed_devices_up,
+                'devices_down': devices_down_details,
+                'failed_devices_down': failed_devices_down}
+
 
 class AgentNotifierApi(dvr_rpc.DVRAgentRpcApiMixin,
                        sg_rpc.SecurityGroupAgentRpcApiMixin,
@@ -335,6 +335,8 @@ class OneConvergencePluginV2(db_base_plugin_v2.NeutronDbPluginV2,
 
         if need_port_update_notify:
             self.notifier.port_update(context, neutron_port)
+        self.notify_security_groups_member_updated_on_update(
+            context, old_port, neutron_port)
 
         return neutron_port
 
@@ -200,6 +200,9 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         self.polling_interval = polling_interval
         self.minimize_polling = minimize_polling
         self.ovsdb_monitor_respawn_interval = ovsdb_monitor_respawn_interval
+        self.port_audit_interval = cfg.CONF.AGENT.port_audit_interval
+        # When the ports of the integration bridge were last scanned
+        self.last_port_audit = None
 
         if tunnel_types:
             self.enable_tunneling = True
@@ -990,12 +993,15 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                     'options:peer', int_if_name)
 
     def scan_ports(self, registered_ports, updated_ports=None):
-        cur_ports = self.int_br.get_vif_port_set()
+        # Both scans below are served from a single dump of the bridge
+        with self.int_br.port_snapshot():
+            cur_ports = self.int_br.get_vif_port_set()
+            changed_ports = self.check_changed_vlans(registered_ports)
         self.int_br_device_count = len(cur_ports)
         port_info = {'current': cur_ports}
         if updated_ports is None:
             updated_ports = set()
-        updated_ports.update(self.check_changed_vlans(registered_ports))
+        updated_ports.update(changed_ports)
         if updated_ports:
             # Some updated ports might have been removed in the
             # meanwhile, and therefore should not be processed.
@@ -1016,6 +1022,81 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         port_info['removed'] = registered_ports - cur_ports
         return port_info
 
+    def process_ports_events(self, events, registered_ports,
+                             updated_ports=None):
+        """Return the port info from the interface events of ovsdb.
+
+        Unlike scan_ports, only the interfaces the events are about are
+        looked at. None is returned when the events don't identify the
+        ports changed, which the caller has to scan the bridge for then.
+        """
+        removed_ports = set()
+        updated_ports = set(updated_ports or [])
+        # Names of the interfaces with a new port id
+        added_ifaces = {}
+        for device in events['removed']:
+            port_id = device['external_ids'].get('iface-id')
+            if port_id in registered_ports:
+                removed_ports.add(port_id)
+        for device in events['added'] + events['modified']:
+            external_ids = device['external_ids']
+            port_id = external_ids.get('iface-id')
+            if not port_id:
+                if 'xs-vif-uuid' in external_ids:
+                    # The port id is only known to XAPI
+                    return
+                continue
+            is_ready = device['ofport'] not in (ovs_lib.UNASSIGNED_OFPORT,
+                                                ovs_lib.INVALID_OFPORT)
+            if not (is_ready and self.int_br._is_vif_interface(device)):
+                if port_id in registered_ports:
+                    removed_ports.add(port_id)
+            elif port_id in registered_ports:
+                # Replugged, or its ofport changed
+                updated_ports.add(port_id)
+            else:
+                added_ifaces[device['name']] = port_id
+        added_ports = set()
+        if added_ifaces:
+            # The events are about the interfaces of every bridge
+            int_br_ports = set(self.int_br.get_port_name_list())
+            added_ports = set(port_id
+                              for name, port_id in added_ifaces.items()
+                              if name in int_br_ports)
+        cur_ports = (registered_ports - removed_ports) | added_ports
+        self.int_br_device_count = len(cur_ports)
+        port_info = {'current': cur_ports}
+        updated_ports &= cur_ports
+        if updated_ports:
+            port_info['updated'] = updated_ports
+        if added_ports or removed_ports:
+            port_info['added'] = added_ports
+            port_info['removed'] = removed_ports
+        return port_info
+
+    def _is_port_audit_due(self):
+        if self.port_audit_interval <= 0:
+            # Every polling scans the bridge
+            return False
+        return (self.last_port_audit is None or
+                time.time() - self.last_port_audit >=
+                self.port_audit_interval)
+
+    def get_port_info(self, polling_manager, registered_ports,
+                      updated_ports, full_scan=False):
+        """Return the port info from ovsdb events or a bridge scan."""
+        # The events received so far are covered by a scan done after
+        events = polling_manager.get_events()
+        port_info = None
+        if (events is not None and not full_scan and
+                self.port_audit_interval > 0):
+            port_info = self.process_ports_events(events, registered_ports,
+                                                  updated_ports)
+        if port_info is None:
+            port_info = self.scan_ports(registered_ports, updated_ports)
+            self.last_port_audit = time.time()
+        return port_info
+
     def check_changed_vlans(self, registered_ports):
         """Return ports which have lost their vlan tag.
 
@@ -1130,8 +1211,33 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     br.delete_flows(in_port=ofport)
                     self.tun_br_ofports[tunnel_type].pop(remote_ip, None)
 
+    def _update_devices_status(self, devices_up, devices_down):
+        """Report the status of the devices to the plugin in one call.
+
+        Returns the update_device_list result, raising
+        DeviceListRetrievalError if any of the devices failed to update.
+        """
+        if not devices_up and not devices_down:
+            return {'devices_up': [], 'devices_down': []}
+        try:
+            devices_set = self.plugin_rpc.update_device_list(
+                self.context, devices_up, devices_down, self.agent_id,
+                cfg.CONF.host)
+        except Exception as e:
+            raise DeviceListRetrievalError(
+                devices=list(devices_up) + list(devices_down), error=e)
+        failed_devices = (devices_set.get('failed_devices_up', []) +
+                          devices_set.get('failed_devices_down', []))
+        if failed_devices:
+            raise DeviceListRetrievalError(
+                devices=failed_devices,
+                error=_("the plugin could not update their status"))
+        return devices_set
+
     def treat_devices_added_or_updated(self, devices, ovs_restarted):
         skipped_devices = []
+        devices_up = []
+        devices_down = []
         try:
             devices_details_list = self.plugin_rpc.get_devices_details_list(
                 self.context,
@@ -1163,24 +1269,25 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                                     details['fixed_ips'],
                                     details['device_owner'],
                                     ovs_restarted)
-                # update plugin about port status
-                # FIXME(salv-orlando): Failures while updating device status
-                # must be handled appropriately. Otherwise this might prevent
-                # neutron server from sending network-vif-* events to the nova
-                # API server, thus possibly preventing instance spawn.
+                # the plugin is told about the status of all the ports at
+                # once, below
                 if details.get('admin_state_up'):
                     LOG.debug("Setting status for %s to UP", device)
-                    self.plugin_rpc.update_device_up(
-                        self.context, device, self.agent_id, cfg.CONF.host)
+                    devices_up.append(device)
                 else:
                     LOG.debug("Setting status for %s to DOWN", device)
-                    self.plugin_rpc.update_device_down(
-                        self.context, device, self.agent_id, cfg.CONF.host)
-                LOG.info(_LI("Configuration for device %s completed."), device)
+                    devices_down.append(device)
             else:
                 LOG.warn(_LW("Device %s not defined on plugin"), device)
                 if (port and port.ofport != -1):
                     self.port_dead(port)
+        # FIXME(salv-orlando): Failures while updating device status
+        # must be handled appropriately. Otherwise this might prevent
+        # neutron server from sending network-vif-* events to the nova
+        # API server, thus possibly preventing instance spawn.
+        self._update_devices_status(devices_up, devices_down)
+        for device in devices_up + devices_down:
+            LOG.info(_LI("Configuration for device %s completed."), device)
         return skipped_devices
 
     def treat_ancillary_devices_added(self, devices):
@@ -1193,53 +1300,52 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         except Exception as e:
             raise DeviceListRetrievalError(devices=devices, error=e)
 
+        devices_up = []
         for details in devices_details_list:
             device = details['device']
             LOG.info(_LI("Ancillary Port %s added"), device)
+            devices_up.append(device)
+
+        # update plugin about port status
+        self._update_devices_status(devices_up, [])
 
-            # update plugin about port status
-            self.plugin_rpc.update_device_up(self.context,
-                                             device,
-                                             self.agent_id,
-                                             cfg.CONF.host)
+    def _update_devices_down(self, devices):
+        """Set the devices down, returning the details and a resync flag."""
+        devices = list(devices)
+        if not devices:
+            return [], False
+        try:
+            devices_set = self.plugin_rpc.update_device_list(
+                self.context, [], devices, self.agent_id, cfg.CONF.host)
+        except Exception as e:
+            LOG.debug("port_removed failed for %(devices)s: %(e)s",
+                      {'devices': devices, 'e': e})
+            return [], True
+        failed_devices = devices_set.get('failed_devices_down', [])
+        for device in failed_devices:
+            LOG.debug("port_removed failed for %s", device)
+        return devices_set.get('devices_down', []), bool(failed_devices)
 
     def treat_devices_removed(self, devices):
-        resync = False
         self.sg_agent.remove_devices_filter(devices)
         for device in devices:
             LOG.info(_LI("Attachment %s removed"), device)
-            try:
-                self.plugin_rpc.update_device_down(self.context,
-                                                   device,
-                                                   self.agent_id,
-                                                   cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("port_removed failed for %(device)s: %(e)s",
-                          {'device': device, 'e': e})
-                resync = True
-                continue
-            self.port_unbound(device)
+        devices_down, resync = self._update_devices_down(devices)
+        for details in devices_down:
+            self.port_unbound(details['device'])
         return resync
 
     def treat_ancillary_devices_removed(self, devices):
-        resync = False
         for device in devices:
             LOG.info(_LI("Attachment %s removed"), device)
-            try:
-                details = self.plugin_rpc.update_device_down(self.context,
-                                                             device,
-                                                             self.agent_id,
-                                                             cfg.CONF.host)
-            except Exception as e:
-                LOG.debug("port_removed failed for %(device)s: %(e)s",
-                          {'device': device, 'e': e})
-                resync = True
-                continue
+        devices_down, resync = self._update_devices_down(devices)
+        for details in devices_down:
             if details['exists']:
-                LOG.info(_LI("Port %s updated."), device)
+                LOG.info(_LI("Port %s updated."), details['device'])
                 # Nothing to do regarding local networking
             else:
-                LOG.debug("Device %s not defined on plugin", device)
+                LOG.debug("Device %s not defined on plugin",
+                          details['device'])
         return resync
 
     def process_network_ports(self, port_info, ovs_restarted):
@@ -1414,6 +1520,7 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
         updated_ports_copy = set()
         ancillary_ports = set()
         tunnel_sync = True
+        ports_scan_needed = True
         ovs_status = constants.OVS_NORMAL
         while self.run_daemon_loop:
             start = time.time()
@@ -1429,6 +1536,8 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                 ports.clear()
                 ancillary_ports.clear()
                 sync = False
+                # The ports known are gone, only a scan finds them again
+                ports_scan_needed = True
                 polling_manager.force_polling()
             ovs_status = self.check_ovs_status()
             if ovs_status == constants.OVS_RESTARTED:
@@ -1460,7 +1569,9 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     LOG.exception(_LE("Error while synchronizing tunnels"))
                     tunnel_sync = True
             ovs_restarted = (ovs_status == constants.OVS_RESTARTED)
-            if self._agent_has_updates(polling_manager) or ovs_restarted:
+            port_audit = self._is_port_audit_due()
+            if (self._agent_has_updates(polling_manager) or ovs_restarted or
+                    port_audit):
                 try:
                     LOG.debug("Agent rpc_loop - iteration:%(iter_num)d - "
                               "starting polling. Elapsed:%(elapsed).3f",
@@ -1473,7 +1584,11 @@ class OVSNeutronAgent(sg_rpc.SecurityGroupAgentRpcCallbackMixin,
                     updated_ports_copy = self.updated_ports
                     self.updated_ports = set()
                     reg_ports = (set() if ovs_restarted else ports)
-                    port_info = self.scan_ports(reg_ports, updated_ports_copy)
+                    port_info = self.get_port_info(
+                        polling_manager, reg_ports, updated_ports_copy,
+                        full_scan=(ports_scan_needed or ovs_restarted or
+                                   port_audit))
+                    ports_scan_needed = False
                     LOG.debug("Agent rpc_loop - iteration:%(iter_num)d - "
                               "port information retrieved. "
                               "Elapsed:%(elapsed).3f",
@@ -58,6 +58,13 @@ agent_opts = [
                default=constants.DEFAULT_OVSDBMON_RESPAWN,
                help=_("The number of seconds to wait before respawning the "
                       "ovsdb monitor after losing communication with it.")),
+    cfg.IntOpt('port_audit_interval',
+               default=300,
+               help=_("When minimize_polling is set, the number of seconds "
+                      "between scans of all the ports of the integration "
+                      "bridge. In between, the ports changed are found "
+                      "from the interface events of the ovsdb monitor. 0 "
+                      "scans the bridge whenever ovsdb reports changes.")),
     cfg.ListOpt('tunnel_types', default=DEFAULT_TUNNEL_TYPES,
                 help=_("Network types supported by the agent "
                        "(gre and/or vxlan).")),
@@ -38,6 +38,10 @@ from neutron.openstack.common import policy
 LOG = log.getLogger(__name__)
 
 _ENFORCER = None
+# Match rules compiled by _build_match_rule, keyed by action and the
+# attributes they check, and the policy rules they were compiled with
+_MATCH_RULES = {}
+_MATCH_RULES_SOURCE = None
 ADMIN_CTX_POLICY = 'context_is_admin'
 ADVSVC_CTX_POLICY = 'context_is_advsvc'
 # Maps deprecated 'extension' policies to new-style policies
@@ -58,11 +62,42 @@ DEPRECATED_ACTION_MAP = {
 }
 
 
+class _Enforcer(policy.Enforcer):
+    """Enforcer locating the policy files and directories once.
+
+    The rules are loaded again before each check, when the policy files
+    changed. Only finding the files in the configuration directories is
+    not repeated, as it cost more than the check itself.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_Enforcer, self).__init__(*args, **kwargs)
+        self._policy_paths = {}
+
+    def load_rules(self, force_reload=False):
+        if force_reload:
+            self._policy_paths.clear()
+        super(_Enforcer, self).load_rules(force_reload)
+
+    def _get_policy_path(self, path):
+        if path not in self._policy_paths:
+            try:
+                self._policy_paths[path] = super(
+                    _Enforcer, self)._get_policy_path(path)
+            except cfg.ConfigFilesNotFoundError as e:
+                self._policy_paths[path] = e
+        policy_path = self._policy_paths[path]
+        if isinstance(policy_path, cfg.ConfigFilesNotFoundError):
+            raise policy_path
+        return policy_path
+
+
 def reset():
     global _ENFORCER
     if _ENFORCER:
         _ENFORCER.clear()
         _ENFORCER = None
+    _MATCH_RULES.clear()
 
 
 def init():
@@ -70,7 +105,7 @@ def init():
 
     global _ENFORCER
     if not _ENFORCER:
-        _ENFORCER = policy.Enforcer()
+        _ENFORCER = _Enforcer()
         # NOTE: Method _get_policy_path in common.policy can not always locate
         # neutron policy file (when init() is called in tests),
         # so set it explicitly.
@@ -131,6 +166,7 @@ def set_rules(policies, overwrite=True):
                               "not be enforced"), pol)
     init()
     _ENFORCER.set_rules(policies, overwrite)
+    _MATCH_RULES.clear()
 
 
 def _is_attribute_explicitly_set(attribute_name, resource, target, action):
@@ -155,8 +191,8 @@ def _should_validate_sub_attributes(attribute, sub_attr):
                  v for (k, v) in validate.iteritems()]))
 
 
-def _build_subattr_match_rule(attr_name, attr, action, target):
-    """Create the rule to match for sub-attribute policy checks."""
+def _get_subattr_names(attr_name, attr, target):
+    """Return the sub-attributes of the target with a policy rule."""
     # TODO(salv-orlando): Instead of relying on validator info, introduce
     # typing for API attributes
     # Expect a dict as type descriptor
@@ -172,14 +208,26 @@ def _build_subattr_match_rule(attr_name, attr, action, target):
                   "generate any sub-attr policy rule for %s.",
                   attr_name)
         return
+    return tuple(sub_attr_name for sub_attr_name in data
+                 if sub_attr_name in target[attr_name])
+
+
+def _compile_subattr_match_rule(attr_name, action, sub_attr_names):
     sub_attr_rules = [policy.RuleCheck('rule', '%s:%s:%s' %
                                        (action, attr_name,
                                         sub_attr_name)) for
-                      sub_attr_name in data if sub_attr_name in
-                      target[attr_name]]
+                      sub_attr_name in sub_attr_names]
     return policy.AndCheck(sub_attr_rules)
 
 
+def _build_subattr_match_rule(attr_name, attr, action, target):
+    """Create the rule to match for sub-attribute policy checks."""
+    sub_attr_names = _get_subattr_names(attr_name, attr, target)
+    if sub_attr_names is None:
+        return
+    return _compile_subattr_match_rule(attr_name, action, sub_attr_names)
+
+
 def _process_rules_list(rules, match_rule):
     """Recursively walk a policy rule to extract a list of match entries."""
     if isinstance(match_rule, policy.RuleCheck):
@@ -201,33 +249,142 @@ def _build_match_rule(action, target):
     4) add an entry for sub-attributes of a resource for which the
        action is being executed
        (e.g.: create_router:external_gateway_info:network_id)
+
+    The rule is compiled once per action and set of attributes it checks,
+    until the policy rules change.
+    """
+    global _MATCH_RULES_SOURCE
+    rules = _ENFORCER.rules if _ENFORCER else None
+    if rules is not _MATCH_RULES_SOURCE:
+        # The policy file was reloaded
+        _MATCH_RULES.clear()
+        _MATCH_RULES_SOURCE = rules
+    key = (action, _get_enforced_attributes(action, target))
+    match_rule = _MATCH_RULES.get(key)
+    if match_rule is None:
+        match_rule = _MATCH_RULES[key] = _compile_match_rule(*key)
+    return match_rule
+
+
+def _get_enforced_attributes(action, target):
+    """Return the attributes of the target the action has a policy on.
+
+    Each attribute comes with the names of its sub-attributes which have a
+    policy, or None when they are not validated.
     """
-    match_rule = policy.RuleCheck('rule', action)
     resource, is_write = get_resource_and_action(action)
     # Attribute-based checks shall not be enforced on GETs
-    if is_write:
-        # assigning to variable with short name for improving readability
-        res_map = attributes.RESOURCE_ATTRIBUTE_MAP
-        if resource in res_map:
-            for attribute_name in res_map[resource]:
-                if _is_attribute_explicitly_set(attribute_name,
-                                                res_map[resource],
-                                                target, action):
-                    attribute = res_map[resource][attribute_name]
-                    if 'enforce_policy' in attribute:
-                        attr_rule = policy.RuleCheck('rule', '%s:%s' %
-                                                     (action, attribute_name))
-                        # Build match entries for sub-attributes
-                        if _should_validate_sub_attributes(
-                                attribute, target[attribute_name]):
-                            attr_rule = policy.AndCheck(
-                                [attr_rule, _build_subattr_match_rule(
-                                    attribute_name, attribute,
-                                    action, target)])
-                        match_rule = policy.AndCheck([match_rule, attr_rule])
+    if not is_write:
+        return ()
+    # assigning to variable with short name for improving readability
+    res_map = attributes.RESOURCE_ATTRIBUTE_MAP
+    if resource not in res_map:
+        return ()
+    enforced_attributes = []
+    for attribute_name, attribute in res_map[resource].iteritems():
+        if ('enforce_policy' in attribute and
+            _is_attribute_explicitly_set(attribute_name, res_map[resource],
+                                         target, action)):
+            sub_attr_names = None
+            # Build match entries for sub-attributes
+            if _should_validate_sub_attributes(attribute,
+                                               target[attribute_name]):
+                sub_attr_names = _get_subattr_names(attribute_name,
+                                                    attribute, target)
+            enforced_attributes.append((attribute_name, sub_attr_names))
+    return tuple(enforced_attributes)
+
+
+def _compile_match_rule(action, enforced_attributes):
+    match_rule = policy.RuleCheck('rule', action)
+    for attribute_name, sub_attr_names in enforced_attributes:
+        attr_rule = policy.RuleCheck('rule', '%s:%s' %
+                                     (action, attribute_name))
+        if sub_attr_names is not None:
+            attr_rule = policy.AndCheck(
+                [attr_rule, _compile_subattr_match_rule(
+                    attribute_name, action, sub_attr_names)])
+        match_rule = policy.AndCheck([match_rule, attr_rule])
     return match_rule
 
 
+class ParentLookup(object):
+    """Parent resources looked up by OwnerCheck, memoized by id.
+
+    A lookup lives as long as the neutron context of a request. The parents
+    of the targets announced with expect() are fetched with a single plugin
+    call, the first time one of them is looked up.
+
+    lookups counts the parents the checks needed, and plugin_calls the calls
+    to the plugin they triggered.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._pending = collections.defaultdict(set)
+        self.lookups = 0
+        self.plugin_calls = 0
+
+    def expect(self, parent_res, parent_field, parent_ids):
+        """Announce parents which are likely to be looked up."""
+        self._pending[(parent_res, parent_field)].update(
+            parent_id for parent_id in parent_ids
+            if (parent_res, parent_field, parent_id) not in self._values)
+
+    def get(self, parent_res, parent_field, parent_id):
+        """Return the value of a field of a parent resource."""
+        key = (parent_res, parent_field, parent_id)
+        self.lookups += 1
+        if key not in self._values:
+            pending = self._pending.pop((parent_res, parent_field), set())
+            pending.discard(parent_id)
+            if pending:
+                self._fetch_all(parent_res, parent_field,
+                                pending | set([parent_id]))
+            if key not in self._values:
+                self._values[key] = self._fetch(parent_res, parent_field,
+                                                parent_id)
+        return self._values[key]
+
+    def _get_plugin(self):
+        # NOTE(salv-orlando): This check currently assumes the parent
+        # resource is handled by the core plugin. It might be worth
+        # having a way to map resources to plugins so to make this
+        # check more general
+        # NOTE(ihrachys): if import is put in global, circular
+        # import failure occurs
+        manager = importutils.import_module('neutron.manager')
+        return manager.NeutronManager.get_instance().plugin
+
+    def _get_admin_context(self):
+        context = importutils.import_module('neutron.context')
+        return context.get_admin_context()
+
+    def _fetch(self, parent_res, parent_field, parent_id):
+        self.plugin_calls += 1
+        f = getattr(self._get_plugin(), 'get_%s' % parent_res)
+        # f *must* exist, if not found it is better to let neutron
+        # explode. Check will be performed with admin context
+        data = f(self._get_admin_context(), parent_id, fields=[parent_field])
+        return data[parent_field]
+
+    def _fetch_all(self, parent_res, parent_field, parent_ids):
+        self.plugin_calls += 1
+        f = getattr(self._get_plugin(), 'get_%ss' % parent_res)
+        parents = f(self._get_admin_context(),
+                    filters={'id': list(parent_ids)},
+                    fields=['id', parent_field])
+        for parent in parents:
+            self._values[(parent_res, parent_field, parent['id'])] = (
+                parent[parent_field])
+
+
+class _Credentials(dict):
+    """Credentials carrying the parent lookup of the checks using them."""
+
+    parent_lookup = None
+
+
 # This check is registered as 'tenant_id' so that it can override
 # GenericCheck which was used for validating parent resource ownership.
 # This will prevent us from having to handling backward compatibility
@@ -258,26 +415,34 @@ class OwnerCheck(policy.Check):
                 reason=err_reason)
         super(OwnerCheck, self).__init__(kind, match)
 
-    def __call__(self, target, creds, enforcer):
-        if self.target_field not in target:
-            # policy needs a plugin check
-            # target field is in the form resource:field
-            # however if they're not separated by a colon, use an underscore
-            # as a separator for backward compatibility
+    def get_parent(self):
+        """Return the parent resource, field and foreign key to look up.
 
-            def do_split(separator):
+        The resource is None when the target field does not name one, and
+        the foreign key is None when the resource is unknown.
+        """
+        # target field is in the form resource:field
+        # however if they're not separated by a colon, use an underscore
+        # as a separator for backward compatibility
+        for separator in (':', '_'):
+            try:
                 parent_res, parent_field = self.target_field.split(
                     separator, 1)
-                return parent_res, parent_field
-
-            for separator in (':', '_'):
-                try:
-                    parent_res, parent_field = do_split(separator)
-                    break
-                except ValueError:
-                    LOG.debug("Unable to find ':' as separator in %s.",
-                              self.target_field)
-            else:
+                break
+            except ValueError:
+                LOG.debug("Unable to find ':' as separator in %s.",
+                          self.target_field)
+        else:
+            return None, None, None
+        parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
+            "%ss" % parent_res, None)
+        return parent_res, parent_field, parent_foreign_key
+
+    def __call__(self, target, creds, enforcer):
+        if self.target_field not in target:
+            # policy needs a plugin check
+            parent_res, parent_field, parent_foreign_key = self.get_parent()
+            if not parent_res:
                 # If we are here split failed with both separators
                 err_reason = (_("Unable to find resource name in %s") %
                               self.target_field)
@@ -285,8 +450,6 @@ class OwnerCheck(policy.Check):
                 raise exceptions.PolicyCheckError(
                     policy="%s:%s" % (self.kind, self.match),
                     reason=err_reason)
-            parent_foreign_key = attributes.RESOURCE_FOREIGN_KEYS.get(
-                "%ss" % parent_res, None)
             if not parent_foreign_key:
                 err_reason = (_("Unable to verify match:%(match)s as the "
                                 "parent resource: %(res)s was not found") %
@@ -295,27 +458,15 @@ class OwnerCheck(policy.Check):
                 raise exceptions.PolicyCheckError(
                     policy="%s:%s" % (self.kind, self.match),
                     reason=err_reason)
-            # NOTE(salv-orlando): This check currently assumes the parent
-            # resource is handled by the core plugin. It might be worth
-            # having a way to map resources to plugins so to make this
-            # check more general
-            # NOTE(ihrachys): if import is put in global, circular
-            # import failure occurs
-            manager = importutils.import_module('neutron.manager')
-            f = getattr(manager.NeutronManager.get_instance().plugin,
-                        'get_%s' % parent_res)
-            # f *must* exist, if not found it is better to let neutron
-            # explode. Check will be performed with admin context
-            context = importutils.import_module('neutron.context')
+            lookup = (getattr(creds, 'parent_lookup', None) or
+                      ParentLookup())
             try:
-                data = f(context.get_admin_context(),
-                         target[parent_foreign_key],
-                         fields=[parent_field])
-                target[self.target_field] = data[parent_field]
+                target[self.target_field] = lookup.get(
+                    parent_res, parent_field, target[parent_foreign_key])
             except Exception:
                 with excutils.save_and_reraise_exception():
-                    LOG.exception(_LE('Policy check error while calling %s!'),
-                                  f)
+                    LOG.exception(_LE('Policy check error while calling '
+                                      'get_%s!'), parent_res)
         match = self.match % target
         if self.kind in creds:
             return match == unicode(creds[self.kind])
@@ -359,10 +510,17 @@ def _prepare_check(context, action, target):
     if target is None:
         target = {}
     match_rule = _build_match_rule(action, target)
-    credentials = context.to_dict()
+    credentials = _get_credentials(context)
     return match_rule, target, credentials
 
 
+def _get_credentials(context):
+    credentials = _Credentials(context.to_dict())
+    # Share the parent resources looked up during the request
+    credentials.parent_lookup = getattr(context, 'parent_lookup', None)
+    return credentials
+
+
 def log_rule_list(match_rule):
     if LOG.isEnabledFor(logging.DEBUG):
         rules = _process_rules_list([], match_rule)
@@ -422,6 +580,84 @@ def enforce(context, action, target, plugin=None):
     return result
 
 
+def _find_owner_checks(rule, owner_checks, seen_rules):
+    """Recursively walk a policy rule to extract its OwnerChecks."""
+    if isinstance(rule, OwnerCheck):
+        owner_checks.append(rule)
+    elif isinstance(rule, policy.RuleCheck):
+        if rule.match not in seen_rules:
+            seen_rules.add(rule.match)
+            try:
+                _find_owner_checks(_ENFORCER.rules[rule.match],
+                                   owner_checks, seen_rules)
+            except KeyError:
+                pass
+    elif isinstance(rule, policy.NotCheck):
+        _find_owner_checks(rule.rule, owner_checks, seen_rules)
+    elif hasattr(rule, 'rules'):
+        for sub_rule in rule.rules:
+            _find_owner_checks(sub_rule, owner_checks, seen_rules)
+    return owner_checks
+
+
+class Checker(object):
+    """Verifies actions in a context on the many targets of a request.
+
+    The credentials are prepared and the rules loaded once, and the parent
+    resources looked up by OwnerCheck are memoized and fetched together for
+    the targets checked with check_all().
+    """
+
+    def __init__(self, context):
+        self.credentials = _get_credentials(context)
+        if self.credentials.parent_lookup is None:
+            self.credentials.parent_lookup = ParentLookup()
+        init()
+        _ENFORCER.load_rules()
+
+    def check(self, action, target, might_not_exist=False):
+        """Verifies that the action is valid on the target.
+
+        Same as check(), with the context of this checker.
+        """
+        if might_not_exist and not (_ENFORCER.rules and
+                                    action in _ENFORCER.rules):
+            return True
+        # Compare with None to distinguish case in which target is {}
+        if target is None:
+            target = {}
+        match_rule = _build_match_rule(action, target)
+        result = match_rule(target, self.credentials, _ENFORCER)
+        # logging applied rules in case of failure
+        if not result:
+            log_rule_list(match_rule)
+        return result
+
+    def check_all(self, action, targets, might_not_exist=False):
+        """Verifies that the action is valid on each of the targets.
+
+        :return: the list of the results of the check of each target.
+        """
+        if targets and not get_resource_and_action(action)[1]:
+            self._expect_parents(_build_match_rule(action, targets[0]),
+                                 targets)
+        return [self.check(action, target, might_not_exist)
+                for target in targets]
+
+    def _expect_parents(self, match_rule, targets):
+        lookup = self.credentials.parent_lookup
+        for owner_check in _find_owner_checks(match_rule, [], set()):
+            parent_res, parent_field, parent_foreign_key = (
+                owner_check.get_parent())
+            if not parent_foreign_key:
+                # The check itself reports the error
+                continue
+            lookup.expect(parent_res, parent_field,
+                          [target[parent_foreign_key] for target in targets
+                           if owner_check.target_field not in target and
+                           target.get(parent_foreign_key)])
+
+
 def check_is_admin(context):
     """Verify context has admin rights according to policy settings."""
     init()
@@ -62,31 +62,65 @@ class TestBasicRouterOperations(BasicRouterTestCaseFramework):
 
         ri.process_floating_ip_nat_rules()
 
-        # Be sure that the rules are cleared first and apply is called last
-        self.assertEqual(mock.call.clear_rules_by_tag('floating_ip'),
-                         ipv4_nat.mock_calls[0])
+        # Be sure that apply is called last
         self.assertEqual(mock.call.apply(), ri.iptables_manager.mock_calls[-1])
 
         # Be sure that add_rule is called somewhere in the middle
+        tag = 'floating_ip-%s-%s' % (mock.sentinel.fip, mock.sentinel.ip)
         ipv4_nat.add_rule.assert_called_once_with(mock.sentinel.chain,
                                                   mock.sentinel.rule,
-                                                  tag='floating_ip')
+                                                  tag=tag)
+
+        # Nothing changes for the floating ips already configured
+        ipv4_nat.reset_mock()
+        ri.process_floating_ip_nat_rules()
+        self.assertFalse(ipv4_nat.add_rule.called)
+        self.assertFalse(ipv4_nat.clear_rules_by_tag.called)
 
     def test_process_floating_ip_nat_rules_removed(self):
         ri = self._create_router()
         ri.get_floating_ips = mock.Mock(return_value=[])
         ri.iptables_manager = mock.MagicMock()
         ipv4_nat = ri.iptables_manager.ipv4['nat']
+        key = (mock.sentinel.fip, mock.sentinel.ip)
+        ri.floating_ip_nat_rules = {
+            key: [(mock.sentinel.chain, mock.sentinel.rule)]}
 
         ri.process_floating_ip_nat_rules()
 
         # Be sure that the rules are cleared first and apply is called last
-        self.assertEqual(mock.call.clear_rules_by_tag('floating_ip'),
-                         ipv4_nat.mock_calls[0])
+        self.assertEqual(mock.call.clear_rules_by_tag(
+            'floating_ip-%s-%s' % key), ipv4_nat.mock_calls[0])
         self.assertEqual(mock.call.apply(), ri.iptables_manager.mock_calls[-1])
 
-        # Be sure that add_rule is called somewhere in the middle
         self.assertFalse(ipv4_nat.add_rule.called)
+        self.assertEqual({}, ri.floating_ip_nat_rules)
+
+    def test_process_floating_ip_nat_rules_changes_changed_fips_only(self):
+        ri = self._create_router()
+        ri.iptables_manager.apply = mock.Mock()
+        nat = ri.iptables_manager.ipv4['nat']
+        fips = [{'floating_ip_address': '15.1.2.%d' % i,
+                 'fixed_ip_address': '192.168.0.%d' % i} for i in (3, 4)]
+        ri.get_floating_ips = mock.Mock(return_value=fips)
+        ri.process_floating_ip_nat_rules()
+        kept_rules = [rule for rule in nat.rules if '15.1.2.3' in rule.rule]
+        self.assertEqual(3, len(kept_rules))
+
+        # Remap the second floating ip
+        fips[1] = {'floating_ip_address': '15.1.2.4',
+                   'fixed_ip_address': '192.168.0.5'}
+        ri.process_floating_ip_nat_rules()
+
+        fip_rules = [rule for rule in nat.rules if '15.1.2.' in rule.rule]
+        self.assertEqual(6, len(fip_rules))
+        for rule in kept_rules:
+            self.assertIn(rule, fip_rules)
+            self.assertTrue(any(rule is kept for kept in fip_rules))
+        self.assertFalse([rule for rule in fip_rules
+                          if '192.168.0.4' in rule.rule])
+        self.assertEqual(3, len([rule for rule in fip_rules
+                                 if '192.168.0.5' in rule.rule]))
 
     def _test_add_fip_addr_to_device_error(self, device):
         ri = self._create_router()
@@ -211,6 +245,37 @@ class TestFloatingIpWithMockDevice(BasicRouterTestCaseFramework):
         self.assertEqual({fip_id: l3_constants.FLOATINGIP_STATUS_ERROR},
                          fip_statuses)
 
+    def test_process_floating_ip_addresses_with_batch_failure(self,
+                                                              IPDevice):
+        IPDevice.return_value = device = mock.Mock()
+        device.addr.list.return_value = []
+        fips = [{'id': _uuid(), 'port_id': _uuid(),
+                 'floating_ip_address': address,
+                 'fixed_ip_address': '192.168.0.2'}
+                for address in ('15.1.2.3', '15.1.2.4')]
+        ri = self._create_router()
+        ri.add_floating_ip = mock.Mock(
+            return_value=l3_constants.FLOATINGIP_STATUS_ACTIVE)
+        ri.get_floating_ips = mock.Mock(return_value=fips)
+        failure = ip_lib.IpBatchFailure(
+            (4,), 'addr',
+            ('add', '15.1.2.4/32', 'brd', '15.1.2.4', 'scope', 'global',
+             'dev', 'qg-1'),
+            'RTNETLINK answers: File exists')
+
+        with mock.patch.object(ip_lib.IpBatch, 'flush',
+                               return_value=[failure]) as flush:
+            fip_statuses = ri.process_floating_ip_addresses(
+                mock.sentinel.interface_name)
+
+        flush.assert_called_once_with()
+        batch = IPDevice.call_args[1]['batch']
+        self.assertIsInstance(batch, ip_lib.IpBatch)
+        self.assertEqual(ri.ns_name, batch.namespace)
+        self.assertEqual({fips[0]['id']: l3_constants.FLOATINGIP_STATUS_ACTIVE,
+                          fips[1]['id']: l3_constants.FLOATINGIP_STATUS_ERROR},
+                         fip_statuses)
+
     # TODO(mrsmith): refactor for DVR cases
     def test_process_floating_ip_addresses_remove(self, IPDevice):
         IPDevice.return_value = device = mock.Mock()
@@ -69,6 +69,20 @@ class TestAddFloatingIpWithMockGarp(BasicRouterTestCaseFramework):
             mock.sentinel.arp_count)
         self.assertEqual(l3_constants.FLOATINGIP_STATUS_ACTIVE, result)
 
+    def test_add_floating_ip_with_batch(self, send_gratuitous_arp):
+        ri = self._create_router()
+        ri._add_fip_addr_to_device = mock.Mock(return_value=True)
+        batch = ip_lib.IpBatch(namespace=ri.ns_name)
+        device = batch.device(mock.sentinel.interface_name)
+        result = ri.add_floating_ip({'floating_ip_address': '15.1.2.3'},
+                                    mock.sentinel.interface_name,
+                                    device)
+        self.assertEqual(l3_constants.FLOATINGIP_STATUS_ACTIVE, result)
+        # The GARP waits for the address to be configured
+        self.assertFalse(ip_lib.send_gratuitous_arp.called)
+        batch.flush()
+        self.assertTrue(ip_lib.send_gratuitous_arp.called)
+
     def test_add_floating_ip_error(self, send_gratuitous_arp):
         ri = self._create_router()
         ri._add_fip_addr_to_device = mock.Mock(return_value=False)
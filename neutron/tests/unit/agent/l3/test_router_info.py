@@ -13,6 +13,7 @@
 import mock
 
 from neutron.agent.common import config as agent_config
+from neutron.agent.l3 import config as l3_config
 from neutron.agent.l3 import router_info
 from neutron.openstack.common import uuidutils
 from neutron.tests import base
@@ -26,7 +27,9 @@ class TestRouterInfo(base.BaseTestCase):
         super(TestRouterInfo, self).setUp()
 
         conf = agent_config.setup_conf()
+        conf.register_opts(l3_config.OPTS)
         conf.use_namespaces = True
+        self.conf = conf
 
         self.ip_cls_p = mock.patch('neutron.agent.linux.ip_lib.IPWrapper')
         ip_cls = self.ip_cls_p.start()
@@ -104,3 +107,23 @@ class TestRouterInfo(base.BaseTestCase):
         expected = [['ip', 'route', 'delete', 'to', '110.100.30.0/24',
                     'via', '10.100.10.30']]
         self._check_agent_method_called(expected)
+
+    def test_routes_updated_with_ip_batch(self):
+        self.conf.set_override('use_ip_batch', True)
+        ri = router_info.RouterInfo(_uuid(), {}, **self.ri_kwargs)
+        ri.routes = [{'destination': '110.100.31.0/24',
+                      'nexthop': '10.100.10.30'}]
+        ri.router = {'routes': [{'destination': '110.100.30.0/24',
+                                 'nexthop': '10.100.10.30'}]}
+        with mock.patch('neutron.agent.linux.utils.execute',
+                        return_value=('', '')) as execute:
+            ri.routes_updated()
+        execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', ri.ns_name,
+             'ip', '-force', '-batch', '-'],
+            process_input='route replace to 110.100.30.0/24 via '
+                          '10.100.10.30\nroute delete to 110.100.31.0/24 '
+                          'via 10.100.10.30\n',
+            run_as_root=True, check_exit_code=False, return_stderr=True,
+            log_fail_as_error=False)
+        self.assertFalse(self.mock_ip.netns.execute.called)
@@ -0,0 +1,100 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License.
+
+import mock
+
+from neutron.agent.linux import ip_conntrack
+from neutron.tests import base
+
+
+class IpConntrackManagerTestCase(base.BaseTestCase):
+    def setUp(self):
+        super(IpConntrackManagerTestCase, self).setUp()
+        self.ipconntrack = ip_conntrack.IpConntrackManager()
+        self.execute = mock.patch.object(self.ipconntrack,
+                                         'execute').start()
+
+    def _expected_call(self, *args):
+        return mock.call(['conntrack', '-D'] + list(args),
+                         run_as_root=True, check_exit_code=True,
+                         extra_ok_codes=[1])
+
+    def test_get_zone(self):
+        self.assertEqual(1, self.ipconntrack.get_zone('dev1'))
+        self.assertEqual(2, self.ipconntrack.get_zone('dev2'))
+        self.assertEqual(1, self.ipconntrack.get_zone('dev1'))
+        self.ipconntrack.release_zones(['dev2'])
+        self.assertEqual(1, self.ipconntrack.get_zone('dev3'))
+        self.assertEqual(2, self.ipconntrack.get_zone('dev2'))
+
+    def test_get_zone_exhausted(self):
+        with mock.patch.object(ip_conntrack, 'ZONE_MAX', 1):
+            self.assertEqual(1, self.ipconntrack.get_zone('dev1'))
+            self.assertIsNone(self.ipconntrack.get_zone('dev2'))
+
+    def test_apply_runs_queued_deletions(self):
+        self.ipconntrack.delete_entries('IPv4', protocol='tcp',
+                                        dest='10.0.0.1', dport=22, zone=3)
+        self.ipconntrack.delete_entries('IPv6', source='fe80::1')
+        self.ipconntrack.apply()
+        self.execute.assert_has_calls(
+            [self._expected_call('-f', 'ipv4', '-p', 'tcp',
+                                 '-d', '10.0.0.1', '--dport', '22',
+                                 '-w', '3'),
+             self._expected_call('-f', 'ipv6', '-s', 'fe80::1')],
+            any_order=True)
+        self.assertEqual(2, self.execute.call_count)
+        self.ipconntrack.apply()
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_apply_skips_covered_deletions(self):
+        self.ipconntrack.delete_entries('IPv4', protocol='tcp',
+                                        dest='10.0.0.1', dport=22)
+        self.ipconntrack.delete_entries('IPv4', protocol='tcp',
+                                        dest='10.0.0.1', dport=22)
+        self.ipconntrack.delete_entries('IPv4', protocol='tcp',
+                                        dest='10.0.0.1')
+        self.ipconntrack.apply()
+        self.execute.assert_called_once_with(
+            ['conntrack', '-D', '-f', 'ipv4', '-p', 'tcp', '-d', '10.0.0.1'],
+            run_as_root=True, check_exit_code=True, extra_ok_codes=[1])
+
+    def test_apply_keeps_deletions_of_an_address_apart(self):
+        # Flows of the address other rules still allow are left alone
+        for dport in range(5):
+            self.ipconntrack.delete_entries('IPv4', protocol='udp',
+                                            dest='10.0.0.1', dport=dport,
+                                            zone=1)
+        self.ipconntrack.apply()
+        self.execute.assert_has_calls(
+            [self._expected_call('-f', 'ipv4', '-p', 'udp', '-d', '10.0.0.1',
+                                 '--dport', str(dport), '-w', '1')
+             for dport in range(5)],
+            any_order=True)
+        self.assertEqual(5, self.execute.call_count)
+
+    def test_apply_carries_on_after_failure(self):
+        self.execute.side_effect = [RuntimeError(), '']
+        self.ipconntrack.delete_entries('IPv4', dest='10.0.0.1')
+        self.ipconntrack.delete_entries('IPv4', dest='10.0.0.2')
+        self.ipconntrack.apply()
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_apply_in_namespace(self):
+        self.ipconntrack.namespace = 'qrouter-1'
+        self.ipconntrack.delete_entries('IPv4', dest='10.0.0.1')
+        self.ipconntrack.apply()
+        self.execute.assert_called_once_with(
+            ['ip', 'netns', 'exec', 'qrouter-1',
+             'conntrack', '-D', '-f', 'ipv4', '-d', '10.0.0.1'],
+            run_as_root=True, check_exit_code=True, extra_ok_codes=[1])
@@ -29,46 +29,45 @@ class BaseIpsetManagerTest(base.BaseTestCase):
         super(BaseIpsetManagerTest, self).setUp()
         self.ipset = ipset_manager.IpsetManager()
         self.execute = mock.patch.object(self.ipset, "execute").start()
+        self.execute.return_value = ''
         self.expected_calls = []
-        self.expect_create()
+        self.expect_save()
 
     def verify_mock_calls(self):
         self.execute.assert_has_calls(self.expected_calls, any_order=False)
 
-    def expect_set(self, addresses):
-        temp_input = ['create IPv4fake_sgid-new hash:ip family inet']
-        temp_input.extend('add IPv4fake_sgid-new %s' % ip for ip in addresses)
-        input = '\n'.join(temp_input)
-        self.expected_calls.extend([
-            mock.call(['ipset', 'restore', '-exist'],
-                      process_input=input,
-                      run_as_root=True),
-            mock.call(['ipset', 'swap', TEST_SET_NAME_NEW, TEST_SET_NAME],
-                      process_input=None,
-                      run_as_root=True),
-            mock.call(['ipset', 'destroy', TEST_SET_NAME_NEW],
-                      process_input=None,
-                      run_as_root=True)])
-
-    def expect_add(self, addresses):
-        self.expected_calls.extend(
-            mock.call(['ipset', 'add', '-exist', TEST_SET_NAME, ip],
-                      process_input=None,
-                      run_as_root=True) for ip in addresses)
-
-    def expect_del(self, addresses):
-        self.expected_calls.extend(
-            mock.call(['ipset', 'del', TEST_SET_NAME, ip],
+    def expect_save(self):
+        self.expected_calls.append(
+            mock.call(['ipset', 'save'],
                       process_input=None,
-                      run_as_root=True) for ip in addresses)
+                      run_as_root=True))
 
-    def expect_create(self):
+    def expect_restore(self, process_input):
         self.expected_calls.append(
-            mock.call(['ipset', 'create', '-exist', TEST_SET_NAME,
-                       'hash:ip', 'family', 'inet'],
-                      process_input=None,
+            mock.call(['ipset', 'restore', '-exist'],
+                      process_input='\n'.join(process_input),
                       run_as_root=True))
 
+    def expect_set(self, addresses):
+        process_input = ['create IPv4fake_sgid-new hash:ip family inet',
+                         'flush IPv4fake_sgid-new']
+        process_input.extend('add IPv4fake_sgid-new %s' % ip
+                             for ip in addresses)
+        process_input.extend(['swap IPv4fake_sgid-new IPv4fake_sgid',
+                              'destroy IPv4fake_sgid-new'])
+        self.expect_restore(process_input)
+
+    def expect_create(self, addresses):
+        process_input = ['create IPv4fake_sgid hash:ip family inet']
+        process_input.extend('add IPv4fake_sgid %s' % ip for ip in addresses)
+        self.expect_restore(process_input)
+
+    def expect_add_del(self, add_addresses, del_addresses):
+        self.expect_restore(['add %s %s' % (TEST_SET_NAME, ip)
+                             for ip in add_addresses] +
+                            ['del %s %s' % (TEST_SET_NAME, ip)
+                             for ip in del_addresses])
+
     def expect_destroy(self):
         self.expected_calls.append(
             mock.call(['ipset', 'destroy', TEST_SET_NAME],
@@ -76,11 +75,11 @@ class BaseIpsetManagerTest(base.BaseTestCase):
                       run_as_root=True))
 
     def add_first_ip(self):
-        self.expect_set([FAKE_IPS[0]])
+        self.expect_create([FAKE_IPS[0]])
         self.ipset.set_members(TEST_SET_ID, ETHERTYPE, [FAKE_IPS[0]])
 
     def add_all_ips(self):
-        self.expect_set(FAKE_IPS)
+        self.expect_create(FAKE_IPS)
         self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS)
 
 
@@ -96,15 +95,21 @@ class IpsetManagerTestCase(BaseIpsetManagerTest):
 
     def test_set_members_adding_less_than_5(self):
         self.add_first_ip()
-        self.expect_add(reversed(FAKE_IPS[1:5]))
         self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:5])
         self.verify_mock_calls()
+        restore_input = self.execute.call_args[1]['process_input']
+        self.assertEqual(sorted('add %s %s' % (TEST_SET_NAME, ip)
+                                for ip in FAKE_IPS[1:5]),
+                         sorted(restore_input.split('\n')))
 
     def test_set_members_deleting_less_than_5(self):
         self.add_all_ips()
-        self.expect_del(reversed(FAKE_IPS[4:5]))
         self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:3])
         self.verify_mock_calls()
+        restore_input = self.execute.call_args[1]['process_input']
+        self.assertEqual(sorted('del %s %s' % (TEST_SET_NAME, ip)
+                                for ip in FAKE_IPS[3:]),
+                         sorted(restore_input.split('\n')))
 
     def test_set_members_adding_more_than_5(self):
         self.add_first_ip()
@@ -112,8 +117,102 @@ class IpsetManagerTestCase(BaseIpsetManagerTest):
         self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS)
         self.verify_mock_calls()
 
+    def test_set_members_unchanged(self):
+        self.add_all_ips()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS)
+        self.assertEqual(2, self.execute.call_count)
+
     def test_destroy(self):
         self.add_first_ip()
         self.expect_destroy()
         self.ipset.destroy(TEST_SET_ID, ETHERTYPE)
         self.verify_mock_calls()
+
+    def test_add_members(self):
+        self.add_first_ip()
+        self.expect_add_del(FAKE_IPS[1:3], [])
+        self.ipset.add_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:3])
+        self.verify_mock_calls()
+        self.assertEqual(FAKE_IPS[0:3],
+                         self.ipset.ipset_sets[TEST_SET_NAME])
+
+    def test_del_members(self):
+        self.add_all_ips()
+        self.expect_add_del([], FAKE_IPS[4:6])
+        self.ipset.del_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[4:])
+        self.verify_mock_calls()
+        self.assertEqual(FAKE_IPS[0:4],
+                         self.ipset.ipset_sets[TEST_SET_NAME])
+
+
+class IpsetManagerLoadTestCase(BaseIpsetManagerTest):
+
+    def setUp(self):
+        super(IpsetManagerLoadTestCase, self).setUp()
+        self.execute.return_value = '\n'.join([
+            'create %s hash:ip family inet hashsize 1024 maxelem 65536' %
+            TEST_SET_NAME,
+            'add %s %s' % (TEST_SET_NAME, FAKE_IPS[0]),
+            'add %s %s' % (TEST_SET_NAME, FAKE_IPS[1]),
+            'create %s hash:ip family inet hashsize 1024 maxelem 65536' %
+            TEST_SET_NAME_NEW,
+            'add %s %s' % (TEST_SET_NAME_NEW, FAKE_IPS[2]),
+            'create other hash:net family inet hashsize 1024 maxelem 65536'])
+
+    def test_existing_sets_are_loaded_once(self):
+        self.assertTrue(self.ipset.set_exists(TEST_SET_ID, ETHERTYPE))
+        self.assertFalse(self.ipset.set_exists('other', ETHERTYPE))
+        self.assertEqual({TEST_SET_NAME: FAKE_IPS[0:2]},
+                         self.ipset.ipset_sets)
+        self.verify_mock_calls()
+        self.assertEqual(1, self.execute.call_count)
+
+    def test_set_members_of_existing_set(self):
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:2])
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[1:3])
+        self.expect_add_del(FAKE_IPS[2:3], FAKE_IPS[0:1])
+        self.verify_mock_calls()
+        self.assertEqual(2, self.execute.call_count)
+
+
+class IpsetManagerDeferApplyTestCase(BaseIpsetManagerTest):
+
+    def test_changes_are_restored_together(self):
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:1])
+        self.ipset.set_members('other_sgid', 'IPv6', ['fe80::1'])
+        self.ipset.add_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[1:2])
+        self.assertTrue(self.ipset.set_exists('other_sgid', 'IPv6'))
+        self.assertEqual(1, self.execute.call_count)
+        self.ipset.defer_apply_off()
+        self.expect_restore([
+            'create %s hash:ip family inet' % TEST_SET_NAME,
+            'add %s %s' % (TEST_SET_NAME, FAKE_IPS[0]),
+            'create IPv6other_sgid hash:ip family inet6',
+            'add IPv6other_sgid fe80::1',
+            'add %s %s' % (TEST_SET_NAME, FAKE_IPS[1])])
+        self.verify_mock_calls()
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_failed_restore_reloads_sets(self):
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:1])
+        self.execute.side_effect = RuntimeError()
+        self.assertRaises(RuntimeError, self.ipset.defer_apply_off)
+        self.execute.side_effect = None
+        self.execute.reset_mock()
+        # The set was never created in the kernel
+        self.assertFalse(self.ipset.set_exists(TEST_SET_ID, ETHERTYPE))
+        self.execute.assert_called_once_with(['ipset', 'save'],
+                                             run_as_root=True,
+                                             process_input=None)
+
+    def test_destroy_applies_pending_changes(self):
+        self.ipset.defer_apply_on()
+        self.ipset.set_members(TEST_SET_ID, ETHERTYPE, FAKE_IPS[0:1])
+        self.ipset.destroy(TEST_SET_ID, ETHERTYPE)
+        self.expect_create(FAKE_IPS[0:1])
+        self.expect_destroy()
+        self.verify_mock_calls()
+        self.ipset.defer_apply_off()
+        self.assertEqual(3, self.execute.call_count)
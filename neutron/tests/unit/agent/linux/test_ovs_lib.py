@@ -470,26 +470,35 @@ class OVS_Lib_Test(base.BaseTestCase):
         self.assertEqual(self.br.add_patch_port(pname, peer), ofport)
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
+    def _port_dump_mock(self):
+        return self._vsctl_mock(
+            "list-ports", self.BR_NAME,
+            "--", "--columns=name,external_ids,ofport", "list", "Interface",
+            "--", "--columns=name,tag", "list", "Port")
+
+    def _port_dump_output(self, port_names, interfaces=(), ports=()):
+        return '\n'.join([
+            '\\n'.join(port_names),
+            self._encode_ovs_json(['name', 'external_ids', 'ofport'],
+                                  interfaces),
+            self._encode_ovs_json(['name', 'tag'], ports)])
+
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
         ofport = 6
-        ofport_data = self._encode_ovs_json(['ofport'], [[ofport]])
         vif_id = uuidutils.generate_uuid()
         mac = "ca:fe:de:ad:be:ef"
         id_field = 'xs-vif-uuid' if is_xen else 'iface-id'
-        external_ids = ('{"data":[[["map",[["attached-mac","%(mac)s"],'
-                        '["%(id_field)s","%(vif)s"],'
-                        '["iface-status","active"]]]]],'
-                        '"headings":["external_ids"]}' % {
-                            'mac': mac, 'vif': vif_id, 'id_field': id_field})
+        external_ids = {"attached-mac": mac, id_field: vif_id,
+                        "iface-status": "active"}
+        interfaces = [[pname, external_ids, ofport],
+                      # Rows of other bridges are ignored
+                      ['tap0', external_ids, 1]]
 
         # Each element is a tuple of (expected mock call, return_value)
         expected_calls_and_values = [
-            (self._vsctl_mock("list-ports", self.BR_NAME), "%s\n" % pname),
-            (self._vsctl_mock("--columns=external_ids", "list",
-                              "Interface", pname), external_ids),
-            (self._vsctl_mock("--columns=ofport", "list", "Interface", pname),
-             ofport_data),
+            (self._port_dump_mock(),
+             self._port_dump_output([pname], interfaces)),
         ]
         if is_xen:
             expected_calls_and_values.append(
@@ -534,7 +543,6 @@ class OVS_Lib_Test(base.BaseTestCase):
         else:
             id_key = 'iface-id'
 
-        headings = ['name', 'external_ids', 'ofport']
         data = [
             # A vif port on this bridge:
             ['tap99', {id_key: 'tap99id', 'attached-mac': 'tap99mac'}, 1],
@@ -546,15 +554,15 @@ class OVS_Lib_Test(base.BaseTestCase):
 
             # Non-vif port on this bridge:
             ['bogus', {}, 2],
+            # A vif port on another bridge:
+            ['tap96', {id_key: 'tap96id', 'attached-mac': 'tap96mac'}, 3],
         ]
 
         # Each element is a tuple of (expected mock call, return_value)
         expected_calls_and_values = [
-            (self._vsctl_mock("list-ports", self.BR_NAME), 'tap99\\ntun22'),
-            (self._vsctl_mock("--if-exists",
-                              "--columns=name,external_ids,ofport",
-                              "list", "Interface", 'tap99', 'tun22'),
-             self._encode_ovs_json(headings, data)),
+            (self._port_dump_mock(),
+             self._port_dump_output(['tap99', 'tap98', 'tap97', 'bogus',
+                                     'tun22'], data)),
         ]
         tools.setup_mock_calls(self.execute, expected_calls_and_values)
 
@@ -583,7 +591,7 @@ class OVS_Lib_Test(base.BaseTestCase):
 
     def test_get_vif_ports_list_ports_error(self):
         expected_calls_and_values = [
-            (self._vsctl_mock("list-ports", self.BR_NAME), RuntimeError()),
+            (self._port_dump_mock(), RuntimeError()),
         ]
         tools.setup_mock_calls(self.execute, expected_calls_and_values)
         self.assertRaises(RuntimeError, self.br.get_vif_ports)
@@ -591,25 +599,13 @@ class OVS_Lib_Test(base.BaseTestCase):
 
     def test_get_vif_port_set_list_ports_error(self):
         expected_calls_and_values = [
-            (self._vsctl_mock("list-ports", self.BR_NAME), RuntimeError()),
-        ]
-        tools.setup_mock_calls(self.execute, expected_calls_and_values)
-        self.assertRaises(RuntimeError, self.br.get_vif_port_set)
-        tools.verify_mock_calls(self.execute, expected_calls_and_values)
-
-    def test_get_vif_port_set_list_interface_error(self):
-        expected_calls_and_values = [
-            (self._vsctl_mock("list-ports", self.BR_NAME), 'tap99\n'),
-            (self._vsctl_mock("--if-exists",
-                              "--columns=name,external_ids,ofport",
-                              "list", "Interface", "tap99"), RuntimeError()),
+            (self._port_dump_mock(), RuntimeError()),
         ]
         tools.setup_mock_calls(self.execute, expected_calls_and_values)
         self.assertRaises(RuntimeError, self.br.get_vif_port_set)
         tools.verify_mock_calls(self.execute, expected_calls_and_values)
 
     def test_get_port_tag_dict(self):
-        headings = ['name', 'tag']
         data = [
             ['int-br-eth2', set()],
             ['patch-tun', set()],
@@ -620,10 +616,9 @@ class OVS_Lib_Test(base.BaseTestCase):
 
         # Each element is a tuple of (expected mock call, return_value)
         expected_calls_and_values = [
-            (self._vsctl_mock("list-ports", self.BR_NAME),
-             '\\n'.join((iface for iface, tag in data))),
-            (self._vsctl_mock("--columns=name,tag", "list", "Port"),
-             self._encode_ovs_json(headings, data)),
+            (self._port_dump_mock(),
+             self._port_dump_output([iface for iface, tag in data],
+                                    ports=data + [['tap0', 2]])),
         ]
         tools.setup_mock_calls(self.execute, expected_calls_and_values)
 
@@ -636,6 +631,41 @@ class OVS_Lib_Test(base.BaseTestCase):
              u'tapce5318ff-78': 1,
              u'tape1400310-e6': 1}
         )
+        tools.verify_mock_calls(self.execute, expected_calls_and_values)
+
+    def test_port_snapshot_shared_between_helpers(self):
+        data = [['tap99', {'iface-id': 'tap99id', 'attached-mac': 'mac'}, 1]]
+        self.execute.return_value = self._port_dump_output(
+            ['tap99'], data, [['tap99', 1]])
+        with self.br.port_snapshot():
+            self.assertEqual(set(['tap99id']), self.br.get_vif_port_set())
+            self.assertEqual({'tap99': 1}, self.br.get_port_tag_dict())
+            self.assertEqual(['tap99'],
+                             [p.port_name for p in self.br.get_vif_ports()])
+        self.assertEqual([self._port_dump_mock()],
+                         self.execute.call_args_list)
+        # Outside of the block, every call queries OVSDB again
+        self.br.get_port_tag_dict()
+        self.assertEqual(2, self.execute.call_count)
+
+    def test_port_snapshot_dropped_on_port_changes(self):
+        dump = self._port_dump_output([])
+        self.execute.side_effect = [dump, '', dump]
+        with self.br.port_snapshot():
+            self.br.get_vif_port_set()
+            self.br.delete_port('tap99')
+            self.br.get_vif_port_set()
+        self.assertEqual(3, self.execute.call_count)
+
+    def test_port_snapshot_caches_xapi_iface_ids(self):
+        data = [['tap99', {'xs-vif-uuid': 'xs', 'attached-mac': 'mac'}, 1]]
+        self.execute.return_value = self._port_dump_output(['tap99'], data)
+        with mock.patch.object(self.br, 'get_xapi_iface_id',
+                               return_value='tap99id') as get_xapi_iface_id:
+            with self.br.port_snapshot():
+                self.br.get_vif_port_set()
+                self.br.get_vif_ports()
+        get_xapi_iface_id.assert_called_once_with('xs')
 
     def test_clear_db_attribute(self):
         pname = "tap77"
@@ -690,7 +720,7 @@ class OVS_Lib_Test(base.BaseTestCase):
 
     def test_delete_neutron_ports_list_error(self):
         expected_calls_and_values = [
-            (self._vsctl_mock("list-ports", self.BR_NAME), RuntimeError()),
+            (self._port_dump_mock(), RuntimeError()),
         ]
         tools.setup_mock_calls(self.execute, expected_calls_and_values)
         self.assertRaises(RuntimeError, self.br.delete_ports, all_ports=False)
@@ -14,6 +14,7 @@
 
 import eventlet.event
 import mock
+from oslo_serialization import jsonutils
 
 from neutron.agent.linux import ovsdb_monitor
 from neutron.tests import base
@@ -97,3 +98,78 @@ class TestSimpleInterfaceMonitor(base.BaseTestCase):
                 return_value=output):
             self.monitor._read_stdout()
         self.assertFalse(self.monitor.data_received)
+
+
+def _monitor_output(*rows):
+    return jsonutils.dumps({
+        'headings': ['row', 'action', 'name', 'ofport', 'external_ids'],
+        'data': [[uuid, action, name, ofport,
+                  ['map', sorted(external_ids.items())]]
+                 for uuid, action, name, ofport, external_ids in rows]})
+
+
+class TestSimpleInterfaceMonitorEvents(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestSimpleInterfaceMonitorEvents, self).setUp()
+        self.monitor = ovsdb_monitor.SimpleInterfaceMonitor()
+        self.output = []
+        mock.patch.object(self.monitor, 'iter_stdout',
+                          side_effect=self._iter_output).start()
+        mock.patch.object(
+            ovsdb_monitor.SimpleInterfaceMonitor, 'is_active',
+            new_callable=mock.PropertyMock(return_value=True)).start()
+        # The events of the first call may be incomplete
+        self.assertIsNone(self.monitor.get_events())
+
+    def _iter_output(self):
+        output = self.output
+        self.output = []
+        return iter(output)
+
+    def test_get_events(self):
+        self.output = [
+            _monitor_output(('u1', 'initial', 'tap1', 1, {'iface-id': 'p1'}),
+                            ('u2', 'insert', 'tap2', ['set', []], {})),
+            _monitor_output(('u3', 'delete', 'tap3', 3, {'iface-id': 'p3'}),
+                            ('u4', 'old', 'tap4', 2, {}),
+                            ('u4', 'new', 'tap4', 4, {'iface-id': 'p4'}))]
+        self.assertTrue(self.monitor.has_updates)
+        self.assertEqual(
+            {'added': [{'name': 'tap1', 'ofport': 1,
+                        'external_ids': {'iface-id': 'p1'}},
+                       {'name': 'tap2', 'ofport': [], 'external_ids': {}}],
+             'removed': [{'name': 'tap3', 'ofport': 3,
+                          'external_ids': {'iface-id': 'p3'}}],
+             'modified': [{'name': 'tap4', 'ofport': 4,
+                           'external_ids': {'iface-id': 'p4'}}]},
+            self.monitor.get_events())
+        self.assertEqual({'added': [], 'removed': [], 'modified': []},
+                         self.monitor.get_events())
+
+    def test_get_events_keeps_the_change_of_each_interface(self):
+        self.output = [
+            _monitor_output(('u1', 'insert', 'tap1', ['set', []], {}),
+                            ('u2', 'insert', 'tap2', 2, {}),
+                            ('u3', 'delete', 'tap3', 3, {})),
+            _monitor_output(('u1', 'new', 'tap1', 1, {}),
+                            ('u2', 'delete', 'tap2', 2, {}),
+                            ('u5', 'insert', 'tap3', 5, {}))]
+        events = self.monitor.get_events()
+        self.assertEqual([('tap1', 1)], [(device['name'], device['ofport'])
+                                         for device in events['added']])
+        self.assertEqual([], events['removed'])
+        self.assertEqual([('tap3', 5)], [(device['name'], device['ofport'])
+                                         for device in events['modified']])
+
+    def test_get_events_returns_none_after_restart(self):
+        self.output = [_monitor_output(('u1', 'insert', 'tap1', 1, {}))]
+        with mock.patch('neutron.agent.linux.ovsdb_monitor.OvsdbMonitor'
+                        '._kill'):
+            self.monitor._kill()
+        self.assertIsNone(self.monitor.get_events())
+        self.assertIsNotNone(self.monitor.get_events())
+
+    def test_get_events_returns_none_for_unparsable_output(self):
+        self.output = ['foo']
+        self.assertIsNone(self.monitor.get_events())
@@ -85,6 +85,9 @@ class TestAlwaysPoll(base.BaseTestCase):
         pm = polling.AlwaysPoll()
         self.assertTrue(pm.is_polling_required)
 
+    def test_get_events_returns_none(self):
+        self.assertIsNone(polling.AlwaysPoll().get_events())
+
 
 class TestInterfacePollingMinimizer(base.BaseTestCase):
 
@@ -97,6 +100,11 @@ class TestInterfacePollingMinimizer(base.BaseTestCase):
             self.pm.start()
         mock_start.assert_called_with()
 
+    def test_get_events_returns_monitor_events(self):
+        with mock.patch.object(self.pm._monitor, 'get_events',
+                               return_value={'added': []}):
+            self.assertEqual({'added': []}, self.pm.get_events())
+
     def test_stop_calls_monitor_stop(self):
         with mock.patch.object(self.pm._monitor, 'stop') as mock_stop:
             self.pm.stop()
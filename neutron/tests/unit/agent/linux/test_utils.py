@@ -105,6 +105,74 @@ class AgentUtilsExecuteTest(base.BaseTestCase):
             self.assertFalse(log.error.called)
 
 
+class AgentUtilsExecuteRootwrapDaemonTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsExecuteRootwrapDaemonTest, self).setUp()
+        self.config(group='AGENT', root_helper_daemon='sudo daemon')
+        self.popen = mock.patch('eventlet.green.subprocess.Popen').start()
+        self.client = mock.patch.object(
+            utils.RootwrapDaemonHelper, 'get_client').start().return_value
+        self.client.execute.return_value = (0, 'out', '')
+
+    def test_run_as_root_uses_daemon(self):
+        result = utils.execute(['ip', 'link'], process_input='in',
+                               run_as_root=True)
+        self.assertEqual('out', result)
+        self.client.execute.assert_called_once_with(['ip', 'link'], 'in')
+        self.assertFalse(self.popen.called)
+
+    def test_addl_env_is_passed_with_env(self):
+        utils.execute(['dnsmasq'], addl_env={'FOO': 'bar'},
+                      run_as_root=True)
+        self.client.execute.assert_called_once_with(
+            ['env', 'FOO=bar', 'dnsmasq'], None)
+
+    def test_not_run_as_root_does_not_use_daemon(self):
+        self.popen.return_value.returncode = 0
+        self.popen.return_value.communicate.return_value = ('out', '')
+        utils.execute(['ls'])
+        self.assertFalse(self.client.execute.called)
+        self.assertTrue(self.popen.called)
+
+    def test_daemon_return_code_raises_runtime(self):
+        self.client.execute.return_value = (1, '', 'error')
+        with mock.patch.object(utils, 'LOG') as log:
+            self.assertRaises(RuntimeError, utils.execute, ['ip', 'link'],
+                              run_as_root=True)
+            self.assertTrue(log.error.called)
+
+    def test_daemon_extra_ok_codes(self):
+        self.client.execute.return_value = (2, 'out', '')
+        result = utils.execute(['ip', 'link'], extra_ok_codes=[2],
+                               run_as_root=True)
+        self.assertEqual('out', result)
+
+
+class AgentUtilsExecuteStatsTest(base.BaseTestCase):
+    def setUp(self):
+        super(AgentUtilsExecuteStatsTest, self).setUp()
+        mock.patch.dict(utils._execute_stats, clear=True).start()
+        self.process = mock.patch('eventlet.green.subprocess.Popen').start()
+        self.process.return_value.returncode = 0
+        self.process.return_value.communicate.return_value = ('', '')
+
+    def test_stats_per_command(self):
+        utils.execute(['ip', 'link'])
+        utils.execute(['ip', 'netns', 'exec', 'ns', 'iptables-save'])
+        utils.execute(['/sbin/ip', 'addr'])
+        stats = utils.get_execute_stats()
+        self.assertEqual(set(['ip', 'iptables-save']), set(stats))
+        self.assertEqual(2, stats['ip']['calls'])
+        self.assertEqual(1, stats['iptables-save']['calls'])
+        self.assertGreaterEqual(stats['ip']['total_time'],
+                                stats['ip']['max_time'])
+
+    def test_stats_counted_on_failure(self):
+        self.process.return_value.returncode = 1
+        self.assertRaises(RuntimeError, utils.execute, ['ip', 'link'])
+        self.assertEqual(1, utils.get_execute_stats()['ip']['calls'])
+
+
 class AgentUtilsGetInterfaceMAC(base.BaseTestCase):
     def test_get_interface_mac(self):
         expect_val = '01:02:03:04:05:06'
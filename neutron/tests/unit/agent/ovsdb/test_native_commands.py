@@ -0,0 +1,265 @@
+# Copyright (c) 2015 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import uuid
+
+from neutron.agent.ovsdb.native import commands
+from neutron.agent.ovsdb.native import idlutils
+from neutron.tests import base
+
+# The default value of the columns of the replicated tables
+FAKE_SCHEMA = {
+    'Open_vSwitch': {'bridges': list},
+    'Bridge': {'name': str, 'ports': list, 'controller': list,
+               'fail_mode': list, 'external_ids': dict, 'protocols': list},
+    'Port': {'name': str, 'interfaces': list, 'tag': list,
+             'external_ids': dict},
+    'Interface': {'name': str, 'type': str, 'ofport': list,
+                  'external_ids': dict, 'options': dict},
+    'Controller': {'target': str},
+}
+
+
+class FakeRow(object):
+    def __init__(self, table, **columns):
+        self._table = table
+        self.uuid = uuid.uuid4()
+        for column, default in table.columns.items():
+            setattr(self, column, columns.get(column, default()))
+
+    def verify(self, column):
+        pass
+
+    def delete(self):
+        self._table.rows.pop(self.uuid, None)
+
+
+class FakeTable(object):
+    def __init__(self, columns):
+        self.columns = columns
+        self.rows = {}
+
+
+class FakeIdl(object):
+    """An in-process stand-in for the OVSDB replica kept by the IDL"""
+
+    def __init__(self):
+        self.tables = dict((name, FakeTable(columns))
+                           for name, columns in FAKE_SCHEMA.items())
+        self.add_row('Open_vSwitch')
+
+    def add_row(self, table, **columns):
+        row = FakeRow(self.tables[table], **columns)
+        self.tables[table].rows[row.uuid] = row
+        return row
+
+
+class FakeTransaction(object):
+    """Commits every change to the FakeIdl right away"""
+
+    def __init__(self, api):
+        self.api = api
+
+    def insert(self, table, name=None):
+        row = self.api.idl.add_row(table)
+        if name is not None:
+            row.name = name
+        return row
+
+    def row_by_record(self, table, record):
+        return idlutils.row_by_record(self.api.idl, table, record)
+
+
+class FakeApi(object):
+    def __init__(self):
+        self.idl = FakeIdl()
+
+
+class TestNativeCommands(base.BaseTestCase):
+
+    def setUp(self):
+        super(TestNativeCommands, self).setUp()
+        self.api = FakeApi()
+        self.txn = FakeTransaction(self.api)
+
+    def _run(self, command_class, *args, **kwargs):
+        command = command_class(self.api, *args, **kwargs)
+        command.run_idl(self.txn)
+        return command.result
+
+    def _add_port(self, bridge, port, **iface_columns):
+        self._run(commands.AddPortCommand, bridge, port, True)
+        if iface_columns:
+            self._run(commands.DbSetCommand, 'Interface', port,
+                      *iface_columns.items())
+
+    def test_add_br(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self.assertTrue(self._run(commands.BridgeExistsCommand, 'br-int'))
+        self.assertEqual(['br-int'],
+                         self._run(commands.ListBridgesCommand))
+        self.assertEqual('internal', self._run(
+            commands.DbGetCommand, 'Interface', 'br-int', 'type'))
+        ovs = self.api.idl.tables['Open_vSwitch'].rows.values()[0]
+        self.assertEqual(['br-int'], [br.name for br in ovs.bridges])
+
+    def test_add_br_may_exist(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self.assertEqual(1, len(self.api.idl.tables['Bridge'].rows))
+        self.assertRaises(commands.OvsdbCommandError, self._run,
+                          commands.AddBridgeCommand, 'br-int', False)
+
+    def test_del_br(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._add_port('br-int', 'tap0')
+        self._run(commands.DelBridgeCommand, 'br-int', True)
+        self.assertFalse(self._run(commands.BridgeExistsCommand, 'br-int'))
+        self.assertFalse(self.api.idl.tables['Port'].rows)
+        self.assertFalse(self.api.idl.tables['Interface'].rows)
+
+    def test_del_br_if_exists(self):
+        self._run(commands.DelBridgeCommand, 'br-int', True)
+        self.assertRaises(idlutils.RowNotFound, self._run,
+                          commands.DelBridgeCommand, 'br-int', False)
+
+    def test_list_ports_skips_local_port(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._add_port('br-int', 'tap1')
+        self._add_port('br-int', 'tap0')
+        self.assertEqual(['tap0', 'tap1'],
+                         self._run(commands.ListPortsCommand, 'br-int'))
+
+    def test_add_port_existing_on_other_bridge(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._run(commands.AddBridgeCommand, 'br-ex', True)
+        self._add_port('br-int', 'tap0')
+        self.assertRaises(commands.OvsdbCommandError, self._run,
+                          commands.AddPortCommand, 'br-ex', 'tap0', True)
+
+    def test_del_port(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._add_port('br-int', 'tap0')
+        self._run(commands.DelPortCommand, 'tap0', 'br-int', True)
+        self.assertEqual([], self._run(commands.ListPortsCommand, 'br-int'))
+        self.assertRaises(idlutils.RowNotFound, self._run,
+                          commands.DelPortCommand, 'tap0', None, False)
+
+    def test_del_port_wrong_bridge(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._run(commands.AddBridgeCommand, 'br-ex', True)
+        self._add_port('br-int', 'tap0')
+        self.assertRaises(commands.OvsdbCommandError, self._run,
+                          commands.DelPortCommand, 'tap0', 'br-ex', True)
+
+    def test_port_and_iface_to_br(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._add_port('br-int', 'tap0')
+        self.assertEqual('br-int',
+                         self._run(commands.PortToBridgeCommand, 'tap0'))
+        self.assertEqual('br-int',
+                         self._run(commands.InterfaceToBridgeCommand, 'tap0'))
+
+    def test_db_set_updates_map_keys(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._add_port('br-int', 'tap0', external_ids={'iface-id': 'id'})
+        self._run(commands.DbSetCommand, 'Interface', 'tap0',
+                  ('external_ids', {'attached-mac': 'mac'}))
+        self.assertEqual(
+            {'iface-id': 'id', 'attached-mac': 'mac'},
+            self._run(commands.DbGetCommand, 'Interface', 'tap0',
+                      'external_ids'))
+
+    def test_db_get_returns_vsctl_values(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._add_port('br-int', 'tap0')
+        self.assertEqual([], self._run(commands.DbGetCommand, 'Interface',
+                                       'tap0', 'ofport'))
+        self._run(commands.DbSetCommand, 'Interface', 'tap0',
+                  ('ofport', [5]))
+        self.assertEqual(5, self._run(commands.DbGetCommand, 'Interface',
+                                      'tap0', 'ofport'))
+
+    def test_db_clear(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._run(commands.DbSetCommand, 'Bridge', 'br-int',
+                  ('external_ids', {'bridge-id': 'br-int'}))
+        self.assertEqual('br-int', self._run(
+            commands.BrGetExternalIdCommand, 'br-int', 'bridge-id'))
+        self._run(commands.DbClearCommand, 'Bridge', 'br-int',
+                  'external_ids')
+        self.assertEqual({}, self._run(commands.DbGetCommand, 'Bridge',
+                                       'br-int', 'external_ids'))
+
+    def test_db_list(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._add_port('br-int', 'tap0', ofport=[1])
+        self._add_port('br-int', 'tap1', ofport=[2])
+        result = self._run(commands.DbListCommand, 'Interface',
+                           ['tap0', 'tap1', 'tap2'], ['name', 'ofport'], True)
+        self.assertEqual([{'name': 'tap0', 'ofport': 1},
+                          {'name': 'tap1', 'ofport': 2}], result)
+        self.assertRaises(idlutils.RowNotFound, self._run,
+                          commands.DbListCommand, 'Interface', ['tap2'],
+                          ['name'], False)
+
+    def test_db_list_all_columns(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        result = self._run(commands.DbListCommand, 'Bridge', None, None,
+                           False)
+        self.assertEqual(1, len(result))
+        self.assertEqual(set(FAKE_SCHEMA['Bridge']) | set(['_uuid']),
+                         set(result[0]))
+
+    def test_db_find(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._add_port('br-int', 'tap0',
+                       external_ids={'iface-id': 'id0', 'attached-mac': 'm'})
+        self._add_port('br-int', 'tap1',
+                       external_ids={'iface-id': 'id0', 'attached-mac': ''})
+        self._add_port('br-int', 'tap2', external_ids={'iface-id': 'id0'})
+        result = self._run(commands.DbFindCommand, 'Interface',
+                           ('external_ids', '=', {'iface-id': 'id0'}),
+                           ('external_ids', '!=', {'attached-mac': ''}),
+                           columns=['name'])
+        self.assertEqual([{'name': 'tap0'}], result)
+
+    def test_db_find_set_operator(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._run(commands.DbSetCommand, 'Bridge', 'br-int',
+                  ('protocols', ['OpenFlow10', 'OpenFlow13']))
+        result = self._run(commands.DbFindCommand, 'Bridge',
+                           ('protocols', '{>=}', 'OpenFlow13'),
+                           columns=['name'])
+        self.assertEqual([{'name': 'br-int'}], result)
+
+    def test_controllers(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._run(commands.SetControllerCommand, 'br-int',
+                  ['tcp:1.1.1.1:6633', 'tcp:2.2.2.2:6633'])
+        self.assertEqual(['tcp:1.1.1.1:6633', 'tcp:2.2.2.2:6633'],
+                         self._run(commands.GetControllerCommand, 'br-int'))
+        self._run(commands.SetControllerCommand, 'br-int',
+                  ['tcp:3.3.3.3:6633'])
+        self.assertEqual(1, len(self.api.idl.tables['Controller'].rows))
+        self._run(commands.DelControllerCommand, 'br-int')
+        self.assertEqual([],
+                         self._run(commands.GetControllerCommand, 'br-int'))
+        self.assertFalse(self.api.idl.tables['Controller'].rows)
+
+    def test_set_fail_mode(self):
+        self._run(commands.AddBridgeCommand, 'br-int', True)
+        self._run(commands.SetFailModeCommand, 'br-int', 'secure')
+        self.assertEqual('secure', self._run(commands.DbGetCommand, 'Bridge',
+                                             'br-int', 'fail_mode'))
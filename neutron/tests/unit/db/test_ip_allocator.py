@@ -0,0 +1,312 @@
+# Copyright (c) 2015 OpenStack Foundation.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import time
+
+import eventlet
+from eventlet import semaphore
+import mock
+import netaddr
+from oslo_config import cfg
+from testtools import content
+
+from neutron.common import exceptions as n_exc
+from neutron import context
+from neutron.db import ip_allocator
+from neutron.db import models_v2
+from neutron.tests import base
+from neutron.tests.unit import test_db_plugin
+
+
+class TestCandidates(base.BaseTestCase):
+
+    ranges = [(10, 14), (20, 22)]
+
+    def test_address_at(self):
+        self.assertEqual([10, 14, 20, 22],
+                         [ip_allocator.address_at(self.ranges, offset)
+                          for offset in (0, 4, 5, 7)])
+        self.assertRaises(IndexError, ip_allocator.address_at,
+                          self.ranges, 8)
+
+    def test_random_candidates_stay_in_pools(self):
+        candidates = ip_allocator.RandomIpAllocator().candidates(
+            self.ranges, 8)
+        for _i in range(100):
+            candidate = next(candidates)
+            self.assertTrue(10 <= candidate <= 14 or 20 <= candidate <= 22)
+
+    def test_stride_candidates_visit_every_address_once(self):
+        for size in (1, 2, 8, 9, 256):
+            ranges = [(0, size - 1)]
+            candidates = list(
+                ip_allocator.StrideIpAllocator().candidates(ranges, size))
+            self.assertEqual(range(size), sorted(candidates))
+
+    def test_get_ip_allocator(self):
+        self.assertIsNone(ip_allocator.get_ip_allocator())
+        cfg.CONF.set_override('ip_allocation_strategy', 'stride')
+        self.assertIsInstance(ip_allocator.get_ip_allocator(),
+                              ip_allocator.StrideIpAllocator)
+
+
+class TestCandidateIpAllocation(test_db_plugin.NeutronDbPluginV2TestCase):
+
+    strategy = 'random'
+
+    def setUp(self):
+        super(TestCandidateIpAllocation, self).setUp()
+        cfg.CONF.set_override('ip_allocation_strategy', self.strategy)
+
+    def _allocated_ips(self, subnet_id):
+        ctx = context.get_admin_context()
+        return sorted(ip['ip_address'] for ip in ctx.session.query(
+            models_v2.IPAllocation).filter_by(subnet_id=subnet_id))
+
+    def test_allocate_whole_subnet(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet_id = subnet['subnet']['id']
+            net_id = subnet['subnet']['network_id']
+            # The gateway takes 10.0.0.1, leaving 5 addresses
+            res = self._create_port(
+                self.fmt, net_id=net_id,
+                fixed_ips=[{'subnet_id': subnet_id}] * 4)
+            port = self.deserialize(self.fmt, res)
+            self.assertEqual(4, len(set(
+                ip['ip_address'] for ip in port['port']['fixed_ips'])))
+            res = self._create_port(self.fmt, net_id=net_id)
+            port = self.deserialize(self.fmt, res)
+            self.assertEqual(1, len(port['port']['fixed_ips']))
+            self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.4',
+                              '10.0.0.5', '10.0.0.6'],
+                             self._allocated_ips(subnet_id))
+            res = self._create_port(self.fmt, net_id=net_id)
+            self.assertEqual(409, res.status_int)
+
+    def test_allocate_next_to_specific_ip(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet_id = subnet['subnet']['id']
+            net_id = subnet['subnet']['network_id']
+            res = self._create_port(
+                self.fmt, net_id=net_id,
+                fixed_ips=[{'subnet_id': subnet_id,
+                            'ip_address': '10.0.0.4'}] +
+                [{'subnet_id': subnet_id}] * 4)
+            port = self.deserialize(self.fmt, res)
+            self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.4',
+                              '10.0.0.5', '10.0.0.6'],
+                             sorted(ip['ip_address']
+                                    for ip in port['port']['fixed_ips']))
+
+    def test_retry_on_allocated_candidate(self):
+        cfg.CONF.set_override('ip_allocation_retries', 2)
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet_id = subnet['subnet']['id']
+            net_id = subnet['subnet']['network_id']
+            self._create_port(self.fmt, net_id=net_id,
+                              fixed_ips=[{'subnet_id': subnet_id,
+                                          'ip_address': '10.0.0.2'},
+                                         {'subnet_id': subnet_id,
+                                          'ip_address': '10.0.0.3'}])
+            # Both candidates are taken, the free address is looked up
+            allocator_class = ip_allocator.ALLOCATORS[self.strategy]
+            with mock.patch.object(allocator_class, 'candidates',
+                                   return_value=iter([0x0a000002,
+                                                      0x0a000003])):
+                res = self._create_port(self.fmt, net_id=net_id)
+            port = self.deserialize(self.fmt, res)
+            self.assertEqual('10.0.0.4',
+                             port['port']['fixed_ips'][0]['ip_address'])
+
+    def test_allocation_failure(self):
+        with self.subnet(cidr='10.0.0.0/30') as subnet:
+            ctx = context.get_admin_context()
+            subnets = [dict(subnet['subnet'])]
+            allocator = ip_allocator.get_ip_allocator()
+            with ctx.session.begin():
+                self.assertEqual('10.0.0.2', allocator.generate_ip(
+                    ctx, subnets)['ip_address'])
+                self.assertRaises(n_exc.IpAddressGenerationFailure,
+                                  allocator.generate_ip, ctx, subnets)
+
+
+class TestStrideIpAllocation(TestCandidateIpAllocation):
+
+    strategy = 'stride'
+
+
+class TestReserve(test_db_plugin.NeutronDbPluginV2TestCase):
+    """Reserve addresses against the database, as concurrent requests do."""
+
+    def setUp(self):
+        super(TestReserve, self).setUp()
+        cfg.CONF.set_override('ip_allocation_strategy', 'random')
+        self.ctx = context.get_admin_context()
+
+    def _take_address(self, subnet, ip_address):
+        # A concurrent request which committed the address first
+        ctx = context.get_admin_context()
+        with ctx.session.begin():
+            self.assertTrue(ip_allocator._reserve(ctx, subnet, ip_address))
+
+    def _allocated_ips(self, subnet_id):
+        return sorted(ip['ip_address'] for ip in self.ctx.session.query(
+            models_v2.IPAllocation).filter_by(subnet_id=subnet_id))
+
+    def test_reserve_duplicate_entry_keeps_transaction(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet = subnet['subnet']
+            self._take_address(subnet, '10.0.0.2')
+            with mock.patch.object(ip_allocator.LOG, 'debug') as log:
+                with self.ctx.session.begin():
+                    self.assertFalse(ip_allocator._reserve(
+                        self.ctx, subnet, '10.0.0.2'))
+                    # The savepoint of the failed insert was rolled back
+                    self.assertTrue(ip_allocator._reserve(
+                        self.ctx, subnet, '10.0.0.3'))
+            # The conflict was raised by the database
+            self.assertEqual(1, log.call_count)
+            self.assertEqual(['10.0.0.2', '10.0.0.3'],
+                             self._allocated_ips(subnet['id']))
+            self.assertIsNone(ip_allocator.get_reservation(
+                self.ctx, '10.0.0.2', subnet['id']))
+            self.assertIsNotNone(ip_allocator.get_reservation(
+                self.ctx, '10.0.0.3', subnet['id']))
+
+    def test_reserve_twice_in_session(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet = subnet['subnet']
+            with mock.patch.object(ip_allocator.LOG, 'debug') as log:
+                with self.ctx.session.begin():
+                    self.assertTrue(ip_allocator._reserve(
+                        self.ctx, subnet, '10.0.0.2'))
+                    self.assertFalse(ip_allocator._reserve(
+                        self.ctx, subnet, '10.0.0.2'))
+            self.assertFalse(log.called)
+
+    def test_reserve_after_rollback(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet = subnet['subnet']
+            try:
+                with self.ctx.session.begin():
+                    self.assertTrue(ip_allocator._reserve(
+                        self.ctx, subnet, '10.0.0.2'))
+                    raise ValueError()
+            except ValueError:
+                pass
+            self.assertIsNone(ip_allocator.get_reservation(
+                self.ctx, '10.0.0.2', subnet['id']))
+            self.assertEqual([], self._allocated_ips(subnet['id']))
+            with self.ctx.session.begin():
+                self.assertTrue(ip_allocator._reserve(
+                    self.ctx, subnet, '10.0.0.2'))
+            self.assertEqual(['10.0.0.2'], self._allocated_ips(subnet['id']))
+
+    def test_generate_ip_retries_after_duplicate_entry(self):
+        with self.subnet(cidr='10.0.0.0/29') as subnet:
+            subnet = subnet['subnet']
+            self._take_address(subnet, '10.0.0.2')
+            allocator = ip_allocator.get_ip_allocator()
+            with contextlib.nested(
+                mock.patch.object(allocator, 'candidates',
+                                  return_value=iter([0x0a000002,
+                                                     0x0a000005])),
+                mock.patch.object(ip_allocator, '_reserve',
+                                  side_effect=ip_allocator._reserve)
+            ) as (candidates, reserve):
+                with self.ctx.session.begin():
+                    self.assertEqual(
+                        {'ip_address': '10.0.0.5', 'subnet_id': subnet['id']},
+                        allocator.generate_ip(self.ctx, [subnet]))
+            self.assertEqual(
+                [mock.call(self.ctx, subnet, '10.0.0.2'),
+                 mock.call(self.ctx, subnet, '10.0.0.5')],
+                reserve.call_args_list)
+            self.assertEqual(['10.0.0.2', '10.0.0.5'],
+                             self._allocated_ips(subnet['id']))
+
+
+class TestAllocatorContention(base.BaseTestCase):
+    """Compare the strategies with concurrent creators on a shared subnet.
+
+    Every creator is a greenthread allocating one address. The database is
+    modeled by a set of allocated addresses and a latency per statement:
+    the 'range' strategy holds the lock of the availability range for one
+    statement per allocation, while the candidate strategies run their
+    generate_ip concurrently, an insert of an address taken meanwhile
+    counting as a retry.
+    """
+
+    latency = 0.005
+
+    def _reserve(self, context, subnet, ip_address):
+        # The insert of the allocation row
+        taken = ip_address in self.allocated
+        eventlet.sleep(self.latency)
+        if taken or ip_address in self.allocated:
+            self.retries += 1
+            return False
+        self.allocated.add(ip_address)
+        return True
+
+    def _range_creator(self, lock, first_ip):
+        with lock:
+            eventlet.sleep(self.latency)
+            ip_address = first_ip + len(self.allocated)
+            self.allocated.add(str(ip_address))
+
+    def _run(self, strategy, creators):
+        subnet = {'id': 'subnet1', 'network_id': 'net1', 'ip_version': 4,
+                  'cidr': '10.0.0.0/22'}
+        self.allocated = set()
+        self.retries = 0
+        pool = eventlet.GreenPool(creators)
+        start = time.time()
+        if strategy == 'range':
+            lock = semaphore.Semaphore()
+            first_ip = netaddr.IPAddress('10.0.0.2')
+            for _i in range(creators):
+                pool.spawn_n(self._range_creator, lock, first_ip)
+            pool.waitall()
+        else:
+            allocator = ip_allocator.ALLOCATORS[strategy]()
+            ranges = [(0x0a000002, 0x0a0003fe)]
+            with contextlib.nested(
+                mock.patch.object(ip_allocator, 'get_pool_ranges',
+                                  return_value=ranges),
+                mock.patch.object(ip_allocator, '_reserve',
+                                  side_effect=self._reserve)):
+                for _i in range(creators):
+                    pool.spawn_n(allocator.generate_ip, mock.Mock(),
+                                 [subnet])
+                pool.waitall()
+        elapsed = time.time() - start
+        self.assertEqual(creators, len(self.allocated))
+        self.addDetail('%s with %d creators' % (strategy, creators),
+                       content.text_content(
+                           '%.3fs, %d retries' % (elapsed, self.retries)))
+        return elapsed, self.retries
+
+    def test_candidate_strategies_allocate_concurrently(self):
+        creators = 50
+        range_elapsed, range_retries = self._run('range', creators)
+        self.assertEqual(0, range_retries)
+        # The availability range lock serializes the creators
+        self.assertGreaterEqual(range_elapsed, creators * self.latency)
+        for strategy in ('random', 'stride'):
+            elapsed, retries = self._run(strategy, creators)
+            self.assertLess(retries, creators / 2)
+            self.assertLess(elapsed, range_elapsed / 2)
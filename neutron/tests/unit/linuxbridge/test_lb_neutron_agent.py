@@ -111,11 +111,12 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
         agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({}, 0)
         devices = [DEVICE_1]
         with contextlib.nested(
-            mock.patch.object(agent.plugin_rpc, "update_device_down"),
+            mock.patch.object(agent.plugin_rpc, "update_device_list"),
             mock.patch.object(agent.sg_agent, "remove_devices_filter")
         ) as (fn_udd, fn_rdf):
-            fn_udd.return_value = {'device': DEVICE_1,
-                                   'exists': True}
+            fn_udd.return_value = {'devices_down': [{'device': DEVICE_1,
+                                                     'exists': True}],
+                                   'failed_devices_down': []}
             with mock.patch.object(linuxbridge_neutron_agent.LOG,
                                    'info') as log:
                 resync = agent.treat_devices_removed(devices)
@@ -128,11 +129,12 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
         agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({}, 0)
         devices = [DEVICE_1]
         with contextlib.nested(
-            mock.patch.object(agent.plugin_rpc, "update_device_down"),
+            mock.patch.object(agent.plugin_rpc, "update_device_list"),
             mock.patch.object(agent.sg_agent, "remove_devices_filter")
         ) as (fn_udd, fn_rdf):
-            fn_udd.return_value = {'device': DEVICE_1,
-                                   'exists': False}
+            fn_udd.return_value = {'devices_down': [{'device': DEVICE_1,
+                                                     'exists': False}],
+                                   'failed_devices_down': []}
             with mock.patch.object(linuxbridge_neutron_agent.LOG,
                                    'debug') as log:
                 resync = agent.treat_devices_removed(devices)
@@ -145,14 +147,14 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
         agent = linuxbridge_neutron_agent.LinuxBridgeNeutronAgentRPC({}, 0)
         devices = [DEVICE_1]
         with contextlib.nested(
-            mock.patch.object(agent.plugin_rpc, "update_device_down"),
+            mock.patch.object(agent.plugin_rpc, "update_device_list"),
             mock.patch.object(agent.sg_agent, "remove_devices_filter")
         ) as (fn_udd, fn_rdf):
             fn_udd.side_effect = Exception()
             with mock.patch.object(linuxbridge_neutron_agent.LOG,
                                    'debug') as log:
                 resync = agent.treat_devices_removed(devices)
-                self.assertEqual(2, log.call_count)
+                self.assertEqual(1, log.call_count)
                 self.assertTrue(resync)
                 self.assertTrue(fn_udd.called)
                 self.assertTrue(fn_rdf.called)
@@ -305,6 +307,8 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
                         'physical_network': 'physnet1'}
         agent.plugin_rpc = mock.Mock()
         agent.plugin_rpc.get_devices_details_list.return_value = [mock_details]
+        agent.plugin_rpc.update_device_list.return_value = {
+            'failed_devices_up': [], 'failed_devices_down': []}
         agent.br_mgr = mock.Mock()
         agent.br_mgr.add_interface.return_value = True
         resync_needed = agent.treat_devices_added_updated(set(['tap1']))
@@ -313,7 +317,25 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
         agent.br_mgr.add_interface.assert_called_with('net123', 'vlan',
                                                       'physnet1', 100,
                                                       'port123')
-        self.assertTrue(agent.plugin_rpc.update_device_up.called)
+        agent.plugin_rpc.update_device_list.assert_called_once_with(
+            agent.context, ['dev123'], [], agent.agent_id, cfg.CONF.host)
+
+    def test_treat_devices_added_updated_failed_device_needs_resync(self):
+        agent = self.agent
+        mock_details = {'device': 'dev123',
+                        'port_id': 'port123',
+                        'network_id': 'net123',
+                        'admin_state_up': True,
+                        'network_type': 'vlan',
+                        'segmentation_id': 100,
+                        'physical_network': 'physnet1'}
+        agent.plugin_rpc = mock.Mock()
+        agent.plugin_rpc.get_devices_details_list.return_value = [mock_details]
+        agent.plugin_rpc.update_device_list.return_value = {
+            'failed_devices_up': ['dev123'], 'failed_devices_down': []}
+        agent.br_mgr = mock.Mock()
+        agent.br_mgr.add_interface.return_value = True
+        self.assertTrue(agent.treat_devices_added_updated(set(['tap1'])))
 
     def test_treat_devices_added_updated_admin_state_up_false(self):
         agent = self.agent
@@ -331,7 +353,7 @@ class TestLinuxBridgeAgent(base.BaseTestCase):
 
         self.assertFalse(resync_needed)
         agent.remove_port_binding.assert_called_with('net123', 'port123')
-        self.assertFalse(agent.plugin_rpc.update_device_up.called)
+        self.assertFalse(agent.plugin_rpc.update_device_list.called)
 
 
 class TestLinuxBridgeManager(base.BaseTestCase):
@@ -91,6 +91,24 @@ class Ml2DBTestCase(testlib_api.SqlTestCase):
                      api.SEGMENTATION_ID: 2}]
         self._create_segments(segments)
 
+    def test_get_networks_segments(self):
+        segments = [{api.NETWORK_TYPE: 'vlan',
+                    api.PHYSICAL_NETWORK: 'physnet1',
+                    api.SEGMENTATION_ID: 1},
+                    {api.NETWORK_TYPE: 'vlan',
+                     api.PHYSICAL_NETWORK: 'physnet1',
+                     api.SEGMENTATION_ID: 2}]
+        net_segments = self._create_segments(segments)
+        self._setup_neutron_network('bar-network-id')
+
+        networks_segments = ml2_db.get_networks_segments(
+            self.ctx.session, ['foo-network-id', 'bar-network-id'])
+
+        self.assertEqual({'foo-network-id': net_segments,
+                          'bar-network-id': []}, networks_segments)
+        self.assertEqual({}, ml2_db.get_networks_segments(self.ctx.session,
+                                                          []))
+
     def test_get_segment_by_id(self):
         segment = {api.NETWORK_TYPE: 'vlan',
                    api.PHYSICAL_NETWORK: 'physnet1',
@@ -552,6 +552,11 @@ class TestMl2DvrPortsV2(TestMl2PortsV2):
         plugin.delete_csnat_router_interface_ports(self.context, router)
 
 
+class TestMl2ListStatementCount(test_plugin.TestListStatementCount,
+                                Ml2PluginV2TestCase):
+    pass
+
+
 class TestMl2PortBinding(Ml2PluginV2TestCase,
                          test_bindings.PortBindingsTestCase):
     # Test case does not set binding:host_id, so ml2 does not attempt
@@ -173,6 +173,51 @@ class RpcCallbacksTestCase(base.BaseTestCase):
                          self.callbacks.update_device_down(
                              'fake_context', device='fake_device'))
 
+    def test_update_device_list(self):
+        devices_up = ['fake_device1', 'fake_device2']
+        devices_down = ['fake_device3']
+        kwargs = {'host': 'fake_host', 'agent_id': 'fake_agent_id'}
+        with contextlib.nested(
+            mock.patch.object(self.callbacks, '_update_device_up'),
+            mock.patch.object(self.callbacks, '_update_device_down',
+                              side_effect=lambda ctx, plugin, **kw: {
+                                  'device': kw['device'], 'exists': True})
+        ) as (update_up, update_down):
+            res = self.callbacks.update_device_list(
+                'fake_context', devices_up=devices_up,
+                devices_down=devices_down, **kwargs)
+        self.assertEqual(
+            {'devices_up': devices_up, 'failed_devices_up': [],
+             'devices_down': [{'device': 'fake_device3', 'exists': True}],
+             'failed_devices_down': []}, res)
+        update_up.assert_has_calls([
+            mock.call('fake_context', self.plugin, device=device, **kwargs)
+            for device in devices_up])
+        update_down.assert_called_once_with(
+            'fake_context', self.plugin, device='fake_device3', **kwargs)
+
+    def test_update_device_list_reports_failed_devices(self):
+        def update_device(ctx, plugin, **kwargs):
+            if kwargs['device'] in ('fake_device1', 'fake_device3'):
+                raise exceptions.PortNotFound(port_id=kwargs['device'])
+            return {'device': kwargs['device'], 'exists': True}
+
+        with contextlib.nested(
+            mock.patch.object(self.callbacks, '_update_device_up',
+                              side_effect=update_device),
+            mock.patch.object(self.callbacks, '_update_device_down',
+                              side_effect=update_device)
+        ):
+            res = self.callbacks.update_device_list(
+                'fake_context',
+                devices_up=['fake_device1', 'fake_device2'],
+                devices_down=['fake_device3', 'fake_device4'])
+        self.assertEqual(
+            {'devices_up': ['fake_device2'],
+             'failed_devices_up': ['fake_device1'],
+             'devices_down': [{'device': 'fake_device4', 'exists': True}],
+             'failed_devices_down': ['fake_device3']}, res)
+
 
 class RpcApiTestCase(base.BaseTestCase):
 
@@ -289,3 +334,13 @@ class RpcApiTestCase(base.BaseTestCase):
                            device='fake_device',
                            agent_id='fake_agent_id',
                            host='fake_host')
+
+    def test_update_device_list(self):
+        rpcapi = agent_rpc.PluginApi(topics.PLUGIN)
+        self._test_rpc_api(rpcapi, None,
+                           'update_device_list', rpc_method='call',
+                           devices_up=['fake_device1', 'fake_device2'],
+                           devices_down=['fake_device3', 'fake_device4'],
+                           agent_id='fake_agent_id',
+                           host='fake_host',
+                           version='1.5')
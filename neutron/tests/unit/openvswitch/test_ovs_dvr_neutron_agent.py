@@ -92,6 +92,10 @@ class TestOvsDvrNeutronAgent(base.BaseTestCase):
             self.agent.tun_br = mock.Mock()
         self.agent.sg_agent = mock.Mock()
 
+    def _devices_down_set(self, device):
+        return {'devices_down': [{'device': device, 'exists': True}],
+                'failed_devices_down': []}
+
     def _setup_for_dvr_test(self, ofport=10):
         self._port = mock.Mock()
         self._port.ofport = ofport
@@ -477,8 +481,9 @@ class TestOvsDvrNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                              return_value=None),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value=self._devices_down_set(
+                                  self._port.vif_id)),
             mock.patch.object(self.agent.dvr_agent.int_br, 'delete_flows'),
             mock.patch.object(self.agent.dvr_agent.tun_br,
                               'delete_flows')) as (reclaim_vlan_fn,
@@ -564,8 +569,9 @@ class TestOvsDvrNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                              return_value=None),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value=self._devices_down_set(
+                                  self._compute_port.vif_id)),
             mock.patch.object(self.agent.dvr_agent.int_br,
                               'delete_flows')) as (reclaim_vlan_fn,
                                                    update_dev_down_fn,
@@ -635,8 +641,9 @@ class TestOvsDvrNeutronAgent(base.BaseTestCase):
 
         with contextlib.nested(
             mock.patch.object(self.agent, 'reclaim_local_vlan'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                              return_value=None),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value=self._devices_down_set(
+                                  self._port.vif_id)),
             mock.patch.object(self.agent.dvr_agent.int_br,
                               'delete_flows')) as (reclaim_vlan_fn,
                                                    update_dev_down_fn,
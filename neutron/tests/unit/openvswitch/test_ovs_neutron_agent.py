@@ -285,6 +285,84 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                 vif_port_set, registered_ports, port_tags_dict=port_tags_dict)
         self.assertEqual(expected, actual)
 
+    def _vif_event(self, name, port_id, ofport=1):
+        return {'name': name, 'ofport': ofport,
+                'external_ids': {'iface-id': port_id,
+                                 'attached-mac': 'ca:fe:de:ad:be:ef'}}
+
+    def test_process_ports_events(self):
+        events = {'added': [self._vif_event('tap3', 3),
+                            self._vif_event('tap4', 4, ofport=[]),
+                            self._vif_event('qg-5', 5)],
+                  'removed': [self._vif_event('tap2', 2)],
+                  'modified': [self._vif_event('tap1', 1, ofport=7)]}
+        with mock.patch.object(self.agent.int_br, 'get_port_name_list',
+                               return_value=['tap1', 'tap3', 'tap4']):
+            actual = self.agent.process_ports_events(events, set([1, 2]))
+        self.assertEqual(dict(current=set([1, 3]), added=set([3]),
+                              removed=set([2]), updated=set([1])), actual)
+
+    def test_process_ports_events_port_no_longer_vif(self):
+        events = {'added': [], 'removed': [],
+                  'modified': [self._vif_event('tap1', 1, ofport=-1)]}
+        with mock.patch.object(self.agent.int_br,
+                               'get_port_name_list') as get_names:
+            actual = self.agent.process_ports_events(events, set([1, 2]),
+                                                     set([1]))
+        self.assertEqual(dict(current=set([2]), added=set(),
+                              removed=set([1])), actual)
+        self.assertFalse(get_names.called)
+
+    def test_process_ports_events_needs_xapi(self):
+        events = {'added': [{'name': 'tap1', 'ofport': 1,
+                             'external_ids': {'xs-vif-uuid': 'x',
+                                              'attached-mac': 'm'}}],
+                  'removed': [], 'modified': []}
+        self.assertIsNone(self.agent.process_ports_events(events, set()))
+
+    def _test_get_port_info(self, events, full_scan=False):
+        polling_manager = mock.Mock()
+        polling_manager.get_events.return_value = events
+        with contextlib.nested(
+            mock.patch.object(self.agent, 'scan_ports',
+                              return_value={'current': set([1])}),
+            mock.patch.object(self.agent, 'process_ports_events',
+                              return_value={'current': set([2])})
+        ) as (scan_ports, process_ports_events):
+            port_info = self.agent.get_port_info(
+                polling_manager, set(), set(), full_scan=full_scan)
+        return port_info, scan_ports, process_ports_events
+
+    def test_get_port_info_from_events(self):
+        self.agent.last_port_audit = 1
+        port_info, scan_ports, _process = self._test_get_port_info(
+            {'added': [], 'removed': [], 'modified': []})
+        self.assertEqual({'current': set([2])}, port_info)
+        self.assertFalse(scan_ports.called)
+        self.assertEqual(1, self.agent.last_port_audit)
+
+    def test_get_port_info_scans_without_events(self):
+        port_info, _scan, process_ports_events = self._test_get_port_info(
+            None)
+        self.assertEqual({'current': set([1])}, port_info)
+        self.assertFalse(process_ports_events.called)
+        self.assertIsNotNone(self.agent.last_port_audit)
+
+    def test_get_port_info_full_scan_consumes_events(self):
+        port_info, _scan, process_ports_events = self._test_get_port_info(
+            {'added': [], 'removed': [], 'modified': []}, full_scan=True)
+        self.assertEqual({'current': set([1])}, port_info)
+        self.assertFalse(process_ports_events.called)
+
+    def test_is_port_audit_due(self):
+        self.agent.port_audit_interval = 300
+        self.assertTrue(self.agent._is_port_audit_due())
+        self.agent.last_port_audit = time.time()
+        self.assertFalse(self.agent._is_port_audit_due())
+        self.agent.port_audit_interval = 0
+        self.agent.last_port_audit = None
+        self.assertFalse(self.agent._is_port_audit_due())
+
     def test_treat_devices_added_returns_raises_for_missing_device(self):
         with contextlib.nested(
             mock.patch.object(self.agent.plugin_rpc,
@@ -310,10 +388,11 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                               return_value=[details]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=port),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value={'failed_devices_up': [],
+                                            'failed_devices_down': []}),
             mock.patch.object(self.agent, func_name)
-        ) as (get_dev_fn, get_vif_func, upd_dev_up, upd_dev_down, func):
+        ) as (get_dev_fn, get_vif_func, upd_dev_list, func):
             skip_devs = self.agent.treat_devices_added_or_updated([{}], False)
             # The function should not raise
             self.assertFalse(skip_devs)
@@ -354,18 +433,15 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                               return_value=[dev_mock]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=None),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list'),
             mock.patch.object(self.agent, 'treat_vif_port')
-        ) as (get_dev_fn, get_vif_func, upd_dev_up,
-              upd_dev_down, treat_vif_port):
+        ) as (get_dev_fn, get_vif_func, upd_dev_list, treat_vif_port):
             skip_devs = self.agent.treat_devices_added_or_updated([{}], False)
             # The function should return False for resync and no device
             # processed
             self.assertEqual(['the_skipped_one'], skip_devs)
             self.assertFalse(treat_vif_port.called)
-            self.assertFalse(upd_dev_down.called)
-            self.assertFalse(upd_dev_up.called)
+            self.assertFalse(upd_dev_list.called)
 
     def test_treat_devices_added_updated_put_port_down(self):
         fake_details_dict = {'admin_state_up': False,
@@ -386,28 +462,103 @@ class TestOvsNeutronAgent(base.BaseTestCase):
                               return_value=[fake_details_dict]),
             mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
                               return_value=mock.MagicMock()),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_up'),
-            mock.patch.object(self.agent.plugin_rpc, 'update_device_down'),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value={'failed_devices_up': [],
+                                            'failed_devices_down': []}),
             mock.patch.object(self.agent, 'treat_vif_port')
-        ) as (get_dev_fn, get_vif_func, upd_dev_up,
-              upd_dev_down, treat_vif_port):
+        ) as (get_dev_fn, get_vif_func, upd_dev_list, treat_vif_port):
             skip_devs = self.agent.treat_devices_added_or_updated([{}], False)
             # The function should return False for resync
             self.assertFalse(skip_devs)
             self.assertTrue(treat_vif_port.called)
-            self.assertTrue(upd_dev_down.called)
+            upd_dev_list.assert_called_once_with(
+                self.agent.context, [], ['xxx'], self.agent.agent_id,
+                cfg.CONF.host)
+
+    def test_treat_devices_added_updated_reports_all_devices_at_once(self):
+        details = [{'admin_state_up': state,
+                    'port_id': device,
+                    'device': device,
+                    'network_id': 'yyy',
+                    'physical_network': 'foo',
+                    'segmentation_id': 'bar',
+                    'network_type': 'baz',
+                    'fixed_ips': [],
+                    'device_owner': 'compute:None'}
+                   for device, state in (('dev1', True), ('dev2', False),
+                                         ('dev3', True))]
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=details),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
+                              return_value=mock.MagicMock()),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value={'failed_devices_up': [],
+                                            'failed_devices_down': []}),
+            mock.patch.object(self.agent, 'treat_vif_port')
+        ) as (get_dev_fn, get_vif_func, upd_dev_list, treat_vif_port):
+            self.agent.treat_devices_added_or_updated(
+                ['dev1', 'dev2', 'dev3'], False)
+        upd_dev_list.assert_called_once_with(
+            self.agent.context, ['dev1', 'dev3'], ['dev2'],
+            self.agent.agent_id, cfg.CONF.host)
+
+    def test_treat_devices_added_updated_raises_on_failed_devices(self):
+        details = {'admin_state_up': True,
+                   'port_id': 'xxx',
+                   'device': 'xxx',
+                   'network_id': 'yyy',
+                   'physical_network': 'foo',
+                   'segmentation_id': 'bar',
+                   'network_type': 'baz',
+                   'fixed_ips': [],
+                   'device_owner': 'compute:None'}
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc,
+                              'get_devices_details_list',
+                              return_value=[details]),
+            mock.patch.object(self.agent.int_br, 'get_vif_port_by_id',
+                              return_value=mock.MagicMock()),
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value={'failed_devices_up': ['xxx'],
+                                            'failed_devices_down': []}),
+            mock.patch.object(self.agent, 'treat_vif_port')
+        ):
+            self.assertRaises(ovs_neutron_agent.DeviceListRetrievalError,
+                              self.agent.treat_devices_added_or_updated,
+                              ['xxx'], False)
 
     def test_treat_devices_removed_returns_true_for_missing_device(self):
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
+        with mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
                                side_effect=Exception()):
             self.assertTrue(self.agent.treat_devices_removed([{}]))
 
+    def test_treat_devices_removed_returns_true_for_failed_device(self):
+        devices_set = {'devices_down': [{'device': 'dev1', 'exists': True}],
+                       'failed_devices_down': ['dev2']}
+        with contextlib.nested(
+            mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                              return_value=devices_set),
+            mock.patch.object(self.agent, 'port_unbound')
+        ) as (upd_dev_list, port_unbound):
+            self.assertTrue(self.agent.treat_devices_removed(['dev1',
+                                                              'dev2']))
+        port_unbound.assert_called_once_with('dev1')
+
+    def test_treat_devices_removed_no_devices(self):
+        with mock.patch.object(self.agent.plugin_rpc,
+                               'update_device_list') as upd_dev_list:
+            self.assertFalse(self.agent.treat_devices_removed(set()))
+        self.assertFalse(upd_dev_list.called)
+
     def _mock_treat_devices_removed(self, port_exists):
-        details = dict(exists=port_exists)
-        with mock.patch.object(self.agent.plugin_rpc, 'update_device_down',
-                               return_value=details):
+        details = dict(device='dev1', exists=port_exists)
+        devices_set = {'devices_down': [details], 'failed_devices_down': []}
+        with mock.patch.object(self.agent.plugin_rpc, 'update_device_list',
+                               return_value=devices_set):
             with mock.patch.object(self.agent, 'port_unbound') as port_unbound:
-                self.assertFalse(self.agent.treat_devices_removed([{}]))
+                self.assertFalse(self.agent.treat_devices_removed(['dev1']))
         self.assertTrue(port_unbound.called)
 
     def test_treat_devices_removed_unbinds_port(self):
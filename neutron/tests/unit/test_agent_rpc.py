@@ -70,6 +70,39 @@ class AgentRPCPluginApi(base.BaseTestCase):
     def test_update_device_down(self):
         self._test_rpc_call('update_device_down')
 
+    def test_update_device_list_unsupported(self):
+        agent = rpc.PluginApi('fake_topic')
+        ctxt = oslo_context.RequestContext('fake_user', 'fake_project')
+        with contextlib.nested(
+            mock.patch.object(agent.client, 'call'),
+            mock.patch.object(agent.client, 'prepare'),
+        ) as (
+            mock_call, mock_prepare
+        ):
+            mock_prepare.return_value = agent.client
+            mock_call.side_effect = [
+                oslo_messaging.UnsupportedVersion('1.5'),
+                None, Exception(),
+                {'device': 'fake_device3', 'exists': True}, Exception()]
+            actual_val = agent.update_device_list(
+                ctxt, ['fake_device1', 'fake_device2'],
+                ['fake_device3', 'fake_device4'], 'fake_agent_id',
+                'fake_host')
+        self.assertEqual(
+            {'devices_up': ['fake_device1'],
+             'failed_devices_up': ['fake_device2'],
+             'devices_down': [{'device': 'fake_device3', 'exists': True}],
+             'failed_devices_down': ['fake_device4']}, actual_val)
+        mock_call.assert_has_calls([
+            mock.call(ctxt, 'update_device_up', device='fake_device1',
+                      agent_id='fake_agent_id', host='fake_host'),
+            mock.call(ctxt, 'update_device_up', device='fake_device2',
+                      agent_id='fake_agent_id', host='fake_host'),
+            mock.call(ctxt, 'update_device_down', device='fake_device3',
+                      agent_id='fake_agent_id', host='fake_host'),
+            mock.call(ctxt, 'update_device_down', device='fake_device4',
+                      agent_id='fake_agent_id', host='fake_host')])
+
     def test_tunnel_sync(self):
         self._test_rpc_call('tunnel_sync')
 
@@ -279,6 +279,19 @@ class ResourceTestCase(base.BaseTestCase):
         res = resource.get('', extra_environ=environ)
         self.assertEqual(res.status_int, 200)
 
+    def test_status_200_without_parent_lookup(self):
+        controller = mock.MagicMock()
+        controller.test = lambda request: {'foo': 'bar'}
+
+        resource = webtest.TestApp(wsgi_resource.Resource(controller))
+
+        ctxt = context.Context('fake_user', 'fake_tenant')
+        environ = {'wsgiorg.routing_args': (None, {'action': 'test'}),
+                   'neutron.context': ctxt}
+        res = resource.get('', extra_environ=environ)
+        self.assertEqual(res.status_int, 200)
+        self.assertIsNone(ctxt._parent_lookup)
+
     def test_status_204(self):
         controller = mock.MagicMock()
         controller.test = lambda request: {'foo': 'bar'}
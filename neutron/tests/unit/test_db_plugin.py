@@ -17,9 +17,11 @@ import contextlib
 import copy
 import itertools
 
+import eventlet
 import mock
 from oslo_config import cfg
 from oslo_utils import importutils
+from sqlalchemy import event
 from testtools import matchers
 import webob.exc
 
@@ -34,6 +36,7 @@ from neutron.common import ipv6_utils
 from neutron.common import test_lib
 from neutron.common import utils
 from neutron import context
+from neutron.db import api as db_api
 from neutron.db import db_base_plugin_v2
 from neutron.db import models_v2
 from neutron import manager
@@ -4233,6 +4236,110 @@ class TestSubnetsV2(NeutronDbPluginV2TestCase):
                          expected_code=webob.exc.HTTPConflict.code)
 
 
+def get_sql_statements(func, *args, **kwargs):
+    """Return the result of calling func and the SQL statements it ran."""
+    statements = []
+    current = eventlet.getcurrent()
+
+    def record_statement(conn, cursor, statement, *args):
+        # Leave out the statements of the threads left running by other
+        # tests
+        if eventlet.getcurrent() is current:
+            statements.append(statement)
+
+    engine = db_api.get_engine()
+    event.listen(engine, 'before_cursor_execute', record_statement)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record_statement)
+    return result, statements
+
+
+class TestProjectedListQueries(NeutronDbPluginV2TestCase):
+
+    def _get_statements(self, func, *args, **kwargs):
+        result, statements = get_sql_statements(func, *args, **kwargs)
+        return result, ' '.join(statements)
+
+    def test_get_ports_with_fields(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.port(device_id='vm') as port:
+            ports, statements = self._get_statements(
+                plugin.get_ports, ctx, fields=['id', 'device_id'])
+        self.assertEqual([{'id': port['port']['id'], 'device_id': 'vm'}],
+                         ports)
+        self.assertNotIn('mac_address', statements)
+        self.assertNotIn('ipallocations', statements)
+
+    def test_get_ports_with_relationship_field(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.port() as port:
+            ports, statements = self._get_statements(
+                plugin.get_ports, ctx, fields=['fixed_ips'])
+        self.assertEqual([{'fixed_ips': port['port']['fixed_ips']}], ports)
+        self.assertNotIn('mac_address', statements)
+
+    def test_get_subnets_with_fields(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        with self.subnet(cidr='10.0.0.0/24') as subnet:
+            subnets, statements = self._get_statements(
+                plugin.get_subnets, ctx, fields=['cidr', 'host_routes'])
+            # The same session loads the whole rows later on
+            self.assertEqual(subnet['subnet']['allocation_pools'],
+                             plugin.get_subnets(ctx)[0]['allocation_pools'])
+        self.assertEqual([{'cidr': '10.0.0.0/24', 'host_routes': []}],
+                         subnets)
+        self.assertNotIn('ipallocationpools', statements)
+        self.assertNotIn('dnsnameservers', statements)
+        self.assertIn('subnetroutes', statements)
+
+    def test_dict_extend_functions_of_unrequested_fields_skipped(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        declared = mock.Mock()
+        undeclared = mock.Mock()
+        with contextlib.nested(
+            mock.patch.dict(plugin._dict_extend_functions,
+                            {attributes.NETWORKS: [declared, undeclared]}),
+            mock.patch.dict(plugin._dict_extend_fields,
+                            {(attributes.NETWORKS, declared): (
+                                frozenset(['foo']), frozenset())}),
+            self.network()
+        ):
+            declared.reset_mock()
+            undeclared.reset_mock()
+            networks = plugin.get_networks(ctx, fields=['name'])
+            self.assertEqual([{'name': 'net1'}], networks)
+            self.assertFalse(declared.called)
+            self.assertTrue(undeclared.called)
+            plugin.get_networks(ctx, fields=['name', 'foo'])
+            self.assertTrue(declared.called)
+
+
+class TestListStatementCount(NeutronDbPluginV2TestCase):
+
+    def _count_listing_statements(self):
+        plugin = manager.NeutronManager.get_plugin()
+        ctx = context.get_admin_context()
+        return dict((func.__name__, len(get_sql_statements(func, ctx)[1]))
+                    for func in (plugin.get_networks, plugin.get_subnets,
+                                 plugin.get_ports))
+
+    def test_listing_statements_do_not_grow_with_rows(self):
+        with self.subnet() as subnet:
+            with self.port(subnet=subnet):
+                counts = self._count_listing_statements()
+                with contextlib.nested(self.subnet(cidr='10.0.1.0/24'),
+                                       self.port(subnet=subnet),
+                                       self.port(subnet=subnet)):
+                    self.assertEqual(counts,
+                                     self._count_listing_statements())
+
+
 class DbModelTestCase(base.BaseTestCase):
     """DB model tests."""
     def test_repr(self):
@@ -269,6 +269,17 @@ class TestDhcpAgent(base.BaseTestCase):
                 mocks['sync_state'].assert_called_once_with()
                 mocks['periodic_resync'].assert_called_once_with()
 
+    def test_run_starts_periodic_reload(self):
+        cfg.CONF.set_override('reload_allocations_interval', 1)
+        with mock.patch(DEVICE_MANAGER):
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            attrs_to_mock = dict(
+                [(a, mock.DEFAULT) for a in
+                 ['sync_state', 'periodic_resync', 'periodic_reload']])
+            with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
+                dhcp.run()
+                mocks['periodic_reload'].assert_called_once_with()
+
     def test_call_driver(self):
         network = mock.Mock()
         network.id = '1'
@@ -317,31 +328,51 @@ class TestDhcpAgent(base.BaseTestCase):
             trace_level='warning',
             expected_sync=False)
 
-    def _test_sync_state_helper(self, known_networks, active_networks):
+    @staticmethod
+    def _make_network(network_id):
+        return dhcp.NetModel(True, dict(id=network_id, admin_state_up=True,
+                                        subnets=[], ports=[]))
+
+    def _test_sync_state_helper(self, known_networks, active_networks,
+                                only_nets=None, synced_networks=None):
         with mock.patch(DHCP_PLUGIN) as plug:
             mock_plugin = mock.Mock()
-            mock_plugin.get_active_networks_info.return_value = active_networks
+            mock_plugin.get_active_networks.return_value = active_networks
+            mock_plugin.get_networks_info.side_effect = (
+                lambda network_ids: [self._make_network(network_id)
+                                     for network_id in network_ids])
             plug.return_value = mock_plugin
 
             dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
 
             attrs_to_mock = dict(
                 [(a, mock.DEFAULT) for a in
-                 ['refresh_dhcp_helper', 'disable_dhcp_helper', 'cache']])
+                 ['safe_configure_dhcp_for_network', 'disable_dhcp_helper',
+                  'cache']])
 
             with mock.patch.multiple(dhcp, **attrs_to_mock) as mocks:
                 mocks['cache'].get_network_ids.return_value = known_networks
-                dhcp.sync_state()
+                dhcp.sync_state(only_nets)
 
-                exp_refresh = [
-                    mock.call(net_id) for net_id in active_networks]
+                if synced_networks is None:
+                    synced_networks = active_networks
+                exp_configure = [
+                    mock.call(self._make_network(net_id))
+                    for net_id in synced_networks]
 
                 diff = set(known_networks) - set(active_networks)
                 exp_disable = [mock.call(net_id) for net_id in diff]
 
                 mocks['cache'].assert_has_calls([mock.call.get_network_ids()])
-                mocks['refresh_dhcp_helper'].assert_has_called(exp_refresh)
-                mocks['disable_dhcp_helper'].assert_has_called(exp_disable)
+                mocks['safe_configure_dhcp_for_network'].assert_has_calls(
+                    exp_configure, any_order=True)
+                self.assertEqual(
+                    len(exp_configure),
+                    mocks['safe_configure_dhcp_for_network'].call_count)
+                mocks['disable_dhcp_helper'].assert_has_calls(exp_disable)
+                self.assertEqual(
+                    len(exp_disable), mocks['disable_dhcp_helper'].call_count)
+            return mock_plugin
 
     def test_sync_state_initial(self):
         self._test_sync_state_helper([], ['a'])
@@ -352,26 +383,52 @@ class TestDhcpAgent(base.BaseTestCase):
     def test_sync_state_disabled_net(self):
         self._test_sync_state_helper(['b'], ['a'])
 
+    def test_sync_state_only_nets(self):
+        self._test_sync_state_helper(['a', 'b'], ['a', 'b', 'c'],
+                                     only_nets=['b'],
+                                     synced_networks=['b', 'c'])
+
     def test_sync_state_waitall(self):
-        class mockNetwork(object):
-            id = '0'
-            admin_state_up = True
-            subnets = []
-
-            def __init__(self, id):
-                self.id = id
-        with mock.patch.object(dhcp_agent.eventlet.GreenPool, 'waitall') as w:
-            active_networks = [mockNetwork('1'), mockNetwork('2'),
-                               mockNetwork('3'), mockNetwork('4'),
-                               mockNetwork('5')]
+        waitall = eventlet.GreenPool.waitall
+        with mock.patch.object(dhcp_agent.eventlet.GreenPool, 'waitall',
+                               autospec=True, side_effect=waitall) as w:
+            active_networks = ['1', '2', '3', '4', '5']
             known_networks = ['1', '2', '3', '4', '5']
             self._test_sync_state_helper(known_networks, active_networks)
-            w.assert_called_once_with()
+            w.assert_called_once_with(mock.ANY)
+
+    def test_sync_state_fetches_networks_by_batches(self):
+        cfg.CONF.set_override('sync_batch_size', 2)
+        active_networks = ['1', '2', '3', '4', '5']
+        plugin = self._test_sync_state_helper([], active_networks)
+        plugin.get_networks_info.assert_has_calls(
+            [mock.call(['1', '2']), mock.call(['3', '4']), mock.call(['5'])])
+
+    def test_sync_batch_size_must_be_positive(self):
+        cfg.CONF.set_override('sync_batch_size', 0)
+        self.assertRaises(SystemExit, dhcp_agent.DhcpAgent, HOSTNAME)
+
+    def test_sync_networks_waits_for_spawned_threads_on_error(self):
+        cfg.CONF.set_override('sync_batch_size', 2)
+        with mock.patch(DHCP_PLUGIN) as plug:
+            mock_plugin = mock.Mock()
+            mock_plugin.get_networks_info.side_effect = [
+                [self._make_network('1'), self._make_network('2')],
+                RuntimeError()]
+            plug.return_value = mock_plugin
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch.object(
+                    dhcp, 'safe_configure_dhcp_for_network') as configure:
+                self.assertRaises(RuntimeError, dhcp._sync_networks,
+                                  ['1', '2', '3'])
+                # The networks of the first batch were configured before
+                # the failure got out of the sync
+                self.assertEqual(2, configure.call_count)
 
     def test_sync_state_plugin_error(self):
         with mock.patch(DHCP_PLUGIN) as plug:
             mock_plugin = mock.Mock()
-            mock_plugin.get_active_networks_info.side_effect = Exception
+            mock_plugin.get_active_networks.side_effect = Exception
             plug.return_value = mock_plugin
 
             with mock.patch.object(dhcp_agent.LOG, 'exception') as log:
@@ -383,12 +440,47 @@ class TestDhcpAgent(base.BaseTestCase):
                     self.assertTrue(log.called)
                     self.assertTrue(schedule_resync.called)
 
+    def test_sync_progress(self):
+        with contextlib.nested(
+            mock.patch.object(dhcp_agent.time, 'time',
+                              side_effect=[100.0, 110.0, 140.0, 150.0]),
+            mock.patch.object(dhcp_agent.LOG, 'info')
+        ) as (time, log):
+            progress = dhcp_agent.SyncProgress(10, 4)
+            progress.networks_done(0)
+            progress.networks_done(2)
+            self.assertFalse(log.called)
+            progress.networks_done(2)
+            # 40 seconds for 4 networks
+            self.assertEqual(60, progress.eta())
+            self.assertEqual(1, log.call_count)
+            progress.networks_done(6)
+            self.assertEqual(2, log.call_count)
+
     def test_periodic_resync(self):
         dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
         with mock.patch.object(dhcp_agent.eventlet, 'spawn') as spawn:
             dhcp.periodic_resync()
             spawn.assert_called_once_with(dhcp._periodic_resync_helper)
 
+    def test_periodic_reload(self):
+        dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+        with mock.patch.object(dhcp_agent.eventlet, 'spawn') as spawn:
+            dhcp.periodic_reload()
+            spawn.assert_called_once_with(dhcp._periodic_reload_helper)
+
+    def test_periodic_reload_helper(self):
+        cfg.CONF.set_override('reload_allocations_interval', 0.5)
+        with mock.patch.object(dhcp_agent.eventlet, 'sleep') as sleep:
+            dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
+            with mock.patch.object(dhcp,
+                                   'reload_dirty_networks') as reload_dirty:
+                reload_dirty.side_effect = RuntimeError
+                with testtools.ExpectedException(RuntimeError):
+                    dhcp._periodic_reload_helper()
+                reload_dirty.assert_called_once_with()
+                sleep.assert_called_once_with(0.5)
+
     def test_periodoc_resync_helper(self):
         with mock.patch.object(dhcp_agent.eventlet, 'sleep') as sleep:
             dhcp = dhcp_agent.DhcpAgent(HOSTNAME)
@@ -927,6 +1019,39 @@ class TestDhcpAgentEventHandler(base.BaseTestCase):
         self.call_driver.assert_has_calls(
             [mock.call.call_driver('reload_allocations', fake_network)])
 
+    def test_port_update_end_coalesced(self):
+        cfg.CONF.set_override('reload_allocations_interval', 1)
+        payload = dict(port=fake_port2)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.dhcp.port_update_end(None, payload)
+        self.cache.assert_has_calls(
+            [mock.call.put_port(mock.ANY),
+             mock.call.mark_dirty(fake_network.id)])
+        self.assertFalse(self.call_driver.called)
+
+    def test_port_delete_end_coalesced(self):
+        cfg.CONF.set_override('reload_allocations_interval', 1)
+        payload = dict(port_id=fake_port2.id)
+        self.cache.get_network_by_id.return_value = fake_network
+        self.cache.get_port_by_id.return_value = fake_port2
+        self.dhcp.port_delete_end(None, payload)
+        self.cache.assert_has_calls(
+            [mock.call.remove_port(fake_port2),
+             mock.call.mark_dirty(fake_network.id)])
+        self.assertFalse(self.call_driver.called)
+
+    def test_reload_dirty_networks(self):
+        self.cache.pop_dirty_networks.return_value = {fake_network.id: 3,
+                                                      'deleted-net': 1}
+        self.cache.get_network_by_id.side_effect = (
+            lambda network_id: {fake_network.id: fake_network}.get(
+                network_id))
+        self.dhcp.reload_dirty_networks()
+        self.call_driver.assert_called_once_with('reload_allocations',
+                                                 fake_network)
+        self.assertEqual({'reloads': 1, 'events': 3},
+                         self.dhcp.reload_stats)
+
     def test_port_delete_end_unknown_port(self):
         payload = dict(port_id='unknown')
         self.cache.get_port_by_id.return_value = None
@@ -970,6 +1095,28 @@ class TestDhcpPluginApiProxy(base.BaseTestCase):
         self._test_dhcp_api('get_network_info', network_id='fake_id',
                             return_value=None)
 
+    def test_get_active_networks(self):
+        self._test_dhcp_api('get_active_networks')
+
+    def test_get_networks_info(self):
+        self._test_dhcp_api('get_networks_info', network_ids=['fake_id'],
+                            version='1.2')
+
+    def test_get_networks_info_unsupported(self):
+        proxy = dhcp_agent.DhcpPluginApi('foo', {}, None)
+        with contextlib.nested(
+            mock.patch.object(proxy.client, 'call'),
+            mock.patch.object(proxy.client, 'prepare'),
+            mock.patch.object(proxy, 'get_network_info')
+        ) as (rpc_mock, prepare_mock, get_network_info):
+            prepare_mock.return_value = proxy.client
+            rpc_mock.side_effect = oslo_messaging.UnsupportedVersion('1.2')
+            get_network_info.side_effect = [fake_network, None]
+            self.assertEqual([fake_network],
+                             proxy.get_networks_info(['a', 'b']))
+            get_network_info.assert_has_calls([mock.call('a'),
+                                               mock.call('b')])
+
     def test_get_dhcp_port(self):
         self._test_dhcp_api('get_dhcp_port', network_id='fake_id',
                             device_id='fake_id_2', return_value=None)
@@ -1100,6 +1247,16 @@ class TestNetworkCache(base.BaseTestCase):
         nc.put(fake_network)
         self.assertEqual(nc.get_port_by_id(fake_port1.id), fake_port1)
 
+    def test_dirty_networks(self):
+        nc = dhcp_agent.NetworkCache()
+        nc.put(fake_network)
+        nc.mark_dirty(fake_network.id)
+        nc.mark_dirty(fake_network.id)
+        # Updating the cached network keeps it dirty
+        nc.put(fake_network)
+        self.assertEqual({fake_network.id: 2}, nc.pop_dirty_networks())
+        self.assertEqual({}, nc.pop_dirty_networks())
+
 
 class FakePort1(object):
     id = 'eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee'
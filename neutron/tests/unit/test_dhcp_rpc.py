@@ -69,6 +69,32 @@ class TestDhcpRpcCallback(base.BaseTestCase):
                     {'id': 'b', 'subnets': [subnet], 'ports': []}]
         self.assertEqual(expected, networks)
 
+    def test_get_networks_info(self):
+        self.plugin.get_networks.return_value = [{'id': 'a'}, {'id': 'b'}]
+        port = {'network_id': 'a'}
+        subnet = {'network_id': 'b'}
+        self.plugin.get_ports.return_value = [port]
+        self.plugin.get_subnets.return_value = [subnet]
+        networks = self.callbacks.get_networks_info(
+            mock.Mock(), network_ids=['a', 'b', 'c'], host='host')
+        expected = [{'id': 'a', 'subnets': [], 'ports': [port]},
+                    {'id': 'b', 'subnets': [subnet], 'ports': []}]
+        self.assertEqual(expected, networks)
+        self.plugin.assert_has_calls([
+            mock.call.get_networks(mock.ANY,
+                                   filters={'id': ['a', 'b', 'c']}),
+            mock.call.get_ports(mock.ANY,
+                                filters={'network_id': ['a', 'b']}),
+            mock.call.get_subnets(mock.ANY,
+                                  filters={'network_id': ['a', 'b']})])
+
+    def test_get_networks_info_no_networks(self):
+        self.assertEqual([], self.callbacks.get_networks_info(
+            mock.Mock(), network_ids=[], host='host'))
+        self.assertFalse(self.plugin.get_networks.called)
+        self.assertEqual([], self.callbacks.get_networks_info(
+            mock.Mock(), host='host'))
+
     def _test__port_action_with_failures(self, exc=None, action=None):
         port = {
             'network_id': 'foo_network_id',
@@ -1525,6 +1525,8 @@ class IptablesFirewallEnhancedIpsetTestCase(BaseIptablesFirewallTestCase):
             mock.call.set_exists('fake_sgid', 'IPv4'),
             mock.call.get_name('fake_sgid', 'IPv6'),
             mock.call.set_exists('fake_sgid', 'IPv6'),
+            mock.call.defer_apply_on(),
+            mock.call.defer_apply_off(),
             mock.call.destroy('fake_sgid', 'IPv4'),
             mock.call.destroy('fake_sgid', 'IPv6')]
 
@@ -1586,3 +1588,257 @@ class IptablesFirewallEnhancedIpsetTestCase(BaseIptablesFirewallTestCase):
                          [dict(rule.items() +
                                [('source_ip_prefix', '%s/32' % ip)])
                           for ip in other_ips])
+
+    def test_update_security_group_members_delta(self):
+        self.firewall.sg_members = {'fake_sgid': {
+            'IPv4': ['10.0.0.1', '10.0.0.2'], 'IPv6': ['fe80::1']}}
+        self.assertTrue(self.firewall.update_security_group_members_delta(
+            'fake_sgid', {'IPv4': ['10.0.0.3'], 'IPv6': []},
+            {'IPv4': ['10.0.0.1'], 'IPv6': []}))
+        self.assertEqual({'IPv4': ['10.0.0.2', '10.0.0.3'],
+                          'IPv6': ['fe80::1']},
+                         self.firewall.sg_members['fake_sgid'])
+        self.firewall.ipset.assert_has_calls([
+            mock.call.add_members('fake_sgid', 'IPv4', ['10.0.0.3']),
+            mock.call.del_members('fake_sgid', 'IPv4', ['10.0.0.1'])])
+
+    def test_update_security_group_members_delta_without_ipset(self):
+        # The rules referring to a group without members yet are missing
+        self.firewall.ipset.set_exists.return_value = False
+        self.assertFalse(self.firewall.update_security_group_members_delta(
+            'fake_sgid', {'IPv4': ['10.0.0.3']}, {}))
+        self.firewall.enable_ipset = False
+        self.firewall.ipset.set_exists.return_value = True
+        self.assertFalse(self.firewall.update_security_group_members_delta(
+            'fake_sgid', {'IPv4': ['10.0.0.3']}, {}))
+        self.assertFalse(self.firewall.ipset.add_members.called)
+
+
+class IptablesFirewallSharedChainsTestCase(BaseIptablesFirewallTestCase):
+    def setUp(self):
+        super(IptablesFirewallSharedChainsTestCase, self).setUp()
+        cfg.CONF.set_override('shared_sg_chains', True, 'SECURITYGROUP')
+        self.firewall = iptables_firewall.IptablesFirewallDriver()
+        self.firewall.iptables = self.iptables_inst
+        self.firewall.ipset = mock.Mock()
+        self.firewall.ipset.get_name.side_effect = (
+            ipset_manager.IpsetManager.get_name)
+        self.firewall.ipset.set_exists.return_value = True
+        self.firewall.sg_rules = {FAKE_SGID: [
+            {'direction': 'ingress', 'ethertype': 'IPv4',
+             'protocol': 'tcp', 'port_range_min': 22, 'port_range_max': 22},
+            {'direction': 'ingress', 'ethertype': 'IPv4',
+             'remote_group_id': FAKE_SGID},
+            {'direction': 'egress', 'ethertype': 'IPv4'}]}
+        self.firewall.sg_members = {FAKE_SGID: {'IPv4': ['10.0.0.2']}}
+
+    def _fake_port(self, device='tapfake_dev'):
+        return {'device': device,
+                'mac_address': 'ff:ff:ff:ff:ff:ff',
+                'fixed_ips': [FAKE_IP['IPv4']],
+                'security_groups': [FAKE_SGID],
+                'security_group_rules': [
+                    {'direction': 'ingress', 'ethertype': 'IPv4',
+                     'protocol': 'udp', 'port_range_min': 68,
+                     'port_range_max': 68, 'source_ip_prefix': '10.0.0.3'}]}
+
+    def _chain_rules(self, chain_name):
+        return [c[1][1] for c in self.v4filter_inst.add_rule.mock_calls
+                if c[1][0] == chain_name]
+
+    def test_prepare_port_filter(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        sg_chain = self.firewall._sg_chain_name([FAKE_SGID], 'ingress')
+        self.assertEqual(
+            ['-p tcp -m tcp --dport 22 -j RETURN',
+             '-m set --match-set IPv4fake_sgid src -j RETURN',
+             '-j $sg-fallback'],
+            self._chain_rules(sg_chain))
+        self.assertEqual(
+            ['-m state --state INVALID -j DROP',
+             '-m state --state RELATED,ESTABLISHED -j RETURN',
+             '-s 10.0.0.3 -p udp -m udp --dport 68 -j RETURN',
+             '-j $%s' % sg_chain],
+            self._chain_rules('ifake_dev'))
+        self.firewall.ipset.set_members.assert_called_once_with(
+            FAKE_SGID, 'IPv4', ['10.0.0.2'])
+
+    def test_ports_share_security_group_chain(self):
+        self.firewall.filter_defer_apply_on()
+        self.firewall.prepare_port_filter(self._fake_port('tapfake_dev1'))
+        self.firewall.prepare_port_filter(self._fake_port('tapfake_dev2'))
+        self.firewall.filter_defer_apply_off()
+        sg_chain = self.firewall._sg_chain_name([FAKE_SGID], 'ingress')
+        self.assertEqual(3, len(self._chain_rules(sg_chain)))
+        for port_chain in ('ifake_dev1', 'ifake_dev2'):
+            self.assertEqual('-j $%s' % sg_chain,
+                             self._chain_rules(port_chain)[-1])
+
+    def test_remove_port_filter_removes_chains(self):
+        port = self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.firewall.remove_port_filter(port)
+        for direction in ('ingress', 'egress'):
+            self.v4filter_inst.remove_chain.assert_any_call(
+                self.firewall._sg_chain_name([FAKE_SGID], direction))
+        self.assertEqual(set(), self.firewall.sg_chains)
+
+    def test_rule_count_scales_with_groups_and_ports(self):
+        self.firewall.sg_rules[FAKE_SGID] += [
+            {'direction': 'ingress', 'ethertype': 'IPv4', 'protocol': 'tcp',
+             'port_range_min': port, 'port_range_max': port}
+            for port in range(1000, 1050)]
+
+        def count_rules(shared_sg_chains):
+            self.firewall.shared_sg_chains = shared_sg_chains
+            self.firewall.filtered_ports = {}
+            self.v4filter_inst.reset_mock()
+            self.firewall.filter_defer_apply_on()
+            for i in range(30):
+                self.firewall.prepare_port_filter(
+                    self._fake_port('tapfake_dev%d' % i))
+            self.firewall.filter_defer_apply_off()
+            return self.v4filter_inst.add_rule.call_count
+
+        shared_count = count_rules(True)
+        # the rules of the group are set up once instead of for each port
+        self.assertGreater(count_rules(False), shared_count + 29 * 50)
+        # the shared chains and a constant number of rules per port
+        self.assertLess(shared_count, 60 + 30 * 20)
+
+
+class IptablesFirewallConntrackTestCase(BaseIptablesFirewallTestCase):
+    def setUp(self):
+        super(IptablesFirewallConntrackTestCase, self).setUp()
+        cfg.CONF.set_override('flush_conntrack', True, 'SECURITYGROUP')
+        self.v4raw_inst = mock.Mock()
+        self.iptables_inst.ipv4['raw'] = self.v4raw_inst
+        self.firewall = self._create_firewall(
+            iptables_firewall.IptablesFirewallDriver)
+
+    def _create_firewall(self, driver_class):
+        firewall = driver_class()
+        firewall.iptables = self.iptables_inst
+        firewall.ipset = mock.Mock()
+        firewall.ipset.get_name.side_effect = (
+            ipset_manager.IpsetManager.get_name)
+        firewall.ipset.set_exists.return_value = True
+        firewall.sg_rules = {FAKE_SGID: [
+            {'direction': 'ingress', 'ethertype': 'IPv4',
+             'protocol': 'tcp', 'port_range_min': 22, 'port_range_max': 22},
+            {'direction': 'ingress', 'ethertype': 'IPv4',
+             'remote_group_id': FAKE_SGID},
+            {'direction': 'egress', 'ethertype': 'IPv6',
+             'protocol': 'icmp', 'dest_ip_prefix': 'fe80::2/128'}]}
+        firewall.sg_members = {FAKE_SGID: {'IPv4': ['10.0.0.2',
+                                                    '10.0.0.3']}}
+        return firewall
+
+    def _fake_port(self, device='tapfake_dev'):
+        return {'device': device,
+                'network_id': 'fake_net',
+                'mac_address': 'ff:ff:ff:ff:ff:ff',
+                'fixed_ips': [FAKE_IP['IPv4'], FAKE_IP['IPv6']],
+                'security_groups': [FAKE_SGID]}
+
+    def _conntrack_calls(self):
+        return [c[1][0] for c in self.utils_exec.mock_calls
+                if c[1] and c[1][0][0] == 'conntrack']
+
+    def _update_rules(self, rules, port=None):
+        port = port or self._fake_port()
+        self.firewall.prepare_port_filter(port)
+        self.firewall.filter_defer_apply_on()
+        self.firewall.update_security_group_rules(FAKE_SGID, rules)
+        self.firewall.update_port_filter(port)
+        self.firewall.filter_defer_apply_off()
+
+    def test_rule_removal_deletes_flows(self):
+        rules = self.firewall.sg_rules[FAKE_SGID]
+        self._update_rules(rules[1:2])
+        self.assertEqual(
+            [['conntrack', '-D', '-f', 'ipv4', '-p', 'tcp',
+              '-d', '10.0.0.1', '--dport', '22'],
+             ['conntrack', '-D', '-f', 'ipv6', '-p', 'icmpv6',
+              '-s', 'fe80::1', '-d', 'fe80::2']],
+            self._conntrack_calls())
+
+    def test_remote_group_rule_removal_deletes_member_flows(self):
+        rules = self.firewall.sg_rules[FAKE_SGID]
+        self._update_rules([rules[0], rules[2]])
+        self.assertEqual(
+            [['conntrack', '-D', '-f', 'ipv4',
+              '-s', '10.0.0.2', '-d', '10.0.0.1'],
+             ['conntrack', '-D', '-f', 'ipv4',
+              '-s', '10.0.0.3', '-d', '10.0.0.1']],
+            self._conntrack_calls())
+
+    def test_unchanged_rules_delete_no_flows(self):
+        self._update_rules(list(self.firewall.sg_rules[FAKE_SGID]))
+        self.assertEqual([], self._conntrack_calls())
+
+    def test_rule_removal_without_flush_conntrack(self):
+        self.firewall.flush_conntrack = False
+        self._update_rules([])
+        self.assertEqual([], self._conntrack_calls())
+
+    def test_member_removal_deletes_flows(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.firewall.filter_defer_apply_on()
+        self.firewall.update_security_group_members(
+            FAKE_SGID, {'IPv4': ['10.0.0.2']})
+        self.firewall.filter_defer_apply_off()
+        self.assertEqual(
+            [['conntrack', '-D', '-f', 'ipv4',
+              '-s', '10.0.0.3', '-d', '10.0.0.1']],
+            self._conntrack_calls())
+
+    def test_member_delta_removal_deletes_flows(self):
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.assertTrue(self.firewall.update_security_group_members_delta(
+            FAKE_SGID, {'IPv4': ['10.0.0.4']}, {'IPv4': ['10.0.0.3']}))
+        self.assertEqual(
+            [['conntrack', '-D', '-f', 'ipv4',
+              '-s', '10.0.0.3', '-d', '10.0.0.1']],
+            self._conntrack_calls())
+
+    def test_member_delta_of_one_ethertype_with_rules_for_both(self):
+        # Like the default security group, with a remote group rule for
+        # each ethertype
+        self.firewall.sg_rules[FAKE_SGID].append(
+            {'direction': 'ingress', 'ethertype': 'IPv6',
+             'remote_group_id': FAKE_SGID})
+        self.firewall.sg_members[FAKE_SGID]['IPv6'] = ['fe80::3']
+        self.firewall.prepare_port_filter(self._fake_port())
+        self.assertTrue(self.firewall.update_security_group_members_delta(
+            FAKE_SGID, {}, {'IPv4': ['10.0.0.3']}))
+        self.assertEqual(
+            [['conntrack', '-D', '-f', 'ipv4',
+              '-s', '10.0.0.3', '-d', '10.0.0.1']],
+            self._conntrack_calls())
+
+    def test_hybrid_driver_port_zones(self):
+        cfg.CONF.set_override('conntrack_zone', 'port', 'SECURITYGROUP')
+        self.firewall = self._create_firewall(
+            iptables_firewall.OVSHybridIptablesFirewallDriver)
+        self.firewall.prepare_port_filter(self._fake_port('fake_dev1'))
+        self.firewall.prepare_port_filter(self._fake_port('fake_dev2'))
+        self.v4raw_inst.add_rule.assert_has_calls(
+            [mock.call('PREROUTING', '-m physdev --physdev-in tapfake_dev2 '
+                       '-j CT --zone 2'),
+             mock.call('PREROUTING', '-m physdev --physdev-in qvbfake_dev2 '
+                       '-j CT --zone 2')])
+        self._update_rules([], self._fake_port('fake_dev2'))
+        self.assertIn(['conntrack', '-D', '-f', 'ipv4', '-p', 'tcp',
+                       '-d', '10.0.0.1', '--dport', '22', '-w', '2'],
+                      self._conntrack_calls())
+        self.firewall.remove_port_filter(self._fake_port('fake_dev1'))
+        self.assertEqual({'fake_dev2': 2}, self.firewall.ipconntrack.zones)
+
+    def test_hybrid_driver_network_zones(self):
+        cfg.CONF.set_override('conntrack_zone', 'network', 'SECURITYGROUP')
+        self.firewall = self._create_firewall(
+            iptables_firewall.OVSHybridIptablesFirewallDriver)
+        self.firewall.prepare_port_filter(self._fake_port('fake_dev1'))
+        self.firewall.prepare_port_filter(self._fake_port('fake_dev2'))
+        self.assertEqual({'fake_net': 1}, self.firewall.ipconntrack.zones)
@@ -15,9 +15,11 @@
 
 import os
 import sys
+import time
 
 import mock
 from oslo_config import cfg
+from testtools import content
 
 from neutron.agent.common import config as a_cfg
 from neutron.agent.linux import iptables_comments as ic
@@ -999,6 +1001,69 @@ class IptablesManagerStateFulTestCase(base.BaseTestCase):
         self.assertIsNone(ret_str)
 
 
+class IptablesManagerModifyRulesScalingTestCase(base.BaseTestCase):
+    """Check that the work of _modify_rules is linear in the rule count."""
+
+    def setUp(self):
+        super(IptablesManagerModifyRulesScalingTestCase, self).setUp()
+        cfg.CONF.register_opts(a_cfg.IPTABLES_OPTS, 'AGENT')
+        cfg.CONF.set_override('comment_iptables_rules', False, 'AGENT')
+        self.iptables = iptables_manager.IptablesManager(state_less=True)
+
+    def _make_table(self, rule_count, chain_size=20):
+        table = iptables_manager.IptablesTable(
+            binary_name=self.iptables.wrap_name)
+        for i in range(rule_count):
+            chain = 'c%d' % (i // chain_size)
+            if not i % chain_size:
+                table.add_chain(chain)
+                table.add_rule('FORWARD', '-j $%s' % chain, wrap=False)
+            table.add_rule(chain, '-s 10.%d.%d.%d -j RETURN' %
+                           (i >> 16 & 255, i >> 8 & 255, i & 255))
+        # What iptables-save returns after the rules were applied once
+        current_lines = self.iptables._modify_rules([], table, 'filter')
+        current_lines = [l.replace('[0:0]', '[1:100]')
+                         for l in current_lines]
+        return table, current_lines
+
+    def _count_entry_parsing(self, rule_count):
+        table, current_lines = self._make_table(rule_count)
+        with mock.patch.object(
+                iptables_manager, '_strip_packets_bytes',
+                side_effect=iptables_manager._strip_packets_bytes) as strip:
+            new_lines = self.iptables._modify_rules(current_lines, table,
+                                                    'filter')
+        self.assertEqual(current_lines, new_lines)
+        return strip.call_count, len(current_lines)
+
+    def test_modify_rules_parses_each_line_a_bounded_time(self):
+        for rule_count in (10, 200):
+            calls, line_count = self._count_entry_parsing(rule_count)
+            # Once when indexing the saved lines, once when filtering
+            # duplicates and removed entries
+            self.assertLessEqual(calls, 2 * line_count)
+
+    def _time_per_rule(self, rule_count, repeats=3):
+        table, current_lines = self._make_table(rule_count)
+        elapsed = []
+        for _i in range(repeats):
+            start = time.time()
+            self.iptables._modify_rules(current_lines, table, 'filter')
+            elapsed.append(time.time() - start)
+        return min(elapsed) / rule_count
+
+    def test_modify_rules_time_per_rule_stays_flat(self):
+        small = self._time_per_rule(1000)
+        large = self._time_per_rule(10000)
+        self.addDetail('time_per_rule_1k',
+                       content.text_content('%.2fus' % (small * 1e6)))
+        self.addDetail('time_per_rule_10k',
+                       content.text_content('%.2fus' % (large * 1e6)))
+        # A quadratic merge spends 10 times longer per rule on the larger
+        # table, leave room for the noise of a loaded node
+        self.assertLess(large, 4 * small)
+
+
 class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def setUp(self):
@@ -1012,3 +1077,142 @@ class IptablesManagerStateLessTestCase(base.BaseTestCase):
 
     def test_mangle_not_found(self):
         self.assertNotIn('mangle', self.iptables.ipv4)
+
+
+class IptablesManagerIncrementalTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(IptablesManagerIncrementalTestCase, self).setUp()
+        cfg.CONF.register_opts(a_cfg.IPTABLES_OPTS, 'AGENT')
+        cfg.CONF.set_override('comment_iptables_rules', False, 'AGENT')
+        cfg.CONF.set_override('iptables_incremental_apply', True, 'AGENT')
+        cfg.CONF.set_override('iptables_full_resync_interval', 0, 'AGENT')
+        self.iptables = iptables_manager.IptablesManager(state_less=True)
+        self.execute = mock.patch.object(self.iptables, "execute").start()
+        self.execute.return_value = ''
+        # The first apply is always a full one
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+    def _restore_calls(self):
+        return [c for c in self.execute.call_args_list
+                if 'iptables-restore' in c[0][0]]
+
+    def test_apply_without_changes_does_not_execute(self):
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_apply_only_writes_dirty_chains(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('filter', '-j DROP')
+        self.iptables.apply()
+
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '--noflush'],
+            process_input=('*filter\n'
+                           ':%(bn)s-filter - [0:0]\n'
+                           '-A %(bn)s-filter -j DROP\n'
+                           'COMMIT\n' % IPTABLES_ARG),
+            run_as_root=True)
+
+    def test_apply_deletes_removed_chains(self):
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.ipv4['filter'].add_rule('INPUT', '-j $filter')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        self.iptables.ipv4['filter'].remove_chain('filter')
+        self.iptables.apply()
+
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '--noflush'],
+            process_input=('*filter\n'
+                           ':%(bn)s-INPUT - [0:0]\n'
+                           ':%(bn)s-filter - [0:0]\n'
+                           '-X %(bn)s-filter\n'
+                           'COMMIT\n' % IPTABLES_ARG),
+            run_as_root=True)
+
+    def test_apply_edits_chains_in_place(self):
+        table = self.iptables.ipv4['filter']
+        table.add_chain('filter')
+        for i in range(4):
+            table.add_rule('filter', '-s 10.0.0.%d -j DROP' % i, tag=i)
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        table.clear_rules_by_tag(1)
+        table.add_rule('filter', '-s 10.0.0.4 -j DROP')
+        self.iptables.apply()
+
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '--noflush'],
+            process_input=('*filter\n'
+                           '-D %(bn)s-filter -s 10.0.0.1 -j DROP\n'
+                           '-A %(bn)s-filter -s 10.0.0.4 -j DROP\n'
+                           'COMMIT\n' % IPTABLES_ARG),
+            run_as_root=True)
+
+    def test_apply_rewrites_reordered_chains(self):
+        table = self.iptables.ipv4['filter']
+        table.add_chain('filter')
+        table.add_rule('filter', '-s 10.0.0.1 -j DROP', tag='first')
+        table.add_rule('filter', '-s 10.0.0.2 -j DROP')
+        self.iptables.apply()
+        self.execute.reset_mock()
+
+        table.clear_rules_by_tag('first')
+        table.add_rule('filter', '-s 10.0.0.1 -j DROP')
+        self.iptables.apply()
+
+        self.execute.assert_called_once_with(
+            ['iptables-restore', '--noflush'],
+            process_input=('*filter\n'
+                           ':%(bn)s-filter - [0:0]\n'
+                           '-A %(bn)s-filter -s 10.0.0.2 -j DROP\n'
+                           '-A %(bn)s-filter -s 10.0.0.1 -j DROP\n'
+                           'COMMIT\n' % IPTABLES_ARG),
+            run_as_root=True)
+
+    def test_unwrapped_change_triggers_full_resync(self):
+        self.iptables.ipv4['filter'].add_rule('FORWARD', '-j DROP',
+                                              wrap=False)
+        self.iptables.apply()
+
+        self.execute.assert_has_calls([
+            mock.call(['iptables-save', '-c'], run_as_root=True),
+            mock.call(['iptables-restore', '-c'], process_input=mock.ANY,
+                      run_as_root=True)])
+
+        self.execute.reset_mock()
+        self.iptables.apply()
+        self.assertFalse(self.execute.called)
+
+    def test_periodic_full_resync(self):
+        cfg.CONF.set_override('iptables_full_resync_interval', 60, 'AGENT')
+        with mock.patch('time.time') as time_mock:
+            time_mock.return_value = (self.iptables._last_full_resync + 30)
+            self.iptables.apply()
+            self.assertFalse(self.execute.called)
+
+            time_mock.return_value = (self.iptables._last_full_resync + 60)
+            self.iptables.apply()
+        self.assertEqual(2, self.execute.call_count)
+        self.assertEqual(1, len(self._restore_calls()))
+
+    def test_failed_incremental_apply_falls_back_to_full(self):
+        def restore_failer(args, **kwargs):
+            if '--noflush' in args:
+                raise RuntimeError()
+            return ''
+        self.execute.side_effect = restore_failer
+
+        self.iptables.ipv4['filter'].add_chain('filter')
+        self.iptables.apply()
+
+        self.assertEqual(
+            [['iptables-restore', '--noflush'],
+             ['iptables-restore', '-c']],
+            [c[0][0] for c in self._restore_calls()])
+        self.assertEqual(1, self.iptables._applied_images['iptables'][
+            'filter'].version)
@@ -249,6 +249,7 @@ class BasicRouterOperationsFramework(base.BaseTestCase):
             'neutron.agent.l3.agent.L3PluginApi')
         l3pluginApi_cls = self.l3pluginApi_cls_p.start()
         self.plugin_api = mock.MagicMock()
+        self.plugin_api.get_router_checksums.return_value = {}
         l3pluginApi_cls.return_value = self.plugin_api
 
         self.looping_call_p = mock.patch(
@@ -309,6 +310,7 @@ class BasicRouterOperationsFramework(base.BaseTestCase):
 class TestBasicRouterOperations(BasicRouterOperationsFramework):
     def test_periodic_sync_routers_task_raise_exception(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        self.plugin_api.get_router_checksums.return_value = {_uuid(): 'a'}
         self.plugin_api.get_routers.side_effect = ValueError
         self.assertRaises(ValueError,
                           agent.periodic_sync_routers_task,
@@ -323,6 +325,123 @@ class TestBasicRouterOperations(BasicRouterOperationsFramework):
                 agent.after_start()
                 router_sync.assert_called_once_with(agent.context)
 
+    def test_after_start_spawns_router_workers(self):
+        self.conf.set_override('router_processing_workers', 3)
+        with contextlib.nested(
+            mock.patch.object(l3_agent.L3NATAgent,
+                              'periodic_sync_routers_task'),
+            mock.patch.object(eventlet, 'spawn_n')
+        ) as (router_sync, spawn_n):
+            agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+            agent.after_start()
+        spawn_n.assert_has_calls(
+            [mock.call(agent._process_routers_loop, worker)
+             for worker in range(3)])
+
+    def test_router_processing_workers_must_be_positive(self):
+        self.conf.set_override('router_processing_workers', 0)
+        self.assertRaises(SystemExit, l3_agent.L3NATAgent,
+                          HOSTNAME, self.conf)
+
+    def test_sync_routers_chunk_size_must_be_positive(self):
+        self.conf.set_override('sync_routers_chunk_size', 0)
+        self.assertRaises(SystemExit, l3_agent.L3NATAgent,
+                          HOSTNAME, self.conf)
+
+    def test_router_workers_share_the_queue(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        router_id = _uuid()
+        agent.routers_updated(None, [router_id, router_id])
+        # A router is processed by whichever worker takes it off the queue,
+        # its other updates being folded in by ExclusiveRouterProcessor
+        updates = list(agent._queue.each_update_to_next_router())
+        self.assertEqual([router_id], [update.id for _rp, update in updates])
+
+    def test_fetch_and_sync_all_routers_fetches_changed_routers(self):
+        self.conf.set_override('sync_routers_chunk_size', 1)
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        agent.router_info = {'r1': mock.Mock(checksum='a'),
+                             'r2': mock.Mock(checksum='b')}
+        self.plugin_api.get_router_checksums.return_value = {
+            'r1': 'a', 'r2': 'c', 'r3': 'd'}
+        self.plugin_api.get_routers.side_effect = [[{'id': 'r2'}],
+                                                   [{'id': 'r3'}]]
+        ns_manager = mock.Mock()
+        agent.fetch_and_sync_all_routers(agent.context, ns_manager)
+        self.plugin_api.get_routers.assert_has_calls(
+            [mock.call(agent.context, ['r2']),
+             mock.call(agent.context, ['r3'])])
+        self.assertEqual(2, self.plugin_api.get_routers.call_count)
+        updates = [args[0] for args, _kwargs in
+                   agent._queue.add.call_args_list]
+        self.assertEqual([('r2', 'c'), ('r3', 'd')],
+                         [(update.id, update.checksum) for update in updates])
+        self.assertEqual(['r1', 'r2', 'r3'],
+                         sorted(args[0] for args, _kwargs in
+                                ns_manager.keep_router.call_args_list))
+        self.assertFalse(agent.fullsync)
+
+    def test_fetch_and_sync_all_routers_deletes_removed_routers(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        agent.router_info = {'r1': mock.Mock(checksum='a')}
+        agent.fetch_and_sync_all_routers(agent.context, mock.Mock())
+        self.assertFalse(self.plugin_api.get_routers.called)
+        update = agent._queue.add.call_args[0][0]
+        self.assertEqual('r1', update.id)
+        self.assertEqual(l3_agent.queue.DELETE_ROUTER, update.action)
+
+    def test_fetch_and_sync_all_routers_without_server_checksums(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._queue = mock.Mock()
+        self.plugin_api.get_router_checksums.side_effect = (
+            oslo_messaging.RemoteError('UnsupportedVersion'))
+        self.plugin_api.get_routers.return_value = [{'id': 'r1'}]
+        for _i in range(2):
+            agent.fetch_and_sync_all_routers(agent.context, mock.Mock())
+        self.plugin_api.get_router_checksums.assert_called_once_with(
+            agent.context)
+        self.plugin_api.get_routers.assert_has_calls(
+            [mock.call(agent.context)] * 2)
+        update = agent._queue.add.call_args[0][0]
+        self.assertIsNone(update.checksum)
+
+    def test_process_router_update_records_checksum(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._process_router_if_compatible = mock.Mock()
+        ri = mock.Mock(checksum=None)
+        agent.router_info = {'r1': ri}
+        agent._queue = mock.Mock()
+        update = l3_agent.queue.RouterUpdate(
+            'r1', l3_agent.queue.PRIORITY_SYNC_ROUTERS_TASK,
+            router={'id': 'r1'}, checksum='a')
+        agent._queue.each_update_to_next_router.return_value = [
+            (mock.Mock(), update)]
+        agent._process_router_update()
+        self.assertEqual('a', ri.checksum)
+
+    def test_process_router_update_failure_forgets_checksum(self):
+        agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
+        agent._process_router_if_compatible = mock.Mock(
+            side_effect=RuntimeError)
+        ri = mock.Mock(checksum='a')
+        agent.router_info = {'r1': ri}
+        agent._queue = mock.Mock()
+        update = l3_agent.queue.RouterUpdate(
+            'r1', l3_agent.queue.PRIORITY_RPC, router={'id': 'r1'})
+        agent._queue.each_update_to_next_router.return_value = [
+            (mock.Mock(), update)]
+        agent._process_router_update()
+        self.assertTrue(agent.fullsync)
+        self.assertIsNone(ri.checksum)
+        # The recovery sync fetches the router although the server checksum
+        # matches its last good one
+        self.plugin_api.get_routers.return_value = [{'id': 'r1'}]
+        self.assertEqual([{'id': 'r1'}],
+                         agent._fetch_changed_routers(agent.context,
+                                                      {'r1': 'a'}))
+
     def test_periodic_sync_routers_task_call_clean_stale_namespaces(self):
         agent = l3_agent.L3NATAgent(HOSTNAME, self.conf)
         self.plugin_api.get_routers.return_value = []
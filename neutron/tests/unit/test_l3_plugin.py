@@ -2420,6 +2420,33 @@ class L3RpcCallbackTestCase(base.BaseTestCase):
             'l3plugin', new_callable=mock.PropertyMock).start()
         self.l3_rpc_cb = l3_rpc.L3RpcCallback()
 
+    def test_get_router_checksums(self):
+        routers = [{'id': 'r%d' % i} for i in range(3)]
+        l3plugin = self.l3_rpc_cb.l3plugin
+        l3plugin.supported_extension_aliases = [
+            l3_constants.L3_AGENT_SCHEDULER_EXT_ALIAS]
+        l3plugin.list_router_ids_on_active_l3_agent.return_value = [
+            router['id'] for router in routers]
+        sync_data = l3plugin.list_active_sync_routers_on_active_l3_agent
+        sync_data.side_effect = [routers[:2], routers[2:]]
+        with mock.patch.object(l3_rpc, 'ROUTER_CHECKSUMS_CHUNK_SIZE', 2):
+            checksums = self.l3_rpc_cb.get_router_checksums(
+                mock.ANY, host='host')
+        sync_data.assert_has_calls(
+            [mock.call(mock.ANY, 'host', ['r0', 'r1']),
+             mock.call(mock.ANY, 'host', ['r2'])])
+        self.assertEqual(dict((router['id'],
+                               l3_rpc.get_router_checksum(router))
+                              for router in routers), checksums)
+
+    def test_get_router_checksum(self):
+        router = {'id': 'r0', 'routes': [], 'admin_state_up': True}
+        checksum = l3_rpc.get_router_checksum(router)
+        self.assertEqual(checksum, l3_rpc.get_router_checksum(
+            {'admin_state_up': True, 'routes': [], 'id': 'r0'}))
+        router['admin_state_up'] = False
+        self.assertNotEqual(checksum, l3_rpc.get_router_checksum(router))
+
     def test__ensure_host_set_on_port_update_on_concurrent_delete(self):
         port_id = 'foo_port_id'
         port = {
@@ -623,6 +623,7 @@ class TestBase(base.BaseTestCase):
         self.isdir = mock.patch('os.path.isdir').start()
         self.isdir.return_value = False
         self.rmtree = mock.patch('shutil.rmtree').start()
+        mock.patch.dict(dhcp.Dnsmasq._config_caches, clear=True).start()
 
         self.external_process = mock.patch(
             'neutron.agent.linux.external_process.ProcessManager').start()
@@ -1328,6 +1329,78 @@ class TestDnsmasq(TestBase):
         dnsmasq._release_lease.assert_has_calls([mock.call(mac2, ip2)],
                                                 any_order=True)
 
+    def _get_two_ports_network(self):
+        self.conf.set_override('enable_isolated_metadata', False)
+        network = mock.Mock(id='eeeeeeee-1111-2222-3333-444444444444',
+                            namespace='qdhcp-ns')
+        network.subnets = [FakeV4Subnet()]
+        network.ports = [FakePort1(), FakePort2()]
+        return network
+
+    def test_output_config_files_renders_changed_ports(self):
+        network = self._get_two_ports_network()
+        self._get_dnsmasq(network)._output_config_files()
+        network.ports[1].fixed_ips = [
+            FakeIPAllocation('192.168.0.9', FakeV4Subnet.id)]
+        dm = self._get_dnsmasq(network)
+        with mock.patch.object(dm, '_render_port',
+                               wraps=dm._render_port) as render_port:
+            dm._output_config_files()
+        render_port.assert_called_once_with(network.ports[1], mock.ANY,
+                                            mock.ANY)
+        self.safe.assert_any_call(
+            '/dhcp/%s/host' % network.id,
+            '00:00:80:aa:bb:cc,host-192-168-0-2.openstacklocal,192.168.0.2\n'
+            '00:00:f3:aa:bb:cc,host-192-168-0-9.openstacklocal,192.168.0.9\n')
+
+    def test_output_config_files_renders_all_ports_on_subnet_change(self):
+        network = self._get_two_ports_network()
+        self._get_dnsmasq(network)._output_config_files()
+        network.subnets = [FakeV4SubnetNoDHCP()]
+        dm = self._get_dnsmasq(network)
+        with mock.patch.object(dm, '_render_port',
+                               wraps=dm._render_port) as render_port:
+            dm._output_config_files()
+        self.assertEqual(2, render_port.call_count)
+
+    def test_output_config_files_skips_unchanged_files(self):
+        network = self._get_two_ports_network()
+        self._get_dnsmasq(network)._output_config_files()
+        self.assertEqual(3, self.safe.call_count)
+        with mock.patch('os.path.exists', return_value=True):
+            self._get_dnsmasq(network)._output_config_files()
+        self.assertEqual(3, self.safe.call_count)
+        # A deleted file is written again
+        with mock.patch('os.path.exists', return_value=False):
+            self._get_dnsmasq(network)._output_config_files()
+        self.assertEqual(6, self.safe.call_count)
+
+    def test_release_unused_leases_from_config_cache(self):
+        network = self._get_two_ports_network()
+        self._get_dnsmasq(network)._output_config_files()
+        port1 = network.ports[0]
+        port1.fixed_ips = [FakeIPAllocation('192.168.0.9', FakeV4Subnet.id)]
+        network.ports = [port1]
+        dm = self._get_dnsmasq(network)
+        dm._read_hosts_file_leases = mock.Mock()
+        dm._release_lease = mock.Mock()
+
+        dm._release_unused_leases()
+
+        self.assertFalse(dm._read_hosts_file_leases.called)
+        dm._release_lease.assert_has_calls(
+            [mock.call('00:00:80:aa:bb:cc', '192.168.0.2'),
+             mock.call('00:00:f3:aa:bb:cc', '192.168.0.3')],
+            any_order=True)
+        self.assertEqual(2, dm._release_lease.call_count)
+
+    def test_disable_drops_config_cache(self):
+        network = self._get_two_ports_network()
+        dm = self._get_dnsmasq(network)
+        dm._output_config_files()
+        dm.disable()
+        self.assertNotIn(network.id, dhcp.Dnsmasq._config_caches)
+
     def test_read_hosts_file_leases(self):
         filename = '/path/to/file'
         with mock.patch('os.path.exists') as mock_exists:
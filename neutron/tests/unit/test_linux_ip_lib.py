@@ -1013,3 +1013,99 @@ class TestAddNamespaceToCmd(base.BaseTestCase):
     def test_add_namespace_to_cmd_without_namespace(self):
         cmd = ['ping', '8.8.8.8']
         self.assertEqual(cmd, ip_lib.add_namespace_to_cmd(cmd, None))
+
+
+class TestIpBatch(base.BaseTestCase):
+    def setUp(self):
+        super(TestIpBatch, self).setUp()
+        self.execute = mock.patch('neutron.agent.linux.utils.execute').start()
+        self.execute.return_value = ('', '')
+        self.batch = ip_lib.IpBatch(namespace='ns')
+
+    def _expected_call(self, options, lines):
+        return mock.call(['ip', 'netns', 'exec', 'ns', 'ip'] + options +
+                         ['-force', '-batch', '-'],
+                         process_input='\n'.join(lines) + '\n',
+                         run_as_root=True, check_exit_code=False,
+                         return_stderr=True, log_fail_as_error=False)
+
+    def test_device_changes_are_queued(self):
+        device = self.batch.device('eth0')
+        device.addr.add(4, '15.1.2.3/32', '15.1.2.3')
+        device.route.add_route('10.0.0.0/8', '15.1.2.1')
+        device.neigh.add(4, '10.0.0.3', 'aa:bb:cc:dd:ee:ff')
+        device.addr.delete(6, 'fd00::3/128')
+        self.assertFalse(self.execute.called)
+        self.assertEqual([], self.batch.flush())
+        self.assertEqual(
+            [self._expected_call(
+                ['-4'],
+                ['addr add 15.1.2.3/32 brd 15.1.2.3 scope global dev eth0']),
+             self._expected_call(
+                [],
+                ['route replace 10.0.0.0/8 via 15.1.2.1 dev eth0']),
+             self._expected_call(
+                ['-4'],
+                ['neigh replace 10.0.0.3 lladdr aa:bb:cc:dd:ee:ff '
+                 'nud permanent dev eth0']),
+             self._expected_call(
+                ['-6'],
+                ['addr del fd00::3/128 dev eth0'])],
+            self.execute.call_args_list)
+        self.batch.flush()
+        self.assertEqual(4, self.execute.call_count)
+
+    def test_commands_sharing_options_run_at_once(self):
+        device = self.batch.device('eth0')
+        for address in ('15.1.2.3', '15.1.2.4', '15.1.2.5'):
+            device.addr.add(4, address + '/32', address)
+        self.batch.flush()
+        self.assertEqual(
+            [self._expected_call(
+                ['-4'],
+                ['addr add 15.1.2.%d/32 brd 15.1.2.%d scope global dev eth0' %
+                 (i, i) for i in (3, 4, 5)])],
+            self.execute.call_args_list)
+
+    def test_flush_reports_failed_commands(self):
+        self.execute.return_value = (
+            '', 'RTNETLINK answers: File exists\nCommand failed -:2\n')
+        device = self.batch.device('eth0')
+        device.addr.add(4, '15.1.2.3/32', '15.1.2.3')
+        device.addr.add(4, '15.1.2.4/32', '15.1.2.4')
+        failures = self.batch.flush()
+        self.assertEqual(
+            [ip_lib.IpBatchFailure(
+                (4,), 'addr',
+                ('add', '15.1.2.4/32', 'brd', '15.1.2.4', 'scope', 'global',
+                 'dev', 'eth0'),
+                'RTNETLINK answers: File exists')],
+            failures)
+
+    def test_flush_reports_all_commands_when_ip_fails(self):
+        self.execute.return_value = (
+            '', 'Cannot open network namespace "ns": No such file')
+        self.batch.add([], 'route', ['replace', 'to', '10.0.0.0/8',
+                                     'via', '15.1.2.1'])
+        self.batch.add([], 'route', ['delete', 'to', '10.1.0.0/16',
+                                     'via', '15.1.2.1'])
+        failures = self.batch.flush()
+        self.assertEqual([('replace', 'to', '10.0.0.0/8', 'via', '15.1.2.1'),
+                          ('delete', 'to', '10.1.0.0/16', 'via', '15.1.2.1')],
+                         [failure.args for failure in failures])
+
+    def test_call_after_batch(self):
+        func = mock.Mock()
+        device = self.batch.device('eth0')
+        device.addr.add(4, '15.1.2.3/32', '15.1.2.3')
+        ip_lib.call_after_batch(device, func, 'arg', kwarg='kwarg')
+        self.assertFalse(func.called)
+        self.execute.side_effect = lambda *args, **kwargs: (
+            self.assertFalse(func.called) or ('', ''))
+        self.batch.flush()
+        func.assert_called_once_with('arg', kwarg='kwarg')
+
+    def test_call_after_batch_without_batch(self):
+        func = mock.Mock()
+        ip_lib.call_after_batch(ip_lib.IPDevice('eth0'), func, 'arg')
+        func.assert_called_once_with('arg')
@@ -127,6 +127,18 @@ class TestNeutronContext(base.BaseTestCase):
         self.assertTrue(elevated_ctx.is_admin)
         self.assertEqual(req_id_before, elevated_ctx.request_id)
 
+    def test_neutron_context_parent_lookup_per_context(self):
+        ctx = context.Context('user_id', 'tenant_id')
+        self.assertIs(ctx.parent_lookup, ctx.parent_lookup)
+        self.assertIs(ctx.parent_lookup, ctx.elevated().parent_lookup)
+        self.assertIsNot(ctx.parent_lookup,
+                         context.Context('user_id', 'tenant_id').parent_lookup)
+
+    def test_neutron_context_parent_lookup_shared_when_elevated_first(self):
+        ctx = context.Context('user_id', 'tenant_id')
+        elevated_ctx = ctx.elevated()
+        self.assertIs(ctx.parent_lookup, elevated_ctx.parent_lookup)
+
     def test_neutron_context_overwrite(self):
         ctx1 = context.Context('user_id', 'tenant_id')
         self.assertEqual(ctx1.request_id, local.store.context.request_id)
@@ -16,7 +16,9 @@
 """Test of Policy Engine For Neutron"""
 
 import contextlib
+import os
 import StringIO
+import time
 import urllib2
 
 import mock
@@ -25,6 +27,7 @@ from oslo_serialization import jsonutils
 from oslo_utils import importutils
 import six
 import six.moves.urllib.request as urlrequest
+from testtools import content
 
 import neutron
 from neutron.api.v2 import attributes
@@ -62,6 +65,29 @@ class PolicyFileTestCase(base.BaseTestCase):
                           action,
                           self.target)
 
+    def test_modified_policy_clears_match_rules(self):
+        tmpfilename = self.get_temp_file_path('policy')
+        action = "example:test"
+        with open(tmpfilename, "w") as policyfile:
+            policyfile.write("""{"example:test": ""}""")
+        cfg.CONF.set_override('policy_file', tmpfilename)
+        policy.refresh()
+        policy.enforce(self.context, action, self.target)
+        match_rule = policy._build_match_rule(action, self.target)
+        self.assertIs(match_rule,
+                      policy._build_match_rule(action, self.target))
+        with open(tmpfilename, "w") as policyfile:
+            policyfile.write("""{"example:test": "!"}""")
+        mtime = os.path.getmtime(tmpfilename) + 10
+        os.utime(tmpfilename, (mtime, mtime))
+        self.assertRaises(common_policy.PolicyNotAuthorized,
+                          policy.enforce,
+                          self.context,
+                          action,
+                          self.target)
+        self.assertIsNot(match_rule,
+                         policy._build_match_rule(action, self.target))
+
 
 class PolicyTestCase(base.BaseTestCase):
     def setUp(self):
@@ -397,6 +423,27 @@ class NeutronPolicyTestCase(base.BaseTestCase):
         self._test_build_subattribute_match_rule(
             {'type:dict': 'wrong_stuff'})
 
+    def test_build_match_rule_cached_per_enforced_attributes(self):
+        action = "create_something"
+        match_rule = policy._build_match_rule(
+            action, {'tenant_id': 'fake', 'attr': {'sub_attr_1': 'x'}})
+        self.assertIs(match_rule, policy._build_match_rule(
+            action, {'tenant_id': 'other', 'attr': {'sub_attr_1': 'y'}}))
+        self.assertIsNot(match_rule, policy._build_match_rule(
+            action, {'tenant_id': 'fake', 'attr': {'sub_attr_2': 'x'}}))
+        self.assertEqual(
+            ['create_something', 'create_something:attr',
+             'create_something:attr:sub_attr_1'],
+            policy._process_rules_list([], match_rule))
+
+    def test_set_rules_clears_match_rules(self):
+        action = "create_something"
+        target = {'tenant_id': 'fake', 'attr': {'sub_attr_1': 'x'}}
+        match_rule = policy._build_match_rule(action, target)
+        policy.set_rules(common_policy.Rules(self.rules))
+        self.assertIsNot(match_rule,
+                         policy._build_match_rule(action, target))
+
     def test_enforce_subattribute(self):
         action = "create_something"
         target = {'tenant_id': 'fake', 'attr': {'sub_attr_1': 'x'}}
@@ -455,6 +502,22 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             result = policy.enforce(self.context, action, target)
             self.assertTrue(result)
 
+    def test_enforce_parent_resource_looked_up_once_per_context(self):
+        action = "create_port:mac"
+        with mock.patch.object(manager.NeutronManager.get_instance().plugin,
+                               'get_network',
+                               return_value={'tenant_id': 'fake'}) as f:
+            for i in range(3):
+                self.assertTrue(policy.enforce(self.context, action,
+                                               {'network_id': 'whatever'}))
+            f.assert_called_once_with(mock.ANY, 'whatever',
+                                      fields=['tenant_id'])
+            self.assertEqual(3, self.context.parent_lookup.lookups)
+            self.assertEqual(1, self.context.parent_lookup.plugin_calls)
+            other_context = context.Context('fake', 'fake', roles=['user'])
+            policy.enforce(other_context, action, {'network_id': 'whatever'})
+            self.assertEqual(2, f.call_count)
+
     def test_enforce_plugin_failure(self):
 
         def fakegetnetwork(*args, **kwargs):
@@ -488,6 +551,44 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             result = policy.enforce(self.context, action, target)
             self.assertTrue(result)
 
+    def test_checker_check_all_batches_parent_lookups(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_network_owner")
+        plugin = manager.NeutronManager.get_instance().plugin
+        networks = [{'id': 'net1', 'tenant_id': 'fake'},
+                    {'id': 'net2', 'tenant_id': 'other'}]
+        ports = [{'network_id': 'net1'}, {'network_id': 'net2'},
+                 {'network_id': 'net1'}]
+        with contextlib.nested(
+            mock.patch.object(plugin, 'get_networks', return_value=networks),
+            mock.patch.object(plugin, 'get_network')
+        ) as (get_networks, get_network):
+            checker = policy.Checker(self.context)
+            self.assertEqual([True, False, True],
+                             checker.check_all('get_port', ports))
+            self.assertTrue(checker.check('get_port', {'network_id': 'net1'}))
+        get_networks.assert_called_once_with(
+            mock.ANY, filters={'id': mock.ANY}, fields=['id', 'tenant_id'])
+        self.assertEqual(set(['net1', 'net2']),
+                         set(get_networks.call_args[1]['filters']['id']))
+        self.assertFalse(get_network.called)
+
+    def test_checker_check_all_single_parent_lookup(self):
+        self.rules['get_port'] = common_policy.parse_rule(
+            "rule:admin_or_network_owner")
+        plugin = manager.NeutronManager.get_instance().plugin
+        with contextlib.nested(
+            mock.patch.object(plugin, 'get_networks'),
+            mock.patch.object(plugin, 'get_network',
+                              return_value={'tenant_id': 'fake'})
+        ) as (get_networks, get_network):
+            checker = policy.Checker(self.context)
+            self.assertEqual([True, True], checker.check_all(
+                'get_port', [{'network_id': 'net1'}, {'network_id': 'net1'}]))
+        get_network.assert_called_once_with(mock.ANY, 'net1',
+                                            fields=['tenant_id'])
+        self.assertFalse(get_networks.called)
+
     def test_tenant_id_check_no_target_field_raises(self):
         # Try and add a bad rule
         self.assertRaises(
@@ -608,3 +709,44 @@ class NeutronPolicyTestCase(base.BaseTestCase):
             policy.log_rule_list(common_policy.RuleCheck('rule', 'create_'))
             self.assertTrue(is_e.called)
             self.assertTrue(dbg.called)
+
+
+class PolicyCheckBenchmarkTestCase(base.BaseTestCase):
+    """Micro-benchmark of the checks of typical port requests."""
+
+    def setUp(self):
+        super(PolicyCheckBenchmarkTestCase, self).setUp()
+        policy.refresh()
+        self.addCleanup(policy.reset)
+        self.context = context.Context('fake', 'fake', roles=['admin'])
+
+    def _checks_per_second(self, action, target, count=2000):
+        start = time.time()
+        for i in range(count):
+            policy.check(self.context, action, target)
+        return count / (time.time() - start)
+
+    def _test_checks_per_second(self, action, target):
+        # The first check compiles the match rule
+        self.assertTrue(policy.check(self.context, action, target))
+        match_rule = policy._build_match_rule(action, target)
+        rate = self._checks_per_second(action, target)
+        self.addDetail('%s checks per second' % action,
+                       content.text_content('%d' % rate))
+        self.assertIs(match_rule, policy._build_match_rule(action, target))
+
+    def test_create_port_checks_per_second(self):
+        self._test_checks_per_second(
+            'create_port',
+            {'tenant_id': 'fake', 'network_id': 'net1', 'name': 'port1',
+             'admin_state_up': True, 'mac_address': 'fa:16:3e:00:00:01',
+             'fixed_ips': [{'subnet_id': 'subnet1',
+                            'ip_address': '10.0.0.3'}],
+             'device_id': 'device1', 'device_owner': 'compute:nova'})
+
+    def test_update_port_checks_per_second(self):
+        self._test_checks_per_second(
+            'update_port',
+            {'tenant_id': 'fake', 'network_id': 'net1', 'name': 'port2',
+             'fixed_ips': [{'subnet_id': 'subnet1'}],
+             const.ATTRIBUTES_TO_UPDATE: ['name', 'fixed_ips']})
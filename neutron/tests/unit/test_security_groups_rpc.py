@@ -88,6 +88,9 @@ class SecurityGroupRpcTestPlugin(test_sg.SecurityGroupTestPlugin,
         self.devices[id] = updated_port
         self.update_security_group_on_port(
             context, id, port, original_port, updated_port)
+        self.notify_security_groups_member_updated_on_update(
+            context, original_port, updated_port)
+        return updated_port
 
     def delete_port(self, context, id):
         port = self.get_port(context, id)
@@ -501,6 +504,152 @@ class SGServerRpcCallBackTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id1)
                 self._delete('ports', port_id2)
 
+    def test_security_group_info_for_devices_cached(self):
+        cfg.CONF.set_override('security_group_cache_ttl', 60)
+        plugin = manager.NeutronManager.get_plugin()
+        rules_cache = sg_db_rpc.SG_RULES_CACHE
+        ips_cache = sg_db_rpc.SG_MEMBER_IPS_CACHE
+        for cache in (rules_cache, ips_cache):
+            cache.clear()
+            self.addCleanup(cache.clear)
+        with self.network() as n:
+            with contextlib.nested(self.subnet(n),
+                                   self.security_group(),
+                                   self.security_group()) as (subnet_v4,
+                                                              sg1,
+                                                              sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                rule1 = self._build_security_group_rule(
+                    sg1_id, 'ingress', const.PROTO_NAME_TCP, '24', '25',
+                    remote_group_id=sg2_id)
+                res = self._create_security_group_rule(self.fmt, rule1)
+                self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+                res1 = self._create_port(
+                    self.fmt, n['network']['id'], security_groups=[sg1_id])
+                port1 = self.deserialize(self.fmt, res1)['port']
+                ctx = context.get_admin_context()
+
+                def get_info():
+                    if isinstance(plugin, SecurityGroupRpcTestPlugin):
+                        # Its devices get their fixed IPs converted
+                        plugin.devices[port1['id']] = dict(port1)
+                    return self.rpc.security_group_info_for_devices(
+                        ctx, devices=[port1['id']])
+
+                self.assertEqual(set(), get_info()[
+                    'sg_member_ips'][sg2_id]['IPv4'])
+                first_stats = (rules_cache.stats(), ips_cache.stats())
+                info = get_info()
+                self.assertEqual(3, len(info['security_groups'][sg1_id]))
+                self.assertEqual(first_stats[0]['misses'],
+                                 rules_cache.stats()['misses'])
+                self.assertEqual(first_stats[0]['hits'] + 1,
+                                 rules_cache.stats()['hits'])
+                self.assertEqual(first_stats[1]['misses'],
+                                 ips_cache.stats()['misses'])
+
+                # Adding a member and a rule invalidates the cached values
+                res2 = self._create_port(
+                    self.fmt, n['network']['id'], security_groups=[sg2_id])
+                port2 = self.deserialize(self.fmt, res2)['port']
+                rule2 = self._build_security_group_rule(
+                    sg1_id, 'ingress', const.PROTO_NAME_UDP, '53', '53')
+                res = self._create_security_group_rule(self.fmt, rule2)
+                self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+                info = get_info()
+                self.assertEqual(4, len(info['security_groups'][sg1_id]))
+                self.assertEqual(
+                    set([port2['fixed_ips'][0]['ip_address']]),
+                    info['sg_member_ips'][sg2_id]['IPv4'])
+
+                # Deleting the remote group deletes the rules referring to it
+                self._delete('ports', port2['id'])
+                self._delete('security-groups', sg2_id)
+                info = get_info()
+                self.assertEqual(3, len(info['security_groups'][sg1_id]))
+                self.assertEqual({}, info['sg_member_ips'])
+                self._delete('ports', port1['id'])
+
+    def test_security_groups_member_updated_with_deltas(self):
+        cfg.CONF.set_override('security_group_member_deltas', True)
+        with self.network() as n:
+            with contextlib.nested(self.subnet(n),
+                                   self.security_group()) as (subnet_v4,
+                                                              sg1):
+                sg1_id = sg1['security_group']['id']
+                res = self._create_port(
+                    self.fmt, n['network']['id'], security_groups=[sg1_id])
+                port = self.deserialize(self.fmt, res)['port']
+                ip = port['fixed_ips'][0]['ip_address']
+                update = self.notifier.security_groups_member_updated.call_args
+                self.assertEqual([sg1_id], update[0][1])
+                created = update[1]['member_updates'][sg1_id]
+                self.assertEqual({const.IPv4: [ip], const.IPv6: []},
+                                 created['added'])
+                self.assertEqual({const.IPv4: [], const.IPv6: []},
+                                 created['removed'])
+
+                self._delete('ports', port['id'])
+                update = self.notifier.security_groups_member_updated.call_args
+                deleted = update[1]['member_updates'][sg1_id]
+                self.assertEqual({const.IPv4: [ip], const.IPv6: []},
+                                 deleted['removed'])
+                self.assertEqual({const.IPv4: [], const.IPv6: []},
+                                 deleted['added'])
+                self.assertEqual(created['source'], deleted['source'])
+                self.assertEqual(created['seq'] + 1, deleted['seq'])
+
+                sequences = sg_db_rpc.MEMBER_UPDATE_SEQUENCER._sequences
+                self.assertIn(sg1_id, sequences)
+                self._delete('security-groups', sg1_id)
+                self.assertNotIn(sg1_id, sequences)
+
+    def test_security_groups_member_updated_on_update_with_deltas(self):
+        cfg.CONF.set_override('security_group_member_deltas', True)
+        with self.network() as n:
+            with contextlib.nested(self.subnet(n),
+                                   self.security_group(),
+                                   self.security_group()) as (subnet_v4,
+                                                              sg1, sg2):
+                sg1_id = sg1['security_group']['id']
+                sg2_id = sg2['security_group']['id']
+                res = self._create_port(
+                    self.fmt, n['network']['id'], security_groups=[sg1_id])
+                port = self.deserialize(self.fmt, res)['port']
+                old_ip = port['fixed_ips'][0]['ip_address']
+                new_ip = '10.0.0.100'
+                notifier = self.notifier.security_groups_member_updated
+
+                self._update('ports', port['id'],
+                             {'port': {'fixed_ips': [
+                                 {'subnet_id': subnet_v4['subnet']['id'],
+                                  'ip_address': new_ip}]}})
+                update = notifier.call_args[1]['member_updates'][sg1_id]
+                self.assertEqual({const.IPv4: [new_ip], const.IPv6: []},
+                                 update['added'])
+                self.assertEqual({const.IPv4: [old_ip], const.IPv6: []},
+                                 update['removed'])
+
+                self._update('ports', port['id'],
+                             {'port': {'security_groups': [sg2_id]}})
+                self.assertEqual(set([sg1_id, sg2_id]),
+                                 set(notifier.call_args[0][1]))
+                updates = notifier.call_args[1]['member_updates']
+                self.assertEqual({const.IPv4: [new_ip], const.IPv6: []},
+                                 updates[sg1_id]['removed'])
+                self.assertEqual({const.IPv4: [], const.IPv6: []},
+                                 updates[sg1_id]['added'])
+                self.assertEqual({const.IPv4: [new_ip], const.IPv6: []},
+                                 updates[sg2_id]['added'])
+
+                # Nothing to notify when the addresses and groups are kept
+                notifier.reset_mock()
+                self._update('ports', port['id'],
+                             {'port': {'name': 'renamed'}})
+                self.assertFalse(notifier.called)
+                self._delete('ports', port['id'])
+
     def test_security_group_rules_for_devices_ipv6_ingress(self):
         fake_prefix = FAKE_PREFIX[const.IPv6]
         fake_gateway = FAKE_IP[const.IPv6]
@@ -1085,6 +1234,76 @@ class SGServerRpcCallBackTestCase(test_sg.SecurityGroupDBTestCase):
                 self._delete('ports', port_id2)
 
 
+class SecurityGroupCacheTestCase(base.BaseTestCase):
+
+    def setUp(self):
+        super(SecurityGroupCacheTestCase, self).setUp()
+        cfg.CONF.set_override('security_group_cache_ttl', 60)
+        self.cache = sg_db_rpc.SecurityGroupCache('test')
+
+    def _populate(self, values):
+        found, missing, token = self.cache.get_many(values)
+        self.cache.set_many(dict((sg_id, values[sg_id])
+                                 for sg_id in missing), token)
+        return found
+
+    def test_get_many(self):
+        self.assertEqual({}, self._populate({'sg1': 1, 'sg2': 2}))
+        self.assertEqual(({'sg1': 1}, ['sg3'], mock.ANY),
+                         self.cache.get_many(['sg1', 'sg3']))
+        self.assertEqual({'name': 'test', 'size': 2, 'hits': 1,
+                          'misses': 3}, self.cache.stats())
+
+    def test_disabled(self):
+        cfg.CONF.set_override('security_group_cache_ttl', 0)
+        self._populate({'sg1': 1})
+        self.assertEqual({}, self._populate({'sg1': 1}))
+        self.assertEqual({'name': 'test', 'size': 0, 'hits': 0,
+                          'misses': 0}, self.cache.stats())
+
+    def test_expiry(self):
+        with mock.patch.object(sg_db_rpc.time, 'time', return_value=100):
+            self._populate({'sg1': 1})
+            self.assertEqual({'sg1': 1}, self._populate({'sg1': 1}))
+        with mock.patch.object(sg_db_rpc.time, 'time', return_value=160):
+            self.assertEqual({}, self._populate({'sg1': 1}))
+
+    def test_invalidate(self):
+        self._populate({'sg1': 1, 'sg2': 2})
+        self.cache.invalidate(['sg1'])
+        self.assertEqual({'sg2': 2}, self._populate({'sg1': 1, 'sg2': 2}))
+        self.cache.clear()
+        self.assertEqual({}, self._populate({'sg1': 1, 'sg2': 2}))
+
+    def test_invalidate_while_computing(self):
+        # A value computed before an invalidation may be outdated
+        _found, _missing, token = self.cache.get_many(['sg1', 'sg2'])
+        self.cache.invalidate(['sg1'])
+        self.cache.set_many({'sg1': 1, 'sg2': 2}, token)
+        self.assertEqual(({'sg2': 2}, ['sg1'], mock.ANY),
+                         self.cache.get_many(['sg1', 'sg2']))
+        _found, _missing, token = self.cache.get_many(['sg1'])
+        self.cache.clear()
+        self.cache.set_many({'sg1': 1}, token)
+        self.assertEqual(0, self.cache.stats()['size'])
+
+
+class MemberUpdateSequencerTestCase(base.BaseTestCase):
+
+    def test_next(self):
+        sequencer = sg_db_rpc.MemberUpdateSequencer()
+        source, seq = sequencer.next('sg1')
+        self.assertEqual((source, seq + 1), sequencer.next('sg1'))
+        self.assertEqual((source, 1), sequencer.next('sg2'))
+
+    def test_forget(self):
+        sequencer = sg_db_rpc.MemberUpdateSequencer()
+        sequencer.next('sg1')
+        sequencer.forget('sg1')
+        sequencer.forget('sg2')
+        self.assertEqual({}, dict(sequencer._sequences))
+
+
 class SGAgentRpcCallBackMixinTestCase(base.BaseTestCase):
     def setUp(self):
         super(SGAgentRpcCallBackMixinTestCase, self).setUp()
@@ -1103,6 +1322,16 @@ class SGAgentRpcCallBackMixinTestCase(base.BaseTestCase):
         self.rpc.sg_agent.assert_has_calls(
             [mock.call.security_groups_member_updated(['fake_sgid'])])
 
+    def test_security_groups_member_updated_with_member_updates(self):
+        member_updates = {'fake_sgid': {'source': 'server1', 'seq': 1,
+                                        'added': {}, 'removed': {}}}
+        self.rpc.security_groups_member_updated(
+            None, security_groups=['fake_sgid'],
+            member_updates=member_updates)
+        self.rpc.sg_agent.assert_has_calls(
+            [mock.call.security_groups_member_updated(
+                ['fake_sgid'], member_updates=member_updates)])
+
     def test_security_groups_provider_updated(self):
         self.rpc.security_groups_provider_updated(None)
         self.rpc.sg_agent.assert_has_calls(
@@ -1274,6 +1503,7 @@ class SecurityGroupAgentEnhancedRpcTestCase(
                 ('fake_sgid1', [{'remote_group_id': 'fake_sgid2'}])]),
             'sg_member_ips': {'fake_sgid2': {'IPv4': [], 'IPv6': []}},
             'devices': self.firewall.ports}
+        self.fake_sg_info = fake_sg_info
         self.agent.plugin_rpc.security_group_info_for_devices.return_value = (
             fake_sg_info)
 
@@ -1327,6 +1557,78 @@ class SecurityGroupAgentEnhancedRpcTestCase(
             ['fake_sgid3', 'fake_sgid4'])
         self.assertFalse(self.agent.refresh_firewall.called)
 
+    def _member_update(self, seq, source='server1'):
+        return {'fake_sgid2': {'source': source, 'seq': seq,
+                               'added': {'IPv4': ['10.0.0.3']},
+                               'removed': {'IPv4': ['10.0.0.4']}}}
+
+    def test_security_groups_member_updated_delta_enhanced_rpc(self):
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.firewall.update_security_group_members_delta.return_value = True
+        # The first update from a server refreshes the members
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._member_update(4))
+        self.agent.refresh_firewall.assert_called_once_with(
+            [self.fake_device['device']])
+        self.agent.refresh_firewall.reset_mock()
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._member_update(5))
+        self.assertFalse(self.agent.refresh_firewall.called)
+        update_delta = self.firewall.update_security_group_members_delta
+        update_delta.assert_called_once_with(
+            'fake_sgid2', {'IPv4': ['10.0.0.3']}, {'IPv4': ['10.0.0.4']})
+
+    def test_security_groups_member_updated_delta_gap_enhanced_rpc(self):
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._member_update(4))
+        self.agent.refresh_firewall.reset_mock()
+        for member_update in (self._member_update(6),
+                              self._member_update(7, source='server2')):
+            self.agent.security_groups_member_updated(
+                ['fake_sgid2'], member_updates=member_update)
+            self.agent.refresh_firewall.assert_called_once_with(
+                [self.fake_device['device']])
+            self.agent.refresh_firewall.reset_mock()
+        self.assertFalse(
+            self.firewall.update_security_group_members_delta.called)
+
+    def test_security_groups_member_updated_delta_not_applied(self):
+        self.agent.refresh_firewall = mock.Mock()
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._member_update(4))
+        self.agent.refresh_firewall.reset_mock()
+        self.firewall.update_security_group_members_delta.return_value = False
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._member_update(5))
+        self.agent.refresh_firewall.assert_called_once_with(
+            [self.fake_device['device']])
+
+    def test_security_groups_member_updated_delta_during_refresh(self):
+        self.agent.prepare_devices_filter(['fake_port_id'])
+        self.agent.security_groups_member_updated(
+            ['fake_sgid2'], member_updates=self._member_update(4))
+        self.firewall.update_security_group_members_delta.return_value = True
+
+        def member_updated(context, devices):
+            # The members fetched may not include the update
+            self.agent.security_groups_member_updated(
+                ['fake_sgid2'], member_updates=self._member_update(5))
+            self.assertFalse(
+                self.firewall.update_security_group_members_delta.called)
+            return self.fake_sg_info
+
+        self.agent.plugin_rpc.security_group_info_for_devices.side_effect = (
+            member_updated)
+        with mock.patch.object(self.agent, '_security_group_updated') as (
+                sg_updated):
+            self.agent.refresh_firewall(['fake_device'])
+        sg_updated.assert_called_once_with(['fake_sgid2'],
+                                           'security_group_source_groups')
+
     def test_security_groups_provider_updated_enhanced_rpc(self):
         self.agent.refresh_firewall = mock.Mock()
         self.agent.security_groups_provider_updated()
@@ -1653,6 +1955,17 @@ class SecurityGroupAgentRpcApiTestCase(base.BaseTestCase):
             [mock.call(None, 'security_groups_member_updated',
                        security_groups=['fake_sgid'])])
 
+    def test_security_groups_member_updated_with_member_updates(self):
+        member_updates = {'fake_sgid': {'source': 'server1', 'seq': 1,
+                                        'added': {}, 'removed': {}}}
+        self.notifier.security_groups_member_updated(
+            None, security_groups=['fake_sgid'],
+            member_updates=member_updates)
+        self.mock_cast.assert_has_calls(
+            [mock.call(None, 'security_groups_member_updated',
+                       security_groups=['fake_sgid'],
+                       member_updates=member_updates)])
+
     def test_security_groups_rule_not_updated(self):
         self.notifier.security_groups_rule_updated(
             None, security_groups=[])